@@ -1,19 +1,114 @@
 """文字肉鸽游戏 - Flask主应用"""
+import functools
+import hmac
 import json
 import os
-import random
-from flask import Flask, request, jsonify, send_from_directory
+from collections.abc import Mapping
+from flask import Flask, Response, request, jsonify, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from game.map_gen import get_next_available_nodes
+
+from game import codec
+
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """jsonify / request.json 走 game.codec（优先 orjson），输出不转义中文的紧凑 JSON、不排序键"""
+
+    @staticmethod
+    def default(o):
+        # 战斗实体等映射类型按 dict 输出，其余交给 Flask 的默认处理
+        return codec.to_builtin(o) if isinstance(o, Mapping) else DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs) -> str:
+        return codec.dumps(obj, default=kwargs.get('default', self.default))
+
+    def loads(self, s, **kwargs):
+        return codec.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(codec.dumps_bytes(obj, default=self.default), mimetype=self.mimetype)
+
 
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
+app.json = CodecJSONProvider(app)
 CORS(app)
 
 # SQLite 持久化存储（支持多人游玩、服务器重启恢复）
-from game.db import get_game, save_game, record_run, get_leaderboard, get_stats_summary, cleanup_old_games
-
-# 每100次新游戏清理一次旧数据
-_new_game_count = 0
+from game.db import (get_game, save_game, checkpoint_game, discard_game, record_run, query_leaderboard,
+                     get_stats_summary, log_action, StaleStateError)
+from game.locks import game_lock
+from game.cards import expand_cards
+from game.combatants import PlayerData
+from game.actions import ActionError, apply_action, apply_batch, run_outcome
+from game.replay import TERMINAL_PHASES, state_hash
+from game import maintenance, metrics, patch, profiler, stream
+
+# /api/combat/batch 一次最多执行的动作数
+BATCH_MAX_ACTIONS = int(os.environ.get('BATCH_MAX_ACTIONS', 20))
+# 每局最近一次发出的视图（差量响应 / 推送的基准）
+_views = patch.ViewCache(int(os.environ.get('VIEW_CACHE_MAX_ENTRIES', 2000)))
+
+
+def _serialized_game(view):
+    """
+    同一局的请求串行执行：整个 读取-修改-保存 周期持有该局的锁。
+    修改类请求出错时回滚改了一半的缓存状态：之前已确认、尚未写回的修改保留（见 checkpoint_game）。
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == 'GET':
+            game_id = request.args.get('game_id')
+        else:
+            game_id = (request.get_json(silent=True) or {}).get('game_id')
+        if not game_id:
+            return view(*args, **kwargs)
+        with game_lock(game_id):
+            if request.method == 'GET':
+                # 只读请求不修改状态，出错时无需回滚
+                return view(*args, **kwargs)
+            checkpoint = checkpoint_game(game_id)
+            try:
+                return view(*args, **kwargs)
+            except Exception:
+                discard_game(game_id, checkpoint)
+                raise
+    return wrapper
+
+
+@app.before_request
+def _start_maintenance():
+    """旧游戏清理等维护任务在后台线程中执行（每个进程第一次处理请求时启动）"""
+    maintenance.start()
+
+
+if metrics.METRICS_ENABLED:
+    @app.before_request
+    def _start_metrics():
+        """请求计时开始；JSON 请求体在此解析（Flask 会缓存结果），计入 json_decode 阶段"""
+        metrics.start_request()
+        if request.is_json:
+            with metrics.phase('json_decode'):
+                request.get_json(silent=True)
+
+    @app.after_request
+    def _finish_metrics(response):
+        """按路由记录总耗时、各阶段耗时与请求/响应字节数"""
+        metrics.finish_request(request.endpoint or 'unmatched', response.status_code,
+                               request.content_length or 0,
+                               None if response.is_streamed else response.calculate_content_length())
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """Prometheus 文本格式的指标"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.errorhandler(StaleStateError)
+def stale_state(e):
+    """其他进程已写入更新的版本：拒绝本次写入，客户端刷新后重试"""
+    return jsonify({'error': '游戏状态已被其他请求更新，请刷新后重试'}), 409
 
 
 # ===== 静态文件服务 =====
@@ -56,19 +151,20 @@ def new_game():
     player_name = data.get('name', '英雄')
 
     ascension = data.get('ascension', 0)
+    # 可选种子：同一种子 + 同一操作序列得到同一局游戏
+    seed = data.get('seed')
+    if seed is not None:
+        try:
+            seed = int(seed) & ((1 << 63) - 1)
+        except (TypeError, ValueError):
+            return jsonify({'error': '无效的种子'}), 400
     from game.state import create_new_game
-    state = create_new_game(character, player_name, ascension)
+    state = create_new_game(character, player_name, ascension, seed=seed)
     game_id = state['game_id']
+    log_action(game_id, state, 'new_game', {'character': character, 'player_name': player_name,
+                                            'ascension': ascension, 'seed': state['seed']})
     save_game(game_id, state)
 
-    # 每50局清理一次超过2小时未活动的旧游戏
-    global _new_game_count
-    _new_game_count += 1
-    if _new_game_count % 50 == 0:
-        removed = cleanup_old_games(hours=2)
-        if removed > 0:
-            app.logger.info(f'清理了 {removed} 个旧游戏会话')
-
     return jsonify({
         'game_id': game_id,
         'message': state['message'],
@@ -78,6 +174,7 @@ def new_game():
 
 
 @app.route('/api/state', methods=['GET'])
+@_serialized_game
 def get_state():
     """获取完整游戏状态"""
     game_id = request.args.get('game_id')
@@ -85,11 +182,50 @@ def get_state():
     if not state:
         return jsonify({'error': '游戏不存在'}), 404
 
-    return jsonify(_build_response(state))
+    with metrics.phase('respond'):
+        base_version = _client_version()
+        if base_version is not None and base_version == state.get('version', 0):
+            return jsonify({'version': base_version, 'base_version': base_version, 'patch': []})
+        return _respond(state, {}, base_version)
+
+
+@app.route('/api/stream', methods=['GET'])
+def stream_events():
+    """服务端推送（SSE）：该局每个动作的分段日志与状态补丁"""
+    if not stream.STREAM_ENABLED:
+        return jsonify({'error': '推送未开启'}), 404
+    game_id = request.args.get('game_id')
+    if not game_id:
+        return jsonify({'error': '游戏不存在'}), 404
+    # 重连时浏览器带上最后收到的事件 id（即状态版本）
+    base_version = request.headers.get('Last-Event-ID') or request.args.get('base_version')
+    try:
+        base_version = int(base_version) if base_version is not None else None
+    except ValueError:
+        base_version = None
+    # 在锁内读取状态并订阅：之后提交的动作一定会推送到队列中
+    with game_lock(game_id):
+        state = get_game(game_id)
+        if not state:
+            return jsonify({'error': '游戏不存在'}), 404
+        try:
+            q = stream.subscribe(game_id)
+        except stream.TooManyStreams:
+            return jsonify({'error': '该局的推送连接过多'}), 429
+        version = state.get('version', 0)
+        if base_version == version:
+            first = stream.format_event('hello', {'version': version}, version)
+        else:
+            view = _view(state)
+            _views.put(game_id, state, view)
+            first = stream.format_event('state', {'version': version, 'state': view}, version)
+    return Response(stream.events(game_id, q, first), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 # ===== API: 地图 =====
 @app.route('/api/map', methods=['GET'])
+@_serialized_game
 def get_map():
     """获取当前地图"""
     game_id = request.args.get('game_id')
@@ -105,547 +241,154 @@ def get_map():
 
 
 @app.route('/api/select_node', methods=['POST'])
+@_serialized_game
 def select_node():
     """选择地图节点"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    node_id = data.get('node_id')
-
-    state = get_game(game_id)
-    if not state:
-        return jsonify({'error': '游戏不存在'}), 404
-
-    if state['phase'] != 'map':
-        return jsonify({'error': '当前不在地图阶段'}), 400
-
-    map_data = state['map']
-    node = map_data['nodes'].get(node_id)
-    if not node:
-        return jsonify({'error': '节点不存在'}), 400
-
-    if node_id not in map_data.get('available_nodes', []):
-        return jsonify({'error': '该节点不可访问'}), 400
-
-    # 更新地图可用节点
-    get_next_available_nodes(map_data, node_id)
-    state['map'] = map_data
-
-    node_type = node['type']
-    player = state['player']
-    player['floor'] = node.get('floor', player.get('floor', 0)) + 1
-
-    if node_type in ('monster', 'elite', 'boss'):
-        from game.state import init_combat
-        state = init_combat(state, node_type, player['floor'])
-        state['message'] = f'⚔️ 进入战斗！'
-
-    elif node_type == 'rest':
-        state['phase'] = 'rest'
-        state['message'] = '🔥 你找到了一处篝火。在此休息或升级卡牌？'
-
-    elif node_type == 'shop':
-        from game.state import get_shop_inventory
-        state['shop'] = get_shop_inventory(state)
-        state['phase'] = 'shop'
-        state['message'] = '🛒 欢迎光临！有什么需要的吗？'
-        # 大颌银行：进入商店后停止收益
-        state['player']['_maw_bank_spent'] = True
-
-    elif node_type == 'event':
-        from game.events import get_random_event
-        state['event'] = get_random_event()
-        state['phase'] = 'event'
-        state['message'] = f'❓ {state["event"]["title"]}'
-
-    elif node_type == 'treasure':
-        from game.relics import get_random_relic
-        relic = get_random_relic()
-        if relic:
-            player['relics'].append(relic)
-            state['message'] = f'📦 你打开了宝箱！获得遗物: {relic["name"]}'
-        gold = random.randint(20, 50)
-        player['gold'] += gold
-        state['message'] += f' 和 {gold} 金币'
-        state['phase'] = 'map'
-
-    state['player'] = player
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+    return _run_action(data.get('game_id'), 'select_node', node_id=data.get('node_id'))
 
 
 # ===== API: 战斗 =====
 @app.route('/api/combat/play_card', methods=['POST'])
+@_serialized_game
 def play_card():
     """打出卡牌"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    card_index = data.get('card_index', 0)
-    target_index = data.get('target_index', 0)
-
-    state = get_game(game_id)
-    if not state:
-        return jsonify({'error': '游戏不存在'}), 404
-    if state['phase'] != 'combat':
-        return jsonify({'error': '当前不在战斗阶段'}), 400
-
-    player = state['player']
-    combat = state['combat']
-    enemies = combat['enemies']
-
-    # 获取手牌中的卡
-    hand = player.get('hand', [])
-    if card_index >= len(hand):
-        return jsonify({'error': '无效的牌索引'}), 400
-
-    card = hand[card_index]
-
-    # 检查能量
-    cost = card.get('cost', 0)
-    if isinstance(cost, int) and player.get('energy', 0) < cost:
-        return jsonify({'error': '能量不足', 'energy': player['energy'], 'cost': cost}), 400
-
-    if card.get('unplayable'):
-        return jsonify({'error': '此牌无法打出'}), 400
-
-    # 过滤存活敌人（记录原始索引，避免同类型敌人更新错乱）
-    alive_indices = [i for i, e in enumerate(enemies) if e.get('hp', 0) > 0]
-    alive_enemies = [enemies[i] for i in alive_indices]
-    if not alive_enemies:
-        return jsonify({'error': '没有存活的敌人'}), 400
-
-    # 确保target_index有效
-    target_index = min(target_index, len(alive_enemies) - 1)
-
-    # 执行卡牌效果
-    from game.combat import apply_card_effect, check_combat_end
-    player, alive_enemies, logs = apply_card_effect(card, player, alive_enemies, target_index)
-
-    # 回声形态：第一张非能力牌触发2次
-    if (player.get('_echo_form') and not player.get('_echo_used')
-            and card.get('type') != 'power' and card.get('id') != 'm_echo_form'):
-        player['_echo_used'] = True
-        _, alive_enemies, echo_logs = apply_card_effect(card, player, alive_enemies, target_index)
-        logs.append('🔮 回声形态：再次触发！')
-        logs.extend(echo_logs)
-
-    # 统计
-    player['cards_played'] = player.get('cards_played', 0) + 1
-
-    # 从手牌移除（exhaust -> exhaust_pile, 反弹->抽牌堆顶, 否则 -> discard_pile）
-    hand.pop(card_index)
-    if player.pop('_rebound_active', False):
-        # 反弹：将牌放回抽牌堆顶
-        player['draw_pile'] = player.get('draw_pile', []) + [card]
-        logs.append(f'🔄 反弹：【{card["name"]}】回到抽牌堆顶')
-    elif card.get('exhaust'):
-        player['exhaust_pile'] = player.get('exhaust_pile', []) + [card]
-    else:
-        player['discard_pile'].append(card)
-
-    player['hand'] = hand
-
-    # 按原始索引回写更新后的存活敌人（保留死亡敌人以显示）
-    for j, orig_idx in enumerate(alive_indices):
-        enemies[orig_idx] = alive_enemies[j]
-
-    combat['log'] = logs
-    combat['enemies'] = enemies
-
-    # 检查战斗结束
-    result = check_combat_end(player, alive_enemies)
-
-    if result == 'victory':
-        from game.state import end_combat_victory
-        state['player'] = player
-        state['combat'] = combat
-        state = end_combat_victory(state)
-        if state['phase'] == 'victory':  # 最终胜利
-            record_run(state['player'], 'victory', state.get('ascension', 0))
-        save_game(game_id, state)
-        return jsonify({**_build_response(state), 'combat_result': 'victory', 'log': logs})
-
-    elif result == 'defeat':
-        state['phase'] = 'game_over'
-        state['message'] = '💀 你已倒下！游戏结束。'
-        state['player'] = player
-        state['combat'] = combat
-        record_run(player, 'defeat', state.get('ascension', 0))
-        save_game(game_id, state)
-        return jsonify({**_build_response(state), 'combat_result': 'defeat', 'log': logs})
-
-    state['player'] = player
-    state['combat'] = combat
-    save_game(game_id, state)
-
-    return jsonify({
-        **_build_response(state),
-        'log': logs,
-    })
+    return _run_action(data.get('game_id'), 'play_card',
+                       card_index=data.get('card_index', 0), target_index=data.get('target_index', 0))
 
 
 @app.route('/api/combat/end_turn', methods=['POST'])
+@_serialized_game
 def end_turn():
     """结束玩家回合"""
     data = request.json or {}
-    game_id = data.get('game_id')
+    return _run_action(data.get('game_id'), 'end_turn')
+
 
+@app.route('/api/combat/batch', methods=['POST'])
+@_serialized_game
+def combat_batch():
+    """
+    一次执行一个回合内的多个战斗动作（出牌 / 使用药水 / 结束回合），只读取、保存一次。
+    遇到错误或战斗结束即停止，已执行的动作照常保存；第一个动作就失败时与单个动作一样返回错误。
+    """
+    data = request.json or {}
+    steps = data.get('actions')
+    if not isinstance(steps, list) or not steps:
+        return jsonify({'error': '缺少动作列表'}), 400
+    if len(steps) > BATCH_MAX_ACTIONS:
+        return jsonify({'error': f'一次最多执行 {BATCH_MAX_ACTIONS} 个动作'}), 400
+    game_id = data.get('game_id')
     state = get_game(game_id)
     if not state:
         return jsonify({'error': '游戏不存在'}), 404
-    if state['phase'] != 'combat':
-        return jsonify({'error': '当前不在战斗阶段'}), 400
+    version, base_version, before = _client_view(game_id, state)
 
-    player = state['player']
-    combat = state['combat']
-    enemies = combat['enemies']
-    # 记录原始索引，避免同类型敌人更新错乱
-    alive_indices = [i for i, e in enumerate(enemies) if e.get('hp', 0) > 0]
-    alive_enemies = [enemies[i] for i in alive_indices]
-
-    from game.combat import end_player_turn, start_player_turn, check_combat_end
-
-    # 敌人回合
-    player, alive_enemies, enemy_logs = end_player_turn(player, alive_enemies)
-
-    # 检查死亡
-    result = check_combat_end(player, alive_enemies)
-
-    # 按原始索引回写（保留死亡敌人供显示）
-    for j, orig_idx in enumerate(alive_indices):
-        enemies[orig_idx] = alive_enemies[j]
-
-    if result == 'defeat':
-        state['phase'] = 'game_over'
-        state['message'] = '💀 你已倒下！游戏结束。'
-        state['player'] = player
-        state['combat'] = combat
-        record_run(player, 'defeat', state.get('ascension', 0))
-        save_game(game_id, state)
-        return jsonify({**_build_response(state), 'combat_result': 'defeat', 'log': enemy_logs})
-
-    if result == 'victory':
-        from game.state import end_combat_victory
-        state['player'] = player
-        state['combat'] = combat
-        state = end_combat_victory(state)
-        if state['phase'] == 'victory':  # 最终胜利
-            record_run(state['player'], 'victory', state.get('ascension', 0))
-        save_game(game_id, state)
-        return jsonify({**_build_response(state), 'combat_result': 'victory', 'log': enemy_logs})
-
-    # 开始新的玩家回合（传入enemies，遗物效果在start_player_turn内统一处理）
-    combat['turn'] += 1
-    player['turns'] = player.get('turns', 0) + 1
-    player, alive_enemies, start_logs = start_player_turn(player, alive_enemies)
-    all_logs = enemy_logs + ['--- 玩家回合 ---'] + start_logs
-
-    combat['enemies'] = enemies
-    combat['log'] = all_logs
-    state['player'] = player
-    state['combat'] = combat
-    save_game(game_id, state)
+    def applied(state, name, params, extra):
+        _log_action(game_id, state, name, params)
 
-    return jsonify({**_build_response(state), 'log': all_logs})
+    with metrics.phase('engine'), profiler.scope(game_id):
+        state, done, error = apply_batch(state, steps, applied)
+    if not done:
+        return jsonify({'error': error.message, **error.extra}), error.status
+
+    # 各动作的日志按顺序合并到顶层 log，与单个动作的响应一致
+    extra = {
+        'log': [line for _, _, e in done for line in e.get('log', [])],
+        'results': [{'action': name, **e} for name, _, e in done],
+        'completed': len(done),
+    }
+    if done[-1][2].get('combat_result'):
+        extra['combat_result'] = done[-1][2]['combat_result']
+    if error is not None:
+        extra['stopped'] = {'index': len(done), 'error': error.message, **error.extra}
+    return _commit(game_id, state, extra, version, base_version, before)
 
 
 # ===== API: 卡牌奖励 =====
 @app.route('/api/pick_card', methods=['POST'])
+@_serialized_game
 def pick_card():
     """选择奖励卡牌"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    card_id = data.get('card_id')
-    skip = data.get('skip', False)
-
-    state = get_game(game_id)
-    if not state:
-        return jsonify({'error': '游戏不存在'}), 404
-
-    player = state['player']
-    relic_ids = {r['id'] for r in player.get('relics', [])}
-
-    if not skip and card_id:
-        from game.cards import ALL_CARDS
-        card_data = None
-        for reward in (state.get('card_rewards') or []):
-            if reward['id'] == card_id:
-                card_data = reward
-                break
-        if card_data:
-            player['deck'].append(card_data)
-            player['discard_pile'].append(card_data)
-            # 陶瓷鱼：选牌时+9金币
-            if 'ceramic_fish' in relic_ids:
-                player['gold'] = player.get('gold', 0) + 9
-                player['gold_earned'] = player.get('gold_earned', 0) + 9
-    else:
-        # 鸣碗：跳过选牌时+2最大HP
-        if skip and 'singing_bowl' in relic_ids:
-            player['max_hp'] = player.get('max_hp', 50) + 2
-            player['hp'] = min(player['hp'], player['max_hp'])
-
-    state['player'] = player
-    state['card_rewards'] = None
-    state['phase'] = 'map'
-    state['message'] = '🗺️ 选择下一个目的地...'
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+    return _run_action(data.get('game_id'), 'pick_card',
+                       card_id=data.get('card_id'), skip=data.get('skip', False))
 
 
 # ===== API: Boss遗物 =====
 @app.route('/api/pick_relic', methods=['POST'])
+@_serialized_game
 def pick_relic():
     """选择Boss遗物"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    relic_id = data.get('relic_id')
-
-    state = get_game(game_id)
-    if not state:
-        return jsonify({'error': '游戏不存在'}), 404
-
-    from game.state import select_boss_relic
-    state = select_boss_relic(state, relic_id)
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+    return _run_action(data.get('game_id'), 'pick_relic', relic_id=data.get('relic_id'))
 
 
 # ===== API: 休息点 =====
 @app.route('/api/rest', methods=['POST'])
+@_serialized_game
 def rest():
     """在休息点休息或升级"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    action = data.get('action', 'heal')  # heal / upgrade
-    card_id = data.get('card_id')
-
-    state = get_game(game_id)
-    if not state:
-        return jsonify({'error': '游戏不存在'}), 404
-    if state['phase'] != 'rest':
-        return jsonify({'error': '当前不在休息阶段'}), 400
-
-    player = state['player']
-
-    if action == 'heal':
-        heal_amount = max(10, player['max_hp'] // 4)
-        player['hp'] = min(player['max_hp'], player['hp'] + heal_amount)
-        state['message'] = f'🔥 休息恢复了 {heal_amount} 点HP！'
-
-    elif action == 'upgrade' and card_id:
-        # 升级指定卡牌
-        for card in player['deck']:
-            if card['id'] == card_id and not card.get('upgraded'):
-                card['upgraded'] = True
-                card['name'] = card['name'] + '+'
-                # 升级效果
-                if card.get('damage'):
-                    card['damage'] = int(card['damage'] * 1.3) + 2
-                if card.get('block'):
-                    card['block'] = int(card['block'] * 1.3) + 2
-                if card.get('cost', 1) > 0:
-                    card['cost'] = max(0, card['cost'] - 1)
-                # 升级后更新描述中的数值
-                import re
-                desc = card.get('description', '')
-                if card.get('damage', 0) > 0 and '伤害' in desc:
-                    desc = re.sub(r'\d+(?=点伤害)', str(card['damage']), desc, count=1)
-                if card.get('block', 0) > 0 and '格挡' in desc:
-                    desc = re.sub(r'\d+(?=点格挡)', str(card['block']), desc, count=1)
-                card['description'] = desc
-                state['message'] = f'✨ 卡牌【{card["name"]}】已升级！'
-                break
-
-    state['phase'] = 'map'
-    state['player'] = player
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+    return _run_action(data.get('game_id'), 'rest',
+                       action=data.get('action', 'heal'), card_id=data.get('card_id'))  # heal / upgrade
 
 
 # ===== API: 商店 =====
 @app.route('/api/shop/buy_card', methods=['POST'])
+@_serialized_game
 def shop_buy_card():
     """购买卡牌"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    card_id = data.get('card_id')
-
-    state = get_game(game_id)
-    if not state or state['phase'] != 'shop':
-        return jsonify({'error': '不在商店'}), 400
-
-    shop = state['shop']
-    player = state['player']
-    price = shop['card_prices'].get(card_id, 999)
-
-    if player.get('gold', 0) < price:
-        return jsonify({'error': f'金币不足！需要 {price} 金币', 'gold': player['gold']}), 400
-
-    card = next((c for c in shop['cards'] if c['id'] == card_id), None)
-    if not card:
-        return jsonify({'error': '商品已售出'}), 400
-
-    player['gold'] -= price
-    player['deck'].append(card)
-    player['discard_pile'].append(card)
-    shop['cards'] = [c for c in shop['cards'] if c['id'] != card_id]
-    del shop['card_prices'][card_id]
-
-    state['message'] = f'💰 购买了【{card["name"]}】(-{price} 金币)'
-    state['player'] = player
-    state['shop'] = shop
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+    return _run_action(data.get('game_id'), 'shop_buy_card', _SHOP_MISSING, card_id=data.get('card_id'))
 
 
 @app.route('/api/shop/buy_relic', methods=['POST'])
+@_serialized_game
 def shop_buy_relic():
     """购买遗物"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    relic_id = data.get('relic_id')
-
-    state = get_game(game_id)
-    if not state or state['phase'] != 'shop':
-        return jsonify({'error': '不在商店'}), 400
-
-    shop = state['shop']
-    player = state['player']
-    price = shop['relic_prices'].get(relic_id, 999)
-
-    if player.get('gold', 0) < price:
-        return jsonify({'error': f'金币不足！需要 {price} 金币', 'gold': player['gold']}), 400
-
-    relic = next((r for r in shop['relics'] if r['id'] == relic_id), None)
-    if not relic:
-        return jsonify({'error': '商品已售出'}), 400
-
-    player['gold'] -= price
-    player['relics'].append(relic)
-    shop['relics'] = [r for r in shop['relics'] if r['id'] != relic_id]
-    del shop['relic_prices'][relic_id]
-
-    state['message'] = f'💰 购买了遗物【{relic["name"]}】(-{price} 金币)'
-    state['player'] = player
-    state['shop'] = shop
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+    return _run_action(data.get('game_id'), 'shop_buy_relic', _SHOP_MISSING, relic_id=data.get('relic_id'))
 
 
 @app.route('/api/shop/remove_card', methods=['POST'])
+@_serialized_game
 def shop_remove_card():
     """商店移除牌"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    card_id = data.get('card_id')
-
-    state = get_game(game_id)
-    if not state or state['phase'] != 'shop':
-        return jsonify({'error': '不在商店'}), 400
-
-    shop = state['shop']
-    player = state['player']
-    price = shop.get('remove_price', 75)
-
-    if player.get('gold', 0) < price:
-        return jsonify({'error': f'金币不足！需要 {price} 金币'}), 400
-
-    original_len = len(player['deck'])
-    player['deck'] = [c for c in player['deck'] if c['id'] != card_id]
-
-    if len(player['deck']) < original_len:
-        player['gold'] -= price
-        state['message'] = f'🗑️ 已从牌组中移除一张牌 (-{price} 金币)'
-    else:
-        return jsonify({'error': '牌不在牌组中'}), 400
-
-    state['player'] = player
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+    return _run_action(data.get('game_id'), 'shop_remove_card', _SHOP_MISSING, card_id=data.get('card_id'))
 
 
 @app.route('/api/shop/heal', methods=['POST'])
+@_serialized_game
 def shop_heal():
     """商店治疗"""
     data = request.json or {}
-    game_id = data.get('game_id')
-
-    state = get_game(game_id)
-    if not state or state['phase'] != 'shop':
-        return jsonify({'error': '不在商店'}), 400
-
-    shop = state['shop']
-    player = state['player']
-    price = shop.get('heal_price', 30)
-    heal_amount = shop.get('heal_amount', 20)
-
-    if player.get('gold', 0) < price:
-        return jsonify({'error': f'金币不足！需要 {price} 金币'}), 400
-
-    player['gold'] -= price
-    player['hp'] = min(player['max_hp'], player['hp'] + heal_amount)
-    state['message'] = f'💊 恢复了 {heal_amount} 点HP (-{price} 金币)'
-    state['player'] = player
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+    return _run_action(data.get('game_id'), 'shop_heal', _SHOP_MISSING)
 
 
 @app.route('/api/shop/leave', methods=['POST'])
+@_serialized_game
 def shop_leave():
     """离开商店"""
     data = request.json or {}
-    game_id = data.get('game_id')
-
-    state = get_game(game_id)
-    if not state:
-        return jsonify({'error': '游戏不存在'}), 404
-
-    state['phase'] = 'map'
-    state['shop'] = None
-    state['message'] = '🗺️ 选择下一个目的地...'
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+    return _run_action(data.get('game_id'), 'shop_leave')
 
 
 # ===== API: 事件 =====
 @app.route('/api/event/choose', methods=['POST'])
+@_serialized_game
 def event_choose():
     """选择事件选项"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    choice_index = data.get('choice_index', 0)
-
-    state = get_game(game_id)
-    if not state or state['phase'] != 'event':
-        return jsonify({'error': '不在事件阶段'}), 400
-
-    event = state['event']
-    player = state['player']
-
-    from game.events import process_event_choice
-    player, result_desc, extra_data = process_event_choice(
-        event['id'], choice_index, player, player['character']
-    )
-
-    state['player'] = player
-    state['message'] = result_desc
-
-    # 处理特殊额外数据
-    if extra_data.get('action') == 'pick_card':
-        state['card_rewards'] = extra_data.get('card_rewards', [])
-        state['phase'] = 'card_reward'
-    elif extra_data.get('action') == 'upgrade_card':
-        state['phase'] = 'rest'  # 复用升级UI
-    else:
-        state['phase'] = 'map'
-
-    state['event'] = None
-    save_game(game_id, state)
-    return jsonify({**_build_response(state), 'extra': extra_data})
+    return _run_action(data.get('game_id'), 'event_choose', ('不在事件阶段', 400),
+                       choice_index=data.get('choice_index', 0))
 
 
 # ===== API: 查看牌组 =====
 @app.route('/api/deck', methods=['GET'])
+@_serialized_game
 def view_deck():
     """查看完整牌组"""
     game_id = request.args.get('game_id')
@@ -655,93 +398,171 @@ def view_deck():
 
     player = state['player']
     return jsonify({
-        'deck': player.get('deck', []),
+        'deck': expand_cards(player.get('deck', [])),
         'deck_size': len(player.get('deck', [])),
     })
 
 
 # ===== API: 药水 =====
 @app.route('/api/use_potion', methods=['POST'])
+@_serialized_game
 def use_potion():
     """使用药水"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    potion_index = data.get('potion_index', 0)
-    target_index = data.get('target_index', 0)
-
-    state = get_game(game_id)
-    if not state:
-        return jsonify({'error': '游戏不存在'}), 404
-
-    player = state['player']
-    potions = player.get('potions', [])
-
-    if potion_index >= len(potions):
-        return jsonify({'error': '无效的药水'}), 400
-
-    potion = potions[potion_index]
-    enemies = []
-    if state['phase'] == 'combat' and state.get('combat'):
-        enemies = state['combat']['enemies']
-
-    from game.potions import use_potion as _use_potion
-    player, enemies, logs = _use_potion(potion, player, enemies, target_index)
-
-    # 移除已使用的药水
-    potions.pop(potion_index)
-    player['potions'] = potions
-
-    if state['phase'] == 'combat' and state.get('combat'):
-        state['combat']['enemies'] = enemies
-        state['combat']['log'] = logs
-
-    state['player'] = player
-    state['message'] = logs[0] if logs else '使用了药水'
-    save_game(game_id, state)
-    return jsonify({**_build_response(state), 'log': logs})
+    return _run_action(data.get('game_id'), 'use_potion',
+                       potion_index=data.get('potion_index', 0), target_index=data.get('target_index', 0))
 
 
 @app.route('/api/shop/buy_potion', methods=['POST'])
+@_serialized_game
 def shop_buy_potion():
     """购买药水"""
     data = request.json or {}
-    game_id = data.get('game_id')
-    potion_id = data.get('potion_id')
-
-    state = get_game(game_id)
-    if not state or state['phase'] != 'shop':
-        return jsonify({'error': '不在商店'}), 400
-
-    shop = state['shop']
-    player = state['player']
-
-    potion = next((p for p in shop.get('potions', []) if p['id'] == potion_id), None)
-    if not potion:
-        return jsonify({'error': '药水不存在'}), 400
-
-    price = potion.get('price', 50)
-    if player.get('gold', 0) < price:
-        return jsonify({'error': f'金币不足！需要 {price} 金币'}), 400
-
-    # 最多携带3瓶药水
-    if len(player.get('potions', [])) >= 3:
-        return jsonify({'error': '药水槽已满（最多3瓶）'}), 400
+    return _run_action(data.get('game_id'), 'shop_buy_potion', _SHOP_MISSING, potion_id=data.get('potion_id'))
+
+
+# ===== API: 性能分析 =====
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """查看 / 开始 / 停止战斗热路径采样（需要请求头 X-Admin-Token 与环境变量 ADMIN_TOKEN 一致）"""
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        return jsonify({'error': '未授权'}), 403
+    if request.method == 'GET':
+        return jsonify({'profile': profiler.status()})
+    data = request.json or {}
+    if data.get('action') == 'stop':
+        return jsonify({'profile': profiler.stop()})
+    if data.get('action') != 'start':
+        return jsonify({'error': 'action 应为 start 或 stop'}), 400
+    try:
+        hz = float(data.get('hz', profiler.PROFILE_HZ))
+    except (TypeError, ValueError):
+        return jsonify({'error': '无效的采样频率'}), 400
+    game_id = data.get('game_id') or None
+    started = profiler.start(game_id=game_id, hz=min(max(hz, 1.0), 1000.0))
+    return jsonify({'profile': started.summary()})
+
+
+@app.route('/api/admin/maintenance', methods=['GET', 'POST'])
+def admin_maintenance():
+    """查看维护任务状态；POST {"job": 名称} 立即执行一次（需要 X-Admin-Token）"""
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        return jsonify({'error': '未授权'}), 403
+    if request.method == 'GET':
+        return jsonify({'maintenance': maintenance.status()})
+    job = (request.json or {}).get('job')
+    if job not in maintenance.JOBS:
+        return jsonify({'error': f"job 应为 {' / '.join(maintenance.JOBS)}"}), 400
+    result = maintenance.run_job(job, force=True)
+    if result is None:
+        return jsonify({'error': '该任务正在其他进程中执行'}), 409
+    return jsonify({'job': job, 'result': result})
 
-    player['gold'] -= price
-    player.setdefault('potions', []).append(potion)
-    shop['potions'] = [p for p in shop.get('potions', []) if p['id'] != potion_id]
 
-    state['message'] = f'🧪 购买了{potion["name"]} (-{price} 金币)'
-    state['player'] = player
-    state['shop'] = shop
-    save_game(game_id, state)
-    return jsonify(_build_response(state))
+# ===== 辅助函数 =====
+# 商店路由对不存在的游戏沿用“不在商店”的 400 响应
+_SHOP_MISSING = ('不在商店', 400)
 
 
-# ===== 辅助函数 =====
-def _safe_player(player: dict) -> dict:
-    """返回玩家的安全视图（不含内部状态）"""
-    return {k: v for k, v in player.items() if k not in ('draw_pile', 'exhaust_pile')}
+def _run_action(game_id: str, name: str, missing=('游戏不存在', 404), **params):
+    """读取游戏 → 执行动作 → 记录结局与动作日志 → 保存 → 构建响应"""
+    state = get_game(game_id)
+    if not state:
+        return jsonify({'error': missing[0]}), missing[1]
+    version, base_version, before = _client_view(game_id, state)
+    try:
+        with metrics.phase('engine'), profiler.scope(game_id):
+            state, extra = apply_action(state, name, **params)
+    except ActionError as e:
+        return jsonify({'error': e.message, **e.extra}), e.status
+    _log_action(game_id, state, name, params)
+    return _commit(game_id, state, extra, version, base_version, before)
+
+
+def _client_view(game_id: str, state: dict):
+    """动作执行前：返回 (服务端版本, 客户端的 base_version, 差量响应 / 推送所需的旧视图或 None)"""
+    version = state.get('version', 0)
+    base_version = _client_version()
+    before = None
+    if base_version == version or stream.has_subscribers(game_id):
+        # 通常就是上次发出的视图；未命中时在动作原地修改状态之前渲染
+        before = _views.get(game_id, state)
+        if before is None:
+            with metrics.phase('respond'):
+                before = _view(state)
+    return version, base_version, before
+
+
+def _log_action(game_id: str, state: dict, name: str, params: dict):
+    """记录一个已执行的动作；对局结束时同时记录最终状态哈希，回放时据此校验"""
+    with metrics.phase('save'):
+        log_action(game_id, state, name, params, state_hash(state) if state['phase'] in TERMINAL_PHASES else None)
+
+
+def _commit(game_id: str, state: dict, extra: dict, version: int, base_version, before):
+    """记录结局 → 保存 → 推送补丁 → 构建响应"""
+    with metrics.phase('save'):
+        outcome = run_outcome(state, extra)
+        if outcome:
+            record_run(state['player'], outcome, state.get('ascension', 0))
+        save_game(game_id, state)
+    with metrics.phase('respond'):
+        if before is None and base_version is None:
+            return _respond(state, extra)
+        after = _view(state)
+        _views.put(game_id, state, after)
+        ops = patch.diff(before, after) if before is not None else None
+        if ops is not None and stream.publish_action(game_id, version, state['version'], ops, extra):
+            # 日志已由本进程的推送送达；订阅在其他 worker 时客户端照常显示响应中的日志
+            extra = {**extra, 'streamed': True}
+        return _respond(state, extra, base_version, ops if base_version == version else None, after)
+
+
+def _client_version():
+    """请求中客户端已持有的视图版本（base_version，带上即启用差量响应）；未带时为 None"""
+    if request.method == 'GET':
+        value = request.args.get('base_version')
+    else:
+        value = (request.get_json(silent=True) or {}).get('base_version')
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _view(state: dict) -> dict:
+    """客户端看到的视图（经过一次 JSON 往返，与客户端解析出的数据一致，且不再引用状态中的对象）"""
+    return codec.loads(codec.dumps_bytes(_build_response(state)))
+
+
+def _respond(state: dict, extra: dict, base_version=None, ops: list = None, view: dict = None):
+    """
+    构建响应。未带 base_version 时返回完整视图（附加字段合并在顶层）；
+    带上时返回 {version, base_version, patch, ...附加字段}（ops 为相对客户端视图的补丁），
+    base_version 与服务端不一致（ops 为 None）时返回 {version, state: 完整视图, ...附加字段}，
+    该视图（或调用方已生成的 view）记为该局最近发出的视图。
+    """
+    if base_version is None:
+        return jsonify({**(view or _build_response(state)), **extra})
+    if ops is None:
+        if view is None:
+            view = _view(state)
+            _views.put(state['game_id'], state, view)
+        return jsonify({**extra, 'version': view['version'], 'state': view})
+    return jsonify({**extra, 'version': state.get('version', 0), 'base_version': base_version, 'patch': ops})
+
+
+def _safe_player(player: PlayerData) -> dict:
+    """返回玩家的安全视图（不含内部状态；牌堆展开为完整卡牌）"""
+    view = {k: v for k, v in player.items() if k not in ('draw_pile', 'exhaust_pile', '_relic_hooks')}
+    for pile in ('deck', 'hand', 'discard_pile'):
+        if view.get(pile):
+            view[pile] = expand_cards(view[pile])
+    return view
 
 
 def _build_response(state: dict) -> dict:
@@ -755,6 +576,7 @@ def _build_response(state: dict) -> dict:
         'message': state.get('message', ''),
         'player': _safe_player(player),
         'turn': state.get('turn', 1),
+        'version': state.get('version', 0),
     }
 
     if state['phase'] == 'map':
@@ -767,7 +589,7 @@ def _build_response(state: dict) -> dict:
             'log': combat.get('log', []),
             'node_type': combat.get('node_type', 'monster'),
         }
-        resp['hand'] = player.get('hand', [])
+        resp['hand'] = expand_cards(player.get('hand', []))
         resp['energy'] = player.get('energy', 0)
         resp['block'] = player.get('block', 0)
         resp['draw_pile_count'] = len(player.get('draw_pile', []))
@@ -787,7 +609,7 @@ def _build_response(state: dict) -> dict:
         resp['event'] = state.get('event')
 
     elif state['phase'] == 'rest':
-        resp['deck'] = player.get('deck', [])
+        resp['deck'] = expand_cards(player.get('deck', []))
 
     elif state['phase'] in ('game_over', 'victory'):
         resp['final_stats'] = state.get('victory_stats') or {
@@ -812,11 +634,28 @@ def _build_response(state: dict) -> dict:
 # ===== API: 排行榜 =====
 @app.route('/api/leaderboard', methods=['GET'])
 def leaderboard():
-    """获取排行榜（按分数降序，最多20条）"""
-    limit = min(int(request.args.get('limit', 20)), 50)
-    entries = get_leaderboard(limit)
+    """
+    获取排行榜（按分数降序，每页最多50条）。
+    可选过滤：character（职业 id 或名称）、ascension、result（victory / game_over）、window（day / week）；
+    翻页时带上一页返回的 cursor。
+    """
+    from game.state import CHARACTER_STATS
+    args = request.args
+    character = args.get('character')
+    if character in CHARACTER_STATS:
+        character = CHARACTER_STATS[character]['name']
+    result = args.get('result')
+    if result not in (None, 'victory', 'game_over'):
+        return jsonify({'error': '无效的结局过滤'}), 400
+    try:
+        limit = max(1, min(int(args.get('limit', 20)), 50))
+        ascension = int(args['ascension']) if 'ascension' in args else None
+        entries, next_cursor = query_leaderboard(limit, character=character, ascension=ascension, result=result,
+                                                 window=args.get('window'), cursor=args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': '无效的排行榜参数'}), 400
     stats = get_stats_summary()
-    return jsonify({'entries': entries, 'stats': stats})
+    return jsonify({'entries': entries, 'stats': stats, 'next_cursor': next_cursor})
 
 
 @app.route('/api/active_players', methods=['GET'])
@@ -0,0 +1,185 @@
+"""ASGI 入口 - 把 app.py 的 Flask（WSGI）应用挂到 ASGI 服务器（uvicorn）上的线程池前端
+
+    python asgi.py                        # 需要 uvicorn
+    uvicorn asgi:app --port 5000
+
+这不是异步版本的应用：每个请求（包括只读请求）仍在有界线程池（ASGI_THREADS）中同步执行 Flask 视图，
+整个请求期间占用一个线程，处理能力与线程数为 ASGI_THREADS 的多线程 WSGI 服务器相同。
+事件循环只负责收发：空闲的 keep-alive 连接不占线程，SSE 等流式响应由独立线程逐块读取，不占用线程池。
+路由与响应与 app.py 完全相同。持久化默认走单写线程（DB_SINGLE_WRITER=1）：
+状态写回、排行榜记录只是入队，由状态缓存的写回线程串行写入 SQLite。
+"""
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DB_SINGLE_WRITER', '1')
+
+from app import app as flask_app  # noqa: E402
+from game.db import flush_games  # noqa: E402
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+ASGI_MAX_BODY = int(os.environ.get('ASGI_MAX_BODY', 1024 * 1024))
+
+_pool = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi-view')
+
+
+def _environ(scope: dict, body: bytes) -> dict:
+    """ASGI HTTP scope -> WSGI environ"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name, value = name.decode('latin1'), value.decode('latin1')
+        if name == 'content-length':
+            continue
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+            continue
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _call_flask(environ: dict):
+    """在线程池中执行 Flask：返回 (状态码, 响应头, 响应体)；流式响应的响应体为未读取的迭代器"""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    body = flask_app(environ, start_response)
+    streaming = any(k.lower() == 'content-type' and v.startswith('text/event-stream')
+                    for k, v in started['headers'])
+    if streaming:
+        return started['status'], started['headers'], body
+    try:
+        return started['status'], started['headers'], b''.join(body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+class _Disconnected(Exception):
+    pass
+
+
+async def _read_body(receive) -> bytes:
+    """读取完整请求体；超过 ASGI_MAX_BODY 时返回 None"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise _Disconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > ASGI_MAX_BODY:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _send_stream(body, send, receive):
+    """由独立线程读取流式响应体（阻塞在订阅队列上），经事件循环转发；客户端断开后线程在下一块时结束"""
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    disconnected = threading.Event()
+
+    def pump():
+        try:
+            for chunk in body:
+                if disconnected.is_set():
+                    break
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk.encode() if isinstance(chunk, str) else chunk)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+    async def watch():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+        chunks.put_nowait(None)
+
+    threading.Thread(target=pump, name='asgi-stream', daemon=True).start()
+    watcher = asyncio.ensure_future(watch())
+    try:
+        while (chunk := await chunks.get()) is not None:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.set()
+        watcher.cancel()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # 退出前把缓存中的脏状态与排队的写入落盘
+            await asyncio.get_running_loop().run_in_executor(None, flush_games)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    try:
+        body = await _read_body(receive)
+    except _Disconnected:
+        return
+    if body is None:
+        await send({'type': 'http.response.start', 'status': 413, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    loop = asyncio.get_running_loop()
+    status, headers, content = await loop.run_in_executor(_pool, _call_flask, _environ(scope, body))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers],
+    })
+    if isinstance(content, bytes):
+        await send({'type': 'http.response.body', 'body': content})
+    else:
+        await _send_stream(content, send, receive)
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('ASGI 入口需要 uvicorn：pip install uvicorn')
+    port = int(os.environ.get('PORT', 5000))
+    print(f'🎮 文字肉鸽游戏服务器启动（ASGI）- http://0.0.0.0:{port}')
+    uvicorn.run(app, host='0.0.0.0', port=port, log_level='warning', access_log=False)
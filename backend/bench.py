@@ -0,0 +1,344 @@
+"""性能基准脚本（在 backend 目录下运行）
+
+用法:
+    python bench.py play_card                 # 当前配置下 /api/combat/play_card 的吞吐
+    python bench.py play_card --compare       # 对比旧连接方式、连接池+WAL、热状态缓存
+    python bench.py play_card --diff          # 差量响应（带 base_version）下的吞吐与响应字节数
+    python bench.py turn [--batch]            # 整回合吞吐：逐个动作请求 vs /api/combat/batch
+    python bench.py codec                     # 各序列化实现/存档格式的编码、解码耗时、字节数与压缩率
+    python bench.py leaderboard --runs 200000 # /api/leaderboard 延迟（对比扫描统计、OFFSET 翻页）
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _load_app(db_path: str):
+    """在导入 app 之前指定独立的数据库文件"""
+    os.environ['DB_PATH'] = db_path
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    return app_module.app.test_client()
+
+
+def _enter_combat(client, character: str) -> str:
+    """新建游戏并走到第一场战斗，返回 game_id"""
+    resp = client.post('/api/new_game', json={'character': character, 'name': 'bench'}).get_json()
+    game_id = resp['game_id']
+    state = client.get(f'/api/state?game_id={game_id}').get_json()
+    node_id = state['map']['available_nodes'][0]
+    client.post('/api/select_node', json={'game_id': game_id, 'node_id': node_id})
+    return game_id
+
+
+def bench_play_card(args) -> dict:
+    client = _load_app(args.db or os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    characters = ['warrior', 'mage', 'assassin']
+    game_id = _enter_combat(client, characters[0])
+    played = 0
+    games = 1
+    elapsed = 0.0
+    response_bytes = 0
+    while played < args.requests:
+        state = client.get(f'/api/state?game_id={game_id}').get_json()
+        if state['phase'] != 'combat':
+            game_id = _enter_combat(client, characters[games % len(characters)])
+            games += 1
+            continue
+        hand = state.get('hand', [])
+        playable = [i for i, c in enumerate(hand)
+                    if not c.get('unplayable')
+                    and (not isinstance(c.get('cost'), int) or c['cost'] <= state['energy'])]
+        if not playable:
+            client.post('/api/combat/end_turn', json={'game_id': game_id})
+            continue
+        body = {'game_id': game_id, 'card_index': playable[0], 'target_index': 0}
+        if args.diff:
+            body['base_version'] = state['version']
+        t0 = time.perf_counter()
+        resp = client.post('/api/combat/play_card', json=body)
+        elapsed += time.perf_counter() - t0
+        played += 1
+        response_bytes += len(resp.data)
+
+    from game.db import get_pool_stats, get_cache_stats
+    return {
+        'requests': played,
+        'games': games,
+        'seconds': round(elapsed, 3),
+        'rps': round(played / elapsed, 1),
+        'avg_response_bytes': round(response_bytes / played),
+        'pool': get_pool_stats(),
+        'cache': get_cache_stats(),
+    }
+
+
+def _plan_turn(state: dict) -> list:
+    """一个回合的动作：从右往左打出能量够的牌（下标不受前面出牌影响），最后结束回合"""
+    energy = state['energy']
+    target = next((i for i, e in enumerate(state['combat']['enemies']) if e.get('hp', 0) > 0), None)
+    if target is None:
+        # 回合开始时的效果（如法球）已击杀全部敌人：结束回合即判定胜利
+        return [{'action': 'end_turn'}]
+    steps = []
+    for i in range(len(state['hand']) - 1, -1, -1):
+        card = state['hand'][i]
+        if not card.get('unplayable') and isinstance(card.get('cost'), int) and card['cost'] <= energy:
+            steps.append({'action': 'play_card', 'card_index': i, 'target_index': target})
+            energy -= card['cost']
+    steps.append({'action': 'end_turn'})
+    return steps
+
+
+def bench_turn(args) -> dict:
+    """整回合吞吐：逐个动作请求 vs /api/combat/batch 一次提交"""
+    client = _load_app(args.db or os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    characters = ['warrior', 'mage', 'assassin']
+    game_id = _enter_combat(client, characters[0])
+    turns = requests = saves = games = 0
+    elapsed = 0.0
+    while turns < args.turns:
+        state = client.get(f'/api/state?game_id={game_id}').get_json()
+        if state['phase'] != 'combat':
+            games += 1
+            game_id = _enter_combat(client, characters[games % len(characters)])
+            continue
+        steps = _plan_turn(state)
+        t0 = time.perf_counter()
+        if args.batch:
+            resp = client.post('/api/combat/batch', json={'game_id': game_id, 'actions': steps}).get_json()
+            requests += 1
+            version = resp.get('version')
+        else:
+            for step in steps:
+                body = {'game_id': game_id, **{k: v for k, v in step.items() if k != 'action'}}
+                resp = client.post(f"/api/combat/{step['action']}", json=body).get_json()
+                requests += 1
+                if 'error' in resp or resp['phase'] != 'combat':
+                    break
+            version = resp.get('version')
+        elapsed += time.perf_counter() - t0
+        saves += (version or state['version']) - state['version']
+        turns += 1
+    return {
+        'mode': 'batch' if args.batch else 'single',
+        'turns': turns,
+        'seconds': round(elapsed, 3),
+        'turns_per_sec': round(turns / elapsed, 1),
+        'requests_per_turn': round(requests / turns, 2),
+        'saves_per_turn': round(saves / turns, 2),
+    }
+
+
+def bench_leaderboard(args) -> dict:
+    """写入 runs 条排行榜记录后测 /api/leaderboard 的平均延迟，并与每次扫描全表的统计查询对比"""
+    import random
+    client = _load_app(args.db or os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    from game import db
+    rng = random.Random(0)
+    batch = 10000
+    for start in range(0, args.runs, batch):
+        for i in range(start, min(start + batch, args.runs)):
+            player = {'name': f'bench{i}', 'floor': rng.randint(1, 16), 'kills': rng.randint(0, 40),
+                      'character_name': rng.choice(['战士', '法师', '刺客'])}
+            db.record_run(player, rng.choice(['victory', 'game_over', 'game_over', 'game_over']), rng.randint(0, 5))
+    db.flush_games()
+
+    def timed(fn) -> float:
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(args.requests):
+            fn()
+        return (time.perf_counter() - t0) / args.requests * 1e6
+
+    def scan_stats():
+        with db._get_conn() as conn:
+            conn.execute('SELECT COUNT(*) FROM leaderboard').fetchone()
+            conn.execute("SELECT COUNT(*) FROM leaderboard WHERE result='victory'").fetchone()
+            conn.execute('SELECT MAX(floor) FROM leaderboard').fetchone()
+
+    # 翻到一半深度的一页：键集游标 vs OFFSET
+    depth = args.runs // 2
+    with db._get_conn() as conn:
+        row = conn.execute('SELECT id, score, floor FROM leaderboard ORDER BY score DESC, floor DESC, id DESC '
+                           'LIMIT 1 OFFSET ?', (depth,)).fetchone()
+    cursor = f"{row['score']}:{row['floor']}:{row['id']}"
+
+    def offset_page():
+        with db._get_conn() as conn:
+            conn.execute(f'SELECT {db._LEADERBOARD_COLUMNS} FROM leaderboard '
+                         'ORDER BY score DESC, floor DESC, id DESC LIMIT 20 OFFSET ?', (depth,)).fetchall()
+
+    return {
+        'runs': args.runs,
+        'endpoint_us': round(timed(lambda: client.get('/api/leaderboard')), 1),
+        'stats_summary_us': round(timed(db.get_stats_summary), 1),
+        'scan_stats_us': round(timed(scan_stats), 1),
+        'filtered_us': round(timed(lambda: db.query_leaderboard(20, character='法师', result='victory')), 1),
+        'keyset_page_us': round(timed(lambda: db.query_leaderboard(20, cursor=cursor)), 1),
+        'offset_page_us': round(timed(offset_page), 1),
+    }
+
+
+def _sample_states(games: int, every: int) -> list:
+    """用模拟器打几局，每隔 every 个动作取一份状态（经过一次存取，与从数据库加载的形态一致）"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from game import codec
+    from game.actions import ActionError, apply_action
+    from game.cards import hydrate_player_cards
+    from game.sim.policies import make_policy
+    from game.state import create_new_game
+
+    states = []
+    for i in range(games):
+        state = create_new_game(['warrior', 'mage', 'assassin'][i % 3], 'bench', seed=i)
+        bot = make_policy('greedy', i)
+        for step in range(2000):
+            if state['phase'] in ('victory', 'game_over'):
+                break
+            name, params = bot.decide(state)
+            try:
+                state, _ = apply_action(state, name, **params)
+            except ActionError:
+                decision = bot.fallback(state)
+                if decision is None:
+                    break
+                state, _ = apply_action(state, decision[0], **decision[1])
+            if step % every == 0:
+                copy = codec.loads(codec.dumps(state))
+                hydrate_player_cards(copy['player'])
+                states.append(copy)
+    return states
+
+
+def bench_codec(args) -> dict:
+    """
+    各 JSON 实现与存档格式的 编码/解码耗时（微秒/份）、字节数与压缩率（相对紧凑 JSON）。
+    zstd 字典用偶数份状态训练，所有实现都只在奇数份上计时，避免字典“见过”被测数据。
+    """
+    from game import codec
+    states = _sample_states(args.games, args.every)
+    train, states = states[::2], states[1::2]
+    raw_bytes = sum(len(codec.dumps_bytes(s)) for s in states)
+
+    def measure(name, encode, decode) -> dict:
+        best_enc = best_dec = None
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            blobs = [encode(s) for s in states]
+            t1 = time.perf_counter()
+            for b in blobs:
+                decode(b)
+            t2 = time.perf_counter()
+            best_enc = t1 - t0 if best_enc is None else min(best_enc, t1 - t0)
+            best_dec = t2 - t1 if best_dec is None else min(best_dec, t2 - t1)
+        n = len(states)
+        size = sum(len(b.encode() if isinstance(b, str) else b) for b in blobs)
+        return {
+            'codec': name,
+            'encode_us': round(best_enc / n * 1e6, 1),
+            'decode_us': round(best_dec / n * 1e6, 1),
+            'bytes': round(size / n),
+            'ratio': round(raw_bytes / size, 2),
+        }
+
+    results = [measure(name, c.dumps_bytes, c.loads) for name, c in codec.available_codecs().items()]
+    # 旧实现：json.dumps(ensure_ascii=False) 的默认分隔符；Flask 默认 jsonify：转义中文并排序键
+    results.append(measure('stdlib-indent', lambda s: json.dumps(s, ensure_ascii=False).encode(), json.loads))
+    results.append(measure('stdlib-ascii', lambda s: json.dumps(s, sort_keys=True).encode(), json.loads))
+    formats = codec.available_state_formats()
+    for fmt in formats:
+        if fmt != 'json':
+            results.append(measure(f'state:{fmt}', lambda s, f=fmt: codec.encode_state(s, f), codec.decode_state))
+    if 'zstd' in formats and len(train) >= 10:
+        data = codec.train_dictionary([codec.dumps_bytes(s) for s in train], args.dict_size)
+        codec.register_dictionary(0, data, active=True)
+        results.append(measure('state:zstd-dict', lambda s: codec.encode_state(s, 'zstd'), codec.decode_state))
+    return {'states': len(states), 'train_states': len(train), 'selected': codec.codec.name,
+            'state_format': codec.STATE_FORMAT, 'results': results}
+
+
+# --compare 依次运行的配置（每个配置一个子进程、一个临时数据库）
+PLAY_CARD_VARIANTS = [
+    ('每次新建连接', {'DB_POOL': '0', 'DB_WAL': '0', 'STATE_CACHE': '0'}),
+    ('连接池 + WAL', {'DB_POOL': '1', 'DB_WAL': '1', 'STATE_CACHE': '0'}),
+    ('+ 热状态缓存', {'DB_POOL': '1', 'DB_WAL': '1', 'STATE_CACHE': '1'}),
+]
+
+
+def _run_variant(name: str, env: dict, args) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), 'play_card', '--json',
+           '--requests', str(args.requests)]
+    out = subprocess.run(cmd, env={**os.environ, **env}, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['variant'] = name
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文字肉鸽游戏性能基准')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('play_card', help='/api/combat/play_card 吞吐（requests/sec）')
+    p.add_argument('--requests', type=int, default=2000)
+    p.add_argument('--db', help='数据库文件路径（默认临时文件）')
+    p.add_argument('--compare', action='store_true', help='对比各数据库配置')
+    p.add_argument('--diff', action='store_true', help='请求带 base_version，响应为差量')
+    p.add_argument('--json', action='store_true', help='输出单行 JSON')
+
+    p = sub.add_parser('turn', help='整回合吞吐（turns/sec）')
+    p.add_argument('--turns', type=int, default=500)
+    p.add_argument('--batch', action='store_true', help='每回合一次 /api/combat/batch')
+    p.add_argument('--db', help='数据库文件路径（默认临时文件）')
+
+    p = sub.add_parser('codec', help='游戏状态的编码/解码耗时（微秒/份）与字节数')
+    p.add_argument('--games', type=int, default=6, help='采样的模拟对局数')
+    p.add_argument('--every', type=int, default=10, help='每隔多少个动作取一份状态')
+    p.add_argument('--repeat', type=int, default=3, help='重复次数（取最快一次）')
+    p.add_argument('--dict-size', type=int, default=16 * 1024, help='zstd 字典字节数')
+    p.add_argument('--json', action='store_true', help='输出单行 JSON')
+
+    p = sub.add_parser('leaderboard', help='/api/leaderboard 延迟（微秒/次）')
+    p.add_argument('--runs', type=int, default=100000, help='预先写入的排行榜记录数')
+    p.add_argument('--requests', type=int, default=500)
+    p.add_argument('--db', help='数据库文件路径（默认临时文件）')
+
+    args = parser.parse_args()
+    if args.command == 'leaderboard':
+        print(json.dumps(bench_leaderboard(args), ensure_ascii=False))
+        return
+    if args.command == 'codec':
+        result = bench_codec(args)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False))
+            return
+        print(f"{result['states']} 份状态（另 {result['train_states']} 份训练字典；"
+              f"当前 JSON 实现: {result['selected']}，存档格式: {result['state_format']}）")
+        print(f"{'实现':<18}{'编码 µs':>10}{'解码 µs':>10}{'字节':>10}{'压缩率':>8}")
+        for r in result['results']:
+            print(f"{r['codec']:<18}{r['encode_us']:>10}{r['decode_us']:>10}{r['bytes']:>10}{r['ratio']:>8}")
+        return
+    if args.command == 'turn':
+        print(json.dumps(bench_turn(args), ensure_ascii=False))
+        return
+    if args.command == 'play_card':
+        if args.compare:
+            results = [_run_variant(name, env, args) for name, env in PLAY_CARD_VARIANTS]
+            base = results[0]['rps']
+            for r in results:
+                print(f"{r['variant']:<16} {r['rps']:>9.1f} req/s  {r['rps'] / base:>5.2f}x"
+                      f"  ({r['requests']} 次, {r['seconds']}s)")
+            return
+        result = bench_play_card(args)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False))
+        else:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
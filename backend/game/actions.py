@@ -0,0 +1,549 @@
+"""玩家动作 - 不依赖 HTTP 的游戏流程（Flask 路由与模拟器共用）"""
+from typing import Callable, Dict, List, Tuple
+
+from .combatants import CombatEnemy, CombatPlayer, release_combat
+from .map_gen import get_next_available_nodes
+from .rng import rng, game_rng
+
+# 每个动作: fn(state, **params) -> (state, 响应附加字段)
+Action = Callable[..., Tuple[dict, dict]]
+ACTIONS: Dict[str, Action] = {}
+
+
+class ActionError(Exception):
+    """动作不合法（对应 HTTP 4xx），extra 为响应中附带的字段"""
+
+    def __init__(self, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+def action(name: str):
+    """注册一个玩家动作"""
+    def register(fn: Action) -> Action:
+        ACTIONS[name] = fn
+        return fn
+    return register
+
+
+def apply_action(state: dict, name: str, **params) -> Tuple[dict, dict]:
+    """按名称执行动作（在该局的随机数上下文中，见 rng.game_rng）"""
+    fn = ACTIONS.get(name)
+    if fn is None:
+        raise ActionError(f'未知动作: {name}')
+    with game_rng(state):
+        return fn(state, **params)
+
+
+# 批量接口允许的动作及其参数（默认值与单个动作的路由一致）
+BATCH_ACTIONS = {
+    'play_card': {'card_index': 0, 'target_index': 0},
+    'use_potion': {'potion_index': 0, 'target_index': 0},
+    'end_turn': {},
+}
+
+
+def apply_batch(state: dict, steps: list,
+                on_applied: Callable[[dict, str, dict, dict], None] = None) -> Tuple[dict, list, ActionError]:
+    """
+    依次执行一组战斗动作（steps 为 [{"action": 名称, ...参数}]），遇到错误或战斗结束即停止。
+    每执行成功一个动作调用 on_applied(state, name, params, extra)。
+    返回 (state, 已执行动作的 [(name, params, extra)], 使批量停止的 ActionError 或 None)。
+    """
+    done = []
+    for step in steps:
+        name = step.get('action') if isinstance(step, dict) else None
+        if name not in BATCH_ACTIONS:
+            return state, done, ActionError(f'不支持的批量动作: {name}')
+        if state['phase'] != 'combat':
+            return state, done, ActionError('当前不在战斗阶段')
+        params = {key: step.get(key, default) for key, default in BATCH_ACTIONS[name].items()}
+        try:
+            state, extra = apply_action(state, name, **params)
+        except ActionError as e:
+            return state, done, e
+        done.append((name, params, extra))
+        if on_applied is not None:
+            on_applied(state, name, params, extra)
+        if extra.get('combat_result') or state['phase'] != 'combat':
+            break
+    return state, done, None
+
+
+def run_outcome(state: dict, extra: dict):
+    """本次动作结束了整局时返回 'victory' / 'defeat'（用于记录排行榜），否则返回 None"""
+    if extra.get('combat_result') and state['phase'] in ('victory', 'game_over'):
+        return 'victory' if state['phase'] == 'victory' else 'defeat'
+    return None
+
+
+def _require_phase(state: dict, phase: str, message: str):
+    if state['phase'] != phase:
+        raise ActionError(message)
+
+
+def _alive(enemies: List[CombatEnemy]) -> Tuple[List[int], List[CombatEnemy]]:
+    """存活敌人及其原始索引（避免同类型敌人更新错乱）"""
+    alive_indices = [i for i, e in enumerate(enemies) if e.hp > 0]
+    return alive_indices, [enemies[i] for i in alive_indices]
+
+
+def _finish_combat(state: dict, player: CombatPlayer, combat: dict, result: str, logs: list) -> Tuple[dict, dict]:
+    """战斗结束（胜利进入奖励/下一幕，失败进入 game_over）；两种结局都把战斗实体转回 dict"""
+    state['player'] = player
+    state['combat'] = combat
+    if result == 'victory':
+        from .state import end_combat_victory
+        state = end_combat_victory(state)
+    else:
+        state['phase'] = 'game_over'
+        state['message'] = '💀 你已倒下！游戏结束。'
+    release_combat(state)
+    return state, {'combat_result': result, 'log': logs}
+
+
+# ===== 地图 =====
+@action('select_node')
+def select_node(state: dict, node_id: str = None) -> Tuple[dict, dict]:
+    """选择地图节点"""
+    _require_phase(state, 'map', '当前不在地图阶段')
+
+    map_data = state['map']
+    node = map_data['nodes'].get(node_id)
+    if not node:
+        raise ActionError('节点不存在')
+
+    if node_id not in map_data.get('available_nodes', []):
+        raise ActionError('该节点不可访问')
+
+    # 更新地图可用节点
+    get_next_available_nodes(map_data, node_id)
+    state['map'] = map_data
+
+    node_type = node['type']
+    player = state['player']
+    player['floor'] = node.get('floor', player.get('floor', 0)) + 1
+
+    if node_type in ('monster', 'elite', 'boss'):
+        from .state import init_combat
+        state = init_combat(state, node_type, player['floor'])
+        player = state['player']
+        state['message'] = f'⚔️ 进入战斗！'
+
+    elif node_type == 'rest':
+        state['phase'] = 'rest'
+        state['message'] = '🔥 你找到了一处篝火。在此休息或升级卡牌？'
+
+    elif node_type == 'shop':
+        from .state import get_shop_inventory
+        state['shop'] = get_shop_inventory(state)
+        state['phase'] = 'shop'
+        state['message'] = '🛒 欢迎光临！有什么需要的吗？'
+        # 大颌银行：进入商店后停止收益
+        state['player']['_maw_bank_spent'] = True
+
+    elif node_type == 'event':
+        from .events import get_random_event
+        state['event'] = get_random_event()
+        state['phase'] = 'event'
+        state['message'] = f'❓ {state["event"]["title"]}'
+
+    elif node_type == 'treasure':
+        from .relics import get_random_relic
+        relic = get_random_relic()
+        if relic:
+            player['relics'].append(relic)
+            state['message'] = f'📦 你打开了宝箱！获得遗物: {relic["name"]}'
+        gold = rng().randint(20, 50)
+        player['gold'] += gold
+        state['message'] += f' 和 {gold} 金币'
+        state['phase'] = 'map'
+
+    state['player'] = player
+    return state, {}
+
+
+# ===== 战斗 =====
+@action('play_card')
+def play_card(state: dict, card_index: int = 0, target_index: int = 0) -> Tuple[dict, dict]:
+    """打出卡牌"""
+    _require_phase(state, 'combat', '当前不在战斗阶段')
+
+    player = state['player']
+    combat = state['combat']
+    enemies = combat['enemies']
+
+    # 获取手牌中的卡
+    hand = player.hand
+    if card_index >= len(hand):
+        raise ActionError('无效的牌索引')
+
+    card = hand[card_index]
+
+    # 检查能量
+    cost = card.get('cost', 0)
+    if isinstance(cost, int) and player.energy < cost:
+        raise ActionError('能量不足', energy=player.energy, cost=cost)
+
+    if card.get('unplayable'):
+        raise ActionError('此牌无法打出')
+
+    # 过滤存活敌人（记录原始索引）
+    alive_indices, alive_enemies = _alive(enemies)
+    if not alive_enemies:
+        raise ActionError('没有存活的敌人')
+
+    # 确保target_index有效
+    target_index = min(target_index, len(alive_enemies) - 1)
+
+    # 执行卡牌效果
+    from .combat import apply_card_effect, check_combat_end
+    player, alive_enemies, logs = apply_card_effect(card, player, alive_enemies, target_index)
+
+    # 回声形态：第一张非能力牌触发2次
+    if (player._echo_form and not player._echo_used
+            and card.get('type') != 'power' and card.get('id') != 'm_echo_form'):
+        player._echo_used = True
+        _, alive_enemies, echo_logs = apply_card_effect(card, player, alive_enemies, target_index)
+        logs.append('🔮 回声形态：再次触发！')
+        logs.extend(echo_logs)
+
+    # 统计
+    player.cards_played += 1
+
+    # 从手牌移除（exhaust -> exhaust_pile, 反弹->抽牌堆顶, 否则 -> discard_pile）
+    hand.pop(card_index)
+    if player.pop('_rebound_active', False):
+        # 反弹：将牌放回抽牌堆顶
+        player.draw_pile = player.draw_pile + [card]
+        logs.append(f'🔄 反弹：【{card["name"]}】回到抽牌堆顶')
+    elif card.get('exhaust'):
+        player.exhaust_pile = player.exhaust_pile + [card]
+    else:
+        player.discard_pile.append(card)
+
+    player.hand = hand
+
+    # 按原始索引回写更新后的存活敌人（保留死亡敌人以显示）
+    for j, orig_idx in enumerate(alive_indices):
+        enemies[orig_idx] = alive_enemies[j]
+
+    combat['log'] = logs
+    combat['enemies'] = enemies
+
+    # 检查战斗结束
+    result = check_combat_end(player, alive_enemies)
+    if result in ('victory', 'defeat'):
+        return _finish_combat(state, player, combat, result, logs)
+
+    state['player'] = player
+    state['combat'] = combat
+    return state, {'log': logs}
+
+
+@action('end_turn')
+def end_turn(state: dict) -> Tuple[dict, dict]:
+    """结束玩家回合"""
+    _require_phase(state, 'combat', '当前不在战斗阶段')
+
+    player = state['player']
+    combat = state['combat']
+    enemies = combat['enemies']
+    alive_indices, alive_enemies = _alive(enemies)
+
+    from .combat import end_player_turn, start_player_turn, check_combat_end
+
+    # 敌人回合
+    player, alive_enemies, enemy_logs = end_player_turn(player, alive_enemies)
+
+    # 检查死亡
+    result = check_combat_end(player, alive_enemies)
+
+    # 按原始索引回写（保留死亡敌人供显示）
+    for j, orig_idx in enumerate(alive_indices):
+        enemies[orig_idx] = alive_enemies[j]
+
+    if result in ('victory', 'defeat'):
+        return _finish_combat(state, player, combat, result, enemy_logs)
+
+    # 开始新的玩家回合（传入enemies，遗物效果在start_player_turn内统一处理）
+    combat['turn'] += 1
+    player.turns += 1
+    player, alive_enemies, start_logs = start_player_turn(player, alive_enemies)
+    all_logs = enemy_logs + ['--- 玩家回合 ---'] + start_logs
+
+    combat['enemies'] = enemies
+    combat['log'] = all_logs
+    state['player'] = player
+    state['combat'] = combat
+    return state, {'log': all_logs}
+
+
+@action('use_potion')
+def use_potion(state: dict, potion_index: int = 0, target_index: int = 0) -> Tuple[dict, dict]:
+    """使用药水"""
+    player = state['player']
+    potions = player.get('potions', [])
+
+    if potion_index >= len(potions):
+        raise ActionError('无效的药水')
+
+    potion = potions[potion_index]
+    in_combat = state['phase'] == 'combat' and state.get('combat')
+    enemies = state['combat']['enemies'] if in_combat else []
+
+    from .potions import use_potion as _use_potion
+    player, enemies, logs = _use_potion(potion, player, enemies, target_index)
+
+    # 移除已使用的药水
+    potions.pop(potion_index)
+    player['potions'] = potions
+
+    if in_combat:
+        state['combat']['enemies'] = enemies
+        state['combat']['log'] = logs
+
+    state['player'] = player
+    state['message'] = logs[0] if logs else '使用了药水'
+    return state, {'log': logs}
+
+
+# ===== 奖励 =====
+@action('pick_card')
+def pick_card(state: dict, card_id: str = None, skip: bool = False) -> Tuple[dict, dict]:
+    """选择奖励卡牌"""
+    player = state['player']
+    relic_ids = {r['id'] for r in player.get('relics', [])}
+
+    if not skip and card_id:
+        from .cards import compact_card
+        card_data = None
+        for reward in (state.get('card_rewards') or []):
+            if reward['id'] == card_id:
+                card_data = reward
+                break
+        if card_data:
+            card_data = compact_card(card_data)
+            player['deck'].append(card_data)
+            player['discard_pile'].append(card_data)
+            # 陶瓷鱼：选牌时+9金币
+            if 'ceramic_fish' in relic_ids:
+                player['gold'] = player.get('gold', 0) + 9
+                player['gold_earned'] = player.get('gold_earned', 0) + 9
+    else:
+        # 鸣碗：跳过选牌时+2最大HP
+        if skip and 'singing_bowl' in relic_ids:
+            player['max_hp'] = player.get('max_hp', 50) + 2
+            player['hp'] = min(player['hp'], player['max_hp'])
+
+    state['player'] = player
+    state['card_rewards'] = None
+    state['phase'] = 'map'
+    state['message'] = '🗺️ 选择下一个目的地...'
+    return state, {}
+
+
+@action('pick_relic')
+def pick_relic(state: dict, relic_id: str = None) -> Tuple[dict, dict]:
+    """选择Boss遗物"""
+    from .state import select_boss_relic
+    return select_boss_relic(state, relic_id), {}
+
+
+# ===== 休息点 =====
+@action('rest')
+def rest(state: dict, action: str = 'heal', card_id: str = None) -> Tuple[dict, dict]:
+    """在休息点休息（heal）或升级（upgrade）"""
+    _require_phase(state, 'rest', '当前不在休息阶段')
+
+    player = state['player']
+
+    if action == 'heal':
+        heal_amount = max(10, player['max_hp'] // 4)
+        player['hp'] = min(player['max_hp'], player['hp'] + heal_amount)
+        state['message'] = f'🔥 休息恢复了 {heal_amount} 点HP！'
+
+    elif action == 'upgrade' and card_id:
+        # 升级指定卡牌
+        from .cards import upgrade_card
+        for card in player['deck']:
+            if card['id'] == card_id and not card.get('upgraded'):
+                upgrade_card(card)
+                state['message'] = f'✨ 卡牌【{card["name"]}】已升级！'
+                break
+    state['phase'] = 'map'
+    state['player'] = player
+    return state, {}
+
+
+# ===== 商店 =====
+@action('shop_buy_card')
+def shop_buy_card(state: dict, card_id: str = None) -> Tuple[dict, dict]:
+    """购买卡牌"""
+    _require_phase(state, 'shop', '不在商店')
+
+    shop = state['shop']
+    player = state['player']
+    price = shop['card_prices'].get(card_id, 999)
+
+    if player.get('gold', 0) < price:
+        raise ActionError(f'金币不足！需要 {price} 金币', gold=player['gold'])
+
+    card = next((c for c in shop['cards'] if c['id'] == card_id), None)
+    if not card:
+        raise ActionError('商品已售出')
+
+    from .cards import compact_card
+    player['gold'] -= price
+    player['deck'].append(compact_card(card))
+    player['discard_pile'].append(compact_card(card))
+    shop['cards'] = [c for c in shop['cards'] if c['id'] != card_id]
+    del shop['card_prices'][card_id]
+
+    state['message'] = f'💰 购买了【{card["name"]}】(-{price} 金币)'
+    state['player'] = player
+    state['shop'] = shop
+    return state, {}
+
+
+@action('shop_buy_relic')
+def shop_buy_relic(state: dict, relic_id: str = None) -> Tuple[dict, dict]:
+    """购买遗物"""
+    _require_phase(state, 'shop', '不在商店')
+
+    shop = state['shop']
+    player = state['player']
+    price = shop['relic_prices'].get(relic_id, 999)
+
+    if player.get('gold', 0) < price:
+        raise ActionError(f'金币不足！需要 {price} 金币', gold=player['gold'])
+
+    relic = next((r for r in shop['relics'] if r['id'] == relic_id), None)
+    if not relic:
+        raise ActionError('商品已售出')
+
+    player['gold'] -= price
+    player['relics'].append(relic)
+    shop['relics'] = [r for r in shop['relics'] if r['id'] != relic_id]
+    del shop['relic_prices'][relic_id]
+
+    state['message'] = f'💰 购买了遗物【{relic["name"]}】(-{price} 金币)'
+    state['player'] = player
+    state['shop'] = shop
+    return state, {}
+
+
+@action('shop_remove_card')
+def shop_remove_card(state: dict, card_id: str = None) -> Tuple[dict, dict]:
+    """商店移除牌"""
+    _require_phase(state, 'shop', '不在商店')
+
+    shop = state['shop']
+    player = state['player']
+    price = shop.get('remove_price', 75)
+
+    if player.get('gold', 0) < price:
+        raise ActionError(f'金币不足！需要 {price} 金币')
+
+    original_len = len(player['deck'])
+    player['deck'] = [c for c in player['deck'] if c['id'] != card_id]
+
+    if len(player['deck']) < original_len:
+        player['gold'] -= price
+        state['message'] = f'🗑️ 已从牌组中移除一张牌 (-{price} 金币)'
+    else:
+        raise ActionError('牌不在牌组中')
+
+    state['player'] = player
+    return state, {}
+
+
+@action('shop_heal')
+def shop_heal(state: dict) -> Tuple[dict, dict]:
+    """商店治疗"""
+    _require_phase(state, 'shop', '不在商店')
+
+    shop = state['shop']
+    player = state['player']
+    price = shop.get('heal_price', 30)
+    heal_amount = shop.get('heal_amount', 20)
+
+    if player.get('gold', 0) < price:
+        raise ActionError(f'金币不足！需要 {price} 金币')
+
+    player['gold'] -= price
+    player['hp'] = min(player['max_hp'], player['hp'] + heal_amount)
+    state['message'] = f'💊 恢复了 {heal_amount} 点HP (-{price} 金币)'
+    state['player'] = player
+    return state, {}
+
+
+@action('shop_buy_potion')
+def shop_buy_potion(state: dict, potion_id: str = None) -> Tuple[dict, dict]:
+    """购买药水"""
+    _require_phase(state, 'shop', '不在商店')
+
+    shop = state['shop']
+    player = state['player']
+
+    potion = next((p for p in shop.get('potions', []) if p['id'] == potion_id), None)
+    if not potion:
+        raise ActionError('药水不存在')
+
+    price = potion.get('price', 50)
+    if player.get('gold', 0) < price:
+        raise ActionError(f'金币不足！需要 {price} 金币')
+
+    # 最多携带3瓶药水
+    if len(player.get('potions', [])) >= 3:
+        raise ActionError('药水槽已满（最多3瓶）')
+
+    player['gold'] -= price
+    player.setdefault('potions', []).append(potion)
+    shop['potions'] = [p for p in shop.get('potions', []) if p['id'] != potion_id]
+
+    state['message'] = f'🧪 购买了{potion["name"]} (-{price} 金币)'
+    state['player'] = player
+    state['shop'] = shop
+    return state, {}
+
+
+@action('shop_leave')
+def shop_leave(state: dict) -> Tuple[dict, dict]:
+    """离开商店"""
+    state['phase'] = 'map'
+    state['shop'] = None
+    state['message'] = '🗺️ 选择下一个目的地...'
+    return state, {}
+
+
+# ===== 事件 =====
+@action('event_choose')
+def event_choose(state: dict, choice_index: int = 0) -> Tuple[dict, dict]:
+    """选择事件选项"""
+    _require_phase(state, 'event', '不在事件阶段')
+
+    event = state['event']
+    player = state['player']
+
+    from .events import process_event_choice
+    player, result_desc, extra_data = process_event_choice(
+        event['id'], choice_index, player, player['character']
+    )
+
+    state['player'] = player
+    state['message'] = result_desc
+
+    # 处理特殊额外数据
+    if extra_data.get('action') == 'pick_card':
+        state['card_rewards'] = extra_data.get('card_rewards', [])
+        state['phase'] = 'card_reward'
+    elif extra_data.get('action') == 'upgrade_card':
+        state['phase'] = 'rest'  # 复用升级UI
+    else:
+        state['phase'] = 'map'
+
+    state['event'] = None
+    return state, {'extra': extra_data}
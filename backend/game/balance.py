@@ -0,0 +1,285 @@
+"""蒙特卡洛平衡性分析（在 backend 目录下运行，需要 numpy：pip install -r requirements-dev.txt）
+
+用法:
+    python -m game.balance --runs 2000                       # 每个 职业 × 天赋 组合 2000 局
+    python -m game.balance --runs 500 --ascensions 0,5,10 --policy block --out reports/
+    python -m game.balance --runs 500 --stream runs.jsonl    # 同时逐局写出结果
+
+每个 职业 × 天赋 组合跑 --runs 局，按块分发到进程池（默认每核一个进程），结果完成一块流回一块。
+输出：各组合胜率、死亡楼层分布、各职业内卡牌/遗物出现与胜利的相关性（CSV + summary.json）。
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # 只有报表需要；游戏服务本身不依赖 numpy
+    np = None
+
+from .sim.runner import simulate_run
+
+# 每局只回传聚合需要的字段，减少进程间传输
+_RUN_FIELDS = ('seed', 'character', 'ascension', 'outcome', 'floor', 'turns', 'deck', 'relic_ids')
+
+NUMPY_MISSING = '平衡报表需要 numpy，请先安装：pip install -r requirements-dev.txt'
+
+
+def _run_chunk(policy: str, character: str, ascension: int, seeds: List[int], max_steps: int) -> List[dict]:
+    """子进程：模拟一块对局"""
+    results = []
+    for seed in seeds:
+        r = simulate_run(policy, character, ascension, seed, max_steps)
+        results.append({k: r[k] for k in _RUN_FIELDS})
+    return results
+
+
+def iter_runs(runs: int, characters: List[str], ascensions: List[int], policy: str = 'greedy',
+              seed: int = 0, workers: Optional[int] = None, chunk: int = 25,
+              max_steps: int = 5000) -> Iterator[dict]:
+    """
+    把 职业 × 天赋 × runs 局分块提交到进程池，按完成顺序逐局产出结果。
+    同一组合的第 i 局种子为 seed + i，结果与进程数无关。
+    """
+    tasks = []
+    for character in characters:
+        for ascension in ascensions:
+            for start in range(0, runs, chunk):
+                seeds = list(range(seed + start, seed + min(runs, start + chunk)))
+                tasks.append((policy, character, ascension, seeds, max_steps))
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(_run_chunk, *task) for task in tasks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+class BalanceReport:
+    """把逐局结果汇总成 NumPy 数组，再计算各项统计"""
+
+    def __init__(self, results: List[dict], characters: List[str], ascensions: List[int]):
+        if np is None:
+            raise RuntimeError(NUMPY_MISSING)
+        from .cards import CARD_DEFAULTS
+        from .relics import ALL_RELICS_DICT, STARTER_RELICS
+        # 按 (职业, 天赋, 种子) 排序，使报告与完成顺序无关
+        results = sorted(results, key=lambda r: (characters.index(r['character']),
+                                                 ascensions.index(r['ascension']), r['seed']))
+        self.characters = characters
+        self.ascensions = ascensions
+        self.card_ids = sorted({cid for r in results for cid in r['deck']})
+        self.relic_ids = sorted({rid for r in results for rid in r['relic_ids']})
+        self.card_names = {cid: CARD_DEFAULTS.get(cid, {}).get('name', cid) for cid in self.card_ids}
+        relics = {r.id: r for r in list(ALL_RELICS_DICT.values()) + list(STARTER_RELICS.values())}
+        self.relic_names = {rid: relics[rid].name if rid in relics else rid for rid in self.relic_ids}
+
+        n = len(results)
+        card_col = {cid: i for i, cid in enumerate(self.card_ids)}
+        relic_col = {rid: i for i, rid in enumerate(self.relic_ids)}
+        self.char_idx = np.fromiter((characters.index(r['character']) for r in results), np.int16, n)
+        self.asc_idx = np.fromiter((ascensions.index(r['ascension']) for r in results), np.int16, n)
+        self.won = np.fromiter((r['outcome'] == 'victory' for r in results), bool, n)
+        self.floor = np.fromiter((r['floor'] for r in results), np.int16, n)
+        self.turns = np.fromiter((r['turns'] for r in results), np.int32, n)
+        # 出现矩阵：第 i 局结束时牌组中该牌的张数 / 是否持有该遗物
+        self.card_counts = np.zeros((n, len(self.card_ids)), np.int16)
+        self.relic_owned = np.zeros((n, len(self.relic_ids)), bool)
+        for i, r in enumerate(results):
+            for cid in r['deck']:
+                self.card_counts[i, card_col[cid]] += 1
+            for rid in r['relic_ids']:
+                self.relic_owned[i, relic_col[rid]] = True
+
+    # ----- 统计 -----
+    def win_rates(self) -> List[dict]:
+        """职业 × 天赋 的局数、胜场、胜率、平均楼层"""
+        shape = (len(self.characters), len(self.ascensions))
+        runs = np.zeros(shape, np.int64)
+        wins = np.zeros(shape, np.int64)
+        floors = np.zeros(shape, np.int64)
+        np.add.at(runs, (self.char_idx, self.asc_idx), 1)
+        np.add.at(wins, (self.char_idx, self.asc_idx), self.won)
+        np.add.at(floors, (self.char_idx, self.asc_idx), self.floor)
+        rows = []
+        for ci, character in enumerate(self.characters):
+            for ai, ascension in enumerate(self.ascensions):
+                n = int(runs[ci, ai])
+                rows.append({
+                    'character': character, 'ascension': ascension, 'runs': n, 'wins': int(wins[ci, ai]),
+                    'win_rate': round(wins[ci, ai] / n * 100, 2) if n else 0.0,
+                    'avg_floor': round(floors[ci, ai] / n, 2) if n else 0.0,
+                })
+        return rows
+
+    def death_floors(self) -> List[dict]:
+        """各职业 × 天赋 失败局的死亡楼层分布"""
+        lost = ~self.won
+        max_floor = int(self.floor.max()) + 1 if len(self.floor) else 1
+        rows = []
+        for ci, character in enumerate(self.characters):
+            for ai, ascension in enumerate(self.ascensions):
+                mask = lost & (self.char_idx == ci) & (self.asc_idx == ai)
+                hist = np.bincount(self.floor[mask], minlength=max_floor)
+                rows.extend({'character': character, 'ascension': ascension, 'floor': f, 'deaths': int(c)}
+                            for f, c in enumerate(hist) if c)
+        return rows
+
+    def _correlations(self, present: 'np.ndarray', ids: List[str], names: Dict[str, str]) -> List[dict]:
+        """
+        每个职业内，每列“出现”与胜利的统计：出现局数、出现时/未出现时胜率、phi 相关系数。
+        按职业分层计算，避免职业间的胜率差异掩盖卡牌/遗物本身的影响。
+        """
+        rows = []
+        for ci, character in enumerate(self.characters):
+            mask = self.char_idx == ci
+            if not mask.any():
+                continue
+            has = present[mask].astype(bool)
+            won_mask = self.won[mask]
+            won = won_mask.astype(np.float64)
+            x = has.astype(np.float64)
+            runs_with = has.sum(axis=0)
+            wins_with = (has & won_mask[:, None]).sum(axis=0)
+            runs_without = len(won) - runs_with
+            wins_without = won_mask.sum() - wins_with
+            cov = (x * won[:, None]).mean(axis=0) - x.mean(axis=0) * won.mean()
+            denom = x.std(axis=0) * won.std()
+            corr = np.divide(cov, denom, out=np.zeros_like(cov), where=denom > 0)
+            for j in np.flatnonzero(runs_with):
+                key = ids[j]
+                rows.append({
+                    'character': character, 'id': key, 'name': names[key],
+                    'runs_with': int(runs_with[j]), 'wins_with': int(wins_with[j]),
+                    'win_rate_with': round(wins_with[j] / runs_with[j] * 100, 2),
+                    'win_rate_without': round(wins_without[j] / runs_without[j] * 100, 2) if runs_without[j] else 0.0,
+                    'corr': round(float(corr[j]), 4),
+                })
+        rows.sort(key=lambda row: row['corr'], reverse=True)
+        return rows
+
+    def card_stats(self) -> List[dict]:
+        return self._correlations(self.card_counts > 0, self.card_ids, self.card_names)
+
+    def relic_stats(self) -> List[dict]:
+        return self._correlations(self.relic_owned, self.relic_ids, self.relic_names)
+
+    def summary(self) -> dict:
+        n = len(self.won)
+        return {
+            'runs': n,
+            'win_rate': round(float(self.won.mean()) * 100, 2) if n else 0.0,
+            'avg_floor': round(float(self.floor.mean()), 2) if n else 0.0,
+            'avg_turns': round(float(self.turns.mean()), 1) if n else 0.0,
+            'win_rates': self.win_rates(),
+        }
+
+    # ----- 输出 -----
+    def write(self, out_dir: str) -> List[str]:
+        """写出 CSV 与 summary.json，返回写出的文件路径"""
+        os.makedirs(out_dir, exist_ok=True)
+        tables = {
+            'win_rates.csv': self.win_rates(),
+            'death_floors.csv': self.death_floors(),
+            'cards.csv': self.card_stats(),
+            'relics.csv': self.relic_stats(),
+        }
+        paths = []
+        for name, rows in tables.items():
+            path = os.path.join(out_dir, name)
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                if rows:
+                    writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                    writer.writeheader()
+                    writer.writerows(rows)
+            paths.append(path)
+        path = os.path.join(out_dir, 'summary.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({**self.summary(), 'death_floors': tables['death_floors.csv'],
+                       'cards': tables['cards.csv'], 'relics': tables['relics.csv']},
+                      f, ensure_ascii=False, indent=2)
+        paths.append(path)
+        return paths
+
+
+def _parse_list(text: str, cast=str) -> list:
+    return [cast(x) for x in text.split(',') if x.strip()]
+
+
+def main():
+    from .sim.policies import POLICIES
+    from .state import CHARACTER_STATS
+
+    parser = argparse.ArgumentParser(description='文字肉鸽游戏蒙特卡洛平衡性分析')
+    parser.add_argument('--runs', type=int, default=1000, help='每个 职业 × 天赋 组合的局数')
+    parser.add_argument('--characters', default='all', help='逗号分隔（默认全部职业）')
+    parser.add_argument('--ascensions', default='0', help='逗号分隔的天赋等级，如 0,5,10')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='greedy')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认 CPU 核数）')
+    parser.add_argument('--chunk', type=int, default=25, help='每个任务的局数')
+    parser.add_argument('--max-steps', type=int, default=5000)
+    parser.add_argument('--out', help='报告目录（CSV + summary.json）')
+    parser.add_argument('--stream', help='逐局结果写入该 JSON Lines 文件')
+    parser.add_argument('--json', action='store_true', help='摘要输出为单行 JSON')
+    args = parser.parse_args()
+    if np is None:
+        parser.error(NUMPY_MISSING)
+
+    characters = sorted(CHARACTER_STATS) if args.characters == 'all' else _parse_list(args.characters)
+    unknown = [c for c in characters if c not in CHARACTER_STATS]
+    if unknown:
+        parser.error(f'未知职业: {", ".join(unknown)}')
+    ascensions = _parse_list(args.ascensions, int)
+
+    total = args.runs * len(characters) * len(ascensions)
+    results = []
+    stream = open(args.stream, 'w', encoding='utf-8') if args.stream else None
+    t0 = time.perf_counter()
+    try:
+        for r in iter_runs(args.runs, characters, ascensions, args.policy, args.seed,
+                           args.workers, args.chunk, args.max_steps):
+            results.append(r)
+            if stream:
+                stream.write(json.dumps(r, ensure_ascii=False) + '\n')
+            if len(results) % 500 == 0 or len(results) == total:
+                elapsed = time.perf_counter() - t0
+                print(f'\r{len(results)}/{total} 局  {len(results) / elapsed * 60:,.0f} 局/分钟',
+                      end='', file=sys.stderr, flush=True)
+    finally:
+        if stream:
+            stream.close()
+    elapsed = time.perf_counter() - t0
+    print(file=sys.stderr)
+
+    report = BalanceReport(results, characters, ascensions)
+    summary = report.summary()
+    summary.update(policy=args.policy, seconds=round(elapsed, 2),
+                   runs_per_min=round(len(results) / elapsed * 60) if elapsed > 0 else 0)
+    if args.out:
+        summary['files'] = report.write(args.out)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False))
+        return
+    print(f"{'职业':<10}{'天赋':>4}{'局数':>8}{'胜率%':>9}{'平均楼层':>10}")
+    for row in summary['win_rates']:
+        print(f"{row['character']:<10}{row['ascension']:>4}{row['runs']:>8}{row['win_rate']:>9.2f}{row['avg_floor']:>10.2f}")
+    print(f"共 {summary['runs']} 局，胜率 {summary['win_rate']}%，"
+          f"{elapsed:.1f}s（{summary['runs_per_min']:,} 局/分钟）")
+    for label, rows in (('卡牌', report.card_stats()), ('遗物', report.relic_stats())):
+        rows = [r for r in rows if r['runs_with'] >= max(10, summary['runs'] // 100) and r['corr']]
+        top = [r for r in rows if r['corr'] > 0][:5]
+        bottom = [r for r in rows if r['corr'] < 0][-5:]
+        for title, picked in (('正相关', top), ('负相关', bottom)):
+            if picked:
+                print(f"{label}与胜利{title}: " + '，'.join(
+                    f"{r['name']}[{r['character']}]({r['corr']:+.3f})" for r in picked))
+    if args.out:
+        print('报告:', ', '.join(summary['files']))
+
+
+if __name__ == '__main__':
+    main()
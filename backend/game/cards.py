@@ -1,7 +1,8 @@
 """卡牌系统 - 定义所有卡牌"""
 from dataclasses import dataclass, field
 from typing import Optional, List
-import random
+import re
+from .rng import rng
 
 
 @dataclass
@@ -187,6 +188,7 @@ COMMON_CARDS = [
     Card('curse_wound', '创伤', '诅咒：无法被打出', 'X', 'curse', 'common', 'curse', unplayable=True),
     Card('curse_burn', '灼伤', '回合结束失去1点HP', 'X', 'curse', 'common', 'curse', unplayable=True),
     Card('curse_dazed', '眩晕', '以太：回合结束移除', 0, 'status', 'common', 'curse', ethereal=True, unplayable=True),
+    Card('wound', '伤口', '无法打出。', 1, 'curse', 'common', 'curse', unplayable=True),  # 天赋5起手
 ]
 
 # 所有卡牌字典
@@ -195,6 +197,98 @@ for card in WARRIOR_CARDS + MAGE_CARDS + ASSASSIN_CARDS + COMMON_CARDS:
     ALL_CARDS[card.id] = card
 
 
+# 目录中每张牌的完整字段（卡牌实例未覆盖的字段从这里读取）
+CARD_DEFAULTS = {card_id: card.to_dict() for card_id, card in ALL_CARDS.items()}
+
+
+class CardInstance(dict):
+    """
+    牌组/牌堆中的一张牌：只保存 id 和本张牌的覆盖字段（升级、费用变化等），
+    其余字段读取时回落到 CARD_DEFAULTS。序列化时只写出自身字段，
+    对外展示前用 expand_card 展开。
+    """
+    __slots__ = ()
+
+    def _defaults(self) -> dict:
+        return CARD_DEFAULTS.get(dict.get(self, 'id'), {})
+
+    def __missing__(self, key):
+        defaults = self._defaults()
+        if key in defaults:
+            return defaults[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._defaults()
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        return self._defaults().get(key, default)
+
+    def copy(self) -> 'CardInstance':
+        return CardInstance(self)
+
+
+def make_card(card_id: str, **overrides) -> CardInstance:
+    """按目录 id 创建一张牌"""
+    return CardInstance(id=card_id, **overrides)
+
+
+def compact_card(card: dict) -> CardInstance:
+    """把完整卡牌 dict（旧存档、奖励/商店卡）转为只含覆盖字段的实例；目录外的牌原样保留"""
+    if isinstance(card, CardInstance):
+        return card
+    defaults = CARD_DEFAULTS.get(card.get('id'))
+    if defaults is None:
+        return CardInstance(card)
+    return CardInstance({k: v for k, v in card.items()
+                         if k == 'id' or k not in defaults or defaults[k] != v})
+
+
+def expand_card(card: dict) -> dict:
+    """展开为完整字段的 dict（API 输出用）"""
+    if isinstance(card, CardInstance):
+        return {**card._defaults(), **card}
+    return card
+
+
+def expand_cards(cards: List[dict]) -> List[dict]:
+    return [expand_card(c) for c in cards]
+
+
+# 存档中保存卡牌的牌堆
+CARD_PILES = ('deck', 'hand', 'draw_pile', 'discard_pile', 'exhaust_pile')
+
+
+def hydrate_player_cards(player: dict) -> dict:
+    """从存档加载后把各牌堆中的 dict 转为卡牌实例"""
+    for pile in CARD_PILES:
+        cards = player.get(pile)
+        if cards:
+            player[pile] = [compact_card(c) for c in cards]
+    return player
+
+
+def upgrade_card(card: dict) -> dict:
+    """升级一张牌：伤害/格挡 ×1.3+2，费用-1，并同步描述中的数值"""
+    card['upgraded'] = True
+    card['name'] = card['name'] + '+'
+    if card.get('damage'):
+        card['damage'] = int(card['damage'] * 1.3) + 2
+    if card.get('block'):
+        card['block'] = int(card['block'] * 1.3) + 2
+    if card.get('cost', 1) > 0:
+        card['cost'] = max(0, card['cost'] - 1)
+    desc = card.get('description', '')
+    if card.get('damage', 0) > 0 and '伤害' in desc:
+        desc = re.sub(r'\d+(?=点伤害)', str(card['damage']), desc, count=1)
+    if card.get('block', 0) > 0 and '格挡' in desc:
+        desc = re.sub(r'\d+(?=点格挡)', str(card['block']), desc, count=1)
+    card['description'] = desc
+    return card
+
+
 def get_starter_deck(character: str) -> List[dict]:
     """获取职业初始牌组"""
     starters = {
@@ -211,7 +305,7 @@ def get_starter_deck(character: str) -> List[dict]:
     deck = []
     for card_id, count in starters.get(character, []):
         for _ in range(count):
-            deck.append(dict(ALL_CARDS[card_id].to_dict()))
+            deck.append(make_card(card_id))
     return deck
 
 
@@ -227,7 +321,7 @@ def get_card_rewards(character: str, floor: int, count: int = 3) -> List[dict]:
                              MAGE_CARDS if character == 'mage' else ASSASSIN_CARDS)
                 if c.rarity != 'starter']
 
-    selected = random.sample(pool, min(count, len(pool)))
+    selected = rng().sample(pool, min(count, len(pool)))
     return [c.to_dict() for c in selected]
 
 
@@ -236,5 +330,5 @@ def get_shop_cards(character: str) -> List[dict]:
     char_cards = (WARRIOR_CARDS if character == 'warrior' else
                   MAGE_CARDS if character == 'mage' else ASSASSIN_CARDS)
     pool = [c for c in char_cards if c.rarity in ('common', 'uncommon', 'rare')]
-    selected = random.sample(pool, min(5, len(pool)))
+    selected = rng().sample(pool, min(5, len(pool)))
     return [c.to_dict() for c in selected]
@@ -0,0 +1,267 @@
+"""序列化层 - 游戏状态存储与 API 响应共用的 JSON / 二进制编解码
+
+JSON：安装了 orjson 时优先使用（JSON_CODEC=auto），否则退回标准库；JSON_CODEC=stdlib 强制标准库。
+两者输出都是不转义中文的紧凑 JSON，可以互相读取。
+
+状态存储格式（STATE_FORMAT）：
+    zlib     zlib 压缩的 JSON（标准库），默认：完整快照约为 JSON 的 1/3，数据库体积与页缓存占用随之减小
+    json     TEXT，不压缩（便于用 sqlite3 命令行直接查看快照）
+    zstd     zstd 压缩的 JSON（需要 zstandard）；注册了共享字典时使用当前字典
+    msgpack  MessagePack（需要 msgpack）
+二进制存档以 1 字节格式号开头（zstd 字典存档之后是 4 字节字典 id），读取时按值的类型与格式号识别，
+切换格式后旧存档照常加载。
+"""
+import json
+import os
+import threading
+import zlib
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Optional, Union
+
+JSON_CODEC = os.environ.get('JSON_CODEC', 'auto')
+STATE_FORMAT = os.environ.get('STATE_FORMAT', 'zlib')
+STATE_COMPRESS_LEVEL = int(os.environ.get('STATE_COMPRESS_LEVEL', 3))
+
+# 二进制存档的格式号（首字节）
+FORMAT_MSGPACK = 0x01
+FORMAT_ZLIB = 0x02
+FORMAT_ZSTD = 0x03
+FORMAT_ZSTD_DICT = 0x04
+_FORMAT_NAMES = {FORMAT_MSGPACK: 'msgpack', FORMAT_ZLIB: 'zlib', FORMAT_ZSTD: 'zstd', FORMAT_ZSTD_DICT: 'zstd-dict'}
+# 由 JSON 文本压缩得到的格式（可直接用增量编码拼出的快照文本生成）
+JSON_STATE_FORMATS = ('json', 'zlib', 'zstd')
+
+
+def to_builtin(obj):
+    """序列化的 default 钩子：非 dict 的映射（战斗实体 CombatPlayer / CombatEnemy）按 dict 输出"""
+    if isinstance(obj, Mapping):
+        to_dict = getattr(obj, 'to_dict', None)
+        return to_dict() if to_dict is not None else dict(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class JSONCodec:
+    """一种 JSON 实现：dumps 返回 str，dumps_bytes 返回 UTF-8 bytes，loads 接受 str / bytes"""
+    __slots__ = ('name', 'dumps', 'dumps_bytes', 'loads')
+
+    def __init__(self, name: str, dumps: Callable[..., str], dumps_bytes: Callable[..., bytes],
+                 loads: Callable[[Union[str, bytes]], Any]):
+        self.name = name
+        self.dumps = dumps
+        self.dumps_bytes = dumps_bytes
+        self.loads = loads
+
+
+def _stdlib_codec() -> JSONCodec:
+    def dumps(obj, default=None) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=default or to_builtin)
+
+    def dumps_bytes(obj, default=None) -> bytes:
+        return dumps(obj, default).encode()
+
+    return JSONCodec('stdlib', dumps, dumps_bytes, json.loads)
+
+
+def _orjson_codec() -> Optional[JSONCodec]:
+    try:
+        import orjson
+    except ImportError:
+        return None
+    # 与标准库保持一致：非字符串键转为字符串
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj, default=None) -> bytes:
+        return orjson.dumps(obj, default=default or to_builtin, option=option)
+
+    def dumps(obj, default=None) -> str:
+        return orjson.dumps(obj, default=default or to_builtin, option=option).decode()
+
+    return JSONCodec('orjson', dumps, dumps_bytes, orjson.loads)
+
+
+def available_codecs() -> Dict[str, JSONCodec]:
+    """本机可用的 JSON 实现"""
+    codecs = {'stdlib': _stdlib_codec()}
+    fast = _orjson_codec()
+    if fast is not None:
+        codecs['orjson'] = fast
+    return codecs
+
+
+def _select(name: str) -> JSONCodec:
+    codecs = available_codecs()
+    if name == 'auto':
+        return codecs.get('orjson') or codecs['stdlib']
+    if name not in codecs:
+        raise RuntimeError(f'JSON_CODEC={name} 不可用（可用: {", ".join(codecs)}）')
+    return codecs[name]
+
+
+codec = _select(JSON_CODEC)
+dumps = codec.dumps
+dumps_bytes = codec.dumps_bytes
+loads = codec.loads
+
+
+# ===== 状态存档 =====
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def available_state_formats() -> list:
+    formats = ['json', 'zlib']
+    if _msgpack() is not None:
+        formats.append('msgpack')
+    if _zstd() is not None:
+        formats.append('zstd')
+    return formats
+
+
+# ----- zstd 共享字典 -----
+# 字典按 id 注册；编码使用当前字典，解码按存档中记录的 id 取字典（本进程没有时通过 loader 加载）
+_dicts: Dict[int, Any] = {}
+_active_dict_id: Optional[int] = None
+_dict_loader: Optional[Callable[[int], Optional[bytes]]] = None
+_zstd_local = threading.local()  # zstd 压缩/解压对象不是线程安全的，每个线程各建一份
+
+
+def set_dictionary_loader(loader: Callable[[int], Optional[bytes]]):
+    """解码遇到未注册的字典 id 时调用 loader(dict_id) 取字典内容"""
+    global _dict_loader
+    _dict_loader = loader
+
+
+def register_dictionary(dict_id: int, data: bytes, active: bool = False):
+    """注册一个 zstd 字典；active=True 时之后的 zstd 存档使用它"""
+    global _active_dict_id
+    zstd = _zstd()
+    if zstd is None:
+        return
+    _dicts[dict_id] = zstd.ZstdCompressionDict(data)
+    if active:
+        _active_dict_id = dict_id
+
+
+def active_dictionary() -> Optional[int]:
+    return _active_dict_id
+
+
+def train_dictionary(samples: List[bytes], size: int = 64 * 1024) -> bytes:
+    """用一批 JSON 存档训练 zstd 字典"""
+    zstd = _zstd()
+    if zstd is None:
+        raise RuntimeError('训练字典需要安装 zstandard')
+    return zstd.train_dictionary(size, samples).as_bytes()
+
+
+def _get_dictionary(dict_id: int):
+    d = _dicts.get(dict_id)
+    if d is None and _dict_loader is not None:
+        data = _dict_loader(dict_id)
+        if data is not None:
+            register_dictionary(dict_id, data)
+            d = _dicts.get(dict_id)
+    if d is None:
+        raise RuntimeError(f'缺少 zstd 字典 {dict_id}')
+    return d
+
+
+def _zstd_obj(kind: str, dict_id: Optional[int]):
+    """当前线程的 zstd 压缩器（kind='c'）/ 解压器（kind='d'），按字典缓存"""
+    cache = getattr(_zstd_local, 'cache', None)
+    if cache is None:
+        cache = _zstd_local.cache = {}
+    key = (kind, dict_id)
+    obj = cache.get(key)
+    if obj is None:
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError('zstd 存档需要安装 zstandard')
+        kwargs = {'dict_data': _get_dictionary(dict_id)} if dict_id is not None else {}
+        if kind == 'c':
+            obj = zstd.ZstdCompressor(level=STATE_COMPRESS_LEVEL, **kwargs)
+        else:
+            obj = zstd.ZstdDecompressor(**kwargs)
+        cache[key] = obj
+    return obj
+
+
+# ----- 编码 / 解码 -----
+def encode_state_json(text: str, fmt: str = None) -> Union[str, bytes]:
+    """由已序列化的 JSON 文本生成存档值（json 原样返回；zlib / zstd 压缩后加格式号）"""
+    fmt = fmt or STATE_FORMAT
+    if fmt == 'json':
+        return text
+    raw = text.encode()
+    if fmt == 'zlib':
+        return bytes((FORMAT_ZLIB,)) + zlib.compress(raw, STATE_COMPRESS_LEVEL)
+    if fmt == 'zstd':
+        dict_id = _active_dict_id
+        if dict_id is None:
+            return bytes((FORMAT_ZSTD,)) + _zstd_obj('c', None).compress(raw)
+        return bytes((FORMAT_ZSTD_DICT,)) + dict_id.to_bytes(4, 'big') + _zstd_obj('c', dict_id).compress(raw)
+    raise ValueError(f'格式 {fmt} 不能由 JSON 文本生成')
+
+
+def encode_state(state: dict, fmt: str = None) -> Union[str, bytes]:
+    """把完整状态编码为存档值（json 为 str，其余为带格式号的 bytes）"""
+    fmt = fmt or STATE_FORMAT
+    if fmt == 'msgpack':
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise RuntimeError('STATE_FORMAT=msgpack 需要安装 msgpack')
+        return bytes((FORMAT_MSGPACK,)) + msgpack.packb(state, use_bin_type=True, default=to_builtin)
+    if fmt in JSON_STATE_FORMATS:
+        return encode_state_json(dumps(state), fmt)
+    raise ValueError(f'未知的状态格式: {fmt}')
+
+
+def decode_state(value: Union[str, bytes]) -> dict:
+    """读取任意格式的存档值"""
+    if isinstance(value, str):
+        return loads(value)
+    value = memoryview(value)
+    fmt = value[0] if len(value) else None
+    if fmt == FORMAT_ZSTD_DICT:
+        dict_id = int.from_bytes(value[1:5], 'big')
+        return loads(_zstd_obj('d', dict_id).decompress(value[5:]))
+    if fmt == FORMAT_ZSTD:
+        return loads(_zstd_obj('d', None).decompress(value[1:]))
+    if fmt == FORMAT_ZLIB:
+        return loads(zlib.decompress(value[1:]))
+    if fmt == FORMAT_MSGPACK:
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise RuntimeError('存档为 msgpack 格式，需要安装 msgpack')
+        return msgpack.unpackb(value[1:], raw=False, strict_map_key=False)
+    if fmt in (ord('{'), ord('[')):
+        return loads(bytes(value))
+    raise ValueError(f'未知的存档格式号: {fmt}')
+
+
+def state_format_of(value: Union[str, bytes]) -> str:
+    """存档值的格式名（统计用）"""
+    if isinstance(value, str):
+        return 'json'
+    fmt = value[0] if len(value) else None
+    return _FORMAT_NAMES.get(fmt, 'json' if fmt in (ord('{'), ord('[')) else 'unknown')
+
+
+def is_current_format(value: Union[str, bytes]) -> bool:
+    """存档值是否已是当前 STATE_FORMAT（zstd 还要求使用当前字典）"""
+    name = state_format_of(value)
+    if STATE_FORMAT == 'zstd' and _active_dict_id is not None:
+        return name == 'zstd-dict' and int.from_bytes(bytes(value[1:5]), 'big') == _active_dict_id
+    return name == STATE_FORMAT
@@ -1,373 +1,572 @@
 """战斗逻辑系统 - V3: 集成遗物效果触发"""
-import random
 from typing import List, Dict, Optional, Tuple
-from .cards import ALL_CARDS, Card
+from .rng import rng
+from .cards import ALL_CARDS, Card, CARD_DEFAULTS
+from .combatants import CombatEnemy, CombatPlayer
 from .enemies import Enemy, EnemyIntent, create_enemy_from_dict
 
 
-def channel_orb(player: dict, orb_type: str, logs: List[str]) -> dict:
+def channel_orb(player: CombatPlayer, orb_type: str, logs: List[str]) -> CombatPlayer:
     """将法球加入法球槽，若满了则先激活最旧的"""
-    orb_slots = player.get('orb_slots', 3)
-    orbs = player.get('orbs', [])
+    orb_slots = player.orb_slots
+    orbs = player.orbs
     if len(orbs) >= orb_slots:
         # 激活最旧的法球（溢出激活）
         _evoke_single_orb(player, orbs[0], logs, [])
         orbs.pop(0)
     orbs.append(orb_type)
-    player['orbs'] = orbs
+    player.orbs = orbs
     orb_names = {'lightning': '⚡闪电', 'frost': '❄️冰霜', 'plasma': '🔵等离子体'}
     logs.append(f'获得 {orb_names.get(orb_type, orb_type)} 法球（共 {len(orbs)} 个）')
     return player
 
 
-def evoke_orb(player: dict, enemies: List[dict], logs: List[str], times: int = 1) -> Tuple[dict, List[dict]]:
+def evoke_orb(player: CombatPlayer, enemies: List[CombatEnemy], logs: List[str],
+              times: int = 1) -> Tuple[CombatPlayer, List[CombatEnemy]]:
     """激活最旧的法球 times 次"""
     for _ in range(times):
-        orbs = player.get('orbs', [])
+        orbs = player.orbs
         if not orbs:
             logs.append('（无法球可激活）')
             break
         orb_type = orbs[0]
         _evoke_single_orb(player, orb_type, logs, enemies)
         orbs.pop(0)
-        player['orbs'] = orbs
+        player.orbs = orbs
     return player, enemies
 
 
-def _evoke_single_orb(player: dict, orb_type: str, logs: List[str], enemies: List[dict]) -> None:
+def _evoke_single_orb(player: CombatPlayer, orb_type: str, logs: List[str], enemies: List[CombatEnemy]) -> None:
     """执行单个法球的激活效果（就地修改）"""
     if orb_type == 'lightning':
-        alive = [e for e in enemies if e.get('hp', 0) > 0]
+        alive = [e for e in enemies if e.hp > 0]
         if alive:
-            target = random.choice(alive)
-            target['hp'] = max(0, target['hp'] - 8)
-            logs.append(f'⚡ 闪电法球激活：对 {target["name"]} 造成8点伤害')
+            target = rng().choice(alive)
+            target.hp = max(0, target.hp - 8)
+            logs.append(f'⚡ 闪电法球激活：对 {target.name} 造成8点伤害')
         else:
             logs.append('⚡ 闪电法球激活：无目标')
     elif orb_type == 'frost':
         block_gain = calculate_block(5, player)
-        player['block'] = player.get('block', 0) + block_gain
+        player.block += block_gain
         logs.append(f'❄️ 冰霜法球激活：获得 {block_gain} 点格挡')
     elif orb_type == 'plasma':
-        player['energy'] = player.get('energy', 0) + 2
+        player.energy += 2
         logs.append('🔵 等离子体法球激活：能量+2')
 
 
-def trigger_orb_passives(player: dict, enemies: List[dict], logs: List[str]) -> Tuple[dict, List[dict]]:
+def trigger_orb_passives(player: CombatPlayer, enemies: List[CombatEnemy],
+                         logs: List[str]) -> Tuple[CombatPlayer, List[CombatEnemy]]:
     """触发所有法球的被动效果（每回合开始）"""
-    for orb_type in player.get('orbs', []):
+    for orb_type in player.orbs:
         if orb_type == 'lightning':
-            alive = [e for e in enemies if e.get('hp', 0) > 0]
+            alive = [e for e in enemies if e.hp > 0]
             if alive:
-                target = random.choice(alive)
-                target['hp'] = max(0, target['hp'] - 3)
-                logs.append(f'⚡ 闪电法球：对 {target["name"]} 造成3点伤害')
+                target = rng().choice(alive)
+                target.hp = max(0, target.hp - 3)
+                logs.append(f'⚡ 闪电法球：对 {target.name} 造成3点伤害')
         elif orb_type == 'frost':
-            player['block'] = player.get('block', 0) + 2
+            player.block += 2
             logs.append('❄️ 冰霜法球：获得2点格挡')
         elif orb_type == 'plasma':
-            player['energy'] = player.get('energy', 0) + 1
+            player.energy += 1
             logs.append('🔵 等离子体法球：能量+1')
     return player, enemies
 
 
-def apply_card_effect(card_data: dict, player: dict, enemies: List[dict],
-                       target_idx: int = 0) -> Tuple[dict, List[dict], List[str]]:
+# ===== 卡牌效果引擎：按卡牌 id 预编译的处理函数表 =====
+class _Play:
+    """一次出牌的上下文（处理函数之间共享）"""
+    __slots__ = ('card', 'player', 'enemies', 'target', 'logs', 'card_type', 'aoe_total')
+
+    def __init__(self, card: dict, player: CombatPlayer, enemies: List[CombatEnemy], logs: List[str]):
+        self.card = card
+        self.player = player
+        self.enemies = enemies
+        self.target = None
+        self.logs = logs
+        self.card_type = ''
+        self.aoe_total = 0
+
+
+# 各阶段的特殊卡牌处理函数：{阶段: {card_id: fn(play)}}
+# prepare: 扣能量之前调整数值（法球动态卡牌）
+# modify:  伤害计算之前的数值覆盖/前置效果
+# strike:  替换默认的单体攻击
+# after_attack: 攻击结算之后、格挡之前
+# power:   能力牌的额外效果
+# after:   打出后的副作用
+# orb:     法球
+CARD_STAGES = ('prepare', 'modify', 'strike', 'after_attack', 'power', 'after', 'orb')
+_CARD_HANDLERS: Dict[str, Dict[str, object]] = {stage: {} for stage in CARD_STAGES}
+
+
+def card_handler(stage: str, *card_ids: str):
+    """注册特殊卡牌在某个阶段的处理函数"""
+    def register(fn):
+        for card_id in card_ids:
+            _CARD_HANDLERS[stage][card_id] = fn
+        return fn
+    return register
+
+
+# ---- prepare ----
+@card_handler('prepare', 'm_compile_driver')
+def _prepare_compile_driver(play: _Play):
+    play.card = play.card.copy()
+    play.card['damage'] = 3 + len(play.player.orbs)
+
+
+@card_handler('prepare', 'm_thunder_strike')
+def _prepare_thunder_strike(play: _Play):
+    lightning_count = sum(1 for o in play.player.orbs if o == 'lightning')
+    play.card = play.card.copy()
+    if lightning_count == 0:
+        play.card['damage'] = 0
+        play.card['hits'] = 0
+        play.logs.append('⚡ 雷击：没有闪电法球，无效！')
+    else:
+        play.card['hits'] = lightning_count
+
+
+# ---- modify ----
+@card_handler('modify', 'm_stack')
+def _modify_stack(play: _Play):
+    # 叠加：格挡值 = 弃牌堆数量
+    play.card = play.card.copy()
+    play.card['block'] = len(play.player.discard_pile)
+
+
+@card_handler('modify', 'w_fiend_fire')
+def _modify_fiend_fire(play: _Play):
+    # 恶魔烈焰：耗尽全部手牌，每张7点伤害
+    player = play.player
+    hand_cards = list(player.hand)
+    play.card = play.card.copy()
+    play.card['hits'] = max(1, len(hand_cards))
+    for c in hand_cards:
+        player.exhaust_pile.append(c)
+    player.hand = []
+    play.logs.append(f'🔥 恶魔烈焰：耗尽 {len(hand_cards)} 张手牌')
+
+
+@card_handler('modify', 'a_flechettes')
+def _modify_flechettes(play: _Play):
+    # 飞镖：每有1张技能牌在手中造成4点伤害
+    play.card = play.card.copy()
+    skill_in_hand = sum(1 for c in play.player.hand if c.get('type') == 'skill')
+    play.card['hits'] = max(0, skill_in_hand) if skill_in_hand > 0 else 1
+    if skill_in_hand == 0:
+        play.card['damage'] = 0
+        play.logs.append('❌ 飞镖：手中没有技能牌，无效！')
+    else:
+        play.logs.append(f'🎯 飞镖：手中{skill_in_hand}张技能牌，造成{4*skill_in_hand}点伤害')
+
+
+@card_handler('modify', 'a_sneaky_strike')
+def _modify_sneaky_strike(play: _Play):
+    # 暗袭：本回合必须弃过牌
+    if not play.player._discarded_this_turn:
+        play.logs.append('❌ 暗袭：本回合未丢弃过牌，无效！')
+        play.card = play.card.copy()
+        play.card['damage'] = 0
+    else:
+        # 额外获得2点能量
+        play.player.energy += 2
+        play.logs.append('暗袭：条件满足，额外获得2点能量')
+
+
+# ---- strike ----
+def _strike(play: _Play):
+    """默认单体攻击"""
+    card, player, target_enemy = play.card, play.player, play.target
+    if not target_enemy:
+        return
+    dmg = calculate_damage(card['damage'], card.get('hits', 1), player, target_enemy)
+    # 笔尖：第一次攻击双倍伤害
+    if not player._pen_nib_used and any(r['id'] == 'pen_nib' for r in player.relics):
+        dmg = dmg * 2
+        player._pen_nib_used = True
+        play.logs.append('✒️ 遗物【笔尖】：双倍伤害！')
+    actual_dmg, play.target = deal_damage(dmg, card.get('hits', 1), target_enemy, play.logs)
+    player.damage_dealt += actual_dmg
+    play.logs.append(f"对 {play.target.name} 造成 {actual_dmg} 点伤害")
+    return True
+
+
+@card_handler('strike', 'm_rebound')
+def _strike_rebound(play: _Play):
+    # 反弹：命中后将自身置于抽牌堆顶
+    if _strike(play):
+        play.player._rebound_active = True
+
+
+@card_handler('strike', 'w_clash')
+def _strike_clash(play: _Play):
+    # 冲撞：本回合只打出过攻击牌时才生效
+    player = play.player
+    if player._attacks_this_turn != player._cards_this_turn:
+        play.logs.append('❌ 冲撞：本回合打出了非攻击牌，无效！')
+    elif play.target:
+        card = play.card
+        dmg = calculate_damage(card['damage'], card.get('hits', 1), player, play.target)
+        actual_dmg, play.target = deal_damage(dmg, card.get('hits', 1), play.target, play.logs)
+        player.damage_dealt += actual_dmg
+        play.logs.append(f"对 {play.target.name} 造成 {actual_dmg} 点伤害")
+
+
+@card_handler('strike', 'a_grand_finale')
+def _strike_grand_finale(play: _Play):
+    # 终幕：抽牌堆为空时才造成伤害
+    player = play.player
+    if len(player.draw_pile) > 0:
+        play.logs.append('❌ 终幕：抽牌堆不为空，无效！')
+    elif play.target:
+        dmg = calculate_damage(play.card['damage'], 1, player, play.target)
+        actual_dmg, play.target = deal_damage(dmg, 1, play.target, play.logs)
+        player.damage_dealt += actual_dmg
+        play.logs.append(f"终幕：造成 {actual_dmg} 点伤害！")
+
+
+# ---- after_attack ----
+@card_handler('after_attack', 'w_reaper')
+def _after_attack_reaper(play: _Play):
+    # 死亡镰刀：恢复等同伤害的HP
+    if play.aoe_total > 0:
+        player = play.player
+        heal = play.aoe_total
+        player.hp = min(player.max_hp, player.hp + heal)
+        play.logs.append(f'💀 死亡镰刀：恢复 {heal} 点HP')
+
+
+@card_handler('after_attack', 'w_body_slam')
+def _after_attack_body_slam(play: _Play):
+    # 重拳：伤害=当前格挡值
+    if not play.target:
+        return
+    player = play.player
+    body_dmg = player.block
+    if body_dmg > 0:
+        body_dmg_calc = calculate_damage(body_dmg, 1, player, play.target)
+        actual_dmg, play.target = deal_damage(body_dmg_calc, 1, play.target, play.logs)
+        player.damage_dealt += actual_dmg
+        play.logs.append(f"重拳：造成 {actual_dmg} 点伤害（来自格挡 {body_dmg}）")
+    else:
+        play.logs.append("重拳：格挡为0，未造成伤害")
+
+
+# ---- power ----
+@card_handler('power', 'm_echo_form')
+def _power_echo_form(play: _Play):
+    # 回声形态：标记激活
+    play.player._echo_form = True
+    play.logs.append('🔮 回声形态：本回合起，每回合第一张牌触发2次')
+
+
+@card_handler('power', 'm_biased_cognition')
+def _power_biased_cognition(play: _Play):
+    # 偏向认知：记录激活（每回合专注-1需在turn_start处理）
+    play.player._biased_cognition = True
+
+
+# ---- after ----
+@card_handler('after', 'w_anger')
+def _after_anger(play: _Play):
+    # 愤怒：将自身副本加入弃牌堆
+    play.player.discard_pile.append(play.card.copy())
+    play.logs.append('愤怒：将一张愤怒加入弃牌堆')
+
+
+@card_handler('after', 'w_wild_strike')
+def _after_wild_strike(play: _Play):
+    # 狂野打击：将创伤加入弃牌堆
+    from .cards import make_card
+    play.player.discard_pile.append(make_card('curse_wound'))
+    play.logs.append('狂野打击：创伤加入弃牌堆')
+
+
+@card_handler('after', 'w_immolate')
+def _after_immolate(play: _Play):
+    # 燃烧牺牲：将一张灼伤加入弃牌堆
+    from .cards import make_card
+    play.player.discard_pile.append(make_card('curse_burn'))
+    play.logs.append('🔥 燃烧牺牲：一张灼伤加入弃牌堆')
+
+
+@card_handler('after', 'm_all_for_one')
+def _after_all_for_one(play: _Play):
+    # 全力一击：将弃牌堆中所有0费牌拿回手牌
+    player = play.player
+    zero_cards = [c for c in player.discard_pile if c.get('cost', -1) == 0]
+    for zc in zero_cards:
+        player.discard_pile.remove(zc)
+        player.hand.append(zc)
+    if zero_cards:
+        play.logs.append(f'全力一击：{len(zero_cards)}张0费牌回到手牌')
+
+
+# ---- orb ----
+@card_handler('orb', 'm_dualcast')
+def _orb_dualcast(play: _Play):
+    play.player, play.enemies = evoke_orb(play.player, play.enemies, play.logs, times=2)
+
+
+@card_handler('orb', 'm_cold_snap')
+def _orb_cold_snap(play: _Play):
+    play.player = channel_orb(play.player, 'frost', play.logs)
+
+
+@card_handler('orb', 'm_ball_lightning')
+def _orb_ball_lightning(play: _Play):
+    play.player = channel_orb(play.player, 'lightning', play.logs)
+
+
+@card_handler('orb', 'm_capacitor')
+def _orb_capacitor(play: _Play):
+    for _ in range(3):
+        play.player = channel_orb(play.player, 'lightning', play.logs)
+
+
+@card_handler('orb', 'm_meteor_strike')
+def _orb_meteor_strike(play: _Play):
+    for _ in range(3):
+        play.player = channel_orb(play.player, 'plasma', play.logs)
+
+
+# ---- 通用效果（按卡牌字段，执行时仍检查数值）----
+def _effect_attack(play: _Play, strike):
+    card = play.card
+    if card.get('damage', 0) > 0 and not card.get('apply_to_all'):
+        strike(play)
+    if card.get('damage', 0) > 0 and card.get('apply_to_all'):
+        player, enemies = play.player, play.enemies
+        for i, enemy in enumerate(enemies):
+            dmg = calculate_damage(card['damage'], card.get('hits', 1), player, enemy)
+            actual_dmg, enemies[i] = deal_damage(dmg, card.get('hits', 1), enemy, play.logs)
+            play.aoe_total += actual_dmg
+        player.damage_dealt += play.aoe_total
+        play.logs.append(f"对所有敌人共造成 {play.aoe_total} 点伤害")
+
+
+def _effect_block(play: _Play):
+    if play.card.get('block', 0) > 0:
+        block_gain = calculate_block(play.card['block'], play.player)
+        play.player.block += block_gain
+        play.logs.append(f"获得 {block_gain} 点格挡")
+
+
+def _effect_draw(play: _Play):
+    if play.card.get('draw', 0) > 0:
+        drawn = draw_cards(play.player, play.card['draw'])
+        play.logs.append(f"抽取 {drawn} 张牌")
+
+
+def _effect_poison(play: _Play):
+    card, target_enemy = play.card, play.target
+    if card.get('poison_stacks', 0) > 0 and target_enemy:
+        target_enemy.poison += card['poison_stacks']
+        play.logs.append(f"对 {target_enemy.name} 施加 {card['poison_stacks']} 层毒素")
+
+
+def _effect_weak(play: _Play):
+    card, target_enemy = play.card, play.target
+    if card.get('weak_turns', 0) > 0 and target_enemy:
+        target_enemy.weak_turns += card['weak_turns']
+        play.logs.append(f"使 {target_enemy.name} 虚弱 {card['weak_turns']} 回合")
+
+
+def _effect_vulnerable(play: _Play):
+    card, target_enemy = play.card, play.target
+    if card.get('vulnerable_turns', 0) > 0 and target_enemy:
+        target_enemy.vulnerable_turns += card['vulnerable_turns']
+        play.logs.append(f"使 {target_enemy.name} 易伤 {card['vulnerable_turns']} 回合")
+
+
+def _effect_strength(play: _Play):
+    if play.card.get('strength_gain', 0) > 0 and play.card_type != 'power':
+        play.player.strength += play.card['strength_gain']
+        play.logs.append(f"力量 +{play.card['strength_gain']}")
+
+
+def _effect_power(play: _Play, extra):
+    if play.card_type != 'power':
+        return
+    card, player = play.card, play.player
+    if card.get('strength_gain', 0) > 0:
+        player.strength += card['strength_gain']
+        play.logs.append(f"永久力量 +{card['strength_gain']}")
+    if card.get('energy_gain', 0) > 0:
+        player.max_energy += card['energy_gain']
+        play.logs.append(f"最大能量 +{card['energy_gain']}")
+    if card.get('dexterity_gain', 0) > 0:
+        player.dexterity += card['dexterity_gain']
+        play.logs.append(f"永久敏捷 +{card['dexterity_gain']}")
+    if extra:
+        extra(play)
+
+
+def _effect_exhaust(play: _Play):
+    if play.card.get('exhaust'):
+        play.logs.append(f"【{play.card['name']}】已耗尽")
+
+
+def _effect_nob_rage(play: _Play):
+    # 哥布林领袖愤怒：打出技能牌时额外受伤
+    if play.card_type == 'skill' and play.player._nob_rage:
+        play.player, _ = deal_damage_to_player(6, play.player, play.logs)
+        play.logs.append('😡 哥布林愤怒：受到6点伤害！')
+
+
+# 通用效果依赖的字段：目录值为假时编译出的程序省略该效果
+_EFFECT_FIELDS = ('damage', 'block', 'draw', 'poison_stacks', 'weak_turns', 'vulnerable_turns',
+                  'strength_gain', 'energy_gain', 'dexterity_gain', 'exhaust')
+
+
+class _CardProgram:
+    """一张牌预解析好的执行步骤"""
+    __slots__ = ('prepare', 'modify', 'card_type', 'zero_fields', 'steps', 'full_steps')
+
+    def __init__(self, card_id: str, defaults: Optional[dict]):
+        handlers = {stage: _CARD_HANDLERS[stage].get(card_id) for stage in CARD_STAGES}
+        all_fields = dict.fromkeys(_EFFECT_FIELDS, True)
+        self.prepare = handlers['prepare']
+        self.modify = handlers['modify']
+        self.card_type = defaults.get('type') if defaults is not None else None
+        # 目录中为 0/False 的字段：实例覆盖了这些字段（或类型）时改用完整步骤
+        self.zero_fields = frozenset(f for f in _EFFECT_FIELDS if defaults is not None and not defaults.get(f))
+        self.steps = _compile_steps(handlers, defaults if defaults is not None else all_fields, self.card_type)
+        self.full_steps = self.steps if defaults is None else _compile_steps(handlers, all_fields, None)
+
+
+def _compile_steps(handlers: dict, fields: dict, card_type: Optional[str]) -> tuple:
+    """按卡牌字段和特殊处理函数生成执行步骤；card_type 为 None 时保留按类型判断的步骤"""
+    steps = []
+    if fields.get('damage'):
+        strike = handlers['strike'] or _strike
+        steps.append(lambda play: _effect_attack(play, strike))
+    if handlers['after_attack']:
+        steps.append(handlers['after_attack'])
+    for field, effect in (('block', _effect_block), ('draw', _effect_draw),
+                          ('poison_stacks', _effect_poison), ('weak_turns', _effect_weak),
+                          ('vulnerable_turns', _effect_vulnerable), ('strength_gain', _effect_strength)):
+        if fields.get(field):
+            steps.append(effect)
+    if card_type in (None, 'power'):
+        extra = handlers['power']
+        steps.append(lambda play: _effect_power(play, extra))
+    if handlers['after']:
+        steps.append(handlers['after'])
+    if handlers['orb']:
+        steps.append(handlers['orb'])
+    if fields.get('exhaust'):
+        steps.append(_effect_exhaust)
+    if card_type in (None, 'skill'):
+        steps.append(_effect_nob_rage)
+    return tuple(steps)
+
+
+# 卡牌目录在导入时编译为 {card_id: _CardProgram}；目录外的牌执行全部通用步骤
+_CARD_PROGRAMS: Dict[str, _CardProgram] = {
+    card_id: _CardProgram(card_id, defaults) for card_id, defaults in CARD_DEFAULTS.items()
+}
+_GENERIC_PROGRAM = _CardProgram('', None)
+
+
+def apply_card_effect(card_data: dict, player: CombatPlayer, enemies: List[CombatEnemy],
+                      target_idx: int = 0) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
     """
-    执行卡牌效果
+    执行卡牌效果（按卡牌 id 查预编译程序，只执行这张牌实际具有的效果）
     返回: (更新后的player, 更新后的enemies列表, 战斗日志)
     """
-    logs = []
-    card = card_data
+    play = _Play(card_data, player, enemies, [])
+    program = _CARD_PROGRAMS.get(card_data.get('id', ''), _GENERIC_PROGRAM)
 
     # 法球动态卡牌：在计算前调整数值
-    card_id_pre = card.get('id', '')
-    if card_id_pre == 'm_compile_driver':
-        card = dict(card)
-        card['damage'] = 3 + len(player.get('orbs', []))
-    elif card_id_pre == 'm_thunder_strike':
-        lightning_count = sum(1 for o in player.get('orbs', []) if o == 'lightning')
-        card = dict(card)
-        if lightning_count == 0:
-            card['damage'] = 0
-            card['hits'] = 0
-            logs.append('⚡ 雷击：没有闪电法球，无效！')
-        else:
-            card['hits'] = lightning_count
+    if program.prepare:
+        program.prepare(play)
+    card, player = play.card, play.player
 
     # 消耗能量
     cost = card.get('cost', 0)
     if isinstance(cost, int):
-        player['energy'] -= cost
+        player.energy -= cost
 
     if card.get('unplayable'):
         return player, enemies, ['此牌无法打出！']
 
     # 追踪本回合出牌数量（用于遗物触发）
-    card_type = card.get('type', '')
-    player['_cards_this_turn'] = player.get('_cards_this_turn', 0) + 1
+    card_type = play.card_type = card.get('type', '')
+    player._cards_this_turn += 1
     if card_type == 'attack':
-        player['_attacks_this_turn'] = player.get('_attacks_this_turn', 0) + 1
+        player._attacks_this_turn += 1
     elif card_type == 'skill':
-        player['_skills_this_turn'] = player.get('_skills_this_turn', 0) + 1
+        player._skills_this_turn += 1
 
     # 获取目标
-    target_enemy = enemies[target_idx] if enemies and target_idx < len(enemies) else None
-
-    # ---- 动态卡牌数值覆盖（在伤害计算前）----
-    pre_id = card.get('id', '')
-    if pre_id == 'm_stack':
-        # 叠加：格挡值 = 弃牌堆数量
-        card = dict(card)
-        card['block'] = len(player.get('discard_pile', []))
-    elif pre_id == 'w_fiend_fire':
-        # 恶魔烈焰：耗尽全部手牌，每张7点伤害
-        hand_cards = list(player.get('hand', []))
-        card = dict(card)
-        card['hits'] = max(1, len(hand_cards))
-        for c in hand_cards:
-            player.setdefault('exhaust_pile', []).append(c)
-        player['hand'] = []
-        logs.append(f'🔥 恶魔烈焰：耗尽 {len(hand_cards)} 张手牌')
-    elif pre_id == 'a_flechettes':
-        # 飞镖：每有1张技能牌在手中造成4点伤害
-        card = dict(card)
-        skill_in_hand = sum(1 for c in player.get('hand', []) if c.get('type') == 'skill')
-        card['hits'] = max(0, skill_in_hand) if skill_in_hand > 0 else 1
-        if skill_in_hand == 0:
-            card['damage'] = 0
-            logs.append('❌ 飞镖：手中没有技能牌，无效！')
-        else:
-            logs.append(f'🎯 飞镖：手中{skill_in_hand}张技能牌，造成{4*skill_in_hand}点伤害')
-    elif pre_id == 'a_sneaky_strike':
-        # 暗袭：本回合必须弃过牌
-        if not player.get('_discarded_this_turn'):
-            logs.append('❌ 暗袭：本回合未丢弃过牌，无效！')
-            card = dict(card); card['damage'] = 0
-        else:
-            # 额外获得2点能量
-            player['energy'] = player.get('energy', 0) + 2
-            logs.append('暗袭：条件满足，额外获得2点能量')
+    play.target = enemies[target_idx] if enemies and target_idx < len(enemies) else None
 
-    # ---- 攻击效果 ----
-    if card.get('damage', 0) > 0 and not card.get('apply_to_all'):
-        card_id = card.get('id', '')
-        # 冲撞：本回合只打出过攻击牌时才生效
-        if card_id == 'w_clash':
-            if player.get('_attacks_this_turn', 0) != player.get('_cards_this_turn', 0):
-                logs.append('❌ 冲撞：本回合打出了非攻击牌，无效！')
-            elif target_enemy:
-                dmg = calculate_damage(card['damage'], card.get('hits', 1), player, target_enemy)
-                actual_dmg, target_enemy = deal_damage(dmg, card.get('hits', 1), target_enemy, logs)
-                player['damage_dealt'] = player.get('damage_dealt', 0) + actual_dmg
-                logs.append(f"对 {target_enemy['name']} 造成 {actual_dmg} 点伤害")
-        # 终幕：抽牌堆为空时才造成伤害
-        elif card_id == 'a_grand_finale':
-            if len(player.get('draw_pile', [])) > 0:
-                logs.append('❌ 终幕：抽牌堆不为空，无效！')
-            elif target_enemy:
-                dmg = calculate_damage(card['damage'], 1, player, target_enemy)
-                actual_dmg, target_enemy = deal_damage(dmg, 1, target_enemy, logs)
-                player['damage_dealt'] = player.get('damage_dealt', 0) + actual_dmg
-                logs.append(f"终幕：造成 {actual_dmg} 点伤害！")
-        elif target_enemy:
-            dmg = calculate_damage(card['damage'], card.get('hits', 1), player, target_enemy)
-            # 笔尖：第一次攻击双倍伤害
-            if not player.get('_pen_nib_used', True) and any(r['id'] == 'pen_nib' for r in player.get('relics', [])):
-                dmg = dmg * 2
-                player['_pen_nib_used'] = True
-                logs.append('✒️ 遗物【笔尖】：双倍伤害！')
-            actual_dmg, target_enemy = deal_damage(dmg, card.get('hits', 1), target_enemy, logs)
-            player['damage_dealt'] = player.get('damage_dealt', 0) + actual_dmg
-            logs.append(f"对 {target_enemy['name']} 造成 {actual_dmg} 点伤害")
-            # 反弹：将自身置于抽牌堆顶
-            if card.get('id') == 'm_rebound':
-                player['_rebound_active'] = True
-
-    _aoe_total = 0
-    if card.get('damage', 0) > 0 and card.get('apply_to_all'):
-        for i, enemy in enumerate(enemies):
-            dmg = calculate_damage(card['damage'], card.get('hits', 1), player, enemy)
-            actual_dmg, enemies[i] = deal_damage(dmg, card.get('hits', 1), enemy, logs)
-            _aoe_total += actual_dmg
-        player['damage_dealt'] = player.get('damage_dealt', 0) + _aoe_total
-        logs.append(f"对所有敌人共造成 {_aoe_total} 点伤害")
+    # 动态卡牌数值覆盖（在伤害计算前）
+    if program.modify:
+        program.modify(play)
 
-    # 死亡镰刀：恢复等同伤害的HP
-    if card.get('id') == 'w_reaper' and _aoe_total > 0:
-        heal = _aoe_total
-        player['hp'] = min(player['max_hp'], player['hp'] + heal)
-        logs.append(f'💀 死亡镰刀：恢复 {heal} 点HP')
-
-    # ---- 特殊卡牌：重拳（伤害=当前格挡值）----
-    if card.get('id') == 'w_body_slam' and target_enemy:
-        body_dmg = player.get('block', 0)
-        if body_dmg > 0:
-            body_dmg_calc = calculate_damage(body_dmg, 1, player, target_enemy)
-            actual_dmg, target_enemy = deal_damage(body_dmg_calc, 1, target_enemy, logs)
-            player['damage_dealt'] = player.get('damage_dealt', 0) + actual_dmg
-            logs.append(f"重拳：造成 {actual_dmg} 点伤害（来自格挡 {body_dmg}）")
-        else:
-            logs.append("重拳：格挡为0，未造成伤害")
-
-    # ---- 格挡效果 ----
-    if card.get('block', 0) > 0:
-        block_gain = calculate_block(card['block'], player)
-        player['block'] = player.get('block', 0) + block_gain
-        logs.append(f"获得 {block_gain} 点格挡")
-
-    # ---- 抽牌 ----
-    if card.get('draw', 0) > 0:
-        drawn = draw_cards(player, card['draw'])
-        logs.append(f"抽取 {drawn} 张牌")
-
-    # ---- 毒素 ----
-    if card.get('poison_stacks', 0) > 0 and target_enemy:
-        target_enemy['poison'] = target_enemy.get('poison', 0) + card['poison_stacks']
-        logs.append(f"对 {target_enemy['name']} 施加 {card['poison_stacks']} 层毒素")
-
-    # ---- 虚弱 ----
-    if card.get('weak_turns', 0) > 0 and target_enemy:
-        target_enemy['weak_turns'] = target_enemy.get('weak_turns', 0) + card['weak_turns']
-        logs.append(f"使 {target_enemy['name']} 虚弱 {card['weak_turns']} 回合")
-
-    # ---- 易伤 ----
-    if card.get('vulnerable_turns', 0) > 0 and target_enemy:
-        target_enemy['vulnerable_turns'] = target_enemy.get('vulnerable_turns', 0) + card['vulnerable_turns']
-        logs.append(f"使 {target_enemy['name']} 易伤 {card['vulnerable_turns']} 回合")
-
-    # ---- 力量增益 ----
-    if card.get('strength_gain', 0) > 0 and card_type != 'power':
-        player['strength'] = player.get('strength', 0) + card['strength_gain']
-        logs.append(f"力量 +{card['strength_gain']}")
-
-    # ---- 能力牌（永久）----
-    if card_type == 'power':
-        if card.get('strength_gain', 0) > 0:
-            player['strength'] = player.get('strength', 0) + card['strength_gain']
-            logs.append(f"永久力量 +{card['strength_gain']}")
-        if card.get('energy_gain', 0) > 0:
-            player['max_energy'] = player.get('max_energy', 3) + card['energy_gain']
-            logs.append(f"最大能量 +{card['energy_gain']}")
-        if card.get('dexterity_gain', 0) > 0:
-            player['dexterity'] = player.get('dexterity', 0) + card['dexterity_gain']
-            logs.append(f"永久敏捷 +{card['dexterity_gain']}")
-        # 回声形态：标记激活
-        if card.get('id') == 'm_echo_form':
-            player['_echo_form'] = True
-            logs.append('🔮 回声形态：本回合起，每回合第一张牌触发2次')
-        # 偏向认知：记录激活（每回合专注-1需在turn_start处理）
-        elif card.get('id') == 'm_biased_cognition':
-            player['_biased_cognition'] = True
-
-    # ---- 特殊卡牌：打出后副作用 ----
-    card_id_post = card.get('id', '')
-    # 愤怒：将自身副本加入弃牌堆
-    if card_id_post == 'w_anger':
-        import copy
-        anger_copy = dict(card)
-        player.setdefault('discard_pile', []).append(anger_copy)
-        logs.append('愤怒：将一张愤怒加入弃牌堆')
-    # 狂野打击：将创伤加入弃牌堆
-    elif card_id_post == 'w_wild_strike':
-        from .cards import ALL_CARDS
-        wound = dict(ALL_CARDS['curse_wound'].to_dict())
-        player.setdefault('discard_pile', []).append(wound)
-        logs.append('狂野打击：创伤加入弃牌堆')
-    # 燃烧牺牲：将一张灼伤加入弃牌堆
-    elif card_id_post == 'w_immolate':
-        from .cards import ALL_CARDS
-        burn = dict(ALL_CARDS['curse_burn'].to_dict()) if 'curse_burn' in ALL_CARDS else {
-            'id': 'curse_burn', 'name': '灼伤', 'type': 'curse', 'cost': 1,
-            'description': '回合结束时失去1HP，不可打出。', 'unplayable': True,
-            'damage': 0, 'block': 0, 'rarity': 'curse', 'exhaust': False
-        }
-        player.setdefault('discard_pile', []).append(burn)
-        logs.append('🔥 燃烧牺牲：一张灼伤加入弃牌堆')
-    # 全力一击：将弃牌堆中所有0费牌拿回手牌
-    elif card_id_post == 'm_all_for_one':
-        zero_cards = [c for c in player.get('discard_pile', []) if c.get('cost', -1) == 0]
-        for zc in zero_cards:
-            player['discard_pile'].remove(zc)
-            player.setdefault('hand', []).append(zc)
-        if zero_cards:
-            logs.append(f'全力一击：{len(zero_cards)}张0费牌回到手牌')
-
-    # ---- 法球系统 ----
-    card_id_orb = card.get('id', '')
-    if card_id_orb == 'm_dualcast':
-        player, enemies = evoke_orb(player, enemies, logs, times=2)
-    elif card_id_orb == 'm_cold_snap':
-        player = channel_orb(player, 'frost', logs)
-    elif card_id_orb == 'm_ball_lightning':
-        player = channel_orb(player, 'lightning', logs)
-    elif card_id_orb == 'm_capacitor':
-        for _ in range(3):
-            player = channel_orb(player, 'lightning', logs)
-    elif card_id_orb == 'm_meteor_strike':
-        for _ in range(3):
-            player = channel_orb(player, 'plasma', logs)
-
-    # 处理exhaust
-    if card.get('exhaust'):
-        logs.append(f"【{card['name']}】已耗尽")
-
-    # ---- 哥布林领袖愤怒：打出技能牌时额外受伤 ----
-    if card_type == 'skill' and player.get('_nob_rage'):
-        player, _ = deal_damage_to_player(6, player, logs)
-        logs.append('😡 哥布林愤怒：受到6点伤害！')
+    # 实例覆盖了目录中为 0 的效果字段（或类型）时，按完整步骤执行
+    steps = program.steps
+    if steps is not program.full_steps and (
+            card_type != program.card_type
+            or any(play.card[f] for f in program.zero_fields.intersection(play.card))):
+        steps = program.full_steps
+    for step in steps:
+        step(play)
 
     # ---- 遗物触发：打出卡牌 ----
-    try:
-        from .relic_effects import on_card_played
-        player, enemies, relic_logs = on_card_played(
-            player, enemies, card,
-            player.get('_attacks_this_turn', 0),
-            player.get('_skills_this_turn', 0),
-            player.get('_cards_this_turn', 0)
-        )
-        logs.extend(relic_logs)
-    except Exception:
-        pass
+    player, enemies, card, logs = play.player, play.enemies, play.card, play.logs
+    from .relic_effects import on_card_played
+    player, enemies, relic_logs = on_card_played(
+        player, enemies, card,
+        player._attacks_this_turn,
+        player._skills_this_turn,
+        player._cards_this_turn
+    )
+    logs.extend(relic_logs)
 
     return player, enemies, logs
 
 
-def calculate_damage(base_dmg: int, hits: int, player: dict, enemy: dict) -> int:
+def calculate_damage(base_dmg: int, hits: int, player: CombatPlayer, enemy: CombatEnemy) -> int:
     """计算实际伤害（含力量、职业攻击加成、虚弱、易伤等修正）"""
-    strength = player.get('strength', 0)
-    char_attack = player.get('char_attack_bonus', 0)
+    strength = player.strength
+    char_attack = player.char_attack_bonus
     per_hit = max(0, base_dmg + strength + char_attack)
     total = per_hit * hits
 
     # 虚弱减伤25%
-    if player.get('weak_turns', 0) > 0:
+    if player.weak_turns > 0:
         total = int(total * 0.75)
 
     # 易伤增伤50%
-    if enemy.get('vulnerable_turns', 0) > 0:
+    if enemy.vulnerable_turns > 0:
         total = int(total * 1.5)
 
     return max(0, total)
 
 
-def calculate_block(base_block: int, player: dict) -> int:
+def calculate_block(base_block: int, player: CombatPlayer) -> int:
     """计算实际格挡（含敏捷、职业防御加成修正）"""
-    dexterity = player.get('dexterity', 0)
-    char_defense = player.get('char_defense_bonus', 0)
+    dexterity = player.dexterity
+    char_defense = player.char_defense_bonus
     block = base_block + dexterity + char_defense
 
     # 虚弱减少格挡25%
-    if player.get('weak_turns', 0) > 0:
+    if player.weak_turns > 0:
         block = int(block * 0.75)
 
     return max(0, block)
 
 
-def deal_damage(damage: int, hits: int, enemy: dict, logs: List[str]) -> Tuple[int, dict]:
+def deal_damage(damage: int, hits: int, enemy: CombatEnemy, logs: List[str]) -> Tuple[int, CombatEnemy]:
     """对敌人造成伤害，处理格挡"""
     # 腐化之心：前4回合无敌（move_history < 4时不受伤害）
-    if 'corrupt_heart' in enemy.get('id', '') and len(enemy.get('move_history', [])) < 4:
+    if 'corrupt_heart' in enemy.id and len(enemy.move_history) < 4:
         logs.append('🛡️ 腐化之心：调试模式，无法被伤害！')
         return 0, enemy
 
@@ -375,61 +574,62 @@ def deal_damage(damage: int, hits: int, enemy: dict, logs: List[str]) -> Tuple[i
     for _ in range(hits):
         if damage <= 0:
             continue
-        current_block = enemy.get('block', 0)
+        current_block = enemy.block
         if current_block > 0:
             if damage >= current_block:
                 dmg_through = damage - current_block
-                enemy['block'] = 0
-                enemy['hp'] -= dmg_through
+                enemy.block = 0
+                enemy.hp -= dmg_through
                 total_dmg += dmg_through
             else:
-                enemy['block'] -= damage
+                enemy.block -= damage
         else:
-            enemy['hp'] -= damage
+            enemy.hp -= damage
             total_dmg += damage
 
-    enemy['hp'] = max(0, enemy['hp'])
+    enemy.hp = max(0, enemy.hp)
     return total_dmg, enemy
 
 
-def deal_damage_to_player(damage: int, player: dict, logs: List[str]) -> Tuple[dict, int]:
+def deal_damage_to_player(damage: int, player: CombatPlayer, logs: List[str]) -> Tuple[CombatPlayer, int]:
     """对玩家造成伤害，格挡先吸收伤害并扣减"""
-    block = player.get('block', 0)
+    block = player.block
     if block >= damage:
-        player['block'] -= damage
+        player.block -= damage
         actual_dmg = 0
-        logs.append(f"护甲完全抵消了 {damage} 点伤害（剩余格挡 {player['block']}）")
+        logs.append(f"护甲完全抵消了 {damage} 点伤害（剩余格挡 {player.block}）")
     elif block > 0:
         actual_dmg = damage - block
-        player['block'] = 0
-        player['hp'] = max(0, player['hp'] - actual_dmg)
+        player.block = 0
+        player.hp = max(0, player.hp - actual_dmg)
         logs.append(f"护甲抵消 {block} 点，你受到 {actual_dmg} 点伤害")
     else:
         actual_dmg = damage
-        player['hp'] = max(0, player['hp'] - actual_dmg)
+        player.hp = max(0, player.hp - actual_dmg)
         logs.append(f"你受到 {actual_dmg} 点伤害")
 
     # 蜥蜴尾巴：第一次致死伤害时以10%HP存活
-    if player['hp'] <= 0:
-        relics = player.get('relics', [])
-        if any(r['id'] == 'lizard_tail' for r in relics) and not player.get('_lizard_tail_used'):
-            player['hp'] = max(1, player['max_hp'] // 10)
-            player['_lizard_tail_used'] = True
-            actual_dmg = max(0, actual_dmg - player['max_hp'] // 10)
+    if player.hp <= 0:
+        relics = player.relics
+        if any(r['id'] == 'lizard_tail' for r in relics) and not player._lizard_tail_used:
+            player.hp = max(1, player.max_hp // 10)
+            player._lizard_tail_used = True
+            actual_dmg = max(0, actual_dmg - player.max_hp // 10)
             logs.append('🦎 遗物【蜥蜴尾巴】：死里逃生！以10%HP存活！')
 
     return player, actual_dmg
 
 
-def draw_cards(player: dict, count: int) -> int:
-    """抽牌：从抽牌堆移到手牌"""
+def draw_cards(player: CombatPlayer, count: int) -> int:
+    """抽牌：从抽牌堆移到手牌（战斗外使用药水时 player 是普通 dict，这里只用映射接口）"""
     drawn = 0
+    draw_pile, hand = player['draw_pile'], player['hand']
     for _ in range(count):
-        if not player['draw_pile']:
+        if not draw_pile:
             # 洗牌：将弃牌堆变成抽牌堆
             if player['discard_pile']:
-                player['draw_pile'] = player['discard_pile'][:]
-                random.shuffle(player['draw_pile'])
+                draw_pile = player['draw_pile'] = player['discard_pile'][:]
+                rng().shuffle(draw_pile)
                 player['discard_pile'] = []
                 # 日晷：每洗牌3次获得2点能量
                 player['_sundial_count'] = player.get('_sundial_count', 0) + 1
@@ -439,32 +639,31 @@ def draw_cards(player: dict, count: int) -> int:
                     player['_sundial_triggered'] = True
             else:
                 break
-        if player['draw_pile']:
-            card = player['draw_pile'].pop()
-            player['hand'].append(card)
-            drawn += 1
+        hand.append(draw_pile.pop())
+        drawn += 1
     return drawn
 
 
-def enemy_turn(player: dict, enemies: List[dict]) -> Tuple[dict, List[dict], List[str]]:
+def enemy_turn(player: CombatPlayer,
+               enemies: List[CombatEnemy]) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
     """执行敌人回合"""
     logs = []
-    alive_enemies = [e for e in enemies if e.get('hp', 0) > 0]
+    alive_enemies = [e for e in enemies if e.hp > 0]
     total_damage_taken = 0
 
     for enemy in alive_enemies:
         # 处理毒素伤害
-        if enemy.get('poison', 0) > 0:
-            poison_dmg = enemy['poison']
-            enemy['hp'] = max(0, enemy['hp'] - poison_dmg)
-            enemy['poison'] -= 1
-            logs.append(f"{enemy['name']} 受到 {poison_dmg} 点毒素伤害")
-
-        if enemy['hp'] <= 0:
-            logs.append(f"{enemy['name']} 因毒素死亡！")
+        if enemy.poison > 0:
+            poison_dmg = enemy.poison
+            enemy.hp = max(0, enemy.hp - poison_dmg)
+            enemy.poison -= 1
+            logs.append(f"{enemy.name} 受到 {poison_dmg} 点毒素伤害")
+
+        if enemy.hp <= 0:
+            logs.append(f"{enemy.name} 因毒素死亡！")
             continue
 
-        intent = enemy.get('intent', {})
+        intent = enemy.intent
         if not intent:
             continue
 
@@ -474,127 +673,121 @@ def enemy_turn(player: dict, enemies: List[dict]) -> Tuple[dict, List[dict], Lis
 
         if action == 'attack':
             # 计算敌人伤害（含力量）
-            strength = enemy.get('strength', 0)
+            strength = enemy.strength
             total_dmg = (value + strength) * times
 
             # 敌人虚弱减伤25%
-            if enemy.get('weak_turns', 0) > 0:
+            if enemy.weak_turns > 0:
                 total_dmg = int(total_dmg * 0.75)
 
             # 玩家易伤增伤
-            if player.get('vulnerable_turns', 0) > 0:
+            if player.vulnerable_turns > 0:
                 total_dmg = int(total_dmg * 1.5)
 
             player, actual_dmg = deal_damage_to_player(total_dmg, player, logs)
             total_damage_taken += actual_dmg
-            logs.append(f"{enemy['name']} 攻击：{intent.get('description', f'{total_dmg}伤害')}")
+            logs.append(f"{enemy.name} 攻击：{intent.get('description', f'{total_dmg}伤害')}")
 
             # 遗物触发：受到伤害时
             if actual_dmg > 0:
-                try:
-                    from .relic_effects import on_player_take_damage
-                    player, alive_enemies, relic_logs = on_player_take_damage(player, alive_enemies, actual_dmg)
-                    logs.extend(relic_logs)
-                except Exception:
-                    pass
+                from .relic_effects import on_player_take_damage
+                player, alive_enemies, relic_logs = on_player_take_damage(player, alive_enemies, actual_dmg)
+                logs.extend(relic_logs)
 
         elif action == 'block':
-            block_gain = value + enemy.get('dexterity', 0)
-            enemy['block'] = enemy.get('block', 0) + block_gain
+            block_gain = value + enemy.dexterity
+            enemy.block += block_gain
             if block_gain > 0:
-                logs.append(f"{enemy['name']} 获得 {block_gain} 点格挡")
+                logs.append(f"{enemy.name} 获得 {block_gain} 点格挡")
             if intent.get('description'):
-                logs.append(f"{enemy['name']}：{intent['description']}")
+                logs.append(f"{enemy.name}：{intent['description']}")
 
         elif action == 'buff':
-            eid_buff = enemy.get('id', '')
+            eid_buff = enemy.id
             desc_buff = intent.get('description', '')
             # 沉睡巨魔觉醒：力量-1, 敏捷-1（debuff玩家）
             if 'lagavulin' in eid_buff and '觉醒' in desc_buff:
-                player['strength'] = player.get('strength', 0) - 1
-                player['dexterity'] = player.get('dexterity', 0) - 1
+                player.strength -= 1
+                player.dexterity -= 1
                 logs.append(f"⚠️ 沉睡巨魔觉醒！你的力量-1，敏捷-1")
             # 哥布林领袖愤怒：之后打出技能牌时额外受到伤害（标记状态）
             elif 'gremlin_nob' in eid_buff and '愤怒' in desc_buff:
-                player['_nob_rage'] = True
+                player._nob_rage = True
                 logs.append(f"😡 哥布林领袖愤怒：打出技能牌时额外受到6点伤害！")
             # 腐化之心：回血100HP
             elif 'corrupt' in eid_buff and '回血' in desc_buff:
-                heal_amount = min(100, enemy['max_hp'] - enemy['hp'])
-                enemy['hp'] = min(enemy['max_hp'], enemy['hp'] + 100)
+                heal_amount = min(100, enemy.max_hp - enemy.hp)
+                enemy.hp = min(enemy.max_hp, enemy.hp + 100)
                 logs.append(f'💗 腐化之心恢复了 {heal_amount} 点HP！')
             else:
                 if value > 0:
-                    enemy['strength'] = enemy.get('strength', 0) + value
-                    logs.append(f"{enemy['name']} 力量 +{value}")
+                    enemy.strength += value
+                    logs.append(f"{enemy.name} 力量 +{value}")
                 if desc_buff:
-                    logs.append(f"{enemy['name']}：{desc_buff}")
+                    logs.append(f"{enemy.name}：{desc_buff}")
 
         elif action == 'debuff':
             # 对玩家施加虚弱或易伤
             debuff_type = intent.get('debuff_type', 'weak')
             turns = max(1, value)
             if debuff_type == 'vulnerable':
-                player['vulnerable_turns'] = player.get('vulnerable_turns', 0) + turns
+                player.vulnerable_turns += turns
             else:
-                player['weak_turns'] = player.get('weak_turns', 0) + turns
+                player.weak_turns += turns
             desc = intent.get('description') or f'{"易伤" if debuff_type == "vulnerable" else "虚弱"}{turns}回合'
-            logs.append(f"{enemy['name']}：{desc}")
+            logs.append(f"{enemy.name}：{desc}")
 
         elif action == 'special':
-            eid = enemy.get('id', '')
+            eid = enemy.id
             desc = intent.get('description', '特殊行动')
-            logs.append(f"{enemy['name']}：{desc}")
+            logs.append(f"{enemy.name}：{desc}")
             # 腐化之心：诅咒——加入10张创伤牌
             if 'corrupt' in eid and '诅咒' in desc:
-                from .cards import ALL_CARDS
-                wound = ALL_CARDS.get('curse_wound')
-                if wound:
-                    wound_dict = wound.to_dict()
-                    for _ in range(10):
-                        player.setdefault('discard_pile', []).append(dict(wound_dict))
-                    logs.append('💀 诅咒：10张创伤牌加入你的弃牌堆！（你的牌组被污染了）')
+                from .cards import make_card
+                for _ in range(10):
+                    player.discard_pile.append(make_card('curse_wound'))
+                logs.append('💀 诅咒：10张创伤牌加入你的弃牌堆！（你的牌组被污染了）')
             # 六角幽灵：召唤将灼伤牌加入弃牌堆
             elif 'hexa' in eid:
-                from .cards import ALL_CARDS
-                burn_card = dict(ALL_CARDS.get('curse_burn', ALL_CARDS.get('curse_wound', next(iter(ALL_CARDS.values())))).to_dict())
+                from .cards import make_card
                 for _ in range(3):
-                    player.setdefault('discard_pile', []).append(dict(burn_card))
+                    player.discard_pile.append(make_card('curse_burn'))
                 logs.append('🔥 3张灼伤牌加入了你的弃牌堆！（每回合结束失去1HP）')
             # 沉睡巨魔：虹吸——偷取玩家力量和敏捷
             elif 'lagavulin' in eid and '虹吸' in desc:
-                steal_str = min(1, player.get('strength', 0))
-                steal_dex = min(1, player.get('dexterity', 0))
-                player['strength'] = player.get('strength', 0) - steal_str
-                player['dexterity'] = player.get('dexterity', 0) - steal_dex
-                enemy['strength'] = enemy.get('strength', 0) + steal_str
-                enemy['dexterity'] = enemy.get('dexterity', 0) + steal_dex
+                steal_str = min(1, player.strength)
+                steal_dex = min(1, player.dexterity)
+                player.strength -= steal_str
+                player.dexterity -= steal_dex
+                enemy.strength += steal_str
+                enemy.dexterity += steal_dex
                 logs.append(f'沉睡巨魔虹吸：偷取你 {steal_str} 力量 {steal_dex} 敏捷')
 
         # 更新敌人虚弱/易伤回合
-        if enemy.get('weak_turns', 0) > 0:
-            enemy['weak_turns'] -= 1
-        if enemy.get('vulnerable_turns', 0) > 0:
-            enemy['vulnerable_turns'] -= 1
+        if enemy.weak_turns > 0:
+            enemy.weak_turns -= 1
+        if enemy.vulnerable_turns > 0:
+            enemy.vulnerable_turns -= 1
 
         # 更新下一回合意图
-        enemy['move_history'] = enemy.get('move_history', [])
-        enemy['move_history'].append(action)
-        enemy['intent'] = _generate_next_intent(enemy)
+        if 'move_history' not in enemy:
+            enemy.move_history = []
+        enemy.move_history.append(action)
+        enemy.intent = _generate_next_intent(enemy)
 
     # 统计伤害
-    player['damage_taken'] = player.get('damage_taken', 0) + total_damage_taken
+    player.damage_taken += total_damage_taken
 
     return player, enemies, logs
 
 
-def _generate_next_intent(enemy: dict) -> dict:
+def _generate_next_intent(enemy: CombatEnemy) -> dict:
     """为敌人生成下一回合意图（简化AI）"""
-    eid = enemy.get('id', '')
-    move_count = len(enemy.get('move_history', []))
+    eid = enemy.id
+    move_count = len(enemy.move_history)
 
     # Boss意图逻辑
-    if enemy.get('is_boss'):
+    if enemy.is_boss:
         if 'guardian' in eid:
             patterns = [
                 {'action': 'attack', 'value': 18, 'times': 1, 'description': '重击 18'},
@@ -607,12 +800,12 @@ def _generate_next_intent(enemy: dict) -> dict:
             if move_count % 7 == 0:
                 return {'action': 'special', 'value': 0, 'times': 1, 'description': '召唤灼伤'}
             elif move_count % 7 < 3:
-                v = 6 + enemy.get('strength', 0)
+                v = 6 + enemy.strength
                 return {'action': 'attack', 'value': v, 'times': 1, 'description': f'折磨 {v}'}
             elif move_count % 7 == 3:
                 return {'action': 'buff', 'value': 3, 'times': 1, 'description': '仪式 力量+3'}
             else:
-                v = 14 + enemy.get('strength', 0)
+                v = 14 + enemy.strength
                 return {'action': 'attack', 'value': v, 'times': 1, 'description': f'能量爆发 {v}'}
         elif 'corrupt' in eid:
             if move_count < 4:
@@ -625,11 +818,11 @@ def _generate_next_intent(enemy: dict) -> dict:
             return patterns[move_count % len(patterns)]
 
     # 精英意图
-    if enemy.get('is_elite'):
+    if enemy.is_elite:
         if 'gremlin_nob' in eid:
             if move_count == 0:
                 return {'action': 'buff', 'value': 2, 'times': 1, 'description': '愤怒'}
-            r = random.random()
+            r = rng().random()
             if r < 0.33:
                 return {'action': 'attack', 'value': 14, 'times': 1, 'description': '冲撞 14'}
             return {'action': 'attack', 'value': 6, 'times': 2, 'description': '斩击 2x6'}
@@ -638,7 +831,7 @@ def _generate_next_intent(enemy: dict) -> dict:
                 return {'action': 'special', 'value': 0, 'times': 1, 'description': f'沉睡中...'}
             elif move_count == 3:
                 return {'action': 'buff', 'value': 0, 'times': 1, 'description': '觉醒！'}
-            r = random.random()
+            r = rng().random()
             if r < 0.45:
                 return {'action': 'attack', 'value': 18, 'times': 1, 'description': '黏液袭击 18'}
             return {'action': 'buff', 'value': 0, 'times': 1, 'description': '虹吸'}
@@ -651,23 +844,23 @@ def _generate_next_intent(enemy: dict) -> dict:
     if 'cultist' in eid:
         if move_count == 0:
             return {'action': 'buff', 'value': 3, 'times': 1, 'description': '召唤仪式 力量+3'}
-        v = 6 + enemy.get('strength', 0)
+        v = 6 + enemy.strength
         return {'action': 'attack', 'value': v, 'times': 1, 'description': f'攻击 {v}'}
     elif 'jaw_worm' in eid:
-        r = random.random()
+        r = rng().random()
         if r < 0.45:
             return {'action': 'attack', 'value': 11, 'times': 1, 'description': '撕咬 11'}
         elif r < 0.75:
             return {'action': 'block', 'value': 6, 'times': 1, 'description': '蜷缩 格挡6'}
         return {'action': 'attack', 'value': 7, 'times': 1, 'description': '嘶鸣 7'}
     elif 'louse' in eid:
-        r = random.random()
+        r = rng().random()
         if r < 0.25:
             return {'action': 'buff', 'value': 3, 'times': 1, 'description': '自噬 力量+3'}
-        v = random.randint(5, 7)
+        v = rng().randint(5, 7)
         return {'action': 'attack', 'value': v, 'times': 1, 'description': f'撕咬 {v}'}
     elif 'slime' in eid:
-        r = random.random()
+        r = rng().random()
         if r < 0.3:
             return {'action': 'attack', 'value': 7, 'times': 2, 'description': '吐酸 2x7'}
         return {'action': 'special', 'value': 0, 'times': 1, 'description': '腐蚀 虚弱2回合'}
@@ -676,10 +869,10 @@ def _generate_next_intent(enemy: dict) -> dict:
     elif 'fungi_beast' in eid:
         patterns = [
             {'action': 'buff', 'value': 2, 'times': 1, 'description': '孢子增强 力量+2'},
-            {'action': 'attack', 'value': 10 + enemy.get('strength', 0), 'times': 1,
-             'description': f'孢子打击 {10 + enemy.get("strength", 0)}'},
-            {'action': 'attack', 'value': 7 + enemy.get('strength', 0), 'times': 2,
-             'description': f'爆裂孢 2×{7 + enemy.get("strength", 0)}'},
+            {'action': 'attack', 'value': 10 + enemy.strength, 'times': 1,
+             'description': f'孢子打击 {10 + enemy.strength}'},
+            {'action': 'attack', 'value': 7 + enemy.strength, 'times': 2,
+             'description': f'爆裂孢 2×{7 + enemy.strength}'},
             {'action': 'block', 'value': 8, 'times': 1, 'description': '孢子甲 格挡8'},
         ]
         return patterns[move_count % len(patterns)]
@@ -697,14 +890,14 @@ def _generate_next_intent(enemy: dict) -> dict:
         if cycle == 0:
             return {'action': 'debuff', 'value': 2, 'debuff_type': 'weak', 'times': 1, 'description': '毒雾缠绕 虚弱2回合'}
         elif cycle == 1:
-            v = 15 + enemy.get('strength', 0)
+            v = 15 + enemy.strength
             return {'action': 'attack', 'value': v, 'times': 1, 'description': f'毒牙 {v}'}
         elif cycle == 2:
             return {'action': 'buff', 'value': 2, 'times': 1, 'description': '毒液强化 力量+2'}
         elif cycle == 3:
             return {'action': 'debuff', 'value': 3, 'debuff_type': 'weak', 'times': 1, 'description': '死亡缠绕 虚弱3回合'}
         else:
-            v = 22 + enemy.get('strength', 0)
+            v = 22 + enemy.strength
             return {'action': 'attack', 'value': v, 'times': 1, 'description': f'猛烈毒击 {v}'}
     elif 'iron_goliath' in eid:
         patterns = [
@@ -721,33 +914,33 @@ def _generate_next_intent(enemy: dict) -> dict:
         if cycle == 0:
             return {'action': 'buff', 'value': 4, 'times': 1, 'description': '虚空充能 力量+4'}
         elif cycle == 1:
-            v = 28 + enemy.get('strength', 0)
+            v = 28 + enemy.strength
             return {'action': 'attack', 'value': v, 'times': 1, 'description': f'暗影斩 {v}'}
         elif cycle == 2:
             return {'action': 'buff', 'value': 2, 'times': 1, 'description': '虚空汲取 力量+2'}
         else:
-            v = 18 + enemy.get('strength', 0)
+            v = 18 + enemy.strength
             return {'action': 'attack', 'value': v, 'times': 2, 'description': f'虚空爆发 2×{v}'}
     elif 'corrupted_seer' in eid:
         cycle = move_count % 5
         if cycle == 0:
             return {'action': 'debuff', 'value': 2, 'debuff_type': 'vulnerable', 'times': 1, 'description': '黑暗祈祷 易伤2回合'}
         elif cycle == 1:
-            v = 20 + enemy.get('strength', 0)
+            v = 20 + enemy.strength
             return {'action': 'attack', 'value': v, 'times': 1, 'description': f'腐化射线 {v}'}
         elif cycle == 2:
             return {'action': 'block', 'value': 18, 'times': 1, 'description': '虚空护盾 格挡18'}
         elif cycle == 3:
             return {'action': 'debuff', 'value': 3, 'debuff_type': 'vulnerable', 'times': 1, 'description': '凝视 易伤3回合'}
         else:
-            v = 30 + enemy.get('strength', 0)
+            v = 30 + enemy.strength
             return {'action': 'attack', 'value': v, 'times': 1, 'description': f'终焉之光 {v}'}
 
     # 第3幕普通敌人
     elif 'void_walker' in eid:
-        r = random.random()
+        r = rng().random()
         if r < 0.55:
-            v = 15 + enemy.get('strength', 0)
+            v = 15 + enemy.strength
             return {'action': 'attack', 'value': v, 'times': 1, 'description': f'暗影打击 {v}'}
         return {'action': 'buff', 'value': 2, 'times': 1, 'description': '汲取 力量+2'}
     elif 'dark_sentinel' in eid:
@@ -760,29 +953,30 @@ def _generate_next_intent(enemy: dict) -> dict:
         return patterns[move_count % len(patterns)]
 
     # 默认
-    v = random.randint(6, 12)
+    v = rng().randint(6, 12)
     return {'action': 'attack', 'value': v, 'times': 1, 'description': f'攻击 {v}'}
 
 
-def start_player_turn(player: dict, enemies: List[dict] = None) -> Tuple[dict, List[dict], List[str]]:
+def start_player_turn(player: CombatPlayer,
+                      enemies: List[CombatEnemy] = None) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
     """开始玩家回合：恢复能量，弃置手牌，抽新牌"""
     logs = []
     if enemies is None:
         enemies = []
 
     # 弃置上回合手牌（除非有retain）
-    for card in player.get('hand', []):
+    for card in player.hand:
         if not card.get('retain'):
-            player['discard_pile'].append(card)
-    player['hand'] = []
+            player.discard_pile.append(card)
+    player.hand = []
 
     # 重置本回合计数器
-    player['_cards_this_turn'] = 0
-    player['_attacks_this_turn'] = 0
-    player['_skills_this_turn'] = 0
-    player['_puzzle_triggered'] = False  # 百年谜题每回合重置
-    player['_echo_used'] = False         # 回声形态每回合重置
-    player['_discarded_this_turn'] = False  # 暗袭条件重置
+    player._cards_this_turn = 0
+    player._attacks_this_turn = 0
+    player._skills_this_turn = 0
+    player._puzzle_triggered = False  # 百年谜题每回合重置
+    player._echo_used = False         # 回声形态每回合重置
+    player._discarded_this_turn = False  # 暗袭条件重置
 
     # 日晷触发提示（在回合开始时提示上一次洗牌触发）
     if player.pop('_sundial_triggered', False):
@@ -792,84 +986,76 @@ def start_player_turn(player: dict, enemies: List[dict] = None) -> Tuple[dict, L
     saved_energy = player.pop('_saved_energy', 0)
 
     # 恢复能量（含卡尺保留格挡逻辑已在end_turn处理）
-    player['energy'] = player.get('max_energy', 3) + saved_energy
+    player.energy = player.max_energy + saved_energy
 
     # 战士被动护甲：每回合开始自动叠加
-    base_block = player.get('base_block', 0)
+    base_block = player.base_block
     if base_block > 0:
-        player['block'] = player.get('block', 0) + base_block
-        logs.append(f"🛡️ 战士护甲：获得 {base_block} 点格挡（当前格挡 {player['block']}）")
+        player.block += base_block
+        logs.append(f"🛡️ 战士护甲：获得 {base_block} 点格挡（当前格挡 {player.block}）")
 
     # 抽5张牌
-    hand_size = 5 + player.get('bonus_draw', 0)
+    hand_size = 5 + player.bonus_draw
     drawn = draw_cards(player, hand_size)
-    logs.append(f"回合开始：恢复 {player['energy']} 点能量，抽取 {drawn} 张牌")
+    logs.append(f"回合开始：恢复 {player.energy} 点能量，抽取 {drawn} 张牌")
 
     # 法球被动效果（每回合触发）
-    if player.get('orbs'):
+    if player.orbs:
         player, enemies = trigger_orb_passives(player, enemies, logs)
 
     # 减少虚弱/易伤回合（玩家的）
-    if player.get('weak_turns', 0) > 0:
-        player['weak_turns'] -= 1
-    if player.get('vulnerable_turns', 0) > 0:
-        player['vulnerable_turns'] -= 1
+    if player.weak_turns > 0:
+        player.weak_turns -= 1
+    if player.vulnerable_turns > 0:
+        player.vulnerable_turns -= 1
 
     # 遗物触发：回合开始
-    combat_turn = player.get('_combat_turn', 1)
-    try:
-        from .relic_effects import on_turn_start
-        player, enemies, relic_logs = on_turn_start(player, enemies, combat_turn)
-        logs.extend(relic_logs)
-    except Exception:
-        pass
+    combat_turn = player._combat_turn
+    from .relic_effects import on_turn_start
+    player, enemies, relic_logs = on_turn_start(player, enemies, combat_turn)
+    logs.extend(relic_logs)
 
-    player['_combat_turn'] = combat_turn + 1
+    player._combat_turn = combat_turn + 1
 
     return player, enemies, logs
 
 
-def end_player_turn(player: dict, enemies: List[dict]) -> Tuple[dict, List[dict], List[str]]:
+def end_player_turn(player: CombatPlayer,
+                    enemies: List[CombatEnemy]) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
     """结束玩家回合：处理手牌，执行敌人回合"""
     logs = ['--- 敌人回合 ---']
 
     # 计算弃牌数量（用于叮钹/坚韧绷带遗物触发）
     discarded_count = sum(
-        1 for card in player.get('hand', [])
+        1 for card in player.hand
         if not card.get('retain') and not card.get('ethereal')
     )
 
     # 遗物触发：回合结束（在弃牌前）
-    try:
-        from .relic_effects import on_turn_end
-        player, enemies, relic_logs = on_turn_end(player, enemies)
-        logs.extend(relic_logs)
-    except Exception:
-        pass
+    from .relic_effects import on_turn_end
+    player, enemies, relic_logs = on_turn_end(player, enemies)
+    logs.extend(relic_logs)
 
     # 弃置手牌
-    for card in player.get('hand', []):
+    for card in player.hand:
         if card.get('ethereal'):
             logs.append(f"【{card['name']}】以太消失")
         elif not card.get('retain'):
-            player['discard_pile'].append(card)
-    player['hand'] = []
+            player.discard_pile.append(card)
+    player.hand = []
 
     # 遗物触发：弃牌
     if discarded_count > 0:
-        try:
-            from .relic_effects import on_discard
-            player, enemies, relic_logs = on_discard(player, enemies, discarded_count)
-            logs.extend(relic_logs)
-        except Exception:
-            pass
+        from .relic_effects import on_discard
+        player, enemies, relic_logs = on_discard(player, enemies, discarded_count)
+        logs.extend(relic_logs)
 
     # 灼伤伤害：统计所有牌堆中的灼伤牌，每张回合末失去1点HP
-    all_deck_cards = (player.get('hand', []) + player.get('discard_pile', [])
-                      + player.get('draw_pile', []) + player.get('exhaust_pile', []))
+    all_deck_cards = (player.hand + player.discard_pile
+                      + player.draw_pile + player.exhaust_pile)
     burn_count = sum(1 for c in all_deck_cards if c.get('id') == 'curse_burn')
     if burn_count > 0:
-        player['hp'] = max(0, player['hp'] - burn_count)
+        player.hp = max(0, player.hp - burn_count)
         logs.append(f'🔥 灼伤：受到 {burn_count} 点伤害（牌组中有 {burn_count} 张灼伤）')
 
     # 格挡在战斗内持续有效，不在回合结束时重置
@@ -882,12 +1068,12 @@ def end_player_turn(player: dict, enemies: List[dict]) -> Tuple[dict, List[dict]
     return player, enemies, logs
 
 
-def check_combat_end(player: dict, enemies: List[dict]) -> Optional[str]:
+def check_combat_end(player: CombatPlayer, enemies: List[CombatEnemy]) -> Optional[str]:
     """检查战斗结束条件"""
-    if player.get('hp', 0) <= 0:
+    if player.hp <= 0:
         return 'defeat'
 
-    all_dead = all(e.get('hp', 0) <= 0 for e in enemies)
+    all_dead = all(e.hp <= 0 for e in enemies)
     if all_dead:
         return 'victory'
 
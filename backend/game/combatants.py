@@ -0,0 +1,246 @@
+"""战斗实体 - 战斗期间的玩家与敌人（__slots__ 对象，代替自由键的 dict）
+
+持久化的状态仍是普通 dict：init_combat（以及从存档加载进行中的战斗时，见 hydrate_combat）
+把 state['player'] 与各敌人转为 CombatPlayer / CombatEnemy，战斗结束（胜利或失败，见 release_combat）时
+都转回 dict；中途离开的对局停在 combat 阶段，下次加载时重新转换。序列化（codec / delta）经 to_dict
+得到与原 dict 相同的键，存档与状态哈希不受影响。
+
+每个字段总有值，原 dict 中没有的键用占位值表示，to_dict 时跳过：
+    数值 / 布尔字段   _Default（int 子类），参与运算、判断时与默认值相同，运算结果是普通 int
+    其余字段         UNSET（假值、空、可迭代），如 orbs、intent、_relic_hooks
+读到的占位值再赋给字段（p.energy = p.max_energy）时转为普通 int，与 dict 写入 .get 的默认值一致。
+战斗代码的热路径用属性读写（player.strength += 1），其余代码照常用映射接口
+（player['hp']、player.get('hp', 0)、'orbs' in player、player.pop(...)）。
+字段表内的键（以及旧存档带来、保存在 _extra 中的字段表外的键）与 dict 的语义一致；其余的键（如拼错的
+临时标记）除 `in` 返回 False 外，任何读写（属性或 get / pop / setdefault / 下标）都抛出
+AttributeError / KeyError，而不是静默得到默认值。
+遗物钩子中的这类错误同样不会被吞掉：严格模式下直接抛出，否则记录日志（见 relic_effects.RELIC_STRICT）。
+"""
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Union
+
+
+class _Default(int):
+    """未设置的数值 / 布尔字段"""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return f'<默认值 {int(self)}>'
+
+
+class _Unset:
+    """未设置的其余字段"""
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __len__(self) -> int:
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+    def __contains__(self, item) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return '<未设置>'
+
+
+UNSET = _Unset()
+_ZERO, _ONE, _THREE = _Default(0), _Default(1), _Default(3)
+
+# 字段 -> 未设置时的值（与战斗代码中 .get(键, 默认值) 的默认值一致）
+PLAYER_FIELDS: Dict[str, object] = {
+    'id': UNSET, 'name': UNSET, 'character': UNSET, 'character_name': UNSET, 'character_icon': UNSET,
+    'hp': _ZERO, 'max_hp': UNSET,
+    'strength': _ZERO, 'dexterity': _ZERO, 'energy': _ZERO, 'max_energy': _THREE, 'base_block': _ZERO,
+    'char_attack_bonus': _ZERO, 'char_defense_bonus': _ZERO,
+    'block': _ZERO, 'weak_turns': _ZERO, 'vulnerable_turns': _ZERO, 'bonus_draw': _ZERO,
+    'deck': UNSET, 'draw_pile': UNSET, 'hand': UNSET, 'discard_pile': UNSET, 'exhaust_pile': UNSET,
+    'gold': _ZERO, 'relics': UNSET, 'potions': UNSET,
+    'floor': _ZERO, 'act': _ONE, 'kills': _ZERO, 'turns': _ZERO,
+    'damage_dealt': _ZERO, 'damage_taken': _ZERO, 'cards_played': _ZERO, 'gold_earned': _ZERO,
+    'orbs': UNSET, 'orb_slots': _THREE, 'metallicize_stacks': _ZERO,
+    # 战斗临时状态（回合计数、遗物 / 能力牌标记）
+    '_combat_turn': _ONE, '_cards_this_turn': _ZERO, '_attacks_this_turn': _ZERO, '_skills_this_turn': _ZERO,
+    '_puzzle_triggered': _ZERO, '_echo_used': _ZERO, '_echo_form': _ZERO, '_discarded_this_turn': _ZERO,
+    '_rebound_active': _ZERO, '_biased_cognition': _ZERO, '_nob_rage': _ZERO,
+    '_sundial_count': _ZERO, '_sundial_triggered': _ZERO, '_saved_energy': _ZERO, '_calipers_block': UNSET,
+    '_pen_nib_used': _ONE, '_lantern_used': _ONE, '_horn_cleat_active': _ZERO, '_flower_count': _ZERO,
+    '_art_of_war_ready': _ZERO, '_lizard_tail_used': _ZERO, '_nunchaku_count': _ZERO, '_ink_count': _ZERO,
+    '_maw_bank_spent': _ZERO, '_relic_hooks': UNSET,
+}
+
+ENEMY_FIELDS: Dict[str, object] = {
+    'id': UNSET, 'name': UNSET, 'hp': _ZERO, 'max_hp': UNSET, 'block': _ZERO,
+    'strength': _ZERO, 'dexterity': _ZERO, 'poison': _ZERO, 'burn': _ZERO,
+    'weak_turns': _ZERO, 'vulnerable_turns': _ZERO,
+    'is_boss': _ZERO, 'is_elite': _ZERO, 'intent': UNSET, 'move_history': UNSET,
+}
+
+
+_set = object.__setattr__  # 绕过 _Combatant.__setattr__，写入占位值
+
+
+def _is_set(value) -> bool:
+    return value is not UNSET and type(value) is not _Default
+
+
+class _Combatant(MutableMapping):
+    """按字段表存储的战斗实体；_extra 保存字段表之外的旧存档键（原样写回）"""
+    __slots__ = ('_extra',)
+    _FIELDS: tuple = ()
+    _DEFAULTS: dict = {}
+
+    def __init_subclass__(cls, fields: dict = None, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELDS = tuple(fields)
+        cls._DEFAULTS = dict(fields)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> '_Combatant':
+        obj = cls.__new__(cls)
+        _set(obj, '_extra', None)
+        defaults = cls._DEFAULTS
+        for key, default in defaults.items():
+            _set(obj, key, data.get(key, default))
+        for key in data.keys() - defaults.keys():
+            if obj._extra is None:
+                _set(obj, '_extra', {})
+            obj._extra[key] = data[key]
+        return obj
+
+    def __setattr__(self, name: str, value):
+        # 占位值只能由字段自己的默认值产生；从别的字段（或本字段）读出再写入时就是一次真正的赋值
+        _set(self, name, int(value) if type(value) is _Default else value)
+
+    def to_dict(self) -> dict:
+        """转回持久化用的 dict（跳过未设置的字段）"""
+        out = {}
+        for key in self._FIELDS:
+            value = getattr(self, key)
+            if value is not UNSET and type(value) is not _Default:
+                out[key] = value
+        if self._extra:
+            out.update(self._extra)
+        return out
+
+    # ---- 映射接口（字段表内与 dict 语义一致，字段表外的键报错）----
+    def _missing(self, key) -> KeyError:
+        """字段表内未设置的键：与 dict 相同的 KeyError；字段表外的键：指出没有该字段"""
+        if key in self._DEFAULTS:
+            return KeyError(key)
+        return KeyError(f'{type(self).__name__} 没有字段 {key!r}')
+
+    def __getitem__(self, key: str):
+        if key in self._DEFAULTS:
+            value = getattr(self, key)
+            if _is_set(value):
+                return value
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise self._missing(key)
+
+    def __setitem__(self, key: str, value):
+        if key in self._DEFAULTS:
+            setattr(self, key, value)
+        elif self._extra and key in self._extra:
+            self._extra[key] = value
+        else:
+            raise self._missing(key)
+
+    def __delitem__(self, key: str):
+        self.pop(key)
+
+    def __contains__(self, key) -> bool:
+        if key in self._DEFAULTS:
+            return _is_set(getattr(self, key))
+        return bool(self._extra) and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __bool__(self) -> bool:
+        # 实体总有字段；避免 if enemy: 经 __len__ 构造整个 dict
+        return True
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def get(self, key: str, default=None):
+        if key in self._DEFAULTS:
+            value = getattr(self, key)
+            return value if _is_set(value) else default
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise self._missing(key)
+
+    def pop(self, key: str, *default):
+        if key in self._DEFAULTS:
+            value = getattr(self, key)
+            if _is_set(value):
+                _set(self, key, self._DEFAULTS[key])
+                return value
+            if default:
+                return default[0]
+        elif self._extra and key in self._extra:
+            return self._extra.pop(key)
+        raise self._missing(key)
+
+    def setdefault(self, key: str, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def values(self):
+        return self.to_dict().values()
+
+
+class CombatPlayer(_Combatant, fields=PLAYER_FIELDS):
+    """战斗中的玩家"""
+    __slots__ = tuple(PLAYER_FIELDS)
+
+
+class CombatEnemy(_Combatant, fields=ENEMY_FIELDS):
+    """战斗中的敌人"""
+    __slots__ = tuple(ENEMY_FIELDS)
+
+
+# 战斗内外都会用到的参数（战斗中是 CombatPlayer，其余时候是持久化的 dict）：只能用映射接口访问
+PlayerData = Union[CombatPlayer, Dict[str, Any]]
+
+
+def hydrate_combat(state: dict) -> dict:
+    """进行中的战斗：把玩家与敌人转为战斗实体（从存档加载后调用；已转换的不重复转换）"""
+    if state.get('phase') != 'combat' or not state.get('combat'):
+        return state
+    if not isinstance(state['player'], CombatPlayer):
+        state['player'] = CombatPlayer.from_dict(state['player'])
+    enemies = state['combat'].get('enemies') or []
+    state['combat']['enemies'] = [e if isinstance(e, CombatEnemy) else CombatEnemy.from_dict(e) for e in enemies]
+    return state
+
+
+def release_player(player: PlayerData) -> dict:
+    """战斗结束：玩家转回持久化的 dict"""
+    return player.to_dict() if isinstance(player, CombatPlayer) else player
+
+
+def release_combat(state: dict) -> dict:
+    """战斗以任何方式结束后：玩家与（仍留在状态中的）敌人都转回 dict，与从存档加载的结果一致"""
+    state['player'] = release_player(state['player'])
+    combat = state.get('combat')
+    if combat and combat.get('enemies'):
+        combat['enemies'] = [e.to_dict() if isinstance(e, CombatEnemy) else e for e in combat['enemies']]
+    return state
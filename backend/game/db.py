@@ -1,22 +1,177 @@
 """数据库模块 - SQLite 持久化存储，支持多人游玩"""
 import sqlite3
-import json
 import os
+import socket
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import Future
 from datetime import datetime, timedelta
 
+from . import codec, delta, metrics
+from .cards import expand_cards, hydrate_player_cards
+from .combatants import hydrate_combat
+from .locks import lock_for
+from .state_cache import StateCache, StaleStateError, CRITICAL_PHASES
+
 DB_PATH = os.environ.get('DB_PATH', '/app/data/textgame.db')
 
+# 连接池配置：每个线程复用一条长连接（DB_POOL=0 退回每次新建连接的旧行为）
+POOL_ENABLED = os.environ.get('DB_POOL', '1') != '0'
+DB_POOL_MAX_IDLE = int(os.environ.get('DB_POOL_MAX_IDLE', 16))       # 线程退出后保留的空闲连接数
+# WAL 日志与连接级 PRAGMA 调优（DB_WAL=0 使用 SQLite 默认的 rollback journal）
+WAL_ENABLED = os.environ.get('DB_WAL', '1') != '0'
+DB_SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')          # WAL 下 NORMAL 足够安全
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 16384))     # 每条连接的页缓存
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 64 * 1024 * 1024))  # 内存映射读取
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+
+# 热状态缓存：读走内存，写由后台线程批量落盘（STATE_CACHE=0 关闭，每次读写直达数据库）
+STATE_CACHE_ENABLED = os.environ.get('STATE_CACHE', '1') != '0'
+STATE_CACHE_MAX_ENTRIES = int(os.environ.get('STATE_CACHE_MAX_ENTRIES', 2000))
+STATE_CACHE_MAX_MB = int(os.environ.get('STATE_CACHE_MAX_MB', 64))
+STATE_FLUSH_MS = int(os.environ.get('STATE_FLUSH_MS', 200))           # 写回批次间隔
+STATE_CRASH_SAFE = os.environ.get('STATE_CRASH_SAFE', '1') != '0'     # 关键阶段同步落盘
+# 单写线程：状态写回、排行榜记录、清理都由缓存的写回线程串行执行，请求线程不写 SQLite（asgi.py 默认开启；
+# 关键阶段改为立即唤醒写回线程而不是同步落盘；需要 STATE_CACHE 且 STATE_FLUSH_MS > 0）
+DB_SINGLE_WRITER = os.environ.get('DB_SINGLE_WRITER', '0') != '0'
+# 多进程部署：命中缓存时先按主键核对数据库中的版本，已被其他进程更新则丢弃缓存重新加载（serve.py 多 worker 时默认开启）
+STATE_CACHE_VERIFY = os.environ.get('STATE_CACHE_VERIFY', '0') != '0'
+# 增量持久化：缓存中的游戏只写入变化的路径，每 N 次写入（或关键阶段）压缩为一次完整快照
+STATE_DELTAS = os.environ.get('STATE_DELTAS', '1') != '0'
+STATE_SNAPSHOT_EVERY = int(os.environ.get('STATE_SNAPSHOT_EVERY', 50))
+# 快照存档格式见 codec.STATE_FORMAT；STATE_FORMAT=zstd 时默认使用最新训练的共享字典（STATE_ZSTD_DICT=0 不用）
+STATE_ZSTD_DICT = os.environ.get('STATE_ZSTD_DICT', '1') != '0'
+# 动作日志：每个被接受的动作追加一行，随状态在同一事务中落盘，供 game.replay 回放校验（ACTION_LOG=0 关闭）
+ACTION_LOG_ENABLED = os.environ.get('ACTION_LOG', '1') != '0'
+ACTION_LOG_KEEP_HOURS = int(os.environ.get('ACTION_LOG_KEEP_HOURS', 168))  # 已结束对局的日志保留时长
+# 已结束对局归档（games_archive）的压缩格式：zlib / zstd（需要 zstandard）/ msgpack
+ARCHIVE_FORMAT = os.environ.get('ARCHIVE_FORMAT', 'zlib')
+# 排行榜：汇总行（leaderboard_summary）随 record_run 增量更新，前 N 名缓存在进程内，汇总行的 generation 变化时才重新加载
+LEADERBOARD_TOP_N = int(os.environ.get('LEADERBOARD_TOP_N', 50))
+LEADERBOARD_FILTERS = ('character', 'ascension', 'result', 'day', 'week')  # 各有一条 (列, score, floor) 索引
+LEADERBOARD_WINDOWS = {'day': '%Y-%m-%d', 'week': '%G-W%V'}  # 时间窗口 -> 分区列的格式（周为 ISO 周）
+ACTIVE_WINDOW_S = 3600  # 最近一小时内有阶段变化且未结束的对局计为在线
+ACTIVE_REFRESH_S = 10   # 多进程部署（STATE_CACHE_VERIFY）时在线人数改为查库，按此间隔缓存
+
+_local = threading.local()
+_pool_lock = threading.RLock()
+_idle_conns = []  # 已退出线程归还的连接，供新线程复用
+_idle_owner = (os.getpid(), DB_PATH)  # 空闲连接所属的进程与数据库
+_pool_stats = {'opened': 0, 'reused': 0, 'recycled': 0, 'closed': 0, 'in_use': 0}
+_prepared_dirs = set()
+_write_stats = {'snapshots': 0, 'snapshot_bytes': 0, 'deltas': 0, 'delta_bytes': 0, 'actions': 0}
+_actions_lock = threading.Lock()
+_pending_actions = {}  # game_id -> [(所属状态版本, seq, 动作, 参数 JSON, 状态哈希)]，等待随状态写入
+_board_lock = threading.Lock()
+_board = {'generation': None, 'top': [], 'keys': []}  # 前 N 名（按 keys 升序）及其对应的汇总 generation
+_active_lock = threading.Lock()
+_active_games = OrderedDict()  # game_id -> (阶段, 最近一次阶段变化的 monotonic 时刻)，按时刻排序
+_active_db = {'count': 0, 'at': None}  # 多进程时查库得到的在线人数及其时刻
+_LEADERBOARD_COLUMNS = '''player_name, character, character_icon, ascension, floor, kills,
+                   turns, cards_played, damage_dealt, damage_taken, result, score, created_at'''
+_LEADERBOARD_FIELDS = [name.strip() for name in _LEADERBOARD_COLUMNS.split(',')]
+
+
+class _PooledConn:
+    """线程持有的连接；线程结束时 threading.local 释放它，连接回到空闲列表"""
+    __slots__ = ('conn', 'pid', 'path', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.pid = os.getpid()
+        self.path = DB_PATH
+        weakref.finalize(self, _release_conn, conn, self.pid, self.path)
 
-def _get_conn():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+
+def _release_conn(conn, pid, path):
+    with _pool_lock:
+        _pool_stats['in_use'] -= 1
+        if (pid, path) == _idle_owner == (os.getpid(), DB_PATH) and len(_idle_conns) < DB_POOL_MAX_IDLE:
+            if conn.in_transaction:
+                conn.rollback()
+            _idle_conns.append(conn)
+            return
+        _pool_stats['closed'] += 1
+    conn.close()
+
+
+def _connect() -> sqlite3.Connection:
+    """新建一条连接并应用连接级 PRAGMA"""
+    db_dir = os.path.dirname(DB_PATH)
+    if db_dir and db_dir not in _prepared_dirs:
+        os.makedirs(db_dir, exist_ok=True)
+        _prepared_dirs.add(db_dir)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
+    if WAL_ENABLED:
+        conn.execute(f'PRAGMA synchronous = {DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+    with _pool_lock:
+        _pool_stats['opened'] += 1
+    return conn
+
+
+def _get_conn() -> sqlite3.Connection:
+    """获取当前线程的连接（线程内复用，fork 或 DB_PATH 变化后自动重建）"""
+    if not POOL_ENABLED:
+        return _connect()
+    held = getattr(_local, 'held', None)
+    if held is not None and held.pid == os.getpid() and held.path == DB_PATH:
+        with _pool_lock:
+            _pool_stats['reused'] += 1
+        return held.conn
+
+    global _idle_owner
+    conn = None
+    with _pool_lock:
+        if _idle_owner != (os.getpid(), DB_PATH):
+            # fork 之后或换库：父进程/旧库的连接不可再用
+            _idle_conns.clear()
+            _idle_owner = (os.getpid(), DB_PATH)
+        if _idle_conns:
+            conn = _idle_conns.pop()
+            _pool_stats['recycled'] += 1
+        _pool_stats['in_use'] += 1
+    if conn is None:
+        conn = _connect()
+    _local.held = _PooledConn(conn)
     return conn
 
 
+def close_all_connections():
+    """关闭空闲连接并丢弃当前线程的连接（进程退出或切换数据库时调用）"""
+    with _pool_lock:
+        conns = list(_idle_conns)
+        _idle_conns.clear()
+        _pool_stats['closed'] += len(conns)
+    for conn in conns:
+        conn.close()
+    _local.__dict__.pop('held', None)
+
+
+def get_pool_stats() -> dict:
+    """连接池统计"""
+    with _pool_lock:
+        stats = dict(_pool_stats)
+        stats['idle'] = len(_idle_conns)
+    stats['enabled'] = POOL_ENABLED
+    stats['journal_mode'] = _get_conn().execute('PRAGMA journal_mode').fetchone()[0]
+    return stats
+
+
 def init_db():
     """初始化数据库表"""
     with _get_conn() as conn:
+        # 新库启用增量 vacuum（建表之前设置才生效；维护任务定期归还空闲页）
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        # WAL 模式持久化在数据库文件中，只需设置一次
+        if WAL_ENABLED:
+            conn.execute('PRAGMA journal_mode = WAL')
         conn.execute('''
             CREATE TABLE IF NOT EXISTS games (
                 game_id     TEXT PRIMARY KEY,
@@ -26,9 +181,39 @@ def init_db():
                 floor       INTEGER DEFAULT 0,
                 state_json  TEXT NOT NULL,
                 created_at  TEXT NOT NULL,
-                updated_at  TEXT NOT NULL
+                updated_at  TEXT NOT NULL,
+                version     INTEGER NOT NULL DEFAULT 0,
+                snapshot_version INTEGER NOT NULL DEFAULT 0
             )
         ''')
+        # 旧库迁移：乐观并发版本号、state_json 快照对应的版本
+        columns = {r['name'] for r in conn.execute('PRAGMA table_info(games)')}
+        if 'version' not in columns:
+            conn.execute('ALTER TABLE games ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        if 'snapshot_version' not in columns:
+            conn.execute('ALTER TABLE games ADD COLUMN snapshot_version INTEGER NOT NULL DEFAULT 0')
+        # 增量日志：快照之后每次写回追加一行，只含变化的路径
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS game_deltas (
+                game_id     TEXT NOT NULL,
+                version     INTEGER NOT NULL,
+                delta_json  TEXT NOT NULL,
+                created_at  TEXT NOT NULL,
+                PRIMARY KEY (game_id, version)
+            ) WITHOUT ROWID
+        ''')
+        # 动作日志：seq 为该动作使用的随机数步数（0 为创建游戏），state_hash 只在对局结束时记录
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS game_actions (
+                game_id     TEXT NOT NULL,
+                seq         INTEGER NOT NULL,
+                action      TEXT NOT NULL,
+                params_json TEXT NOT NULL,
+                state_hash  TEXT,
+                created_at  TEXT NOT NULL,
+                PRIMARY KEY (game_id, seq)
+            ) WITHOUT ROWID
+        ''')
         conn.execute('''
             CREATE TABLE IF NOT EXISTS leaderboard (
                 id              INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,47 +232,509 @@ def init_db():
                 created_at      TEXT NOT NULL
             )
         ''')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_leaderboard_score ON leaderboard(score DESC)')
+        # 多进程共享的周期任务租约（claim_job）：last_run 控制执行间隔，lease_until 防止同时执行
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS job_leases (
+                name        TEXT PRIMARY KEY,
+                owner       TEXT DEFAULT '',
+                lease_until REAL NOT NULL DEFAULT 0,
+                last_run    REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        # 旧库迁移：任务执行统计（release_job 写入）
+        columns = {r['name'] for r in conn.execute('PRAGMA table_info(job_leases)')}
+        for column, decl in (('runs', 'INTEGER NOT NULL DEFAULT 0'), ('errors', 'INTEGER NOT NULL DEFAULT 0'),
+                             ('last_duration', 'REAL NOT NULL DEFAULT 0'), ('last_result', 'TEXT'),
+                             ('last_error', 'TEXT')):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE job_leases ADD COLUMN {column} {decl}')
+        # 排行榜汇总（单行）：record_run 在插入记录的同一事务中增量更新，generation 每次 +1
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS leaderboard_summary (
+                id          INTEGER PRIMARY KEY CHECK (id = 1),
+                total_runs  INTEGER NOT NULL DEFAULT 0,
+                victories   INTEGER NOT NULL DEFAULT 0,
+                best_floor  INTEGER NOT NULL DEFAULT 0,
+                generation  INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # 旧库迁移：按已有记录一次性算出汇总
+        conn.execute('''
+            INSERT OR IGNORE INTO leaderboard_summary (id, total_runs, victories, best_floor)
+            SELECT 1, COUNT(*), COALESCE(SUM(result = 'victory'), 0), COALESCE(MAX(floor), 0) FROM leaderboard
+        ''')
+        # 旧库迁移：按日 / 按周排行榜的分区列（UTC 日期、ISO 周）
+        columns = {r['name'] for r in conn.execute('PRAGMA table_info(leaderboard)')}
+        if 'day' not in columns:
+            conn.execute('ALTER TABLE leaderboard ADD COLUMN day TEXT')
+            conn.execute('ALTER TABLE leaderboard ADD COLUMN week TEXT')
+            conn.execute('UPDATE leaderboard SET day = substr(created_at, 1, 10)')
+        # 周列为空，或是旧的 %Y-%W 格式（跨年的一周被拆成两段）时按 ISO 周重算；SQLite 3.46 之前没有 %G / %V
+        rows = conn.execute("SELECT id, created_at FROM leaderboard WHERE week IS NULL OR week NOT LIKE '%-W%'").fetchall()
+        if rows:
+            conn.executemany('UPDATE leaderboard SET week = ? WHERE id = ?', [
+                (datetime.fromisoformat(r['created_at']).strftime(LEADERBOARD_WINDOWS['week']), r['id']) for r in rows])
+        # 排行榜索引：过滤列在前、(score, floor) 在后，反向扫描即为 分数、楼层、id 降序，过滤与键集分页都不需要排序
+        conn.execute('DROP INDEX IF EXISTS idx_leaderboard_score')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON leaderboard(score, floor)')
+        for column in LEADERBOARD_FILTERS:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_leaderboard_{column} ON leaderboard({column}, score, floor)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_games_updated ON games(updated_at)')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_games_finished ON games(updated_at)
+            WHERE phase IN ('game_over', 'victory')
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_game_actions_start ON game_actions(created_at) WHERE seq = 0')
+        # 已结束对局的冷存档（只追加）：检索用的列 + 压缩的完整记录（最终状态、牌组、遗物、动作摘要与日志）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS games_archive (
+                game_id     TEXT PRIMARY KEY,
+                player_name TEXT DEFAULT '',
+                character   TEXT DEFAULT '',
+                result      TEXT NOT NULL,
+                ascension   INTEGER DEFAULT 0,
+                floor       INTEGER DEFAULT 0,
+                actions     INTEGER DEFAULT 0,
+                state_hash  TEXT,
+                created_at  TEXT NOT NULL,
+                finished_at TEXT NOT NULL,
+                archived_at TEXT NOT NULL,
+                data        BLOB NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_games_archive_finished ON games_archive(finished_at)')
+        # zstd 共享字典（python -m game.storage train 训练），存档中记录所用字典的 id
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS state_dicts (
+                dict_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+                data        BLOB NOT NULL,
+                samples     INTEGER DEFAULT 0,
+                created_at  TEXT NOT NULL
+            )
+        ''')
         conn.commit()
+        latest = conn.execute('SELECT dict_id, data FROM state_dicts ORDER BY dict_id DESC LIMIT 1').fetchone()
+    codec.set_dictionary_loader(_load_state_dictionary)
+    if latest and STATE_ZSTD_DICT:
+        codec.register_dictionary(latest['dict_id'], latest['data'], active=True)
 
 
-def save_game(game_id: str, state: dict):
-    """保存游戏状态到数据库"""
+def _load_state_dictionary(dict_id: int):
+    """读取存档引用的 zstd 字典（其他进程训练的字典按需加载）"""
+    with _get_conn() as conn:
+        row = conn.execute('SELECT data FROM state_dicts WHERE dict_id = ?', (dict_id,)).fetchone()
+    return row['data'] if row else None
+
+
+class _Encoded:
+    """一局状态的写入数据：按路径拆分的 JSON 文本，以及相对上次写入的增量"""
+    __slots__ = ('meta', 'parts', 'fps', 'delta_json', 'delta_base', 'since_snapshot', 'next_base', 'blob')
+
+    def __init__(self, state: dict, base):
+        player = state.get('player', {})
+        # (player_name, character, phase, floor, version)
+        self.meta = (player.get('name', ''), player.get('character', ''), state.get('phase', 'map'),
+                     player.get('floor', 0), state.get('version', 0))
+        self.parts = delta.split_state(state)
+        self.fps = None
+        self.delta_json = None
+        self.delta_base = None
+        self.since_snapshot = 0
+        self.next_base = None
+        self.blob = None
+        if STATE_DELTAS:
+            self.fps = delta.fingerprints(self.parts)
+            if base is not None and state.get('phase') not in CRITICAL_PHASES:
+                base_version, prev_fps, since_snapshot = base
+                if since_snapshot + 1 < STATE_SNAPSHOT_EVERY:
+                    changed, removed = delta.diff(self.parts, self.fps, prev_fps)
+                    self.delta_json = delta.encode_delta(changed, removed)
+                    self.delta_base = base_version
+                    self.since_snapshot = since_snapshot + 1
+        # msgpack 等非 JSON 格式需要在锁内对完整状态编码；JSON（及其压缩格式）由各路径文本拼出
+        if self.delta_json is None and codec.STATE_FORMAT not in codec.JSON_STATE_FORMATS:
+            self.blob = codec.encode_state(state)
+
+    def snapshot(self):
+        """
+        完整快照的存档值：非 JSON 格式用编码时生成的 blob；否则由路径文本拼出 JSON，
+        按 STATE_FORMAT 压缩（在写回线程中进行，不占用该局的锁）
+        """
+        if self.blob is not None:
+            return self.blob
+        text = delta.join_state(self.parts)
+        if codec.STATE_FORMAT in codec.JSON_STATE_FORMATS:
+            return codec.encode_state_json(text)
+        return text
+
+    @property
+    def size(self) -> int:
+        """完整状态 JSON 的近似字节数"""
+        return sum(len(text) for text in self.parts.values())
+
+
+def _encode_state(state: dict, base=None) -> _Encoded:
+    """在该局的锁内拆分状态；base 为上次写入后的 (版本, 路径指纹, 快照后的增量数)"""
+    return _Encoded(state, base)
+
+
+def _take_actions(game_id: str, version: int, keep: bool = False) -> list:
+    """
+    取出该局不晚于 version 的待写动作（版本冲突时取出后丢弃，与被丢弃的状态一致）；
+    keep=True 时反过来保留这些动作，丢弃更晚的（回滚出错的动作）。
+    """
+    with _actions_lock:
+        pending = _pending_actions.get(game_id)
+        if not pending:
+            return []
+        taken = [e for e in pending if (e[0] <= version) != keep]
+        rest = [e for e in pending if (e[0] <= version) == keep]
+        if rest:
+            _pending_actions[game_id] = rest
+        else:
+            del _pending_actions[game_id]
+    return taken
+
+
+def _return_actions(taken: dict):
+    """写入事务失败：把已取出的动作放回待写队列（排在之后记录的动作之前）"""
+    with _actions_lock:
+        for game_id, actions in taken.items():
+            _pending_actions[game_id] = actions + _pending_actions.get(game_id, [])
+
+
+def _write_states(items: list) -> tuple:
+    """
+    在一个事务里写入一批游戏状态。
+    items 为 [(game_id, _Encoded, 期望的数据库 version)]，
+    只有数据库中的 version 与期望一致（或尚无记录）时才写入。
+    增量基准就是期望版本时只追加一条增量，否则写完整快照并清理旧增量。
+    返回 ({game_id: 状态字节数}, [版本冲突的 game_id])
+    """
     now = datetime.utcnow().isoformat()
-    player = state.get('player', {})
+    sizes = {}
+    stale = []
+    stats = dict.fromkeys(_write_stats, 0)
+    taken = {}  # 已从待写队列取出的动作；事务失败时放回
+    try:
+        with _get_conn() as conn:
+            _write_batch(conn, items, now, sizes, stale, stats, taken)
+            conn.commit()
+    except Exception:
+        _return_actions(taken)
+        raise
+    with _pool_lock:
+        for key, value in stats.items():
+            _write_stats[key] += value
+    return sizes, stale
+
+
+def _write_batch(conn, items: list, now: str, sizes: dict, stale: list, stats: dict, taken: dict):
+    """_write_states 的事务内部分（不提交）"""
+    for game_id, enc, base_version in items:
+        name, character, phase, floor, version = enc.meta
+        if enc.delta_json is not None and enc.delta_base == base_version:
+            cur = conn.execute('''
+                UPDATE games SET player_name = ?, character = ?, phase = ?, floor = ?,
+                                 version = ?, updated_at = ?
+                WHERE game_id = ? AND version = ?
+            ''', (name, character, phase, floor, version, now, game_id, base_version))
+            if not cur.rowcount:
+                stale.append(game_id)
+                taken[game_id] = _take_actions(game_id, version)
+                continue
+            conn.execute(
+                'INSERT OR REPLACE INTO game_deltas (game_id, version, delta_json, created_at) VALUES (?, ?, ?, ?)',
+                (game_id, version, enc.delta_json, now)
+            )
+            stats['deltas'] += 1
+            stats['delta_bytes'] += len(enc.delta_json)
+            metrics.observe_state_size('delta', len(enc.delta_json))
+        else:
+            state_json = enc.snapshot()
+            cur = conn.execute('''
+                INSERT INTO games (player_name, character, phase, floor, version, snapshot_version,
+                                   state_json, game_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(game_id) DO UPDATE SET
+                    player_name      = excluded.player_name,
+                    character        = excluded.character,
+                    phase            = excluded.phase,
+                    floor            = excluded.floor,
+                    version          = excluded.version,
+                    snapshot_version = excluded.snapshot_version,
+                    state_json       = excluded.state_json,
+                    updated_at       = excluded.updated_at
+                WHERE games.version = ?
+            ''', (name, character, phase, floor, version, version, state_json,
+                  game_id, now, now, base_version))
+            if not cur.rowcount:
+                stale.append(game_id)
+                taken[game_id] = _take_actions(game_id, version)
+                continue
+            conn.execute('DELETE FROM game_deltas WHERE game_id = ? AND version <= ?', (game_id, version))
+            enc.since_snapshot = 0
+            stats['snapshots'] += 1
+            stats['snapshot_bytes'] += len(state_json)
+            metrics.observe_state_size('snapshot', len(state_json))
+        actions = taken[game_id] = _take_actions(game_id, version)
+        if actions:
+            conn.executemany('''
+                INSERT OR REPLACE INTO game_actions (game_id, seq, action, params_json, state_hash, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(game_id, seq, act, params, digest, now) for _, seq, act, params, digest in actions])
+            stats['actions'] += len(actions)
+        if enc.fps is not None:
+            enc.next_base = (version, enc.fps, enc.since_snapshot)
+        sizes[game_id] = enc.size
+        metrics.observe_state_size('state', enc.size)
+
+
+_state_cache = StateCache(
+    _write_states,
+    _encode_state,
+    lock_for=lock_for,
+    max_entries=STATE_CACHE_MAX_ENTRIES,
+    max_bytes=STATE_CACHE_MAX_MB * 1024 * 1024,
+    flush_interval_ms=STATE_FLUSH_MS,
+    crash_safe=STATE_CRASH_SAFE,
+    single_writer=DB_SINGLE_WRITER,
+) if STATE_CACHE_ENABLED else None
+
+
+def _submit_write(fn) -> Future:
+    """执行一个写入：单写线程模式下交给写回线程（与状态写回串行），否则在当前线程执行"""
+    if _state_cache is not None and _state_cache.single_writer:
+        return _state_cache.submit(fn)
+    future = Future()
+    future.set_result(fn())
+    return future
+
+
+def save_game(game_id: str, state: dict):
+    """
+    保存游戏状态（启用缓存时异步写回数据库）。
+    每次保存递增 state['version']；数据库中的版本已被他人更新时抛出 StaleStateError。
+    """
+    state['version'] = state.get('version', 0) + 1
+    _track_active(game_id, state.get('phase'))
+    with metrics.phase('save'):
+        if _state_cache is not None:
+            _state_cache.save(game_id, state)
+            return
+        _, stale = _write_states([(game_id, _encode_state(state), state['version'] - 1)])
+    if stale:
+        raise StaleStateError(game_id)
+
+
+def get_game(game_id: str) -> dict:
+    """读取游戏状态（优先命中内存缓存；否则由最新快照 + 之后的增量重建）"""
+    with metrics.phase('load'):
+        if _state_cache is not None:
+            state = _state_cache.get(game_id)
+            if state is not None and STATE_CACHE_VERIFY and not _cache_current(game_id):
+                discard_game(game_id)
+                state = None
+            if state is not None:
+                return state
+        with _get_conn() as conn:
+            row = conn.execute(
+                'SELECT state_json, version, snapshot_version FROM games WHERE game_id = ?', (game_id,)
+            ).fetchone()
+            if not row:
+                return None
+            deltas = _select_deltas(conn, game_id, row)
+        with metrics.phase('json_decode'):
+            state = _rebuild_state(row, deltas)
+        hydrate_player_cards(state.get('player') or {})
+        hydrate_combat(state)
+        if _state_cache is not None:
+            size = len(row['state_json'])
+            base = None
+            if STATE_DELTAS:
+                parts = delta.split_state(state)
+                size = sum(len(text) for text in parts.values())
+                base = (row['version'], delta.fingerprints(parts), len(deltas))
+            _state_cache.put(game_id, state, size, base)
+            # 并发加载时以先放入缓存的对象为准
+            state = _state_cache.get(game_id) or state
+        return state
+
+
+def _select_deltas(conn, game_id: str, row) -> list:
+    """快照（row 的 snapshot_version）之后到 row 的 version 为止的增量"""
+    if row['version'] <= row['snapshot_version']:
+        return []
+    return conn.execute('''
+        SELECT delta_json FROM game_deltas
+        WHERE game_id = ? AND version > ? AND version <= ?
+        ORDER BY version
+    ''', (game_id, row['snapshot_version'], row['version'])).fetchall()
+
+
+def _rebuild_state(row, deltas: list) -> dict:
+    """由快照与之后的增量重建完整状态"""
+    state = codec.decode_state(row['state_json'])
+    for d in deltas:
+        delta.apply_delta(state, codec.loads(d['delta_json']))
+    state['version'] = row['version']
+    return state
+
+
+def _cache_current(game_id: str) -> bool:
+    """缓存中的状态是否仍基于数据库中的最新版本（未被其他进程写过；新游戏尚未落盘时版本视为 0）"""
     with _get_conn() as conn:
-        conn.execute('''
-            INSERT INTO games (game_id, player_name, character, phase, floor, state_json, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(game_id) DO UPDATE SET
-                player_name = excluded.player_name,
-                character   = excluded.character,
-                phase       = excluded.phase,
-                floor       = excluded.floor,
-                state_json  = excluded.state_json,
-                updated_at  = excluded.updated_at
-        ''', (
-            game_id,
-            player.get('name', ''),
-            player.get('character', ''),
-            state.get('phase', 'map'),
-            player.get('floor', 0),
-            json.dumps(state, ensure_ascii=False),
-            now, now
-        ))
+        row = conn.execute('SELECT version FROM games WHERE game_id = ?', (game_id,)).fetchone()
+    return (row['version'] if row else 0) == _state_cache.persisted_version(game_id)
+
+
+def log_action(game_id: str, state: dict, action: str, params: dict, state_hash: str = None):
+    """
+    记录一个已被接受的动作（在 save_game 之前调用），随下一次状态写入一起落盘。
+    seq 取该动作使用的随机数步数；值为 None 的参数即动作的默认值，不写入。
+    """
+    if not ACTION_LOG_ENABLED:
+        return
+    params = {k: v for k, v in params.items() if v is not None}
+    entry = (state.get('version', 0) + 1, state.get('rng_step', 1) - 1, action,
+             codec.dumps(params), state_hash)
+    with _actions_lock:
+        _pending_actions.setdefault(game_id, []).append(entry)
+
+
+def get_action_log(game_id: str) -> list:
+    """一局的动作日志（已落盘部分），按 seq 排序"""
+    with _get_conn() as conn:
+        rows = conn.execute('''
+            SELECT seq, action, params_json, state_hash FROM game_actions
+            WHERE game_id = ? ORDER BY seq
+        ''', (game_id,)).fetchall()
+    return [{'seq': r['seq'], 'action': r['action'], 'params': codec.loads(r['params_json']),
+             'state_hash': r['state_hash']} for r in rows]
+
+
+def get_replayable_games(limit: int = None) -> list:
+    """动作日志完整且已结束（记录了最终哈希）的对局 id，含日志已过保留期的归档对局，最早开始的在前"""
+    with _get_conn() as conn:
+        rows = conn.execute('''
+            SELECT a.game_id, a.created_at FROM game_actions a
+            WHERE a.seq = 0 AND EXISTS (
+                SELECT 1 FROM game_actions b WHERE b.game_id = a.game_id AND b.state_hash IS NOT NULL)
+            UNION ALL
+            SELECT g.game_id, g.created_at FROM games_archive g
+            WHERE g.state_hash IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM game_actions b WHERE b.game_id = g.game_id AND b.seq = 0)
+            ORDER BY created_at
+            LIMIT ?
+        ''', (limit if limit is not None else -1,)).fetchall()
+    return [r['game_id'] for r in rows]
+
+
+def flush_games() -> int:
+    """立即把缓存中的脏状态写入数据库"""
+    return _state_cache.flush() if _state_cache is not None else 0
+
+
+def checkpoint_game(game_id: str):
+    """
+    修改前调用：该局在缓存中有已确认但尚未写入数据库的修改时，返回当前状态的序列化副本，
+    请求出错时交给 discard_game 回滚；没有待写修改时返回 None（出错时直接丢弃缓存即可）。
+    """
+    if _state_cache is None:
+        return None
+    state = _state_cache.dirty_state(game_id)
+    return codec.dumps_bytes(state, default=codec.to_builtin) if state is not None else None
+
+
+def discard_game(game_id: str, checkpoint: bytes = None):
+    """
+    丢弃某局改了一半的缓存状态（请求中途出错时调用）。
+    带上 checkpoint_game 的副本时回滚到该状态，之前已确认的修改与动作日志仍会写回；
+    否则丢弃缓存与待写的动作日志，下次从数据库重新加载。
+    """
+    if checkpoint is not None and _state_cache is not None:
+        state = codec.loads(checkpoint)
+        hydrate_player_cards(state.get('player') or {})
+        hydrate_combat(state)
+        if _state_cache.restore(game_id, state):
+            _take_actions(game_id, state.get('version', 0), keep=True)
+            return
+    with _actions_lock:
+        _pending_actions.pop(game_id, None)
+    if _state_cache is not None:
+        _state_cache.discard(game_id)
+
+
+def get_cache_stats() -> dict:
+    """热状态缓存统计（writes 为快照/增量的写入次数与字节数）"""
+    with _pool_lock:
+        writes = dict(_write_stats)
+    if _state_cache is None:
+        return {'enabled': False, 'writes': writes}
+    return {'enabled': True, **_state_cache.stats(), 'writes': writes}
+
+
+def sample_state_texts(limit: int = 2000) -> list:
+    """最近更新的若干局的完整状态 JSON（UTF-8 bytes，训练字典用）"""
+    with _get_conn() as conn:
+        ids = [r['game_id'] for r in conn.execute(
+            'SELECT game_id FROM games ORDER BY updated_at DESC LIMIT ?', (limit,))]
+    samples = []
+    for game_id in ids:
+        state = get_game(game_id)
+        if state:
+            samples.append(codec.dumps_bytes({k: v for k, v in state.items() if k != 'version'}))
+    return samples
+
+
+def save_state_dictionary(data: bytes, samples: int = 0) -> int:
+    """保存新训练的 zstd 字典并在本进程启用（其他进程重启或按需加载后使用），返回字典 id"""
+    with _get_conn() as conn:
+        cur = conn.execute('INSERT INTO state_dicts (data, samples, created_at) VALUES (?, ?, ?)',
+                           (data, samples, datetime.utcnow().isoformat()))
         conn.commit()
+        dict_id = cur.lastrowid
+    codec.register_dictionary(dict_id, data, active=STATE_ZSTD_DICT)
+    return dict_id
 
 
-def get_game(game_id: str) -> dict:
-    """从数据库读取游戏状态"""
+def get_storage_stats(sample: int = 200) -> dict:
+    """
+    快照存档统计：各格式的行数与字节数，以及抽样的解码耗时与压缩率
+    （压缩率 = 紧凑 JSON 字节数 / 存档字节数）
+    """
     with _get_conn() as conn:
-        row = conn.execute(
-            'SELECT state_json FROM games WHERE game_id = ?', (game_id,)
-        ).fetchone()
-        if row:
-            return json.loads(row['state_json'])
-    return None
+        rows = conn.execute('''
+            SELECT typeof(state_json) AS t, substr(CAST(state_json AS BLOB), 1, 1) AS head,
+                   COUNT(*) AS n, SUM(length(CAST(state_json AS BLOB))) AS bytes
+            FROM games GROUP BY t, head
+        ''').fetchall()
+        values = [r['state_json'] for r in conn.execute(
+            'SELECT state_json FROM games ORDER BY updated_at DESC LIMIT ?', (sample,))]
+    formats = {}
+    for r in rows:
+        name = 'json' if r['t'] == 'text' else codec.state_format_of(r['head'] or b'')
+        entry = formats.setdefault(name, {'rows': 0, 'bytes': 0})
+        entry['rows'] += r['n']
+        entry['bytes'] += r['bytes'] or 0
+    by_format = {}
+    for value in values:
+        t0 = time.perf_counter()
+        state = codec.decode_state(value)
+        elapsed = time.perf_counter() - t0
+        stats = by_format.setdefault(codec.state_format_of(value), {'n': 0, 'stored': 0, 'raw': 0, 'decode_s': 0.0})
+        stats['n'] += 1
+        stats['stored'] += len(value.encode() if isinstance(value, str) else value)
+        stats['raw'] += len(codec.dumps_bytes(state))
+        stats['decode_s'] += elapsed
+    sampled = {name: {
+        'rows': s['n'],
+        'avg_bytes': round(s['stored'] / s['n']),
+        'ratio': round(s['raw'] / s['stored'], 2) if s['stored'] else 0,
+        'decode_us': round(s['decode_s'] / s['n'] * 1e6, 1),
+    } for name, s in by_format.items()}
+    return {'format': codec.STATE_FORMAT, 'dictionary': codec.active_dictionary(),
+            'rows': formats, 'sample': sampled}
 
 
 def get_active_games(limit: int = 20) -> list:
@@ -104,17 +751,260 @@ def get_active_games(limit: int = 20) -> list:
         return [dict(r) for r in rows]
 
 
-def cleanup_old_games(hours: int = 2):
-    """清理超过指定小时的旧游戏（释放内存/磁盘）"""
+def claim_job(name: str, interval_s: float, lease_s: float = 300) -> bool:
+    """
+    领取一个周期任务：距上次领取已超过 interval_s 且没有未过期的租约时，原子地记下本进程为执行者并返回 True。
+    多个进程（serve.py 的 worker）共享同一数据库，同一任务全局每个间隔最多执行一次；执行完调用 release_job。
+    """
+    def claim():
+        now = time.time()
+        with _get_conn() as conn:
+            conn.execute('INSERT OR IGNORE INTO job_leases (name) VALUES (?)', (name,))
+            cur = conn.execute('''
+                UPDATE job_leases SET owner = ?, lease_until = ?, last_run = ?
+                WHERE name = ? AND lease_until < ? AND last_run <= ?
+            ''', (f'{socket.gethostname()}:{os.getpid()}', now + lease_s, now, name, now, now - interval_s))
+            conn.commit()
+            return cur.rowcount == 1
+
+    return _submit_write(claim).result()
+
+
+def release_job(name: str, result: dict = None, error: str = None, duration: float = 0.0):
+    """释放本进程持有的任务租约，并记下本次执行的结果（get_job_status 可见）"""
+    def release():
+        with _get_conn() as conn:
+            conn.execute('''
+                UPDATE job_leases
+                SET lease_until = 0, runs = runs + 1, errors = errors + ?, last_duration = ?,
+                    last_result = ?, last_error = COALESCE(?, last_error)
+                WHERE name = ? AND owner = ?
+            ''', (int(error is not None), duration, codec.dumps(result) if result is not None else None,
+                  error, name, f'{socket.gethostname()}:{os.getpid()}'))
+            conn.commit()
+
+    _submit_write(release).result()
+
+
+def get_job_status() -> list:
+    """各周期任务最近一次的执行者、时间、耗时与结果（所有进程共享）"""
+    with _get_conn() as conn:
+        rows = conn.execute('SELECT * FROM job_leases ORDER BY name').fetchall()
+    return [{
+        'name': r['name'],
+        'owner': r['owner'],
+        'running': r['lease_until'] > time.time(),
+        'last_run': datetime.utcfromtimestamp(r['last_run']).isoformat() if r['last_run'] else None,
+        'last_duration_ms': round(r['last_duration'] * 1000, 1),
+        'runs': r['runs'],
+        'errors': r['errors'],
+        'last_result': codec.loads(r['last_result']) if r['last_result'] else None,
+        'last_error': r['last_error'],
+    } for r in rows]
+
+
+def purge_old_games(hours: float, limit: int, keep_finished: bool = False) -> dict:
+    """
+    删除最多 limit 局超过 hours 小时未更新的游戏（维护任务按批调用）及其增量；
+    未完成对局的动作日志随游戏删除，已结束对局的日志作为回放语料保留 ACTION_LOG_KEEP_HOURS。
+    keep_finished 时跳过已结束的对局（留给 archive_finished_games 归档）。
+    """
     cutoff = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+    finished = "AND phase NOT IN ('game_over', 'victory')" if keep_finished else ''
+
+    def purge():
+        with _get_conn() as conn:
+            rows = conn.execute(f'''
+                DELETE FROM games WHERE game_id IN (
+                    SELECT game_id FROM games WHERE updated_at < ? {finished} ORDER BY updated_at LIMIT ?)
+                RETURNING game_id, phase
+            ''', (cutoff, limit)).fetchall()
+            ids = [r['game_id'] for r in rows]
+            unfinished = [r['game_id'] for r in rows if r['phase'] not in CRITICAL_PHASES]
+            deltas = actions = 0
+            for chunk in range(0, len(ids), 500):
+                marks = ','.join('?' * len(ids[chunk:chunk + 500]))
+                deltas += conn.execute(f'DELETE FROM game_deltas WHERE game_id IN ({marks})',
+                                       ids[chunk:chunk + 500]).rowcount
+            for chunk in range(0, len(unfinished), 500):
+                marks = ','.join('?' * len(unfinished[chunk:chunk + 500]))
+                actions += conn.execute(f'DELETE FROM game_actions WHERE game_id IN ({marks})',
+                                        unfinished[chunk:chunk + 500]).rowcount
+            conn.commit()
+        return {'games': len(ids), 'deltas': deltas, 'actions': actions, 'more': len(ids) == limit}
+
+    return _submit_write(purge).result()
+
+
+def purge_action_logs(limit: int) -> dict:
+    """删除最多 limit 局超过保留期（ACTION_LOG_KEEP_HOURS）的动作日志"""
+    cutoff = (datetime.utcnow() - timedelta(hours=ACTION_LOG_KEEP_HOURS)).isoformat()
+
+    def purge():
+        with _get_conn() as conn:
+            ids = [r['game_id'] for r in conn.execute(
+                'SELECT game_id FROM game_actions WHERE seq = 0 AND created_at < ? LIMIT ?', (cutoff, limit))]
+            marks = ','.join('?' * len(ids))
+            actions = conn.execute(f'DELETE FROM game_actions WHERE game_id IN ({marks})', ids).rowcount if ids else 0
+            conn.commit()
+        return {'logs': len(ids), 'actions': actions, 'more': len(ids) == limit}
+
+    return _submit_write(purge).result()
+
+
+def _archive_record(game_id: str, state: dict, log: list, state_hash: str = None) -> dict:
+    """一局已结束对局的归档记录：最终状态，以及便于分析的牌组、遗物、动作摘要"""
+    player = state.get('player') or {}
+    by_action = {}
+    for _, action, _ in log:
+        by_action[action] = by_action.get(action, 0) + 1
+    return {
+        'game_id': game_id,
+        'result': state.get('phase'),
+        'ascension': state.get('ascension', 0),
+        'deck': [c['id'] + ('+' if c.get('upgraded') else '') for c in expand_cards(player.get('deck', []))],
+        'relics': [r.get('id') if isinstance(r, dict) else r for r in player.get('relics', [])],
+        'final_stats': state.get('victory_stats'),
+        'actions': {'count': len(log), 'by_action': by_action, 'state_hash': state_hash},
+        'log': log,
+        'state': state,
+    }
+
+
+def archive_finished_games(idle_minutes: float, limit: int) -> dict:
+    """
+    把最多 limit 局已结束且 idle_minutes 分钟未更新的对局移入 games_archive（维护任务按批调用）：
+    在同一事务中删除热表中的状态与增量并写入压缩的归档记录（热表版本与读取时不同则跳过该局）；
+    动作日志仍按 ACTION_LOG_KEEP_HOURS 保留。
+    """
+    cutoff = (datetime.utcnow() - timedelta(minutes=idle_minutes)).isoformat()
+
+    def archive():
+        now = datetime.utcnow().isoformat()
+        archived_ids = []
+        raw = stored = 0
+        with _get_conn() as conn:
+            rows = conn.execute('''
+                SELECT game_id, player_name, character, phase, floor, state_json, version, snapshot_version,
+                       created_at, updated_at
+                FROM games WHERE phase IN ('game_over', 'victory') AND updated_at < ?
+                ORDER BY updated_at LIMIT ?
+            ''', (cutoff, limit)).fetchall()
+            for row in rows:
+                game_id = row['game_id']
+                state = _rebuild_state(row, _select_deltas(conn, game_id, row))
+                actions = conn.execute(
+                    'SELECT seq, action, params_json, state_hash FROM game_actions WHERE game_id = ? ORDER BY seq',
+                    (game_id,)).fetchall()
+                log = [[a['seq'], a['action'], codec.loads(a['params_json'])] for a in actions]
+                final_hash = actions[-1]['state_hash'] if log and log[0][0] == 0 else None
+                record = _archive_record(game_id, state, log, final_hash)
+                data = codec.encode_state(record, ARCHIVE_FORMAT)
+                # 先按版本删除热表记录：读取之后该局又被写过（版本变化）时不写归档，保留热表记录下一批再处理；
+                # 删除成功后本事务已持有写锁，归档的就是热表中的最后版本（覆盖此前留下的旧归档）
+                if not conn.execute('DELETE FROM games WHERE game_id = ? AND version = ?',
+                                    (game_id, row['version'])).rowcount:
+                    continue
+                conn.execute('DELETE FROM game_deltas WHERE game_id = ?', (game_id,))
+                conn.execute('''
+                    INSERT OR REPLACE INTO games_archive
+                        (game_id, player_name, character, result, ascension, floor, actions, state_hash,
+                         created_at, finished_at, archived_at, data)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (game_id, row['player_name'], row['character'], row['phase'], record['ascension'],
+                      row['floor'], len(log), final_hash,
+                      row['created_at'], row['updated_at'], now, data))
+                archived_ids.append(game_id)
+                raw += len(row['state_json'])
+                stored += len(data)
+            conn.commit()
+        # 只丢弃已归档对局的缓存；版本冲突而留在热表中的对局照常使用缓存
+        if _state_cache is not None:
+            for game_id in archived_ids:
+                _state_cache.discard(game_id)
+        return {'games': len(archived_ids), 'snapshot_bytes': raw, 'archive_bytes': stored, 'more': len(rows) == limit}
+
+    return _submit_write(archive).result()
+
+
+def get_archived_game(game_id: str) -> dict:
+    """读取一局归档记录（解压后的完整记录），不存在时返回 None"""
     with _get_conn() as conn:
-        result = conn.execute('DELETE FROM games WHERE updated_at < ?', (cutoff,))
-        conn.commit()
-        return result.rowcount
+        row = conn.execute('SELECT data FROM games_archive WHERE game_id = ?', (game_id,)).fetchone()
+    return codec.decode_state(row['data']) if row else None
+
+
+def iter_archived_games(since: str = None, limit: int = None):
+    """按结束时间顺序逐条读取归档记录（since 为 ISO 时间，只取之后结束的对局）"""
+    with _get_conn() as conn:
+        for row in conn.execute('SELECT data FROM games_archive WHERE finished_at >= ? ORDER BY finished_at LIMIT ?',
+                                (since or '', limit if limit is not None else -1)):
+            yield codec.decode_state(row['data'])
+
+
+def get_archive_stats() -> dict:
+    """归档统计：按结果的局数、压缩后字节数，以及最早 / 最晚的结束时间"""
+    with _get_conn() as conn:
+        rows = conn.execute('''
+            SELECT result, COUNT(*) AS n, SUM(length(data)) AS bytes, MIN(finished_at) AS first,
+                   MAX(finished_at) AS last
+            FROM games_archive GROUP BY result
+        ''').fetchall()
+        hot = conn.execute("SELECT COUNT(*) FROM games WHERE phase IN ('game_over', 'victory')").fetchone()[0]
+    return {
+        'format': ARCHIVE_FORMAT,
+        'results': {r['result']: {'games': r['n'], 'bytes': r['bytes'], 'first': r['first'], 'last': r['last']}
+                    for r in rows},
+        'finished_in_hot_table': hot,
+    }
+
+
+def drop_idle_games(seconds: float) -> int:
+    """从本进程的状态缓存中移除长时间未访问的干净状态"""
+    return _state_cache.drop_idle(seconds) if _state_cache is not None else 0
+
+
+def optimize_db() -> dict:
+    """PRAGMA optimize：按需更新查询规划器的统计信息"""
+    def optimize():
+        with _get_conn() as conn:
+            conn.execute('PRAGMA optimize')
+        return {}
+
+    return _submit_write(optimize).result()
+
+
+def checkpoint_wal() -> dict:
+    """PASSIVE 检查点：把 WAL 中已提交的页写回数据库文件（不等待读者）"""
+    if not WAL_ENABLED:
+        return {'skipped': 'WAL 未开启'}
+
+    def checkpoint():
+        with _get_conn() as conn:
+            busy, log, done = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        return {'busy': bool(busy), 'wal_pages': log, 'checkpointed': done}
+
+    return _submit_write(checkpoint).result()
+
+
+def incremental_vacuum(pages: int) -> dict:
+    """归还最多 pages 个空闲页（需要 auto_vacuum=INCREMENTAL，旧库用 python -m game.storage vacuum 转换）"""
+    def vacuum():
+        with _get_conn() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return {'skipped': 'auto_vacuum 不是 INCREMENTAL'}
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if before:
+                # execute 只执行一步（只归还一页），executescript 会执行到底
+                conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+            after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return {'freed_pages': before - after, 'free_pages': after}
+
+    return _submit_write(vacuum).result()
 
 
 def record_run(player: dict, result: str, ascension: int):
-    """将一局游戏记录到排行榜"""
+    """将一局游戏记录到排行榜（单写线程模式下只是入队）"""
     floor = player.get('floor', 0)
     kills = player.get('kills', 0)
     turns = player.get('turns', 0)
@@ -127,59 +1017,226 @@ def record_run(player: dict, result: str, ascension: int):
     if result == 'victory':
         score = score * 2 + 1000
 
-    now = datetime.utcnow().isoformat()
+    now = datetime.utcnow()
+    row = (
+        player.get('name', '无名英雄'),
+        player.get('character_name', ''),
+        player.get('character_icon', ''),
+        ascension, floor, kills, turns, cards,
+        dmg_dealt, dmg_taken, result, score, now.isoformat()
+    )
+    windows = tuple(now.strftime(fmt) for fmt in LEADERBOARD_WINDOWS.values())
+
+    def insert():
+        with _get_conn() as conn:
+            run_id = conn.execute('''
+                INSERT INTO leaderboard
+                    (player_name, character, character_icon, ascension, floor, kills, turns,
+                     cards_played, damage_dealt, damage_taken, result, score, created_at, day, week)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', row + windows).lastrowid
+            generation = conn.execute('''
+                UPDATE leaderboard_summary
+                SET total_runs = total_runs + 1, victories = victories + ?,
+                    best_floor = MAX(best_floor, ?), generation = generation + 1
+                WHERE id = 1
+                RETURNING generation
+            ''', (int(result == 'victory'), floor)).fetchone()[0]
+            conn.commit()
+        _board_insert(generation, run_id, dict(zip(_LEADERBOARD_FIELDS, row)))
+
+    _submit_write(insert)
+
+
+def _board_key(entry: dict, run_id: int) -> tuple:
+    """排行榜顺序：分数、楼层、记录 id 降序（同分时后来者在前）"""
+    return (-entry['score'], -entry['floor'], -run_id)
+
+
+def _board_insert(generation: int, run_id: int, entry: dict):
+    """把本进程刚写入的记录并入前 N 名缓存；期间有其他进程写入过（generation 不连续）时等下次读取重新加载"""
+    with _board_lock:
+        if _board['generation'] != generation - 1:
+            _board['generation'] = None
+            return
+        key = _board_key(entry, run_id)
+        i = bisect_left(_board['keys'], key)
+        # 重新加载时可能已读到这条记录
+        fresh = i == len(_board['keys']) or _board['keys'][i] != key
+        if fresh and i < LEADERBOARD_TOP_N:
+            _board['keys'].insert(i, key)
+            _board['top'].insert(i, entry)
+            del _board['keys'][LEADERBOARD_TOP_N:], _board['top'][LEADERBOARD_TOP_N:]
+        _board['generation'] = generation
+
+
+def _leaderboard_summary() -> dict:
     with _get_conn() as conn:
-        conn.execute('''
-            INSERT INTO leaderboard
-                (player_name, character, character_icon, ascension, floor, kills, turns,
-                 cards_played, damage_dealt, damage_taken, result, score, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            player.get('name', '无名英雄'),
-            player.get('character_name', ''),
-            player.get('character_icon', ''),
-            ascension, floor, kills, turns, cards,
-            dmg_dealt, dmg_taken, result, score, now
-        ))
-        conn.commit()
+        return dict(conn.execute('SELECT * FROM leaderboard_summary WHERE id = 1').fetchone())
 
 
-def get_leaderboard(limit: int = 20) -> list:
-    """获取排行榜（按分数降序）"""
+def _leaderboard_top(generation: int) -> tuple:
+    """前 N 名缓存 (记录, 排序键)：与汇总的 generation 一致时直接返回，否则按索引重新加载"""
+    with _board_lock:
+        if _board['generation'] == generation:
+            return _board['top'], _board['keys']
+    rows = _select_leaderboard([], [], LEADERBOARD_TOP_N)
+    top = [{name: r[name] for name in _LEADERBOARD_FIELDS} for r in rows]
+    keys = [_board_key(entry, r['id']) for entry, r in zip(top, rows)]
+    with _board_lock:
+        _board.update(generation=generation, top=top, keys=keys)
+    return top, keys
+
+
+def _select_leaderboard(terms: list, params: list, limit: int) -> list:
+    where = f"WHERE {' AND '.join(terms)}" if terms else ''
     with _get_conn() as conn:
-        rows = conn.execute('''
-            SELECT player_name, character, character_icon, ascension, floor, kills,
-                   turns, cards_played, damage_dealt, damage_taken, result, score, created_at
-            FROM leaderboard
-            ORDER BY score DESC, floor DESC
+        return conn.execute(f'''
+            SELECT id, {_LEADERBOARD_COLUMNS}
+            FROM leaderboard {where}
+            ORDER BY score DESC, floor DESC, id DESC
             LIMIT ?
-        ''', (limit,)).fetchall()
-        return [dict(r) for r in rows]
+        ''', (*params, limit)).fetchall()
 
 
-def get_stats_summary() -> dict:
-    """全局统计概览"""
-    with _get_conn() as conn:
-        total = conn.execute('SELECT COUNT(*) as n FROM leaderboard').fetchone()['n']
-        victories = conn.execute(
-            "SELECT COUNT(*) as n FROM leaderboard WHERE result='victory'"
-        ).fetchone()['n']
-        best = conn.execute(
-            'SELECT MAX(floor) as f FROM leaderboard'
-        ).fetchone()['f'] or 0
-        active = conn.execute('''
-            SELECT COUNT(*) as n FROM games
-            WHERE updated_at > ? AND phase NOT IN ('game_over','victory')
-        ''', ((datetime.utcnow() - timedelta(hours=1)).isoformat(),)).fetchone()['n']
+def _leaderboard_where(character: str = None, ascension: int = None, result: str = None,
+                       window: str = None, cursor: str = None) -> tuple:
+    """过滤条件与键集分页条件 -> (WHERE 子句列表, 参数)；cursor 或 window 无效时抛出 ValueError"""
+    terms, params = [], []
+    for column, value in (('character', character), ('ascension', ascension), ('result', result)):
+        if value is not None:
+            terms.append(f'{column} = ?')
+            params.append(value)
+    if window is not None:
+        if window not in LEADERBOARD_WINDOWS:
+            raise ValueError(f'未知的时间窗口: {window}')
+        terms.append(f'{window} = ?')
+        params.append(datetime.utcnow().strftime(LEADERBOARD_WINDOWS[window]))
+    if cursor is not None:
+        score, floor, run_id = (int(part) for part in cursor.split(':'))
+        terms.append('(score, floor, id) < (?, ?, ?)')
+        params.extend((score, floor, run_id))
+    return terms, params
+
+
+def _cursor(key: tuple) -> str:
+    """排序键 -> 下一页的游标（"分数:楼层:id"）"""
+    return ':'.join(str(-part) for part in key)
+
+
+def _track_active(game_id: str, phase: str):
+    """在线对局跟踪：阶段变化时刷新时刻，进入结束阶段时移除"""
+    with _active_lock:
+        current = _active_games.get(game_id)
+        if phase in CRITICAL_PHASES:
+            if current is not None:
+                del _active_games[game_id]
+        elif current is None or current[0] != phase:
+            _active_games[game_id] = (phase, time.monotonic())
+            _active_games.move_to_end(game_id)
+
+
+def _seed_active_games():
+    """启动时从数据库恢复最近一小时内的在线对局"""
+    now_utc, now = datetime.utcnow(), time.monotonic()
+    with _get_conn() as conn:
+        rows = conn.execute('''
+            SELECT game_id, phase, updated_at FROM games
+            WHERE updated_at > ? AND phase NOT IN ('game_over', 'victory')
+            ORDER BY updated_at
+        ''', ((now_utc - timedelta(seconds=ACTIVE_WINDOW_S)).isoformat(),)).fetchall()
+    with _active_lock:
+        for r in rows:
+            age = (now_utc - datetime.fromisoformat(r['updated_at'])).total_seconds()
+            _active_games[r['game_id']] = (r['phase'], now - age)
+
 
+def _active_count() -> int:
+    if STATE_CACHE_VERIFY:
+        # 多进程：同一局可能由不同 worker 处理，各进程的跟踪不完整，改为查库（带短时缓存）
+        now = time.monotonic()
+        if _active_db['at'] is None or now - _active_db['at'] > ACTIVE_REFRESH_S:
+            with _get_conn() as conn:
+                _active_db['count'] = conn.execute('''
+                    SELECT COUNT(*) as n FROM games
+                    WHERE updated_at > ? AND phase NOT IN ('game_over','victory')
+                ''', ((datetime.utcnow() - timedelta(seconds=ACTIVE_WINDOW_S)).isoformat(),)).fetchone()['n']
+            _active_db['at'] = now
+        return _active_db['count']
+    cutoff = time.monotonic() - ACTIVE_WINDOW_S
+    with _active_lock:
+        while _active_games and next(iter(_active_games.values()))[1] < cutoff:
+            _active_games.popitem(last=False)
+        return len(_active_games)
+
+
+def get_leaderboard(limit: int = 20) -> list:
+    """获取排行榜（按分数降序；前 LEADERBOARD_TOP_N 名走进程内缓存）"""
+    return query_leaderboard(limit)[0]
+
+
+def query_leaderboard(limit: int = 20, character: str = None, ascension: int = None, result: str = None,
+                      window: str = None, cursor: str = None) -> tuple:
+    """
+    排行榜查询，返回 (记录列表, 下一页游标或 None)。
+    可按职业（显示名）、天赋等级、结局、当日 / 本周（window='day' / 'week'）过滤，条件可组合；
+    按 分数、楼层、id 降序，cursor 为上一页返回的游标（键集分页，不用 OFFSET）。
+    不带过滤的第一页走前 N 名缓存。
+    """
+    terms, params = _leaderboard_where(character, ascension, result, window, cursor)
+    if not terms and limit <= LEADERBOARD_TOP_N:
+        summary = _leaderboard_summary()
+        top, keys = _leaderboard_top(summary['generation'])
+        entries = [dict(entry) for entry in top[:limit]]
+        more = summary['total_runs'] > limit and len(keys) >= limit
+        return entries, _cursor(keys[limit - 1]) if more and limit else None
+    rows = _select_leaderboard(terms, params, limit + 1)
+    entries = [{name: r[name] for name in _LEADERBOARD_FIELDS} for r in rows[:limit]]
+    if len(rows) > limit and limit:
+        last = rows[limit - 1]
+        return entries, f"{last['score']}:{last['floor']}:{last['id']}"
+    return entries, None
+
+
+def leaderboard_query_plans() -> dict:
+    """各排行榜查询模式的 EXPLAIN QUERY PLAN（检查是否走索引、有无额外排序）"""
+    modes = {
+        'all': {},
+        'all_page2': {'cursor': '1000:5:100'},
+        'character': {'character': '战士'},
+        'ascension': {'ascension': 5},
+        'victories': {'result': 'victory'},
+        'day': {'window': 'day'},
+        'week_page2': {'window': 'week', 'cursor': '1000:5:100'},
+        'character_victories': {'character': '战士', 'result': 'victory'},
+    }
+    plans = {}
+    with _get_conn() as conn:
+        for name, filters in modes.items():
+            terms, params = _leaderboard_where(**filters)
+            where = f"WHERE {' AND '.join(terms)}" if terms else ''
+            rows = conn.execute(f'''
+                EXPLAIN QUERY PLAN
+                SELECT id, {_LEADERBOARD_COLUMNS} FROM leaderboard {where}
+                ORDER BY score DESC, floor DESC, id DESC LIMIT 20
+            ''', params).fetchall()
+            plans[name] = [r['detail'] for r in rows]
+    return plans
+
+
+def get_stats_summary() -> dict:
+    """全局统计概览（读汇总行与在线跟踪，与记录条数无关）"""
+    summary = _leaderboard_summary()
+    total, victories = summary['total_runs'], summary['victories']
     return {
         'total_runs': total,
         'victories': victories,
-        'best_floor': best,
-        'active_players': active,
+        'best_floor': summary['best_floor'],
+        'active_players': _active_count(),
         'win_rate': round(victories / total * 100, 1) if total > 0 else 0,
     }
 
 
 # 启动时初始化
 init_db()
+_seed_active_games()
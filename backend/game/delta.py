@@ -0,0 +1,88 @@
+"""游戏状态增量编码 - 按路径拆分状态，只持久化发生变化的路径"""
+import hashlib
+from collections.abc import Mapping
+from typing import Dict, List, Tuple
+
+from . import codec
+
+Path = Tuple[str, ...]
+
+# 这些字段（值为非空 dict 或战斗实体等映射时）继续按子键拆分；其余路径整体作为一个值
+SPLIT_PATHS = {('player',), ('combat',), ('shop',), ('map',), ('map', 'nodes')}
+
+
+def split_state(state: dict) -> Dict[Path, str]:
+    """把状态拆成 {路径: 该路径值的 JSON 文本}，保持字段顺序"""
+    parts = {}
+
+    def walk(prefix: Path, obj: dict):
+        for key, value in obj.items():
+            path = prefix + (str(key),)
+            if path in SPLIT_PATHS and isinstance(value, Mapping) and value:
+                walk(path, value)
+            else:
+                parts[path] = codec.dumps(value)
+
+    walk((), state)
+    return parts
+
+
+def fingerprints(parts: Dict[Path, str]) -> Dict[Path, bytes]:
+    """每个路径的 blake2b 指纹（8 字节），用于和上次持久化的状态比较"""
+    return {path: hashlib.blake2b(text.encode(), digest_size=8).digest() for path, text in parts.items()}
+
+
+def diff(parts: Dict[Path, str], fps: Dict[Path, bytes],
+         prev_fps: Dict[Path, bytes]) -> Tuple[Dict[Path, str], List[Path]]:
+    """返回 (变化或新增的路径, 已删除的路径)"""
+    changed = {path: parts[path] for path, fp in fps.items() if prev_fps.get(path) != fp}
+    removed = [path for path in prev_fps if path not in fps]
+    return changed, removed
+
+
+def join_state(parts: Dict[Path, str]) -> str:
+    """由各路径的 JSON 文本拼出完整状态的 JSON（不重新序列化）"""
+    tree = {}
+    for path, text in parts.items():
+        node = tree
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = text
+
+    def emit(node: dict) -> str:
+        return '{' + ','.join(
+            codec.dumps(key) + ':' + (emit(value) if isinstance(value, dict) else value)
+            for key, value in node.items()
+        ) + '}'
+
+    return emit(tree)
+
+
+def encode_delta(changed: Dict[Path, str], removed: List[Path]) -> str:
+    """增量的 JSON：{"set": [[路径, 值], ...], "del": [路径, ...]}"""
+    sets = ','.join(
+        '[' + codec.dumps(list(path)) + ',' + text + ']'
+        for path, text in changed.items()
+    )
+    return '{"set":[' + sets + '],"del":' + codec.dumps([list(p) for p in removed]) + '}'
+
+
+def apply_delta(state: dict, delta: dict) -> dict:
+    """把一条增量应用到状态上（先删除后写入，中间层不存在或不是 dict 时自动创建）"""
+    for path in delta.get('del', []):
+        node = state
+        for key in path[:-1]:
+            node = node.get(key) if isinstance(node, dict) else None
+            if node is None:
+                break
+        if isinstance(node, dict):
+            node.pop(path[-1], None)
+    for path, value in delta.get('set', []):
+        node = state
+        for key in path[:-1]:
+            child = node.get(key)
+            if not isinstance(child, dict):
+                child = node[key] = {}
+            node = child
+        node[path[-1]] = value
+    return state
@@ -1,7 +1,7 @@
 """敌人系统 - 定义所有敌人和AI"""
-import random
 from dataclasses import dataclass, field
 from typing import List, Optional
+from .rng import rng
 
 
 @dataclass
@@ -71,7 +71,7 @@ class Enemy:
 
 class Cultist(Enemy):
     def __init__(self):
-        super().__init__('cultist', '邪教徒', random.randint(48, 56))
+        super().__init__('cultist', '邪教徒', rng().randint(48, 56))
 
     def get_next_intent(self) -> EnemyIntent:
         if len(self.move_history) == 0:
@@ -81,12 +81,12 @@ class Cultist(Enemy):
 
 class JawWorm(Enemy):
     def __init__(self):
-        super().__init__('jaw_worm', '颌虫', random.randint(44, 52))
+        super().__init__('jaw_worm', '颌虫', rng().randint(44, 52))
 
     def get_next_intent(self) -> EnemyIntent:
         if len(self.move_history) == 0:
             return EnemyIntent('attack', 13, 1, '撕咬 13')
-        r = random.random()
+        r = rng().random()
         if r < 0.45:
             return EnemyIntent('attack', 13, 1, '撕咬 13')
         elif r < 0.75:
@@ -96,25 +96,25 @@ class JawWorm(Enemy):
 
 class RedLouse(Enemy):
     def __init__(self):
-        super().__init__('red_louse', '红虱', random.randint(18, 25))
+        super().__init__('red_louse', '红虱', rng().randint(18, 25))
 
     def get_next_intent(self) -> EnemyIntent:
-        r = random.random()
+        r = rng().random()
         if r < 0.25:
             return EnemyIntent('buff', 3, 1, '自噬（力量+3）')
-        return EnemyIntent('attack', random.randint(7, 10), 1, f'撕咬 {random.randint(7,10)}')
+        return EnemyIntent('attack', rng().randint(7, 10), 1, f'撕咬 {rng().randint(7,10)}')
 
 
 class Slime(Enemy):
     def __init__(self, size='acid'):
         if size == 'acid':
-            super().__init__('acid_slime_m', '中型酸液史莱姆', random.randint(34, 40))
+            super().__init__('acid_slime_m', '中型酸液史莱姆', rng().randint(34, 40))
         else:
-            super().__init__('spike_slime_m', '中型尖刺史莱姆', random.randint(34, 40))
+            super().__init__('spike_slime_m', '中型尖刺史莱姆', rng().randint(34, 40))
         self.slime_type = size
 
     def get_next_intent(self) -> EnemyIntent:
-        r = random.random()
+        r = rng().random()
         if r < 0.3:
             return EnemyIntent('attack', 9, 2, '吐酸（2x9伤害）')
         return EnemyIntent('block', 0, 1, '腐蚀（弱化敌人2回合）')
@@ -122,13 +122,13 @@ class Slime(Enemy):
 
 class GremlinNob(Enemy):
     def __init__(self):
-        super().__init__('gremlin_nob', '哥布林领袖', random.randint(90, 98))
+        super().__init__('gremlin_nob', '哥布林领袖', rng().randint(90, 98))
         self.is_elite = True
 
     def get_next_intent(self) -> EnemyIntent:
         if len(self.move_history) == 0:
             return EnemyIntent('buff', 2, 1, '愤怒（每次打出技能牌额外承受3伤害）')
-        r = random.random()
+        r = rng().random()
         if r < 0.33:
             return EnemyIntent('attack', 18, 1, '冲撞 18')
         return EnemyIntent('attack', 8, 2, '斩击 2x8')
@@ -136,7 +136,7 @@ class GremlinNob(Enemy):
 
 class Lagavulin(Enemy):
     def __init__(self):
-        super().__init__('lagavulin', '沉睡巨魔', random.randint(115, 120))
+        super().__init__('lagavulin', '沉睡巨魔', rng().randint(115, 120))
         self.is_elite = True
         self.sleeping = True
 
@@ -146,7 +146,7 @@ class Lagavulin(Enemy):
         if len(self.move_history) == 3:
             self.sleeping = False
             return EnemyIntent('buff', 0, 1, '觉醒（力量-1，敏捷-1）')
-        r = random.random()
+        r = rng().random()
         if r < 0.45:
             return EnemyIntent('attack', 22, 1, '黏液袭击 22')
         return EnemyIntent('buff', 0, 1, '虹吸（从玩家偷取力量和敏捷各1点）')
@@ -154,7 +154,7 @@ class Lagavulin(Enemy):
 
 class SentryPair(Enemy):
     def __init__(self):
-        super().__init__('sentry', '哨兵', random.randint(38, 42))
+        super().__init__('sentry', '哨兵', rng().randint(38, 42))
         self.is_elite = True
 
     def get_next_intent(self) -> EnemyIntent:
@@ -168,7 +168,7 @@ class SentryPair(Enemy):
 class FungiBeast(Enemy):
     """第2幕普通 - 菌兽（逐渐增强型）"""
     def __init__(self):
-        super().__init__('fungi_beast', '菌兽', random.randint(62, 75))
+        super().__init__('fungi_beast', '菌兽', rng().randint(62, 75))
 
     def get_next_intent(self) -> EnemyIntent:
         turn = len(self.move_history)
@@ -186,7 +186,7 @@ class FungiBeast(Enemy):
 class CopperGolem(Enemy):
     """第2幕普通 - 铜傀儡（攻守交替型）"""
     def __init__(self):
-        super().__init__('copper_golem', '铜傀儡', random.randint(72, 84))
+        super().__init__('copper_golem', '铜傀儡', rng().randint(72, 84))
 
     def get_next_intent(self) -> EnemyIntent:
         turn = len(self.move_history)
@@ -201,12 +201,12 @@ class CopperGolem(Enemy):
 class VoidWalker(Enemy):
     """第3幕普通 - 虚空行者（力量堆叠型）"""
     def __init__(self):
-        super().__init__('void_walker', '虚空行者', random.randint(85, 98))
+        super().__init__('void_walker', '虚空行者', rng().randint(85, 98))
 
     def get_next_intent(self) -> EnemyIntent:
         if len(self.move_history) == 0:
             return EnemyIntent('buff', 3, 1, '虚空汲取（力量+3）')
-        r = random.random()
+        r = rng().random()
         if r < 0.55:
             dmg = 18 + self.strength
             return EnemyIntent('attack', dmg, 1, f'暗影打击 {dmg}')
@@ -216,7 +216,7 @@ class VoidWalker(Enemy):
 class DarkSentinel(Enemy):
     """第3幕普通 - 暗影哨兵（重甲重击型）"""
     def __init__(self):
-        super().__init__('dark_sentinel', '暗影哨兵', random.randint(108, 122))
+        super().__init__('dark_sentinel', '暗影哨兵', rng().randint(108, 122))
 
     def get_next_intent(self) -> EnemyIntent:
         turn = len(self.move_history)
@@ -233,7 +233,7 @@ class DarkSentinel(Enemy):
 class SerpentDancer(Enemy):
     """第2幕精英 - 毒舞者（虚弱施加型）"""
     def __init__(self):
-        super().__init__('serpent_dancer', '毒舞者', random.randint(130, 145))
+        super().__init__('serpent_dancer', '毒舞者', rng().randint(130, 145))
         self.is_elite = True
 
     def get_next_intent(self) -> EnemyIntent:
@@ -256,7 +256,7 @@ class SerpentDancer(Enemy):
 class IronGoliath(Enemy):
     """第2幕精英 - 铁巨人（高格挡重击型）"""
     def __init__(self):
-        super().__init__('iron_goliath', '铁巨人', random.randint(160, 178))
+        super().__init__('iron_goliath', '铁巨人', rng().randint(160, 178))
         self.is_elite = True
 
     def get_next_intent(self) -> EnemyIntent:
@@ -276,7 +276,7 @@ class IronGoliath(Enemy):
 class VoidKnight(Enemy):
     """第3幕精英 - 虚空骑士（快速力量堆叠型）"""
     def __init__(self):
-        super().__init__('void_knight', '虚空骑士', random.randint(190, 210))
+        super().__init__('void_knight', '虚空骑士', rng().randint(190, 210))
         self.is_elite = True
 
     def get_next_intent(self) -> EnemyIntent:
@@ -297,7 +297,7 @@ class VoidKnight(Enemy):
 class CorruptedSeer(Enemy):
     """第3幕精英 - 腐化占卜师（易伤施加+高伤）"""
     def __init__(self):
-        super().__init__('corrupted_seer', '腐化占卜师', random.randint(180, 200))
+        super().__init__('corrupted_seer', '腐化占卜师', rng().randint(180, 200))
         self.is_elite = True
 
     def get_next_intent(self) -> EnemyIntent:
@@ -321,7 +321,7 @@ class CorruptedSeer(Enemy):
 class TheGuardian(Enemy):
     """第1幕Boss"""
     def __init__(self):
-        super().__init__('the_guardian', '守卫者', random.randint(240, 260))
+        super().__init__('the_guardian', '守卫者', rng().randint(240, 260))
         self.is_boss = True
         self.mode = 'normal'  # normal / defensive
         self.mode_shift_count = 0
@@ -343,7 +343,7 @@ class TheGuardian(Enemy):
 class HexaGhost(Enemy):
     """第2幕Boss"""
     def __init__(self):
-        super().__init__('hexa_ghost', '六角幽灵', random.randint(265, 285))
+        super().__init__('hexa_ghost', '六角幽灵', rng().randint(265, 285))
         self.is_boss = True
         self.ritual_stacks = 0
 
@@ -362,7 +362,7 @@ class HexaGhost(Enemy):
 class CorruptHeart(Enemy):
     """第3幕最终Boss"""
     def __init__(self):
-        super().__init__('corrupt_heart', '腐化之心', random.randint(750, 800))
+        super().__init__('corrupt_heart', '腐化之心', rng().randint(750, 800))
         self.is_boss = True
         self.invincible = True
         self.invincible_turns = 4
@@ -406,7 +406,7 @@ def create_enemy(enemy_type: str, floor: int) -> Enemy:
     else:
         pool = ENEMY_POOLS['act1_normal']
 
-    enemy_class = random.choice(pool)
+    enemy_class = rng().choice(pool)
     enemy = enemy_class()
     # 缩放HP
     enemy.current_intent = enemy.get_next_intent()
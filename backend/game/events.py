@@ -1,6 +1,6 @@
 """随机事件系统"""
-import random
 from typing import Dict, List
+from .rng import rng
 
 
 EVENTS = [
@@ -228,7 +228,7 @@ EVENTS = [
 
 def get_random_event() -> Dict:
     """获取随机事件"""
-    return random.choice(EVENTS).copy()
+    return rng().choice(EVENTS).copy()
 
 
 def process_event_choice(event_id: str, choice_index: int, player: dict,
@@ -283,7 +283,7 @@ def process_event_choice(event_id: str, choice_index: int, player: dict,
 
     elif effect == 'loot':
         # 随机奖励
-        r = random.random()
+        r = rng().random()
         if r < 0.5:
             from .relics import get_random_relic
             new_relic = get_random_relic('common')
@@ -292,7 +292,7 @@ def process_event_choice(event_id: str, choice_index: int, player: dict,
                 extra_data['new_relic'] = new_relic
                 result_desc += f' (获得遗物: {new_relic["name"]})'
         else:
-            gold = random.randint(30, 60)
+            gold = rng().randint(30, 60)
             player['gold'] = player.get('gold', 0) + gold
             result_desc += f' (+{gold} 金币)'
 
@@ -307,10 +307,10 @@ def process_event_choice(event_id: str, choice_index: int, player: dict,
         extra_data['action'] = 'pick_card'
 
     elif effect == 'card':
-        from .cards import get_card_rewards
+        from .cards import get_card_rewards, compact_card
         rewards = get_card_rewards(character, player.get('floor', 1), 1)
         if rewards:
-            player.setdefault('deck', []).append(rewards[0])
+            player.setdefault('deck', []).append(compact_card(rewards[0]))
             extra_data['new_card'] = rewards[0]
             result_desc += f' (获得: {rewards[0]["name"]})'
 
@@ -354,7 +354,7 @@ def process_event_choice(event_id: str, choice_index: int, player: dict,
             lambda: player.update({'gold': player.get('gold', 0) + 50}) or '获得50金币！',
             lambda: player.update({'strength': player.get('strength', 0) + 1}) or '力量+1！',
         ]
-        chosen_effect = random.choice(effects)
+        chosen_effect = rng().choice(effects)
         result_desc += f' {chosen_effect()}'
 
     elif effect == 'boss_info':
@@ -0,0 +1,49 @@
+"""每局游戏的串行化锁 - 分段（striped）可重入锁，同一局的请求依次执行"""
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from . import metrics
+
+GAME_LOCK_STRIPES = int(os.environ.get('GAME_LOCK_STRIPES', 64))
+
+_stripes = [threading.RLock() for _ in range(max(1, GAME_LOCK_STRIPES))]
+_stats_lock = threading.Lock()
+_stats = {'acquired': 0, 'contended': 0, 'wait_ms': 0.0}
+
+
+def lock_for(game_id: str) -> threading.RLock:
+    """game_id 对应的分段锁（不同局可能共用一把锁，但同一局永远是同一把）"""
+    return _stripes[zlib.crc32(str(game_id).encode()) % len(_stripes)]
+
+
+@contextmanager
+def game_lock(game_id: str):
+    """持有某局的锁，覆盖一次完整的 读取-修改-保存"""
+    lock = lock_for(game_id)
+    waited = 0.0
+    if not lock.acquire(blocking=False):
+        t0 = time.perf_counter()
+        lock.acquire()
+        waited = (time.perf_counter() - t0) * 1000
+    with _stats_lock:
+        _stats['acquired'] += 1
+        if waited:
+            _stats['contended'] += 1
+            _stats['wait_ms'] += waited
+    metrics.add_phase('lock_wait', waited / 1000)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def get_lock_stats() -> dict:
+    """锁统计：获取次数、发生等待的次数与总等待时间"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['wait_ms'] = round(stats['wait_ms'], 2)
+    stats['stripes'] = len(_stripes)
+    return stats
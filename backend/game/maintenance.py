@@ -0,0 +1,125 @@
+"""后台维护调度 - 在请求之外分批执行清理与数据库维护
+
+任务（间隔均可用环境变量调整）：
+    archive      把结束超过 ARCHIVE_AFTER_MINUTES 分钟的对局移入压缩的 games_archive，每次最多 MAINT_BATCH_ROWS 局
+    cleanup      删除超过 GAME_TTL_HOURS 小时未更新的游戏（开启归档时只删未完成的），每次最多 MAINT_BATCH_ROWS 局
+    action_logs  删除超过 ACTION_LOG_KEEP_HOURS 的动作日志，每次最多 MAINT_BATCH_ROWS 局
+    checkpoint   PASSIVE WAL 检查点
+    optimize     PRAGMA optimize
+    vacuum       增量 vacuum，每次最多归还 MAINT_VACUUM_PAGES 页
+删除类任务还有剩余时下一个 tick 继续，每个 tick 的删除量有上限，不会长时间占用写锁。
+多个 worker 进程各有一个调度线程，通过 db.claim_job 的租约保证同一任务全局每个间隔只执行一次，
+执行结果写入 job_leases，GET /api/admin/maintenance 可见。状态缓存的空闲清理只涉及本进程，各进程自行执行。
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_ENABLED = os.environ.get('MAINTENANCE', '1') != '0'
+MAINT_TICK_S = float(os.environ.get('MAINT_TICK_S', 5))
+MAINT_BATCH_ROWS = int(os.environ.get('MAINT_BATCH_ROWS', 200))       # 删除类任务每个 tick 最多处理的局数
+MAINT_VACUUM_PAGES = int(os.environ.get('MAINT_VACUUM_PAGES', 1000))
+GAME_TTL_HOURS = float(os.environ.get('GAME_TTL_HOURS', 2))           # 未更新超过该时长的游戏被清理
+ARCHIVE_ENABLED = os.environ.get('ARCHIVE', '1') != '0'
+ARCHIVE_AFTER_MINUTES = float(os.environ.get('ARCHIVE_AFTER_MINUTES', 10))  # 结束后仍留在热表的时长（结算页可刷新）
+
+# 任务名 -> 间隔（秒）
+JOB_INTERVALS = {
+    'archive': float(os.environ.get('MAINT_ARCHIVE_S', 60)),
+    'cleanup': float(os.environ.get('CLEANUP_INTERVAL_S', 60)),
+    'action_logs': float(os.environ.get('MAINT_ACTION_LOGS_S', 600)),
+    'checkpoint': float(os.environ.get('MAINT_CHECKPOINT_S', 60)),
+    'optimize': float(os.environ.get('MAINT_OPTIMIZE_S', 3600)),
+    'vacuum': float(os.environ.get('MAINT_VACUUM_S', 600)),
+}
+
+JOBS: Dict[str, Callable[[], dict]] = {
+    'archive': lambda: db.archive_finished_games(ARCHIVE_AFTER_MINUTES, MAINT_BATCH_ROWS),
+    'cleanup': lambda: db.purge_old_games(GAME_TTL_HOURS, MAINT_BATCH_ROWS, keep_finished=ARCHIVE_ENABLED),
+    'action_logs': lambda: db.purge_action_logs(MAINT_BATCH_ROWS),
+    'checkpoint': db.checkpoint_wal,
+    'optimize': db.optimize_db,
+    'vacuum': lambda: db.incremental_vacuum(MAINT_VACUUM_PAGES),
+}
+if not ARCHIVE_ENABLED:
+    del JOBS['archive'], JOB_INTERVALS['archive']
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_thread_pid: Optional[int] = None
+_backlog = set()  # 上次还有剩余、下个 tick 继续的任务
+_local = {'ticks': 0, 'cache_dropped': 0, 'ran': {}}  # 本进程的统计
+
+
+def run_job(name: str, force: bool = False) -> Optional[dict]:
+    """领取并执行一个任务，返回结果；没领到（未到间隔或其他进程正在执行）时返回 None"""
+    interval = 0 if force or name in _backlog else JOB_INTERVALS[name]
+    if not db.claim_job(name, interval):
+        return None
+    t0 = time.perf_counter()
+    result = error = None
+    try:
+        result = JOBS[name]()
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        logger.exception('维护任务 %s 失败', name)
+    duration = time.perf_counter() - t0
+    db.release_job(name, result, error, duration)
+    if result and result.get('more'):
+        _backlog.add(name)
+    else:
+        _backlog.discard(name)
+    _local['ran'][name] = _local['ran'].get(name, 0) + 1
+    return result
+
+
+def tick():
+    """执行一轮：本进程的缓存清理，以及到期的共享任务"""
+    _local['ticks'] += 1
+    _local['cache_dropped'] += db.drop_idle_games(GAME_TTL_HOURS * 3600)
+    for name in JOBS:
+        try:
+            run_job(name)
+        except Exception:
+            # 领取 / 释放租约失败（如数据库忙），下个 tick 再试
+            logger.exception('维护任务 %s 调度失败', name)
+
+
+def _loop():
+    while True:
+        time.sleep(MAINT_TICK_S)
+        tick()
+
+
+def start():
+    """启动本进程的调度线程（幂等；fork 出的子进程会重新启动）"""
+    global _thread, _thread_pid
+    if not MAINTENANCE_ENABLED:
+        return
+    if _thread is not None and _thread_pid == os.getpid() and _thread.is_alive():
+        return
+    with _lock:
+        if _thread is not None and _thread_pid == os.getpid() and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_loop, name='maintenance', daemon=True)
+        _thread_pid = os.getpid()
+        _thread.start()
+
+
+def status() -> dict:
+    """各任务的共享执行记录，以及本进程调度线程的统计"""
+    running = _thread is not None and _thread_pid == os.getpid() and _thread.is_alive()
+    return {
+        'enabled': MAINTENANCE_ENABLED,
+        'tick_s': MAINT_TICK_S,
+        'batch_rows': MAINT_BATCH_ROWS,
+        'intervals': JOB_INTERVALS,
+        'jobs': db.get_job_status(),
+        'process': {'pid': os.getpid(), 'running': running, 'backlog': sorted(_backlog), **_local},
+    }
@@ -1,6 +1,6 @@
 """地图生成系统 - 类Slay the Spire节点地图"""
-import random
 from typing import List, Dict, Optional
+from .rng import rng
 
 
 NODE_TYPES = {
@@ -27,7 +27,7 @@ def generate_map(act: int = 1) -> Dict:
     # 每层3-4个节点
     nodes = []
     for floor in range(floors):
-        num_nodes = random.randint(3, 4)
+        num_nodes = rng().randint(3, 4)
         floor_nodes = []
         for pos in range(num_nodes):
             node_type = _pick_node_type(floor, floors)
@@ -51,8 +51,8 @@ def generate_map(act: int = 1) -> Dict:
         next_floor = nodes[floor + 1]
         for node in current_floor:
             # 随机连接1-2个下一层节点
-            num_connections = random.randint(1, min(2, len(next_floor)))
-            chosen = random.sample(next_floor, num_connections)
+            num_connections = rng().randint(1, min(2, len(next_floor)))
+            chosen = rng().sample(next_floor, num_connections)
             node['connections'] = [n['id'] for n in chosen]
 
     # 确保所有下一层节点至少有一个入口
@@ -65,7 +65,7 @@ def generate_map(act: int = 1) -> Dict:
         for next_node in next_floor:
             if next_node['id'] not in all_connected:
                 # 随机给它一个入口
-                random.choice(current_floor)['connections'].append(next_node['id'])
+                rng().choice(current_floor)['connections'].append(next_node['id'])
 
     # 扁平化节点列表，加上Boss节点
     flat_nodes = {}
@@ -112,7 +112,7 @@ def _pick_node_type(floor: int, total_floors: int) -> str:
         types = list(NODE_TYPES.keys())
         weights = [NODE_TYPES[t]['weight'] for t in types]
 
-    return random.choices(types, weights=weights)[0]
+    return rng().choices(types, weights=weights)[0]
 
 
 def get_next_available_nodes(map_data: dict, visited_node_id: str) -> List[str]:
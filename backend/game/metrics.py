@@ -0,0 +1,184 @@
+"""请求耗时与数据量指标 - 进程内直方图，以 Prometheus 文本格式导出（/metrics）
+
+每个请求按阶段拆分耗时：lock_wait（等待该局的锁）、json_decode（请求体与存档 JSON 解析）、
+load（get_game）、engine（游戏逻辑）、save（save_game / 记录排行榜 / 动作日志）、
+respond（构建响应 + jsonify），其余计入 other。阶段可以嵌套，各阶段只统计自身（不含内层阶段）的时间，
+因此各阶段之和不超过请求总耗时。不在请求上下文中（模拟器、回放）时 phase() 不计时。
+指标按进程统计；多进程部署时每个进程的 /metrics 各自独立。
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.environ.get('METRICS', '1') != '0'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class _RequestTimer:
+    """一个请求的阶段计时：{阶段: 秒}，以及正在计时的阶段栈（用于扣除内层阶段）"""
+    __slots__ = ('start', 'phases', 'stack')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.stack: List[float] = []  # 每层已被内层阶段占用的时间
+
+
+_current: ContextVar[Optional[_RequestTimer]] = ContextVar('request_timer', default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """带标签的直方图（累计桶 + sum + count）"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}  # 标签值 -> [各桶计数（非累计，末位为 +Inf）, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{_num(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_num(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Counter:
+    """带标签的计数器"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        lines.extend(f'{self.name}{_labels(self.labelnames, labels)} {_num(v)}' for labels, v in snapshot)
+        return lines
+
+
+REQUESTS = Counter('textgame_requests_total', '请求数', ('route', 'status'))
+REQUEST_SECONDS = Histogram('textgame_request_seconds', '请求总耗时（秒）', ('route',), LATENCY_BUCKETS)
+PHASE_SECONDS = Histogram('textgame_request_phase_seconds', '请求各阶段耗时（秒，不含内层阶段）',
+                          ('route', 'phase'), LATENCY_BUCKETS)
+REQUEST_BYTES = Histogram('textgame_request_bytes', '请求体字节数', ('route',), BYTES_BUCKETS)
+RESPONSE_BYTES = Histogram('textgame_response_bytes', '响应体字节数', ('route',), BYTES_BUCKETS)
+STATE_BYTES = Histogram('textgame_state_bytes',
+                        '状态写入字节数（state 为完整状态 JSON，snapshot / delta 为实际写入数据库的内容）',
+                        ('kind',), BYTES_BUCKETS)
+
+_METRICS = (REQUESTS, REQUEST_SECONDS, PHASE_SECONDS, REQUEST_BYTES, RESPONSE_BYTES, STATE_BYTES)
+
+
+def start_request():
+    """开始为当前请求计时"""
+    if METRICS_ENABLED:
+        _current.set(_RequestTimer())
+
+
+def finish_request(route: str, status: int, request_bytes: int, response_bytes: Optional[int]):
+    """请求结束：记录总耗时、各阶段耗时与请求/响应大小"""
+    timer = _current.get()
+    if timer is None:
+        return
+    _current.set(None)
+    total = time.perf_counter() - timer.start
+    REQUESTS.inc((route, str(status)))
+    REQUEST_SECONDS.observe((route,), total)
+    for name, seconds in timer.phases.items():
+        PHASE_SECONDS.observe((route, name), seconds)
+    PHASE_SECONDS.observe((route, 'other'), max(0.0, total - sum(timer.phases.values())))
+    REQUEST_BYTES.observe((route,), request_bytes)
+    if response_bytes is not None:
+        RESPONSE_BYTES.observe((route,), response_bytes)
+
+
+@contextmanager
+def phase(name: str):
+    """把这段代码的耗时（扣除内层阶段）计入当前请求的 name 阶段"""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    timer.stack.append(0.0)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        inner = timer.stack.pop()
+        timer.phases[name] = timer.phases.get(name, 0.0) + elapsed - inner
+        if timer.stack:
+            timer.stack[-1] += elapsed
+
+
+def add_phase(name: str, seconds: float):
+    """直接计入一段已测得的耗时（如锁等待）"""
+    timer = _current.get()
+    if timer is None or seconds <= 0:
+        return
+    timer.phases[name] = timer.phases.get(name, 0.0) + seconds
+    if timer.stack:
+        timer.stack[-1] += seconds
+
+
+def observe_state_size(kind: str, size: int):
+    """记录一次状态写入的大小（kind 为 state / snapshot / delta）"""
+    if METRICS_ENABLED:
+        STATE_BYTES.observe((kind,), size)
+
+
+def render() -> str:
+    """全部指标的 Prometheus 文本格式"""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
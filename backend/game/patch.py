@@ -0,0 +1,177 @@
+"""响应差量 - 在两份 API 视图之间生成 / 应用补丁
+
+补丁是 JSON Patch 形式的操作列表（op / path / value / from，路径按 RFC 6901 转义），
+只用 add / remove / replace / copy 四种操作，但不是 RFC 6902：copy 的 from 指向应用补丁之前的文档，
+不受同一补丁中前面操作的影响，因此不能交给通用的 RFC 6902 库应用。
+前端 js/api.js 的 applyPatch 与这里的 apply_patch 语义相同（tests/test_patch.py 对照两者）。
+
+dict 按键递归；列表先去掉首尾相同的元素，中间段等长时按下标递归，否则逐个删除 / 插入
+（只在末尾追加时路径为 "-"，如战斗日志、弃牌堆）；首尾都不同的列表与其余变化整体替换。
+新出现的 dict 若与旧视图中某个列表元素相同（如打出的牌进入弃牌堆、抽到的牌与牌组中的牌相同），
+用 copy 引用它而不重复发送。
+"""
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from . import codec
+
+Op = dict
+
+
+def _escape(key) -> str:
+    """RFC 6901 路径片段转义"""
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(part: str) -> str:
+    return part.replace('~1', '/').replace('~0', '~')
+
+
+class _Differ:
+    def __init__(self, before: Any):
+        self.before = before
+        self.ops: List[Op] = []
+        self._index: Optional[Dict[str, str]] = None  # 旧视图中列表内 dict 元素的 JSON -> 路径
+
+    def index(self) -> Dict[str, str]:
+        if self._index is None:
+            self._index = {}
+
+            # 只收录列表中的 dict 元素（卡牌、敌人、遗物等），不再进入元素内部
+            def walk(node, path):
+                if isinstance(node, dict):
+                    for key, value in node.items():
+                        if isinstance(value, (dict, list)):
+                            walk(value, f'{path}/{_escape(key)}')
+                else:
+                    for i, value in enumerate(node):
+                        if isinstance(value, dict):
+                            self._index.setdefault(codec.dumps(value), f'{path}/{i}')
+
+            walk(self.before, '')
+        return self._index
+
+    def add(self, path: str, value: Any):
+        """写入新值：能在旧视图中找到相同的 dict 时用 copy"""
+        source = self.index().get(codec.dumps(value)) if isinstance(value, dict) else None
+        if source is not None:
+            self.ops.append({'op': 'copy', 'from': source, 'path': path})
+        else:
+            self.ops.append({'op': 'add', 'path': path, 'value': value})
+
+    def replace(self, path: str, value: Any):
+        if isinstance(value, list) and any(isinstance(v, dict) for v in value):
+            # 整体替换的列表（如回合开始时的新手牌）逐个元素写入，以便复用旧视图中的元素
+            self.ops.append({'op': 'replace', 'path': path, 'value': []})
+            for v in value:
+                self.add(f'{path}/-', v)
+        else:
+            self.ops.append({'op': 'replace', 'path': path, 'value': value})
+
+    def diff(self, before: Any, after: Any, path: str):
+        """调用方已确认 before != after"""
+        if isinstance(before, dict) and isinstance(after, dict):
+            for key, value in before.items():
+                if key not in after:
+                    self.ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+                elif value != after[key]:
+                    self.diff(value, after[key], f'{path}/{_escape(key)}')
+            for key, value in after.items():
+                if key not in before:
+                    self.add(f'{path}/{_escape(key)}', value)
+            return
+        if isinstance(before, list) and isinstance(after, list):
+            n, m = len(before), len(after)
+            head = 0
+            while head < n and head < m and before[head] == after[head]:
+                head += 1
+            tail = 0
+            while tail < n - head and tail < m - head and before[n - 1 - tail] == after[m - 1 - tail]:
+                tail += 1
+            old, new = before[head:n - tail], after[head:m - tail]
+            if len(old) == len(new):
+                for i, (a, b) in enumerate(zip(old, new)):
+                    self.diff(a, b, f'{path}/{head + i}')
+                return
+            if head or tail:
+                self.ops.extend({'op': 'remove', 'path': f'{path}/{head}'} for _ in old)
+                for i, v in enumerate(new):
+                    self.add(f'{path}/-' if head == n else f'{path}/{head + i}', v)
+                return
+        self.replace(path, after)
+
+
+def diff(before: Any, after: Any) -> List[Op]:
+    """before → after 的补丁操作列表（相同时为空）"""
+    differ = _Differ(before)
+    if before != after:
+        differ.diff(before, after, '')
+    return differ.ops
+
+
+def _resolve(doc: Any, path: str) -> Any:
+    for part in path.split('/')[1:]:
+        part = _unescape(part)
+        doc = doc[int(part)] if isinstance(doc, list) else doc[part]
+    return doc
+
+
+def apply_patch(doc: Any, ops: List[Op]) -> Any:
+    """把补丁应用到 doc 上（原地修改，返回新的根）"""
+    base = copy.deepcopy(doc) if any(op['op'] == 'copy' for op in ops) else None
+    for op in ops:
+        value = copy.deepcopy(_resolve(base, op['from'])) if op['op'] == 'copy' else op.get('value')
+        if not op['path']:
+            doc = value
+            continue
+        parts = [_unescape(p) for p in op['path'].split('/')[1:]]
+        node = doc
+        for part in parts[:-1]:
+            node = node[int(part)] if isinstance(node, list) else node[part]
+        last = parts[-1]
+        if isinstance(node, list):
+            if op['op'] == 'remove':
+                node.pop(int(last))
+            elif last == '-':
+                node.append(value)
+            elif op['op'] in ('add', 'copy'):
+                node.insert(int(last), value)
+            else:
+                node[int(last)] = value
+        elif op['op'] == 'remove':
+            node.pop(last, None)
+        else:
+            node[last] = value
+    return doc
+
+
+class ViewCache:
+    """
+    每局最近一次发给客户端的视图，作为下一次动作的差量基准，省去每次动作前重新渲染旧视图。
+    条目记下生成它的状态对象与版本：状态被重新加载（缓存淘汰、出错回滚、其他进程写入）后对象不同，不再命中。
+    """
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._items: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, game_id: str, state: dict) -> Optional[dict]:
+        with self._lock:
+            item = self._items.get(game_id)
+        if item is None or item[0] is not state or item[1] != state.get('version', 0):
+            return None
+        return item[2]
+
+    def put(self, game_id: str, state: dict, view: dict):
+        """view 由调用方生成后不再修改"""
+        with self._lock:
+            self._items[game_id] = (state, state.get('version', 0), view)
+            self._items.move_to_end(game_id)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
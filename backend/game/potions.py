@@ -1,6 +1,7 @@
 """药水系统"""
-import random
 from typing import List, Dict
+from .combatants import CombatEnemy, PlayerData
+from .rng import rng
 
 
 POTIONS = [
@@ -104,10 +105,10 @@ def get_random_potion(rarity: str = None) -> Dict:
         pool = [p for p in POTIONS if p['rarity'] == rarity]
     else:
         pool = POTIONS
-    return random.choice(pool).copy() if pool else None
+    return rng().choice(pool).copy() if pool else None
 
 
-def use_potion(potion: dict, player: dict, enemies: list, target_idx: int = 0) -> tuple:
+def use_potion(potion: dict, player: PlayerData, enemies: List[CombatEnemy], target_idx: int = 0) -> tuple:
     """使用药水，返回(更新后player, 更新后enemies, 日志)"""
     logs = []
     effect = potion.get('effect', '')
@@ -154,6 +155,8 @@ def use_potion(potion: dict, player: dict, enemies: list, target_idx: int = 0) -
         relic = get_random_relic('uncommon')
         if relic:
             player.setdefault('relics', []).append(relic)
+            from .relic_effects import refresh_relic_hooks
+            refresh_relic_hooks(player)
             logs.append(f"🏺 使用{potion['name']}：获得遗物 {relic['name']}")
 
     elif effect == 'gamble':
@@ -173,7 +176,7 @@ def use_potion(potion: dict, player: dict, enemies: list, target_idx: int = 0) -
 
 
 def get_shop_potions(count: int = 3) -> List[dict]:
-    selected = random.sample(POTIONS, min(count, len(POTIONS)))
+    selected = rng().sample(POTIONS, min(count, len(POTIONS)))
     prices = {'common': 50, 'uncommon': 75, 'rare': 120}
     result = []
     for p in selected:
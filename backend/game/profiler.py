@@ -0,0 +1,197 @@
+"""战斗热路径采样分析器 - 定时采样线程栈，输出 collapsed stack（可离线生成火焰图）
+
+只有进入 scope() 的线程会被采样（路由在执行动作时、模拟器在整局期间进入），
+且只保留经过热路径函数（出牌效果、敌人回合、意图生成、回合开始、遗物钩子）的栈。
+采样线程按自身耗时自适应拉长间隔，使采样开销不超过 PROFILE_MAX_OVERHEAD（默认 2%）。
+
+开启方式：环境变量 PROFILE=1（可选 PROFILE_GAME_ID 只采样某一局），
+或设置 ADMIN_TOKEN 后调用 POST /api/admin/profile，或 python -m game.sim --profile out.folded。
+输出文件每行 "帧1;帧2;...;帧N 次数"，可用 flamegraph.pl / speedscope 等工具生成火焰图。
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+PROFILE_ENABLED = os.environ.get('PROFILE', '0') == '1'
+PROFILE_GAME_ID = os.environ.get('PROFILE_GAME_ID') or None
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/app/data/profiles')
+PROFILE_HZ = float(os.environ.get('PROFILE_HZ', 97))                   # 目标采样频率（奇数避免与定时任务同步）
+PROFILE_MAX_OVERHEAD = float(os.environ.get('PROFILE_MAX_OVERHEAD', 0.02))
+PROFILE_FLUSH_S = float(os.environ.get('PROFILE_FLUSH_S', 30))         # 运行中定期重写输出文件
+
+_GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _hot_codes() -> set:
+    """热路径函数的 code 对象"""
+    from . import combat, relic_effects
+    funcs = [combat.apply_card_effect, combat.enemy_turn, combat._generate_next_intent,
+             combat.start_player_turn]
+    funcs += [getattr(relic_effects, hook) for hook in relic_effects.RELIC_HOOKS
+              if callable(getattr(relic_effects, hook, None))]
+    return {f.__code__ for f in funcs}
+
+
+def _label(code) -> str:
+    module = os.path.splitext(os.path.relpath(code.co_filename, _GAME_DIR))[0].replace(os.sep, '.')
+    return f'{module}.{code.co_qualname}'
+
+
+class SamplingProfiler:
+    """后台线程定时读取 sys._current_frames()，统计处于 scope 中的线程的热路径栈"""
+
+    def __init__(self, path: str, game_id: Optional[str] = None, hz: float = PROFILE_HZ,
+                 max_overhead: float = PROFILE_MAX_OVERHEAD, flush_s: float = PROFILE_FLUSH_S):
+        self.path = path
+        self.game_id = game_id
+        self.interval = 1.0 / max(hz, 1e-3)
+        self.max_overhead = max_overhead
+        self.flush_s = flush_s
+        self.stacks = Counter()
+        self.stats = {'ticks': 0, 'samples': 0, 'skipped': 0, 'sample_ms': 0.0}
+        self._active: Dict[int, str] = {}  # 线程 ident -> game_id
+        self._hot = _hot_codes()
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict:
+        """停止采样并写出文件，返回统计"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.write()
+        return self.summary()
+
+    def wants(self, game_id: Optional[str]) -> bool:
+        return self.game_id is None or self.game_id == game_id
+
+    def _loop(self):
+        wait = self.interval
+        last_flush = time.monotonic()
+        while not self._stop.wait(wait):
+            t0 = time.perf_counter()
+            self._sample()
+            cost = time.perf_counter() - t0
+            self.stats['ticks'] += 1
+            self.stats['sample_ms'] += cost * 1000
+            # 采样耗时 / 采样间隔 不超过允许的开销
+            wait = max(self.interval, cost / self.max_overhead - cost)
+            if self.flush_s and time.monotonic() - last_flush >= self.flush_s:
+                self.write()
+                last_flush = time.monotonic()
+
+    def _sample(self):
+        if not self._active:
+            return
+        frames = sys._current_frames()
+        hot = self._hot
+        for ident in list(self._active):
+            frame = frames.get(ident)
+            codes = []
+            is_hot = False
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename.startswith(_GAME_DIR):
+                    codes.append(code)
+                    is_hot = is_hot or code in hot
+                frame = frame.f_back
+            if not is_hot:
+                self.stats['skipped'] += 1
+                continue
+            labels = self._labels
+            stack = ';'.join(labels.get(c) or labels.setdefault(c, _label(c)) for c in reversed(codes))
+            with self._lock:
+                self.stacks[stack] += 1
+            self.stats['samples'] += 1
+
+    def write(self):
+        """把目前的采样结果写为 collapsed stack 文件（整体重写）"""
+        with self._lock:
+            lines = [f'{stack} {n}\n' for stack, n in self.stacks.most_common()]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(tmp, self.path)
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self._started if self._started else 0
+        stats = dict(self.stats)
+        stats['sample_ms'] = round(stats['sample_ms'], 2)
+        stats['seconds'] = round(elapsed, 2)
+        stats['overhead'] = round(stats['sample_ms'] / 1000 / elapsed, 4) if elapsed else 0
+        stats['stacks'] = len(self.stacks)
+        stats['path'] = self.path
+        stats['game_id'] = self.game_id
+        return stats
+
+
+_profiler: Optional[SamplingProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def default_path(game_id: Optional[str] = None) -> str:
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    suffix = f'-{game_id}' if game_id else ''
+    return os.path.join(PROFILE_DIR, f'combat-{os.getpid()}-{stamp}{suffix}.folded')
+
+
+def start(path: Optional[str] = None, game_id: Optional[str] = None, **kwargs) -> SamplingProfiler:
+    """开始采样（已在采样时先停止旧的）"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is not None:
+            _profiler.stop()
+        _profiler = SamplingProfiler(path or default_path(game_id), game_id, **kwargs)
+        _profiler.start()
+        return _profiler
+
+
+def stop() -> Optional[dict]:
+    """停止采样并写出文件；未在采样时返回 None"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            return None
+        profiler, _profiler = _profiler, None
+    return profiler.stop()
+
+
+def status() -> Optional[dict]:
+    profiler = _profiler
+    return profiler.summary() if profiler is not None else None
+
+
+@contextmanager
+def scope(game_id: Optional[str] = None):
+    """在此上下文中允许采样当前线程（未开启分析或 game_id 不在范围内时无开销）"""
+    profiler = _profiler
+    if profiler is None or not profiler.wants(game_id):
+        yield
+        return
+    ident = threading.get_ident()
+    profiler._active[ident] = game_id
+    try:
+        yield
+    finally:
+        profiler._active.pop(ident, None)
+
+
+if PROFILE_ENABLED:
+    start(game_id=PROFILE_GAME_ID)
+    atexit.register(stop)
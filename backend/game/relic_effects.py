@@ -1,315 +1,469 @@
 """遗物效果触发系统 - 让遗物真正发挥作用"""
-from typing import List, Dict, Tuple
+import logging
+import os
+from contextlib import contextmanager
+from typing import List, Dict, Sequence, Tuple
+from .rng import rng
+from .combatants import UNSET, CombatEnemy, CombatPlayer, PlayerData
+
+logger = logging.getLogger(__name__)
+
+# 遗物处理函数出错时：严格模式（RELIC_STRICT=1，DEBUG=true 时默认开启；模拟器总是开启）直接抛出，
+# 否则记录日志并跳过该遗物，同一钩子上后面的遗物照常触发
+RELIC_STRICT = os.environ.get(
+    'RELIC_STRICT', '1' if os.environ.get('DEBUG', 'false').lower() == 'true' else '0') != '0'
+
+# 各钩子的遗物处理函数：{钩子名: {relic_id: fn}}，按注册顺序触发
+RELIC_HOOKS = ('on_combat_start', 'on_turn_start', 'on_turn_end', 'on_card_played',
+               'on_discard', 'on_combat_end', 'on_player_take_damage')
+_HANDLERS: Dict[str, Dict[str, object]] = {hook: {} for hook in RELIC_HOOKS}
 
 
-def on_combat_start(player: dict, enemies: list) -> Tuple[dict, list, List[str]]:
-    """战斗开始时触发的遗物效果"""
-    logs = []
-    relics = player.get('relics', [])
-    relic_ids = {r['id'] for r in relics}
+def relic_handler(hook: str, relic_id: str):
+    """注册遗物在某个钩子上的处理函数"""
+    def register(fn):
+        _HANDLERS[hook][relic_id] = fn
+        return fn
+    return register
+
+
+def build_relic_index(player: PlayerData) -> Dict[str, List[str]]:
+    """按钩子列出玩家拥有且有处理函数的遗物（保持注册顺序，省略没有遗物的钩子）"""
+    owned = {r['id'] for r in player.get('relics', [])}
+    index = {}
+    for hook, handlers in _HANDLERS.items():
+        relic_ids = [relic_id for relic_id in handlers if relic_id in owned]
+        if relic_ids:
+            index[hook] = relic_ids
+    return index
+
+
+def refresh_relic_hooks(player: PlayerData) -> Dict[str, List[str]]:
+    """重建并缓存玩家的遗物触发索引（战斗开始、战斗中遗物变化时调用）"""
+    index = player['_relic_hooks'] = build_relic_index(player)
+    return index
+
+
+@contextmanager
+def strict_relics(strict: bool = True):
+    """在此范围内开关严格模式（遗物出错时抛出而不是跳过），退出时恢复"""
+    global RELIC_STRICT
+    previous, RELIC_STRICT = RELIC_STRICT, strict
+    try:
+        yield
+    finally:
+        RELIC_STRICT = previous
+
+
+def _relic_ids_for(player: CombatPlayer, hook: str) -> Sequence[str]:
+    index = player._relic_hooks
+    if index is UNSET:
+        index = refresh_relic_hooks(player)
+    return index.get(hook, ())
+
+
+def _fire(hook: str, relic_ids, *args):
+    """按注册顺序调用各遗物的处理函数；单个遗物出错只跳过它自己"""
+    handlers = _HANDLERS[hook]
+    for relic_id in relic_ids:
+        try:
+            handlers[relic_id](*args)
+        except Exception:
+            if RELIC_STRICT:
+                raise
+            logger.exception('遗物 %s 的 %s 效果出错，已跳过', relic_id, hook)
+
+
+# ===== 战斗开始 =====
+@relic_handler('on_combat_start', 'anchor')
+def _anchor(player, enemies, logs):
+    player.block += 10
+    logs.append('🔩 遗物【锚】：获得10点格挡')
+
+
+@relic_handler('on_combat_start', 'bag_of_marbles')
+def _bag_of_marbles(player, enemies, logs):
+    for e in enemies:
+        e.weak_turns += 1
+    logs.append('🪨 遗物【弹珠袋】：所有敌人虚弱1回合')
+
+
+@relic_handler('on_combat_start', 'ring_of_snake')
+def _ring_of_snake(player, enemies, logs):
+    from .combat import draw_cards
+    draw_cards(player, 2)
+    logs.append('🐍 遗物【蛇之戒】：额外抽2张牌')
+
+
+@relic_handler('on_combat_start', 'bag_of_preparation')
+def _bag_of_preparation(player, enemies, logs):
+    from .combat import draw_cards
+    draw_cards(player, 2)
+    logs.append('🎒 遗物【准备袋】：额外抽2张牌')
+
+
+@relic_handler('on_combat_start', 'captain_wheel')
+def _captain_wheel(player, enemies, logs):
+    player.strength += 3
+    player.dexterity += 3
+    player.block += 3
+    logs.append('⚓ 遗物【船长之轮】：力量+3, 敏捷+3, 格挡+3')
+
+
+@relic_handler('on_combat_start', 'horn_cleat')
+def _horn_cleat_start(player, enemies, logs):
+    # 前两回合额外格挡，用 combat_turn_count 追踪
+    player._horn_cleat_active = True
+    logs.append('📎 遗物【角钳】：前2回合额外获得14点格挡')
+
+
+@relic_handler('on_combat_start', 'blood_vial')
+def _blood_vial(player, enemies, logs):
+    player.hp = min(player.max_hp, player.hp + 2)
+    logs.append('🩸 遗物【血瓶】：恢复2点HP')
+
 
-    if 'anchor' in relic_ids:
-        player['block'] = player.get('block', 0) + 10
-        logs.append('🔩 遗物【锚】：获得10点格挡')
+@relic_handler('on_combat_start', 'lantern')
+def _lantern_start(player, enemies, logs):
+    player._lantern_used = False  # 第一回合才生效
 
-    if 'bag_of_marbles' in relic_ids:
+
+@relic_handler('on_combat_start', 'vajra')
+def _vajra(player, enemies, logs):
+    player.strength += 1
+    logs.append('🔱 遗物【金刚杵】：力量+1')
+
+
+@relic_handler('on_combat_start', 'preserved_insect')
+def _preserved_insect(player, enemies, logs):
+    if any(e.is_elite for e in enemies):
         for e in enemies:
-            e['weak_turns'] = e.get('weak_turns', 0) + 1
-        logs.append('🪨 遗物【弹珠袋】：所有敌人虚弱1回合')
+            new_hp = max(1, int(e.hp * 0.75))
+            new_max = max(1, int(e.max_hp * 0.75))
+            e.hp = new_hp
+            e.max_hp = new_max
+        logs.append('🪲 遗物【标本昆虫】：精英敌人HP减少25%')
 
-    if 'ring_of_snake' in relic_ids:
-        from .combat import draw_cards
-        draw_cards(player, 2)
-        logs.append('🐍 遗物【蛇之戒】：额外抽2张牌')
 
-    if 'bag_of_preparation' in relic_ids:
-        from .combat import draw_cards
-        draw_cards(player, 2)
-        logs.append('🎒 遗物【准备袋】：额外抽2张牌')
-
-    if 'captain_wheel' in relic_ids:
-        player['strength'] = player.get('strength', 0) + 3
-        player['dexterity'] = player.get('dexterity', 0) + 3
-        player['block'] = player.get('block', 0) + 3
-        logs.append('⚓ 遗物【船长之轮】：力量+3, 敏捷+3, 格挡+3')
-
-    if 'horn_cleat' in relic_ids:
-        # 前两回合额外格挡，用 combat_turn_count 追踪
-        player['_horn_cleat_active'] = True
-        logs.append('📎 遗物【角钳】：前2回合额外获得14点格挡')
-
-    if 'blood_vial' in relic_ids:
-        player['hp'] = min(player['max_hp'], player['hp'] + 2)
-        logs.append('🩸 遗物【血瓶】：恢复2点HP')
-
-    if 'lantern' in relic_ids:
-        player['_lantern_used'] = False  # 第一回合才生效
-
-    if 'vajra' in relic_ids:
-        player['strength'] = player.get('strength', 0) + 1
-        logs.append('🔱 遗物【金刚杵】：力量+1')
-
-    if 'preserved_insect' in relic_ids:
-        if any(e.get('is_elite') for e in enemies):
-            for e in enemies:
-                new_hp = max(1, int(e['hp'] * 0.75))
-                new_max = max(1, int(e['max_hp'] * 0.75))
-                e['hp'] = new_hp
-                e['max_hp'] = new_max
-            logs.append('🪲 遗物【标本昆虫】：精英敌人HP减少25%')
-
-    if 'pen_nib' in relic_ids:
-        player['_pen_nib_used'] = False
+@relic_handler('on_combat_start', 'pen_nib')
+def _pen_nib(player, enemies, logs):
+    player._pen_nib_used = False
 
-    # 破裂核心：战斗开始获得1个闪电法球
-    if 'cracked_core' in relic_ids:
-        from .combat import channel_orb
-        player = channel_orb(player, 'lightning', logs)
-        if logs and '获得' in logs[-1]:
-            logs[-1] = '💎 遗物【破裂核心】：获得 ⚡闪电 法球'
 
-    return player, enemies, logs
+@relic_handler('on_combat_start', 'cracked_core')
+def _cracked_core(player, enemies, logs):
+    # 破裂核心：战斗开始获得1个闪电法球
+    from .combat import channel_orb
+    channel_orb(player, 'lightning', logs)
+    if logs and '获得' in logs[-1]:
+        logs[-1] = '💎 遗物【破裂核心】：获得 ⚡闪电 法球'
 
 
-def on_turn_start(player: dict, enemies: list, turn: int) -> Tuple[dict, list, List[str]]:
-    """每回合开始时触发的遗物效果"""
+def on_combat_start(player: CombatPlayer,
+                    enemies: List[CombatEnemy]) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
+    """战斗开始时触发的遗物效果（同时重建本场战斗的遗物触发索引）"""
     logs = []
-    relic_ids = {r['id'] for r in player.get('relics', [])}
+    refresh_relic_hooks(player)
+    _fire('on_combat_start', _relic_ids_for(player, 'on_combat_start'), player, enemies, logs)
+    return player, enemies, logs
+
 
+# ===== 回合开始 =====
+@relic_handler('on_turn_start', 'lantern')
+def _lantern(player, enemies, turn, logs):
     # 灯笼：第一回合+1能量
-    if 'lantern' in relic_ids and not player.get('_lantern_used', True):
-        player['energy'] = player.get('energy', 0) + 1
-        player['_lantern_used'] = True
+    if not player._lantern_used:
+        player.energy += 1
+        player._lantern_used = True
         logs.append('🏮 遗物【灯笼】：第一回合能量+1')
 
+
+@relic_handler('on_turn_start', 'horn_cleat')
+def _horn_cleat(player, enemies, turn, logs):
     # 角钳：前两回合+14格挡
-    if 'horn_cleat' in relic_ids and player.get('_horn_cleat_active') and turn <= 2:
-        player['block'] = player.get('block', 0) + 14
+    if player._horn_cleat_active and turn <= 2:
+        player.block += 14
         logs.append('📎 遗物【角钳】：格挡+14')
         if turn == 2:
-            player['_horn_cleat_active'] = False
+            player._horn_cleat_active = False
+
 
+@relic_handler('on_turn_start', 'happy_flower')
+def _happy_flower(player, enemies, turn, logs):
     # 快乐花：每3回合+1能量
-    if 'happy_flower' in relic_ids:
-        flower_count = player.get('_flower_count', 0) + 1
-        player['_flower_count'] = flower_count
-        if flower_count % 3 == 0:
-            player['energy'] = player.get('energy', 0) + 1
-            logs.append('🌸 遗物【快乐花】：能量+1')
+    flower_count = player._flower_count + 1
+    player._flower_count = flower_count
+    if flower_count % 3 == 0:
+        player.energy += 1
+        logs.append('🌸 遗物【快乐花】：能量+1')
+
 
+@relic_handler('on_turn_start', 'mercury_hourglass')
+def _mercury_hourglass(player, enemies, turn, logs):
     # 汞沙漏：每回合对所有敌人造成3点伤害
-    if 'mercury_hourglass' in relic_ids:
-        for e in enemies:
-            if e.get('hp', 0) > 0:
-                e['hp'] = max(0, e['hp'] - 3)
-        logs.append('⏳ 遗物【汞沙漏】：对所有敌人造成3点伤害')
+    for e in enemies:
+        if e.hp > 0:
+            e.hp = max(0, e.hp - 3)
+    logs.append('⏳ 遗物【汞沙漏】：对所有敌人造成3点伤害')
+
 
+@relic_handler('on_turn_start', 'white_beast_statue')
+def _white_beast_statue(player, enemies, turn, logs):
     # 白兽雕像：每回合开始回血2点
-    if 'white_beast_statue' in relic_ids:
-        player['hp'] = min(player['max_hp'], player['hp'] + 2)
-        logs.append('🗿 遗物【白兽雕像】：恢复2点HP')
+    player.hp = min(player.max_hp, player.hp + 2)
+    logs.append('🗿 遗物【白兽雕像】：恢复2点HP')
+
 
+@relic_handler('on_turn_start', 'art_of_war')
+def _art_of_war(player, enemies, turn, logs):
     # 兵法：上回合未出攻击牌，本回合+1能量
-    if 'art_of_war' in relic_ids and player.get('_art_of_war_ready'):
-        player['energy'] = player.get('energy', 0) + 1
-        player['_art_of_war_ready'] = False
+    if player._art_of_war_ready:
+        player.energy += 1
+        player._art_of_war_ready = False
         logs.append('📜 遗物【兵法】：上回合未出攻击牌，能量+1')
 
-    return player, enemies, logs
-
 
-def on_turn_end(player: dict, enemies: list) -> Tuple[dict, list, List[str]]:
-    """每回合结束时触发的遗物效果"""
+def on_turn_start(player: CombatPlayer, enemies: List[CombatEnemy],
+                  turn: int) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
+    """每回合开始时触发的遗物效果"""
     logs = []
-    relic_ids = {r['id'] for r in player.get('relics', [])}
-
-    # 金属化（来自能力牌）
-    if player.get('metallicize_stacks', 0) > 0:
-        stacks = player['metallicize_stacks']
-        player['block'] = player.get('block', 0) + stacks
-        logs.append(f'⚙️ 金属化：回合结束获得{stacks}点格挡')
+    _fire('on_turn_start', _relic_ids_for(player, 'on_turn_start'), player, enemies, turn, logs)
+    return player, enemies, logs
 
-    # 冰淇淋：保留未使用能量
-    if 'ice_cream' in relic_ids:
-        # 能量已经在end_turn被处理，这里确保保留
-        player['_saved_energy'] = player.get('energy', 0)
-        if player.get('energy', 0) > 0:
-            logs.append(f'🍦 遗物【冰淇淋】：保留{player["energy"]}点能量')
 
+# ===== 回合结束 =====
+@relic_handler('on_turn_end', 'ice_cream')
+def _ice_cream(player, enemies, logs):
+    # 冰淇淋：保留未使用能量（能量已经在end_turn被处理，这里确保保留）
+    player._saved_energy = player.energy
+    if player.energy > 0:
+        logs.append(f'🍦 遗物【冰淇淋】：保留{player.energy}点能量')
 
 
+@relic_handler('on_turn_end', 'frozen_core')
+def _frozen_core(player, enemies, logs):
     # 冰封核心：若回合结束时法球槽为空，获得一个冰霜法球
-    if 'frozen_core' in relic_ids:
-        if not player.get('orbs'):
-            from .combat import channel_orb
-            player = channel_orb(player, 'frost', logs)
-            if logs and '获得' in logs[-1]:
-                logs[-1] = '🧊 遗物【冰封核心】：法球槽为空，获得 ❄️冰霜 法球'
+    if not player.orbs:
+        from .combat import channel_orb
+        channel_orb(player, 'frost', logs)
+        if logs and '获得' in logs[-1]:
+            logs[-1] = '🧊 遗物【冰封核心】：法球槽为空，获得 ❄️冰霜 法球'
 
-    # 叮钹：每次丢弃牌时伤害（在这里处理弃牌时的效果）
 
+@relic_handler('on_turn_end', 'art_of_war')
+def _art_of_war_end(player, enemies, logs):
     # 兵法：若本回合未出攻击牌，下回合+1能量
-    if 'art_of_war' in relic_ids:
-        if player.get('_attacks_this_turn', 0) == 0:
-            player['_art_of_war_ready'] = True
-        else:
-            player['_art_of_war_ready'] = False
-
-    return player, enemies, logs
+    player._art_of_war_ready = player._attacks_this_turn == 0
 
 
-def on_card_played(player: dict, enemies: list, card: dict,
-                    attack_count: int, skill_count: int,
-                    total_count: int) -> Tuple[dict, list, List[str]]:
-    """打出卡牌时触发的遗物效果"""
+def on_turn_end(player: CombatPlayer,
+                enemies: List[CombatEnemy]) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
+    """每回合结束时触发的遗物效果"""
     logs = []
-    relic_ids = {r['id'] for r in player.get('relics', [])}
-    card_type = card.get('type', '')
 
+    # 金属化（来自能力牌）
+    if player.metallicize_stacks > 0:
+        stacks = player.metallicize_stacks
+        player.block += stacks
+        logs.append(f'⚙️ 金属化：回合结束获得{stacks}点格挡')
+
+    # 叮钹：每次丢弃牌时伤害（在 on_discard 处理）
+    _fire('on_turn_end', _relic_ids_for(player, 'on_turn_end'), player, enemies, logs)
+    return player, enemies, logs
+
+
+# ===== 打出卡牌 =====
+@relic_handler('on_card_played', 'nunchaku')
+def _nunchaku(player, enemies, card, card_type, attack_count, skill_count, logs):
     # 双截棍：每打出10张攻击牌+1能量
-    if 'nunchaku' in relic_ids and card_type == 'attack':
-        player['_nunchaku_count'] = player.get('_nunchaku_count', 0) + 1
-        if player['_nunchaku_count'] % 10 == 0:
-            player['energy'] = player.get('energy', 0) + 1
+    if card_type == 'attack':
+        player._nunchaku_count += 1
+        if player._nunchaku_count % 10 == 0:
+            player.energy += 1
             logs.append('🥊 遗物【双截棍】：能量+1')
 
+
+@relic_handler('on_card_played', 'kunai')
+def _kunai(player, enemies, card, card_type, attack_count, skill_count, logs):
     # 苦无：每打出3张攻击牌+1敏捷
-    if 'kunai' in relic_ids and card_type == 'attack':
-        if attack_count % 3 == 0:
-            player['dexterity'] = player.get('dexterity', 0) + 1
-            logs.append('🗡️ 遗物【苦无】：敏捷+1')
+    if card_type == 'attack' and attack_count % 3 == 0:
+        player.dexterity += 1
+        logs.append('🗡️ 遗物【苦无】：敏捷+1')
+
 
+@relic_handler('on_card_played', 'shuriken')
+def _shuriken(player, enemies, card, card_type, attack_count, skill_count, logs):
     # 飞镖星：每打出3张攻击牌+1力量
-    if 'shuriken' in relic_ids and card_type == 'attack':
-        if attack_count % 3 == 0:
-            player['strength'] = player.get('strength', 0) + 1
-            logs.append('⭐ 遗物【飞镖星】：力量+1')
+    if card_type == 'attack' and attack_count % 3 == 0:
+        player.strength += 1
+        logs.append('⭐ 遗物【飞镖星】：力量+1')
 
+
+@relic_handler('on_card_played', 'ornamental_fan')
+def _ornamental_fan(player, enemies, card, card_type, attack_count, skill_count, logs):
     # 装饰扇：每打出3张攻击牌+4格挡
-    if 'ornamental_fan' in relic_ids and card_type == 'attack':
-        if attack_count % 3 == 0:
-            from .combat import calculate_block
-            block_gain = calculate_block(4, player)
-            player['block'] = player.get('block', 0) + block_gain
-            logs.append(f'🪭 遗物【装饰扇】：格挡+{block_gain}')
+    if card_type == 'attack' and attack_count % 3 == 0:
+        from .combat import calculate_block
+        block_gain = calculate_block(4, player)
+        player.block += block_gain
+        logs.append(f'🪭 遗物【装饰扇】：格挡+{block_gain}')
+
 
+@relic_handler('on_card_played', 'letter_opener')
+def _letter_opener(player, enemies, card, card_type, attack_count, skill_count, logs):
     # 拆信刀：每打出3张技能牌对所有敌人造成5点伤害
-    if 'letter_opener' in relic_ids and card_type == 'skill':
-        if skill_count % 3 == 0:
-            for e in enemies:
-                if e.get('hp', 0) > 0:
-                    e['hp'] = max(0, e['hp'] - 5)
-            logs.append('✉️ 遗物【拆信刀】：对所有敌人造成5点伤害')
+    if card_type == 'skill' and skill_count % 3 == 0:
+        for e in enemies:
+            if e.hp > 0:
+                e.hp = max(0, e.hp - 5)
+        logs.append('✉️ 遗物【拆信刀】：对所有敌人造成5点伤害')
 
+
+@relic_handler('on_card_played', 'ink_bottle')
+def _ink_bottle(player, enemies, card, card_type, attack_count, skill_count, logs):
     # 墨水瓶：每打出10张牌抽1张
-    if 'ink_bottle' in relic_ids:
-        player['_ink_count'] = player.get('_ink_count', 0) + 1
-        if player['_ink_count'] % 10 == 0:
-            from .combat import draw_cards
-            draw_cards(player, 1)
-            logs.append('🖊️ 遗物【墨水瓶】：抽1张牌')
+    player._ink_count += 1
+    if player._ink_count % 10 == 0:
+        from .combat import draw_cards
+        draw_cards(player, 1)
+        logs.append('🖊️ 遗物【墨水瓶】：抽1张牌')
+
 
+@relic_handler('on_card_played', 'bird_faced_urn')
+def _bird_faced_urn(player, enemies, card, card_type, attack_count, skill_count, logs):
     # 鸟脸瓮：打出能力牌恢复2点HP
-    if 'bird_faced_urn' in relic_ids and card_type == 'power':
-        player['hp'] = min(player['max_hp'], player['hp'] + 2)
+    if card_type == 'power':
+        player.hp = min(player.max_hp, player.hp + 2)
         logs.append('🏺 遗物【鸟脸瓮】：恢复2点HP')
 
+
+@relic_handler('on_card_played', 'mummified_hand')
+def _mummified_hand(player, enemies, card, card_type, attack_count, skill_count, logs):
     # 木乃伊手：打出能力牌随机降低手牌费用1点
-    if 'mummified_hand' in relic_ids and card_type == 'power':
-        import random
-        hand = player.get('hand', [])
+    if card_type == 'power':
+        hand = player.hand
         if hand:
-            target = random.choice(hand)
+            target = rng().choice(hand)
             if isinstance(target.get('cost', 0), int) and target['cost'] > 0:
                 target['cost'] -= 1
                 logs.append(f'🤚 遗物【木乃伊手】：【{target["name"]}】费用-1')
 
+
+@relic_handler('on_card_played', 'dead_branch')
+def _dead_branch(player, enemies, card, card_type, attack_count, skill_count, logs):
     # 枯枝：耗尽牌时获得随机牌
-    if 'dead_branch' in relic_ids and card.get('exhaust'):
-        from .cards import get_card_rewards
+    if card.get('exhaust'):
+        from .cards import get_card_rewards, compact_card
         rewards = get_card_rewards(player.get('character', 'warrior'), player.get('floor', 1), 1)
         if rewards:
-            player.get('hand', []).append(rewards[0])
+            player.hand.append(compact_card(rewards[0]))
             logs.append(f'🌿 遗物【枯枝】：获得【{rewards[0]["name"]}】')
 
+
+def on_card_played(player: CombatPlayer, enemies: List[CombatEnemy], card: dict,
+                   attack_count: int, skill_count: int,
+                   total_count: int) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
+    """打出卡牌时触发的遗物效果"""
+    logs = []
+    relic_ids = _relic_ids_for(player, 'on_card_played')
+    if relic_ids:
+        _fire('on_card_played', relic_ids, player, enemies, card, card.get('type', ''),
+              attack_count, skill_count, logs)
     # 铜鳞（bronze_scales）在受到攻击时反弹，这里在打出攻击时不触发
     # 叮铛：每次丢弃牌时对随机敌人造成3点伤害（在弃牌时触发）
-
     return player, enemies, logs
 
 
-def on_discard(player: dict, enemies: list, discarded_count: int) -> Tuple[dict, list, List[str]]:
-    """弃牌时触发的遗物效果"""
-    logs = []
-    relic_ids = {r['id'] for r in player.get('relics', [])}
-    import random
-
+# ===== 弃牌 =====
+@relic_handler('on_discard', 'tingsha')
+def _tingsha(player, enemies, discarded_count, logs):
     # 叮钹：每次丢弃牌对随机敌人造成3点伤害
-    if 'tingsha' in relic_ids and discarded_count > 0:
-        alive = [e for e in enemies if e.get('hp', 0) > 0]
-        if alive:
-            target = random.choice(alive)
-            target['hp'] = max(0, target['hp'] - 3 * discarded_count)
-            logs.append(f'🔔 遗物【叮钹】：对{target["name"]}造成{3*discarded_count}点伤害')
+    alive = [e for e in enemies if e.hp > 0]
+    if alive:
+        target = rng().choice(alive)
+        target.hp = max(0, target.hp - 3 * discarded_count)
+        logs.append(f'🔔 遗物【叮钹】：对{target.name}造成{3*discarded_count}点伤害')
+
 
+@relic_handler('on_discard', 'tough_bandages')
+def _tough_bandages(player, enemies, discarded_count, logs):
     # 坚韧绷带：每次丢弃牌时+3格挡
-    if 'tough_bandages' in relic_ids and discarded_count > 0:
-        block_gain = 3 * discarded_count
-        player['block'] = player.get('block', 0) + block_gain
-        logs.append(f'🩹 遗物【坚韧绷带】：格挡+{block_gain}')
+    block_gain = 3 * discarded_count
+    player.block += block_gain
+    logs.append(f'🩹 遗物【坚韧绷带】：格挡+{block_gain}')
 
+
+def on_discard(player: CombatPlayer, enemies: List[CombatEnemy],
+               discarded_count: int) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
+    """弃牌时触发的遗物效果"""
+    logs = []
+    if discarded_count > 0:
+        _fire('on_discard', _relic_ids_for(player, 'on_discard'), player, enemies, discarded_count, logs)
     return player, enemies, logs
 
 
-def on_combat_end(player: dict, is_victory: bool) -> Tuple[dict, List[str]]:
+# ===== 战斗结束（仅胜利时触发） =====
+@relic_handler('on_combat_end', 'burning_blood')
+def _burning_blood(player, logs):
+    # 燃烧之血：战斗胜利恢复6点HP
+    player.hp = min(player.max_hp, player.hp + 6)
+    logs.append('🔥 遗物【燃烧之血】：恢复6点HP')
+
+
+@relic_handler('on_combat_end', 'black_blood')
+def _black_blood(player, logs):
+    # 黑血：战斗胜利恢复12点HP（升级版）
+    player.hp = min(player.max_hp, player.hp + 12)
+    logs.append('🖤 遗物【黑血】：恢复12点HP')
+
+
+@relic_handler('on_combat_end', 'meat_on_the_bone')
+def _meat_on_the_bone(player, logs):
+    # 肉在骨头上：HP低于50%时恢复12HP（餐券在进入商店时处理）
+    if player.hp <= player.max_hp * 0.5:
+        player.hp = min(player.max_hp, player.hp + 12)
+        logs.append('🍖 遗物【骨头上的肉】：HP低，恢复12点HP')
+
+
+def on_combat_end(player: CombatPlayer, is_victory: bool) -> Tuple[CombatPlayer, List[str]]:
     """战斗结束时触发的遗物效果"""
     logs = []
-    relic_ids = {r['id'] for r in player.get('relics', [])}
-
     if is_victory:
-        # 燃烧之血：战斗胜利恢复6点HP
-        if 'burning_blood' in relic_ids:
-            player['hp'] = min(player['max_hp'], player['hp'] + 6)
-            logs.append('🔥 遗物【燃烧之血】：恢复6点HP')
-
-        # 黑血：战斗胜利恢复12点HP（升级版）
-        if 'black_blood' in relic_ids:
-            player['hp'] = min(player['max_hp'], player['hp'] + 12)
-            logs.append('🖤 遗物【黑血】：恢复12点HP')
-
-        # 餐券：进入商店恢复15HP（在进入商店时处理）
-        # 肉在骨头上：HP低于50%时恢复12HP
-        if 'meat_on_the_bone' in relic_ids:
-            if player['hp'] <= player['max_hp'] * 0.5:
-                player['hp'] = min(player['max_hp'], player['hp'] + 12)
-                logs.append('🍖 遗物【骨头上的肉】：HP低，恢复12点HP')
-
-    # 清理战斗临时状态
+        _fire('on_combat_end', _relic_ids_for(player, 'on_combat_end'), player, logs)
+
+    # 清理战斗临时状态（包括本场战斗的遗物触发索引）
     for key in ['_lantern_used', '_horn_cleat_active', '_calipers_block', '_flower_count',
-                '_nob_rage', '_pen_nib_used', '_art_of_war_ready', '_lizard_tail_used']:
+                '_nob_rage', '_pen_nib_used', '_art_of_war_ready', '_lizard_tail_used', '_relic_hooks']:
         player.pop(key, None)
 
     return player, logs
 
 
-def on_player_take_damage(player: dict, enemies: list, damage: int) -> Tuple[dict, list, List[str]]:
-    """玩家受到伤害时触发"""
-    logs = []
-    relic_ids = {r['id'] for r in player.get('relics', [])}
-
+# ===== 受到伤害 =====
+@relic_handler('on_player_take_damage', 'bronze_scales')
+def _bronze_scales(player, enemies, damage, logs):
     # 铜鳞：受到攻击时反弹3点伤害
-    if 'bronze_scales' in relic_ids and damage > 0:
+    if damage > 0:
         for e in enemies:
-            if e.get('hp', 0) > 0:
-                e['hp'] = max(0, e['hp'] - 3)
+            if e.hp > 0:
+                e.hp = max(0, e.hp - 3)
                 break
         logs.append('🐉 遗物【铜鳞】：反弹3点伤害')
 
+
+@relic_handler('on_player_take_damage', 'centennial_puzzle')
+def _centennial_puzzle(player, enemies, damage, logs):
     # 百年谜题：第一次每回合受伤时抽3张牌
-    if 'centennial_puzzle' in relic_ids and not player.get('_puzzle_triggered'):
-        player['_puzzle_triggered'] = True
+    if not player._puzzle_triggered:
+        player._puzzle_triggered = True
         from .combat import draw_cards
         draw_cards(player, 3)
         logs.append('🧩 遗物【百年谜题】：受伤，抽3张牌')
 
+
+def on_player_take_damage(player: CombatPlayer, enemies: List[CombatEnemy],
+                          damage: int) -> Tuple[CombatPlayer, List[CombatEnemy], List[str]]:
+    """玩家受到伤害时触发"""
+    logs = []
+    _fire('on_player_take_damage', _relic_ids_for(player, 'on_player_take_damage'), player, enemies, damage, logs)
     return player, enemies, logs
@@ -1,7 +1,7 @@
 """遗物系统"""
-import random
 from dataclasses import dataclass
 from typing import List, Optional
+from .rng import rng
 
 
 @dataclass
@@ -130,13 +130,13 @@ def get_starter_relic(character: str) -> dict:
 
 def get_boss_relic_choices(count: int = 3) -> List[dict]:
     boss_relics = [r for r in ALL_RELICS if r.rarity == 'boss']
-    selected = random.sample(boss_relics, min(count, len(boss_relics)))
+    selected = rng().sample(boss_relics, min(count, len(boss_relics)))
     return [r.to_dict() for r in selected]
 
 
 def get_shop_relics(count: int = 2) -> List[dict]:
     shop_pool = [r for r in ALL_RELICS if r.rarity in ('common', 'uncommon')]
-    selected = random.sample(shop_pool, min(count, len(shop_pool)))
+    selected = rng().sample(shop_pool, min(count, len(shop_pool)))
     return [r.to_dict() for r in selected]
 
 
@@ -145,4 +145,4 @@ def get_random_relic(rarity: str = None) -> dict:
         pool = [r for r in ALL_RELICS if r.rarity == rarity]
     else:
         pool = [r for r in ALL_RELICS if r.rarity in ('common', 'uncommon', 'rare')]
-    return random.choice(pool).to_dict() if pool else None
+    return rng().choice(pool).to_dict() if pool else None
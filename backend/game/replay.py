@@ -0,0 +1,222 @@
+"""动作日志回放（在 backend 目录下运行）
+
+一局游戏 = 创建参数（含种子）+ 被接受的动作序列，见 rng.py。回放即用同样的参数调用 create_new_game，
+再依次 apply_action，最后比较状态哈希；不经过 Flask 与数据库，可作为 combat.py 等改动的正确性基准与吞吐基准。
+
+语料为 JSON Lines，每行一局：{"game_id": ..., "log": [[seq, 动作, 参数], ...], "hash": 最终状态哈希}
+
+用法:
+    python -m game.replay export corpus.jsonl --limit 5000            # 从数据库导出已结束对局
+    python -m game.replay record corpus.jsonl --runs 2000 --policy greedy   # 用模拟器生成语料
+    python -m game.replay verify corpus.jsonl --repeat 3               # 回放校验并报告吞吐
+    python -m game.replay verify corpus.jsonl --profile combat.folded  # 同时采样战斗热路径
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional
+
+from . import codec, profiler
+from .actions import ActionError, apply_action
+from .cards import CARD_PILES, compact_card, expand_card
+from .state import create_new_game
+
+TERMINAL_PHASES = ('victory', 'game_over')
+
+# 不参与哈希的字段：随机 id、持久化版本号、可由遗物重建的索引
+_VOLATILE_STATE_KEYS = ('game_id', 'version')
+_VOLATILE_PLAYER_KEYS = ('id', '_relic_hooks')
+
+
+class ReplayError(Exception):
+    """回放与日志不一致（动作被拒绝或随机数步数对不上）"""
+
+    def __init__(self, message: str, seq: int = None):
+        super().__init__(message if seq is None else f'seq {seq}: {message}')
+        self.seq = seq
+
+
+def state_hash(state: dict) -> str:
+    """
+    状态的规范哈希（键排序后的紧凑 JSON 的 blake2b）。
+    牌堆中的牌先展开为完整字段：卡牌实例、存档中的紧凑 dict（如归档记录）与旧存档的完整 dict 哈希相同。
+    """
+    view = {k: v for k, v in state.items() if k not in _VOLATILE_STATE_KEYS}
+    if isinstance(view.get('player'), Mapping):
+        player = {k: v for k, v in view['player'].items() if k not in _VOLATILE_PLAYER_KEYS}
+        for pile in CARD_PILES:
+            if player.get(pile):
+                player[pile] = [expand_card(compact_card(c)) for c in player[pile]]
+        view['player'] = player
+    text = json.dumps(view, sort_keys=True, ensure_ascii=False, separators=(',', ':'),
+                      default=codec.to_builtin)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def replay(log: List[list]) -> dict:
+    """按日志 [[seq, 动作, 参数], ...] 重建一局，返回最终状态；第一条必须是 seq 0 的 new_game"""
+    if not log or log[0][0] != 0 or log[0][1] != 'new_game':
+        raise ReplayError('日志缺少创建游戏的记录')
+    state = create_new_game(**log[0][2])
+    with profiler.scope(state['game_id']):
+        for seq, name, params in log[1:]:
+            if state.get('rng_step') != seq:
+                raise ReplayError(f'随机数步数为 {state.get("rng_step")}，日志为 {seq}', seq)
+            try:
+                state, _ = apply_action(state, name, **params)
+            except ActionError as e:
+                raise ReplayError(f'{name} 被拒绝: {e.message}', seq) from e
+    return state
+
+
+def verify(record: dict) -> dict:
+    """回放一条语料并与记录的哈希比较"""
+    result = {'game_id': record.get('game_id'), 'actions': len(record['log']), 'expected': record.get('hash')}
+    try:
+        result['hash'] = state_hash(replay(record['log']))
+    except ReplayError as e:
+        result.update(ok=False, hash=None, error=str(e))
+        return result
+    result['ok'] = result['expected'] is None or result['hash'] == result['expected']
+    return result
+
+
+def record_from_db(game_id: str) -> Optional[dict]:
+    """把数据库中一局的动作日志转成语料记录（日志已清理时取归档中的日志；没有创建记录的旧对局返回 None）"""
+    from .db import get_action_log, get_archived_game
+    rows = get_action_log(game_id)
+    if not rows:
+        archived = get_archived_game(game_id)
+        log = archived['log'] if archived else []
+        if not log or log[0][0] != 0:
+            return None
+        return {'game_id': game_id, 'log': log, 'hash': archived['actions'].get('state_hash')}
+    if rows[0]['seq'] != 0:
+        return None
+    return {
+        'game_id': game_id,
+        'log': [[r['seq'], r['action'], r['params']] for r in rows],
+        'hash': rows[-1]['state_hash'],
+    }
+
+
+def record_from_sim(policy: str, character: str, ascension: int, seed: int, max_steps: int = 5000) -> dict:
+    """用模拟器打一局并记录动作日志"""
+    from .sim.runner import simulate_run
+    r = simulate_run(policy, character, ascension, seed, max_steps, record=True)
+    return {'game_id': f'sim-{policy}-{character}-{ascension}-{seed}', 'log': r['log'], 'hash': r['state_hash']}
+
+
+def load_corpus(path: str) -> Iterator[dict]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_corpus(path: str, records: Iterable[dict]) -> int:
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            count += 1
+    return count
+
+
+def _verify_chunk(records: List[dict]) -> List[dict]:
+    """子进程：回放一块语料"""
+    return [verify(r) for r in records]
+
+
+def verify_corpus(records: List[dict], workers: int = 1, chunk: int = 50) -> List[dict]:
+    """回放校验全部语料（workers > 1 时分块交给进程池），结果与输入同序"""
+    if workers <= 1:
+        return _verify_chunk(records)
+    chunks = [records[i:i + chunk] for i in range(0, len(records), chunk)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [r for part in pool.map(_verify_chunk, chunks) for r in part]
+
+
+def main():
+    from .sim.policies import POLICIES
+    from .state import CHARACTER_STATS
+
+    parser = argparse.ArgumentParser(description='文字肉鸽游戏动作日志回放')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('export', help='从数据库导出已结束对局的动作日志')
+    p.add_argument('corpus')
+    p.add_argument('--limit', type=int, default=None)
+
+    p = sub.add_parser('record', help='用模拟器生成语料（第 i 局种子为 seed + i，职业轮流）')
+    p.add_argument('corpus')
+    p.add_argument('--runs', type=int, default=1000)
+    p.add_argument('--policy', choices=sorted(POLICIES), default='greedy')
+    p.add_argument('--character', choices=sorted(CHARACTER_STATS) + ['all'], default='all')
+    p.add_argument('--ascension', type=int, default=0)
+    p.add_argument('--seed', type=int, default=0)
+
+    p = sub.add_parser('verify', help='回放语料、校验哈希并报告吞吐')
+    p.add_argument('corpus')
+    p.add_argument('--repeat', type=int, default=1, help='重复回放次数（取最快一次计吞吐）')
+    p.add_argument('--workers', type=int, default=1, help=f'进程数（本机 {os.cpu_count()} 核）')
+    p.add_argument('--json', action='store_true', help='摘要输出为单行 JSON')
+    p.add_argument('--profile', metavar='PATH', help='采样战斗热路径（仅 --workers 1），写出 collapsed stack 文件')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        from .db import get_replayable_games
+        records = (record_from_db(gid) for gid in get_replayable_games(args.limit))
+        count = write_corpus(args.corpus, (r for r in records if r is not None))
+        print(f'导出 {count} 局 → {args.corpus}')
+        return
+
+    if args.command == 'record':
+        characters = sorted(CHARACTER_STATS) if args.character == 'all' else [args.character]
+        records = (record_from_sim(args.policy, characters[i % len(characters)], args.ascension, args.seed + i)
+                   for i in range(args.runs))
+        count = write_corpus(args.corpus, records)
+        print(f'记录 {count} 局 → {args.corpus}')
+        return
+
+    records = list(load_corpus(args.corpus))
+    actions = sum(len(r['log']) for r in records)
+    best = None
+    if args.profile:
+        profiler.start(args.profile)
+    for _ in range(max(1, args.repeat)):
+        t0 = time.perf_counter()
+        results = verify_corpus(records, args.workers)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    if args.profile:
+        print(json.dumps(profiler.stop(), ensure_ascii=False), file=sys.stderr)
+    failed = [r for r in results if not r['ok']]
+    summary = {
+        'runs': len(records),
+        'actions': actions,
+        'failed': len(failed),
+        'unverified': sum(1 for r in results if r['expected'] is None),
+        'seconds': round(best, 3),
+        'runs_per_sec': round(len(records) / best, 1) if best > 0 else 0,
+        'actions_per_sec': round(actions / best) if best > 0 else 0,
+        'workers': args.workers,
+    }
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False))
+    else:
+        for r in failed[:20]:
+            print(f"不一致 {r['game_id']}: {r.get('error') or r['hash'] + ' != ' + r['expected']}", file=sys.stderr)
+        print(f"回放 {summary['runs']} 局 / {summary['actions']} 个动作，失败 {summary['failed']}，"
+              f"{summary['seconds']}s（{summary['runs_per_sec']:,} 局/秒，{summary['actions_per_sec']:,} 动作/秒）")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""每局独立的随机数 - 由 (种子, 步数) 派生，整局可复现、可回放
+
+游戏状态只保存 seed 与 rng_step 两个整数：每执行一个动作，用 (seed, rng_step) 派生一个
+random.Random，并递增 rng_step。同一种子 + 同一动作序列必然得到同一局游戏。
+游戏逻辑统一通过 rng() 取随机数；不在任何一局的上下文中时退回全局 random 模块。
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+_current: ContextVar[Optional[random.Random]] = ContextVar('game_rng', default=None)
+
+SEED_BITS = 63
+
+
+def rng():
+    """当前这一局的随机数生成器（不在一局的上下文中时为全局 random 模块）"""
+    r = _current.get()
+    return r if r is not None else random
+
+
+def new_seed() -> int:
+    """新游戏的种子（取自全局 random，便于整体播种的脚本复现）"""
+    return random.getrandbits(SEED_BITS)
+
+
+def derive(seed: int, step: int) -> random.Random:
+    """由 (种子, 步数) 派生独立的生成器"""
+    return random.Random(seed ^ (step << SEED_BITS))
+
+
+@contextmanager
+def use_rng(r: random.Random):
+    """在此上下文中 rng() 返回 r"""
+    token = _current.set(r)
+    try:
+        yield r
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def game_rng(state: dict):
+    """
+    为一次动作派生该局的生成器并递增 rng_step；动作抛出异常（被拒绝）时不消耗步数。
+    旧存档没有种子时补上。
+    """
+    if state.get('seed') is None:
+        state['seed'] = new_seed()
+    step = state.get('rng_step', 0)
+    state['rng_step'] = step + 1
+    try:
+        with use_rng(derive(state['seed'], step)) as r:
+            yield r
+    except BaseException:
+        state['rng_step'] = step
+        raise
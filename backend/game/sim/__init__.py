@@ -0,0 +1,5 @@
+"""无头模拟器 - 不经过 HTTP，用机器人策略批量跑完整局（平衡性分析、引擎压测）"""
+from .policies import POLICIES, Policy, make_policy
+from .runner import simulate_run, run_batch, summarize, timed_batch
+
+__all__ = ['POLICIES', 'Policy', 'make_policy', 'simulate_run', 'run_batch', 'summarize', 'timed_batch']
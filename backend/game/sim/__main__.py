@@ -0,0 +1,45 @@
+"""命令行入口（在 backend 目录下运行）
+
+用法:
+    python -m game.sim --runs 1000 --policy greedy
+    python -m game.sim --runs 300 --policy block --character all --ascension 5 --json
+    python -m game.sim --runs 500 --profile combat.folded    # 同时采样战斗热路径（见 game.profiler）
+"""
+import argparse
+import json
+import sys
+
+from .. import profiler
+from ..state import CHARACTER_STATS
+from .policies import POLICIES
+from .runner import timed_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文字肉鸽游戏无头模拟器')
+    parser.add_argument('--runs', type=int, default=1000)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='greedy')
+    parser.add_argument('--character', choices=sorted(CHARACTER_STATS) + ['all'], default='all')
+    parser.add_argument('--ascension', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0, help='第 i 局使用 seed + i')
+    parser.add_argument('--max-steps', type=int, default=5000)
+    parser.add_argument('--json', action='store_true', help='输出单行 JSON')
+    parser.add_argument('--profile', metavar='PATH', help='采样战斗热路径，写出 collapsed stack 文件')
+    args = parser.parse_args()
+
+    characters = sorted(CHARACTER_STATS) if args.character == 'all' else [args.character]
+    if args.profile:
+        profiler.start(args.profile)
+    summary = timed_batch(args.runs, policy=args.policy, characters=characters,
+                          ascension=args.ascension, seed=args.seed, max_steps=args.max_steps)
+    if args.profile:
+        print(json.dumps(profiler.stop(), ensure_ascii=False), file=sys.stderr)
+    summary.update(policy=args.policy, characters=characters, ascension=args.ascension)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False))
+    else:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""模拟器的机器人策略：根据当前状态选择下一个动作"""
+import random
+from typing import Dict, List, Optional, Tuple
+
+Decision = Tuple[str, dict]
+
+
+def playable_cards(player: dict) -> List[int]:
+    """能量足够且可以打出的手牌索引"""
+    energy = player.get('energy', 0)
+    return [i for i, c in enumerate(player.get('hand', []))
+            if not c.get('unplayable') and (not isinstance(c.get('cost', 0), int) or c.get('cost', 0) <= energy)]
+
+
+def alive_enemies(state: dict) -> List[dict]:
+    return [e for e in state['combat']['enemies'] if e.get('hp', 0) > 0]
+
+
+def card_damage(card: dict, enemy_count: int = 1) -> int:
+    """不计修正的预估伤害"""
+    dmg = card.get('damage', 0) * max(1, card.get('hits', 1))
+    return dmg * enemy_count if card.get('apply_to_all') else dmg
+
+
+def incoming_damage(state: dict) -> int:
+    """本回合敌人意图中的攻击总伤害"""
+    total = 0
+    for e in alive_enemies(state):
+        intent = e.get('intent') or {}
+        if intent.get('action', 'attack') == 'attack':
+            total += (intent.get('value', 0) + e.get('strength', 0)) * intent.get('times', 1)
+    return total
+
+
+class Policy:
+    """
+    策略基类：decide(state) 返回 (动作名, 参数)。
+    非战斗阶段给出通用的合理选择；子类主要重写 choose_card / card_score。
+    """
+    name = 'base'
+
+    def __init__(self, seed: Optional[int] = None):
+        # 策略自己的随机源，不影响游戏内的随机数
+        self.rng = random.Random(seed)
+
+    def decide(self, state: dict) -> Decision:
+        return getattr(self, 'on_' + state['phase'])(state)
+
+    def fallback(self, state: dict) -> Optional[Decision]:
+        """动作被拒绝时的退路（None 表示无法继续）"""
+        return {
+            'combat': ('end_turn', {}),
+            'shop': ('shop_leave', {}),
+            'card_reward': ('pick_card', {'skip': True}),
+            'rest': ('rest', {'action': 'heal'}),
+        }.get(state['phase'])
+
+    # ----- 战斗 -----
+    def choose_card(self, state: dict, playable: List[int]) -> Optional[Tuple[int, int]]:
+        """返回 (手牌索引, 存活敌人中的目标索引)，None 表示结束回合"""
+        raise NotImplementedError
+
+    def on_combat(self, state: dict) -> Decision:
+        player = state['player']
+        potions = player.get('potions', [])
+        if potions and player['hp'] <= player['max_hp'] * 0.3:
+            return 'use_potion', {'potion_index': 0, 'target_index': self.weakest_target(state)}
+        playable = playable_cards(player)
+        choice = self.choose_card(state, playable) if playable else None
+        if choice is None:
+            return 'end_turn', {}
+        card_index, target_index = choice
+        return 'play_card', {'card_index': card_index, 'target_index': target_index}
+
+    def weakest_target(self, state: dict) -> int:
+        alive = alive_enemies(state)
+        if not alive:
+            return 0
+        return min(range(len(alive)), key=lambda i: alive[i]['hp'] + alive[i].get('block', 0))
+
+    # ----- 战斗之外 -----
+    def card_score(self, card: dict) -> float:
+        return self.rng.random()
+
+    def on_map(self, state: dict) -> Decision:
+        return 'select_node', {'node_id': self.rng.choice(state['map']['available_nodes'])}
+
+    def on_card_reward(self, state: dict) -> Decision:
+        rewards = state.get('card_rewards') or []
+        if not rewards:
+            return 'pick_card', {'skip': True}
+        best = max(rewards, key=self.card_score)
+        return 'pick_card', {'card_id': best['id']}
+
+    def on_boss_relic(self, state: dict) -> Decision:
+        choices = state.get('boss_relic_choices') or []
+        return 'pick_relic', {'relic_id': self.rng.choice(choices)['id'] if choices else None}
+
+    def on_rest(self, state: dict) -> Decision:
+        player = state['player']
+        upgradeable = [c for c in player['deck'] if not c.get('upgraded')]
+        if player['hp'] < player['max_hp'] * 0.6 or not upgradeable:
+            return 'rest', {'action': 'heal'}
+        best = max(upgradeable, key=self.card_score)
+        return 'rest', {'action': 'upgrade', 'card_id': best['id']}
+
+    def on_shop(self, state: dict) -> Decision:
+        shop, player = state['shop'], state['player']
+        gold = player.get('gold', 0)
+        if player['hp'] < player['max_hp'] * 0.5 and gold >= shop.get('heal_price', 30):
+            return 'shop_heal', {}
+        affordable = [c for c in shop.get('cards', []) if shop['card_prices'].get(c['id'], 999) <= gold]
+        if affordable:
+            best = max(affordable, key=self.card_score)
+            if self.card_score(best) > 0.5:
+                return 'shop_buy_card', {'card_id': best['id']}
+        return 'shop_leave', {}
+
+    def on_event(self, state: dict) -> Decision:
+        return 'event_choose', {'choice_index': self.rng.randrange(len(state['event']['choices']))}
+
+
+class RandomPolicy(Policy):
+    """随机出牌：90% 概率打出一张随机可用的牌"""
+    name = 'random'
+
+    def choose_card(self, state, playable):
+        if self.rng.random() >= 0.9:
+            return None
+        return self.rng.choice(playable), self.rng.randrange(max(1, len(alive_enemies(state))))
+
+
+class GreedyDamagePolicy(Policy):
+    """优先打出预估伤害最高的牌，目标为血量最低的敌人；没有攻击牌时打出其他牌"""
+    name = 'greedy'
+
+    def choose_card(self, state, playable):
+        hand = state['player']['hand']
+        enemy_count = len(alive_enemies(state))
+        best = max(playable, key=lambda i: (card_damage(hand[i], enemy_count), -self._cost(hand[i])))
+        return best, self.weakest_target(state)
+
+    @staticmethod
+    def _cost(card: dict) -> int:
+        cost = card.get('cost', 0)
+        return cost if isinstance(cost, int) else 0
+
+    def card_score(self, card):
+        return card_damage(card) / 10 + card.get('strength_gain', 0) * 0.2
+
+
+class BlockFirstPolicy(GreedyDamagePolicy):
+    """敌人意图的伤害超过当前格挡时先出格挡最高的牌，否则按贪心伤害出牌"""
+    name = 'block'
+
+    def choose_card(self, state, playable):
+        hand = state['player']['hand']
+        if incoming_damage(state) > state['player'].get('block', 0):
+            blockers = [i for i in playable if hand[i].get('block', 0) > 0]
+            if blockers:
+                return max(blockers, key=lambda i: hand[i]['block']), self.weakest_target(state)
+        return super().choose_card(state, playable)
+
+    def card_score(self, card):
+        return card.get('block', 0) / 8 + card_damage(card) / 20
+
+
+POLICIES: Dict[str, type] = {p.name: p for p in (RandomPolicy, GreedyDamagePolicy, BlockFirstPolicy)}
+
+
+def make_policy(name: str, seed: Optional[int] = None) -> Policy:
+    if name not in POLICIES:
+        raise ValueError(f'未知策略: {name}（可选: {", ".join(POLICIES)}）')
+    return POLICIES[name](seed)
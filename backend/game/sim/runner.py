@@ -0,0 +1,111 @@
+"""整局模拟：用策略驱动 game.actions，直到胜利、失败或超出步数"""
+import time
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from .. import profiler
+from ..actions import ActionError, apply_action
+from ..relic_effects import strict_relics
+from ..replay import TERMINAL_PHASES, state_hash
+from ..state import create_new_game
+from .policies import make_policy
+
+
+def simulate_run(policy: str = 'greedy', character: str = 'warrior', ascension: int = 0,
+                 seed: Optional[int] = None, max_steps: int = 5000, record: bool = False) -> dict:
+    """
+    模拟一整局，返回结果摘要（outcome 为 victory / defeat / stuck / timeout）。
+    record=True 时附带动作日志 log 与最终状态哈希 state_hash（格式见 game.replay）。
+    """
+    bot = make_policy(policy, seed)
+    state = create_new_game(character, f'bot-{policy}', ascension, seed=seed)
+    log = [[0, 'new_game', {'character': character, 'player_name': f'bot-{policy}',
+                            'ascension': ascension, 'seed': state['seed']}]] if record else None
+    steps = rejected = 0
+    outcome = 'timeout'
+    actions = Counter()
+
+    # 模拟中遗物出错直接抛出，而不是像线上那样记录后跳过
+    with profiler.scope(state['game_id']), strict_relics():
+        while steps < max_steps:
+            if state['phase'] in TERMINAL_PHASES:
+                outcome = 'victory' if state['phase'] == 'victory' else 'defeat'
+                break
+            name, params = bot.decide(state)
+            try:
+                state, _ = apply_action(state, name, **params)
+            except ActionError:
+                rejected += 1
+                decision = bot.fallback(state)
+                if decision is None:
+                    outcome = 'stuck'
+                    break
+                name, params = decision
+                state, _ = apply_action(state, name, **params)
+            if record:
+                log.append([state['rng_step'] - 1, name, {k: v for k, v in params.items() if v is not None}])
+            actions[name] += 1
+            steps += 1
+
+    player = state['player']
+    result = {
+        'seed': seed,
+        'policy': policy,
+        'character': character,
+        'ascension': ascension,
+        'outcome': outcome,
+        'floor': player.get('floor', 0),
+        'act': state.get('map', {}).get('act', 1) if state.get('map') else 1,
+        'hp': player.get('hp', 0),
+        'max_hp': player.get('max_hp', 0),
+        'turns': player.get('turns', 0),
+        'cards_played': player.get('cards_played', 0),
+        'damage_dealt': player.get('damage_dealt', 0),
+        'damage_taken': player.get('damage_taken', 0),
+        'deck_size': len(player.get('deck', [])),
+        'relics': len(player.get('relics', [])),
+        'deck': [c['id'] for c in player.get('deck', [])],
+        'relic_ids': [r['id'] for r in player.get('relics', [])],
+        'steps': steps,
+        'rejected': rejected,
+        'actions': dict(actions),
+    }
+    if record:
+        result['log'] = log
+        result['state_hash'] = state_hash(state)
+    return result
+
+
+def run_batch(runs: int, policy: str = 'greedy', characters: Iterable[str] = ('warrior',),
+              ascension: int = 0, seed: int = 0, max_steps: int = 5000) -> List[dict]:
+    """顺序模拟 runs 局（职业轮流），第 i 局的种子为 seed + i"""
+    characters = list(characters)
+    return [simulate_run(policy, characters[i % len(characters)], ascension, seed + i, max_steps)
+            for i in range(runs)]
+
+
+def summarize(results: List[dict], seconds: Optional[float] = None) -> dict:
+    """汇总胜率、平均楼层、楼层分布"""
+    n = len(results)
+    outcomes = Counter(r['outcome'] for r in results)
+    summary = {
+        'runs': n,
+        'outcomes': dict(outcomes),
+        'win_rate': round(outcomes['victory'] / n * 100, 1) if n else 0,
+        'avg_floor': round(sum(r['floor'] for r in results) / n, 2) if n else 0,
+        'avg_turns': round(sum(r['turns'] for r in results) / n, 1) if n else 0,
+        'avg_steps': round(sum(r['steps'] for r in results) / n, 1) if n else 0,
+        'floors': dict(sorted(Counter(r['floor'] for r in results).items())),
+    }
+    if seconds is not None:
+        summary['seconds'] = round(seconds, 2)
+        summary['runs_per_min'] = round(n / seconds * 60) if seconds > 0 else 0
+        summary['actions_per_sec'] = round(sum(r['steps'] for r in results) / seconds) if seconds > 0 else 0
+    return summary
+
+
+def timed_batch(runs: int, **kwargs) -> dict:
+    """模拟并汇总（含吞吐）"""
+    t0 = time.perf_counter()
+    results = run_batch(runs, **kwargs)
+    return summarize(results, time.perf_counter() - t0)
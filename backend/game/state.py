@@ -1,13 +1,13 @@
 """游戏状态管理 - V3: 天赋难度系统 + 完整遗物集成"""
-import copy
-import random
 import uuid
 from typing import Dict, List, Optional
 
-from .cards import get_starter_deck, get_card_rewards
+from .rng import rng, new_seed, derive, use_rng
+from .cards import get_starter_deck, get_card_rewards, make_card, compact_card, upgrade_card
 from .relics import get_starter_relic, get_boss_relic_choices
 from .map_gen import generate_map, get_next_available_nodes
 from .enemies import create_enemy
+from .combatants import CombatPlayer, CombatEnemy, release_player
 
 
 CHARACTER_STATS = {
@@ -45,24 +45,30 @@ ASCENSION_INFO = {
 }
 
 
-def create_new_game(character: str, player_name: str = 'Hero', ascension: int = 0) -> Dict:
-    """创建新游戏状态"""
+def create_new_game(character: str, player_name: str = 'Hero', ascension: int = 0,
+                    seed: Optional[int] = None) -> Dict:
+    """创建新游戏状态（同一种子 + 同一动作序列可完整复现一局；seed 为空时随机生成）"""
+    if seed is None:
+        seed = new_seed()
+    with use_rng(derive(seed, 0)):
+        game_state = _new_game_state(character, player_name, ascension)
+    game_state['seed'] = seed
+    game_state['rng_step'] = 1
+    return game_state
+
+
+def _new_game_state(character: str, player_name: str, ascension: int) -> Dict:
     stats = CHARACTER_STATS.get(character, CHARACTER_STATS['warrior'])
     starter_deck = get_starter_deck(character)
     starter_relic = get_starter_relic(character)
 
     # 天赋5：起手加入1张伤口牌
     if ascension >= 5:
-        wound_card = {
-            'id': 'wound', 'name': '伤口', 'description': '无法打出。',
-            'cost': 1, 'type': 'curse', 'character': 'common', 'rarity': 'curse',
-            'damage': 0, 'block': 0, 'unplayable': True, 'exhaust': False,
-        }
-        starter_deck.append(wound_card)
+        starter_deck.append(make_card('wound', unplayable=True))
 
     # 洗牌
     shuffled_deck = starter_deck[:]
-    random.shuffle(shuffled_deck)
+    rng().shuffle(shuffled_deck)
 
     player = {
         'id': str(uuid.uuid4()),
@@ -145,7 +151,10 @@ def init_combat(game_state: Dict, node_type: str, floor: int) -> Dict:
     from .enemies import create_enemy
     from .combat import start_player_turn
 
+    # 战斗期间玩家与敌人使用 __slots__ 实体，战斗结束（胜利或失败）时转回 dict
     player = game_state['player']
+    if not isinstance(player, CombatPlayer):
+        player = game_state['player'] = CombatPlayer.from_dict(player)
     ascension = game_state.get('ascension', 0)
 
     # 重置战斗状态
@@ -153,8 +162,9 @@ def init_combat(game_state: Dict, node_type: str, floor: int) -> Dict:
     player['_combat_turn'] = 1
 
     # 重置手牌：从 deck（权威牌组）重建抽牌堆，确保升级效果生效
-    all_cards = copy.deepcopy(player['deck'])
-    random.shuffle(all_cards)
+    # 卡牌实例只含标量覆盖字段，逐张浅拷贝即可（战斗中的修改不影响牌组）
+    all_cards = [card.copy() for card in player['deck']]
+    rng().shuffle(all_cards)
     player['hand'] = []
     player['discard_pile'] = []
     player['draw_pile'] = all_cards
@@ -168,17 +178,17 @@ def init_combat(game_state: Dict, node_type: str, floor: int) -> Dict:
     enemies = []
     if node_type == 'boss':
         enemy = create_enemy('boss', floor)
-        enemies.append(enemy.to_dict())
+        enemies.append(CombatEnemy.from_dict(enemy.to_dict()))
     elif node_type == 'elite':
         enemy = create_enemy('elite', floor)
-        enemies.append(enemy.to_dict())
+        enemies.append(CombatEnemy.from_dict(enemy.to_dict()))
     else:
         # 天赋1+：更多可能出现2个敌人
         two_enemy_weight = 40 + ascension * 5
-        num_enemies = random.choices([1, 2], weights=[100 - two_enemy_weight, two_enemy_weight])[0]
+        num_enemies = rng().choices([1, 2], weights=[100 - two_enemy_weight, two_enemy_weight])[0]
         for _ in range(num_enemies):
             enemy = create_enemy('normal', floor)
-            enemies.append(enemy.to_dict())
+            enemies.append(CombatEnemy.from_dict(enemy.to_dict()))
 
     # 天赋难度：缩放敌人属性
     if ascension >= 2:
@@ -215,12 +225,9 @@ def init_combat(game_state: Dict, node_type: str, floor: int) -> Dict:
     game_state['phase'] = 'combat'
 
     # 遗物触发：战斗开始
-    try:
-        from .relic_effects import on_combat_start
-        player, enemies, relic_logs = on_combat_start(player, enemies)
-        combat['log'].extend(relic_logs)
-    except Exception:
-        pass
+    from .relic_effects import on_combat_start
+    player, enemies, relic_logs = on_combat_start(player, enemies)
+    combat['log'].extend(relic_logs)
 
     # 开始第一回合（传入enemies以触发汞沙漏等遗物）
     player, enemies, start_logs = start_player_turn(player, enemies)
@@ -243,9 +250,9 @@ def end_combat_victory(game_state: Dict) -> Dict:
     # 金币奖励
     ascension = game_state.get('ascension', 0)
     base_gold = {
-        'monster': random.randint(10, 20),
-        'elite': random.randint(25, 35),
-        'boss': random.randint(95, 105),
+        'monster': rng().randint(10, 20),
+        'elite': rng().randint(25, 35),
+        'boss': rng().randint(95, 105),
     }.get(node_type, 10)
 
     # 天赋模式略微降低金币
@@ -261,12 +268,10 @@ def end_combat_victory(game_state: Dict) -> Dict:
     player['gold_earned'] = player.get('gold_earned', 0) + base_gold
 
     # 遗物触发：战斗结束
-    try:
-        from .relic_effects import on_combat_end
-        player, relic_logs = on_combat_end(player, is_victory=True)
-        # 日志会在下一次响应中显示
-    except Exception:
-        pass
+    from .relic_effects import on_combat_end
+    player, relic_logs = on_combat_end(player, is_victory=True)
+    # 日志会在下一次响应中显示
+    player = game_state['player'] = release_player(player)
 
     # 地图楼层推进
     player['floor'] += 1
@@ -334,22 +339,11 @@ def select_boss_relic(game_state: Dict, relic_id: str) -> Dict:
     # ---- Boss遗物特殊效果 ----
     if relic_id == 'astrolabe':
         # 星盘：随机升级牌组中3张未升级的牌
-        import re as _re
         deck = player.get('deck', [])
         upgradeable = [c for c in deck if not c.get('upgraded')]
-        chosen = random.sample(upgradeable, min(3, len(upgradeable)))
+        chosen = rng().sample(upgradeable, min(3, len(upgradeable)))
         for card in chosen:
-            card['upgraded'] = True
-            card['name'] = card['name'] + '+'
-            if card.get('damage'): card['damage'] = int(card['damage'] * 1.3) + 2
-            if card.get('block'):  card['block']  = int(card['block']  * 1.3) + 2
-            if card.get('cost', 1) > 0: card['cost'] = max(0, card['cost'] - 1)
-            desc = card.get('description', '')
-            if card.get('damage', 0) > 0 and '伤害' in desc:
-                desc = _re.sub(r'\d+(?=点伤害)', str(card['damage']), desc, count=1)
-            if card.get('block', 0) > 0 and '格挡' in desc:
-                desc = _re.sub(r'\d+(?=点格挡)', str(card['block']), desc, count=1)
-            card['description'] = desc
+            upgrade_card(card)
         game_state['message'] = f'⭐ 星盘：升级了 {len(chosen)} 张牌！'
 
     elif relic_id == 'pandoras_box':
@@ -362,7 +356,7 @@ def select_boss_relic(game_state: Dict, relic_id: str) -> Dict:
         starter_count = len(deck) - len(non_starter)
         if starter_count > 0:
             replacements = get_card_rewards(character, player.get('floor', 1), starter_count)
-            player['deck'] = non_starter + replacements
+            player['deck'] = non_starter + [compact_card(c) for c in replacements]
             game_state['message'] = f'📦 潘多拉魔盒：{starter_count}张起始牌被替换！'
 
     elif relic_id == 'black_blood':
@@ -0,0 +1,355 @@
+"""游戏状态热缓存 - LRU 内存缓存 + 后台批量写回（write-behind）"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 进入这些阶段时视为关键状态：崩溃安全模式下同步落盘
+CRITICAL_PHASES = ('game_over', 'victory')
+
+
+class StaleStateError(Exception):
+    """写入时数据库中的版本已被其他进程/请求更新（乐观并发冲突）"""
+
+    def __init__(self, game_id: str):
+        super().__init__(f'游戏 {game_id} 的状态已过期')
+        self.game_id = game_id
+
+
+class _Entry:
+    __slots__ = ('state', 'phase', 'size', 'dirty_gen', 'flushed_gen', 'persisted_version', 'base', 'touched')
+
+    def __init__(self, state: dict, size: int, persisted_version: int, base: Any = None):
+        self.state = state
+        self.phase = state.get('phase')
+        self.size = size
+        self.dirty_gen = 0    # 每次 save 递增
+        self.flushed_gen = 0  # 已写入数据库的 dirty_gen
+        self.persisted_version = persisted_version  # 数据库中的 version，写回时作为条件
+        self.base = base  # 编码器的增量基准（对应 persisted_version 时的状态），None 表示未知
+        self.touched = time.monotonic()
+
+    @property
+    def dirty(self) -> bool:
+        return self.dirty_gen != self.flushed_gen
+
+
+class StateCache:
+    """
+    按 game_id 缓存活跃游戏状态。
+    读：命中时直接返回内存中的 state（调用方用 lock_for(game_id) 串行化同一局的修改）。
+    写：save 只标记脏，由后台线程每 flush_interval_ms 批量写回；
+        阶段变化时立即唤醒写回线程，崩溃安全模式下关键阶段同步写回；
+        flush_interval_ms <= 0 时退化为同步写穿。
+    同步写回失败时异常抛给调用方；后台写回失败的条目保持为脏，下一批次重试。
+    single_writer=True 时所有写入都由写回线程完成（SQLite 只有一个写入者）：关键阶段不再在请求线程中
+    同步写回，而是立即唤醒写回线程；其他写入（如排行榜记录）用 submit 交给写回线程，与状态写回串行执行。
+    encoder(state, base) 在该局的锁内把状态序列化为写入数据，base 为上次写入后的增量基准；
+    writer(items) 接收 [(game_id, 写入数据, 期望的数据库 version)]，在一个事务里写入，
+    返回 ({game_id: 状态字节数}, [版本冲突的 game_id])。冲突的条目会被丢弃，下次从数据库重新加载。
+    写入成功后，写入数据的 next_base 属性成为该局新的增量基准。
+    """
+
+    def __init__(self, writer: Callable[[List[Tuple[str, Any, int]]], Tuple[Dict[str, int], List[str]]],
+                 encoder: Callable[[dict, Any], Any],
+                 lock_for: Optional[Callable[[str], Any]] = None,
+                 max_entries: int = 2000, max_bytes: int = 64 * 1024 * 1024,
+                 flush_interval_ms: int = 200, crash_safe: bool = True, single_writer: bool = False):
+        self._writer = writer
+        self._encoder = encoder
+        self._lock_for = lock_for
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval_ms / 1000
+        self.crash_safe = crash_safe
+        self.single_writer = single_writer and flush_interval_ms > 0
+        self._jobs = deque()  # submit 提交的 (fn, Future)，由写回线程依次执行
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # 同一时间只有一个写回批次
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid = None
+        self._stats = {
+            'hits': 0, 'misses': 0, 'evictions': 0, 'evict_deferred': 0,
+            'flushes': 0, 'flushed_states': 0, 'flushed_bytes': 0,
+            'sync_flushes': 0, 'flush_errors': 0, 'stale_writes': 0, 'jobs': 0, 'job_errors': 0,
+        }
+        atexit.register(self.flush)
+
+    # ----- 读写 -----
+    def get(self, game_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(game_id)
+            entry.touched = time.monotonic()
+            self._stats['hits'] += 1
+            return entry.state
+
+    def persisted_version(self, game_id: str) -> Optional[int]:
+        """缓存条目对应的数据库版本（写回时的条件）；不在缓存中时为 None"""
+        with self._lock:
+            entry = self._entries.get(game_id)
+            return entry.persisted_version if entry is not None else None
+
+    def put(self, game_id: str, state: dict, size: int = 0, base: Any = None):
+        """放入从数据库加载的干净状态（base 为其增量基准）"""
+        with self._lock:
+            if game_id in self._entries:
+                return
+            entry = _Entry(state, size or self._avg_size(), state.get('version', 0), base)
+            self._entries[game_id] = entry
+            self._bytes += entry.size
+        self._evict()
+
+    def save(self, game_id: str, state: dict):
+        """标记状态已修改（调用方已递增 state['version']）；按阶段决定同步写回或交给后台线程"""
+        phase = state.get('phase')
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                # 新游戏，或干净时被淘汰的条目：数据库中就是修改前的版本
+                entry = _Entry(state, self._avg_size(), state.get('version', 1) - 1)
+                self._entries[game_id] = entry
+                self._bytes += entry.size
+            else:
+                self._entries.move_to_end(game_id)
+                entry.state = state
+            phase_changed = entry.phase != phase
+            entry.phase = phase
+            entry.dirty_gen += 1
+            entry.touched = time.monotonic()
+
+        critical = self.crash_safe and phase in CRITICAL_PHASES
+        if self.single_writer:
+            self._ensure_flusher()
+            if phase_changed or critical:
+                self._wakeup.set()
+        elif self.flush_interval <= 0 or critical:
+            with self._lock:
+                self._stats['sync_flushes'] += 1
+            # 没有后台线程兜底：写入失败时异常交给调用方（请求报错，本次保存不算成功）
+            _, stale = self._flush([game_id], raise_errors=True)
+            if game_id in stale:
+                raise StaleStateError(game_id)
+        else:
+            self._ensure_flusher()
+            if phase_changed:
+                self._wakeup.set()
+        self._evict()
+
+    def dirty_state(self, game_id: str) -> Optional[dict]:
+        """该局有尚未写入数据库的修改时返回缓存中的状态，否则 None（不计入命中统计）"""
+        with self._lock:
+            entry = self._entries.get(game_id)
+            return entry.state if entry is not None and entry.dirty else None
+
+    def restore(self, game_id: str, state: dict) -> bool:
+        """
+        把条目换回之前的状态（请求中途出错时回滚本次动作），该状态仍标记为待写回。
+        条目已不在缓存中，或数据库中已是该版本或更新的版本时不做修改，返回 False。
+        """
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None or entry.persisted_version >= state.get('version', 0):
+                return False
+            entry.state = state
+            entry.phase = state.get('phase')
+            entry.dirty_gen += 1
+            entry.touched = time.monotonic()
+            return True
+
+    def discard(self, game_id: str):
+        """丢弃缓存（不写回），用于请求中途出错的状态"""
+        with self._lock:
+            entry = self._entries.pop(game_id, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def drop_idle(self, idle_seconds: float) -> int:
+        """移除超过 idle_seconds 未访问的干净条目"""
+        cutoff = time.monotonic() - idle_seconds
+        removed = 0
+        with self._lock:
+            for game_id in [gid for gid, e in self._entries.items()
+                            if e.touched < cutoff and not e.dirty]:
+                self._bytes -= self._entries.pop(game_id).size
+                removed += 1
+        return removed
+
+    # ----- 写回 -----
+    def flush(self, game_ids: Optional[List[str]] = None) -> int:
+        """把脏状态写入数据库（并执行已提交的写入任务），返回写入条数"""
+        written = self._flush(game_ids)[0]
+        self._run_jobs()
+        return written
+
+    def submit(self, fn: Callable[[], Any]) -> Future:
+        """把一个写入任务交给写回线程执行（single_writer 时）；否则在当前线程直接执行"""
+        future = Future()
+        if not self.single_writer:
+            self._run_job(fn, future)
+            return future
+        self._jobs.append((fn, future))
+        self._ensure_flusher()
+        self._wakeup.set()
+        return future
+
+    def _run_jobs(self):
+        while self._jobs:
+            try:
+                fn, future = self._jobs.popleft()
+            except IndexError:
+                return
+            self._run_job(fn, future)
+
+    def _run_job(self, fn: Callable[[], Any], future: Future):
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            with self._lock:
+                self._stats['job_errors'] += 1
+            logger.exception('写入任务失败')
+            future.set_exception(e)
+        with self._lock:
+            self._stats['jobs'] += 1
+
+    def _flush(self, game_ids: Optional[List[str]] = None, raise_errors: bool = False) -> Tuple[int, List[str]]:
+        """写回脏条目；写入失败时条目保持脏状态等待下一批次重试，raise_errors 时再把异常抛给调用方"""
+        with self._lock:
+            ids = game_ids if game_ids is not None else list(self._entries)
+            picked = [(gid, self._entries[gid]) for gid in ids
+                      if gid in self._entries and self._entries[gid].dirty]
+        if not picked:
+            return 0, []
+
+        # 在各局的锁内序列化，避免与正在修改该局的请求交错
+        encoded = []
+        for game_id, entry in picked:
+            with self._lock_for(game_id) if self._lock_for else nullcontext():
+                gen = entry.dirty_gen
+                version = entry.state.get('version', 0)
+                data = self._encoder(entry.state, entry.base)
+            encoded.append((game_id, entry, gen, version, data))
+
+        with self._flush_lock:
+            batch = []
+            with self._lock:
+                for game_id, entry, gen, version, data in encoded:
+                    # 已被丢弃，或更新的版本已由另一批次写入
+                    if self._entries.get(game_id) is not entry or version <= entry.persisted_version:
+                        continue
+                    batch.append((game_id, entry, gen, version, data, entry.persisted_version))
+            if not batch:
+                return 0, []
+            try:
+                sizes, stale = self._writer([(game_id, data, base) for game_id, _, _, _, data, base in batch])
+            except Exception:
+                # flushed_gen 未推进，条目仍是脏的；后台线程下一批次重试
+                with self._lock:
+                    self._stats['flush_errors'] += 1
+                if raise_errors:
+                    raise
+                logger.exception('游戏状态写回失败（%d 条），稍后重试', len(batch))
+                self._ensure_flusher()
+                return 0, []
+            with self._lock:
+                for game_id, entry, gen, version, data, _ in batch:
+                    if game_id in stale:
+                        if self._entries.get(game_id) is entry:
+                            del self._entries[game_id]
+                            self._bytes -= entry.size
+                        continue
+                    entry.flushed_gen = max(entry.flushed_gen, gen)
+                    entry.persisted_version = max(entry.persisted_version, version)
+                    entry.base = getattr(data, 'next_base', None)
+                    size = sizes.get(game_id)
+                    if size:
+                        if self._entries.get(game_id) is entry:
+                            self._bytes += size - entry.size
+                        entry.size = size
+                        self._stats['flushed_bytes'] += size
+                written = len(batch) - len(stale)
+                self._stats['flushes'] += 1
+                self._stats['flushed_states'] += written
+                self._stats['stale_writes'] += len(stale)
+            if stale:
+                logger.warning('游戏状态版本冲突，已丢弃缓存: %s', ', '.join(stale))
+            return written, list(stale)
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _ensure_flusher(self):
+        if self.flush_interval <= 0:
+            return
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._flush_loop, name='state-cache-flusher', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    # ----- 容量控制 -----
+    def _avg_size(self) -> int:
+        if not self._entries:
+            return 16 * 1024
+        return max(1, self._bytes // len(self._entries))
+
+    def _evict(self):
+        """超出条目数或内存预算时淘汰最久未用的干净条目；脏条目交给写回线程，写回后再淘汰"""
+        with self._lock:
+            over_count = len(self._entries) - self.max_entries
+            over_bytes = self._bytes - self.max_bytes
+            if over_count <= 0 and over_bytes <= 0:
+                return
+            victims = []
+            for game_id, entry in self._entries.items():
+                if (over_count <= 0 and over_bytes <= 0) or len(self._entries) - len(victims) <= 1:
+                    break
+                if entry.dirty:
+                    continue
+                victims.append(game_id)
+                over_count -= 1
+                over_bytes -= entry.size
+            for game_id in victims:
+                self._bytes -= self._entries.pop(game_id).size
+            self._stats['evictions'] += len(victims)
+            deferred = (over_count > 0 or over_bytes > 0) and len(self._entries) > 1
+            if deferred:
+                self._stats['evict_deferred'] += 1
+        if deferred:
+            self._ensure_flusher()
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['dirty'] = sum(1 for e in self._entries.values() if e.dirty)
+            stats['bytes'] = self._bytes
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        stats['flush_interval_ms'] = int(self.flush_interval * 1000)
+        stats['crash_safe'] = self.crash_safe
+        stats['single_writer'] = self.single_writer
+        stats['pending_jobs'] = len(self._jobs)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        return stats
@@ -0,0 +1,110 @@
+"""存档维护命令（在 backend 目录下运行，DB_PATH 指向要操作的数据库）
+
+用法:
+    python -m game.storage stats                       # 各格式行数/字节数，抽样压缩率与解码耗时
+    python -m game.storage train --samples 2000        # 用最近的对局训练 zstd 共享字典
+    python -m game.storage recompress --limit 5000     # 按当前 STATE_FORMAT 重写已有快照
+    python -m game.storage plans                       # 排行榜各查询模式的执行计划（有全表扫描或额外排序时退出码为 1）
+    python -m game.storage vacuum                      # 旧库转换为 auto_vacuum=INCREMENTAL（整库 VACUUM，需停服）
+    python -m game.storage archive                     # 归档统计（games_archive）
+    python -m game.storage archive --export runs.jsonl --since 2024-01-01   # 导出解压后的归档记录供分析
+    python -m game.storage archive --game-id <id>      # 查看一局的归档记录
+
+训练后新写入的快照（STATE_FORMAT=zstd）使用新字典；旧存档记录了各自的格式与字典 id，照常读取。
+"""
+import argparse
+import json
+
+from . import codec, db
+
+
+def recompress(limit: int = None) -> int:
+    """把旧格式的快照按当前格式重写（只改存档编码，不改版本号与增量）"""
+    rewritten = 0
+    with db._get_conn() as conn:
+        rows = conn.execute('SELECT game_id, state_json FROM games LIMIT ?',
+                            (limit if limit is not None else -1,)).fetchall()
+        for row in rows:
+            value = row['state_json']
+            if codec.is_current_format(value):
+                continue
+            state = codec.decode_state(value)
+            conn.execute('UPDATE games SET state_json = ? WHERE game_id = ? AND state_json = ?',
+                         (codec.encode_state(state), row['game_id'], value))
+            rewritten += 1
+        conn.commit()
+    return rewritten
+
+
+def check_plans(plans: dict) -> list:
+    """没有走索引或需要临时排序的查询模式"""
+    return [name for name, details in plans.items()
+            if any('TEMP B-TREE' in d or (d.startswith('SCAN') and 'USING' not in d) for d in details)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文字肉鸽游戏存档维护')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('stats', help='存档格式、压缩率与解码耗时')
+    p.add_argument('--sample', type=int, default=200, help='抽样解码的行数')
+
+    p = sub.add_parser('train', help='训练并启用新的 zstd 共享字典')
+    p.add_argument('--samples', type=int, default=2000, help='取最近多少局作为样本')
+    p.add_argument('--size', type=int, default=64 * 1024, help='字典字节数')
+
+    p = sub.add_parser('recompress', help='按当前 STATE_FORMAT 重写快照')
+    p.add_argument('--limit', type=int, default=None)
+
+    sub.add_parser('plans', help='排行榜查询的执行计划检查')
+    sub.add_parser('vacuum', help='启用增量 vacuum 并整理数据库')
+
+    p = sub.add_parser('archive', help='已结束对局的归档统计 / 导出')
+    p.add_argument('--export', metavar='PATH', help='把归档记录导出为 JSON Lines')
+    p.add_argument('--since', default=None, help='只导出该时间（ISO，UTC）之后结束的对局')
+    p.add_argument('--limit', type=int, default=None)
+    p.add_argument('--game-id', default=None, help='打印一局的归档记录')
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        print(json.dumps(db.get_storage_stats(args.sample), ensure_ascii=False, indent=2))
+    elif args.command == 'plans':
+        plans = db.leaderboard_query_plans()
+        for name, details in plans.items():
+            print(f'{name:<22}' + '; '.join(details))
+        bad = check_plans(plans)
+        if bad:
+            raise SystemExit(f"以下查询没有走索引或需要额外排序: {', '.join(bad)}")
+    elif args.command == 'archive':
+        if args.game_id:
+            record = db.get_archived_game(args.game_id)
+            if record is None:
+                raise SystemExit(f'没有归档记录: {args.game_id}')
+            print(json.dumps(record, ensure_ascii=False, indent=2))
+        elif args.export:
+            count = 0
+            with open(args.export, 'w', encoding='utf-8') as f:
+                for record in db.iter_archived_games(args.since, args.limit):
+                    f.write(codec.dumps(record) + '\n')
+                    count += 1
+            print(f'导出 {count} 局 → {args.export}')
+        else:
+            print(json.dumps(db.get_archive_stats(), ensure_ascii=False, indent=2))
+    elif args.command == 'vacuum':
+        with db._get_conn() as conn:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        print(f'auto_vacuum = {mode}（2 为 INCREMENTAL）')
+    elif args.command == 'train':
+        samples = db.sample_state_texts(args.samples)
+        if len(samples) < 10:
+            parser.error(f'样本太少（{len(samples)} 局），至少需要 10 局')
+        dict_id = db.save_state_dictionary(codec.train_dictionary(samples, args.size), len(samples))
+        print(f'字典 {dict_id}：{len(samples)} 局样本，{args.size} 字节')
+    else:
+        print(f'重写 {recompress(args.limit)} 个快照（格式 {codec.STATE_FORMAT}）')
+
+
+if __name__ == '__main__':
+    main()
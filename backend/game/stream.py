@@ -0,0 +1,129 @@
+"""服务端推送（SSE）- 进程内按局的订阅与发布
+
+每个被接受的动作提交后向该局的订阅者推送：
+    log    {version, phase, lines}   日志按阶段分段（action / enemy_turn / player_turn），客户端可逐段播放
+    patch  {version, base_version, patch, ...附加字段}   与差量响应相同的 JSON Patch
+连接建立时先推送 state（完整视图）或 hello（客户端版本已是最新）。state / hello / patch 事件的 id
+为状态版本，断线重连时浏览器带上 Last-Event-ID，据此决定是否需要重发完整视图。
+事件在发布时即序列化，之后状态再被修改也不影响已排队的事件。
+订阅只在本进程内有效：多进程部署时推送连接与动作请求需要落在同一进程。
+"""
+import os
+import queue
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from . import codec
+
+STREAM_ENABLED = os.environ.get('STREAM', '1') != '0'
+STREAM_MAX_PER_GAME = int(os.environ.get('STREAM_MAX_PER_GAME', 4))
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', 256))
+STREAM_KEEPALIVE_S = float(os.environ.get('STREAM_KEEPALIVE_S', 15))
+
+# 日志中的回合分隔行（combat.end_player_turn / actions.end_turn 写入）
+ENEMY_TURN_MARK = '--- 敌人回合 ---'
+PLAYER_TURN_MARK = '--- 玩家回合 ---'
+
+_subscribers: Dict[str, List[queue.Queue]] = {}
+_lock = threading.Lock()
+_CLOSE = None  # 队列积压时通知连接结束，客户端重连后取完整视图
+
+
+class TooManyStreams(Exception):
+    """同一局的推送连接数已达上限"""
+
+
+def subscribe(game_id: str) -> queue.Queue:
+    """为该局新建一个订阅队列；超过 STREAM_MAX_PER_GAME 时抛出 TooManyStreams"""
+    q = queue.Queue(STREAM_QUEUE_SIZE)
+    with _lock:
+        subs = _subscribers.setdefault(game_id, [])
+        if len(subs) >= STREAM_MAX_PER_GAME:
+            raise TooManyStreams(game_id)
+        subs.append(q)
+    return q
+
+
+def unsubscribe(game_id: str, q: queue.Queue):
+    with _lock:
+        subs = _subscribers.get(game_id)
+        if subs and q in subs:
+            subs.remove(q)
+            if not subs:
+                del _subscribers[game_id]
+
+
+def has_subscribers(game_id: str) -> bool:
+    return game_id in _subscribers
+
+
+def subscriber_count() -> int:
+    with _lock:
+        return sum(len(subs) for subs in _subscribers.values())
+
+
+def publish(game_id: str, event: str, data: dict, event_id: Optional[int] = None) -> bool:
+    """推送给本进程中该局的订阅者，返回是否有订阅者"""
+    with _lock:
+        subs = list(_subscribers.get(game_id, ()))
+    if not subs:
+        return False
+    text = format_event(event, data, event_id)
+    for q in subs:
+        try:
+            q.put_nowait(text)
+        except queue.Full:
+            # 客户端读得太慢：丢掉积压，让它重连后重新同步
+            unsubscribe(game_id, q)
+            with q.mutex:
+                q.queue.clear()
+            q.put_nowait(_CLOSE)
+    return True
+
+
+def split_log(lines: List[str]) -> List[Tuple[str, List[str]]]:
+    """按回合分隔行把日志切成 [(阶段, 行)]"""
+    segments = []
+    phase, current = 'action', []
+    for line in lines:
+        if line in (ENEMY_TURN_MARK, PLAYER_TURN_MARK):
+            if current:
+                segments.append((phase, current))
+            phase = 'enemy_turn' if line == ENEMY_TURN_MARK else 'player_turn'
+            current = []
+        current.append(line)
+    if current:
+        segments.append((phase, current))
+    return segments
+
+
+def publish_action(game_id: str, base_version: int, version: int, ops: list, extra: dict) -> bool:
+    """推送一个已提交动作的日志与状态补丁；返回本进程中是否有订阅者（多进程部署时订阅可能在其他进程）"""
+    for phase, lines in split_log(extra.get('log') or []):
+        # 不带 id：日志之后的 patch 才标志该版本已送达
+        publish(game_id, 'log', {'version': version, 'phase': phase, 'lines': lines})
+    data = {k: v for k, v in extra.items() if k != 'log'}
+    data.update(version=version, base_version=base_version, patch=ops)
+    return publish(game_id, 'patch', data, version)
+
+
+def format_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    head = f'event: {event}\n' + (f'id: {event_id}\n' if event_id is not None else '')
+    return f'{head}data: {codec.dumps(data)}\n\n'
+
+
+def events(game_id: str, q: queue.Queue, first: str) -> Iterator[str]:
+    """SSE 响应体：先发 first（已格式化的事件），之后转发队列中的事件，空闲时发送注释行保活；连接断开时退订"""
+    try:
+        yield 'retry: 2000\n' + first
+        while True:
+            try:
+                text = q.get(timeout=STREAM_KEEPALIVE_S)
+            except queue.Empty:
+                yield ': ping\n\n'
+                continue
+            if text is _CLOSE:
+                return
+            yield text
+    finally:
+        unsubscribe(game_id, q)
@@ -0,0 +1,259 @@
+"""本地压测：同一套路由在 WSGI（app.py，Flask 开发服务器）、ASGI（asgi.py，单写线程）
+与多进程（serve.py）入口下的延迟与吞吐
+
+用法（在 backend 目录下运行，ASGI 模式需要 uvicorn）:
+    python loadtest.py --mode both --players 500 --duration 30
+    python loadtest.py --mode asgi --players 200 --think-ms 0      # 不等待，测饱和吞吐
+    python loadtest.py --mode prefork --workers 1,2,4 --think-ms 0 --client-procs 2   # 多 worker 扩展性
+    python loadtest.py --url http://127.0.0.1:5000                  # 压测已启动的服务器
+
+每个模拟玩家持有一条 keep-alive 连接，循环：新建游戏 → 取状态 → 进入第一个节点 → 出牌 / 结束回合，
+战斗结束（或进入非战斗阶段）后重新开局；两次请求之间随机等待 0 ~ 2×think-ms。
+服务器以子进程启动，使用临时数据库；压测前 --ramp 秒内的请求不计入统计。
+prefork 模式依次以各个 worker 数启动 serve.py，scaling 为相对 1 个 worker 的吞吐倍数，
+efficiency = scaling / worker 数；压测客户端本身也占 CPU，多核机器上用 --client-procs 分摊到多个进程。
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHARACTERS = ['warrior', 'mage', 'assassin']
+
+
+class _Client:
+    """最小的 HTTP/1.1 keep-alive 客户端（只处理 Content-Length 响应）"""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: dict = None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(payload)}\r\n'
+        if body is not None:
+            head += 'Content-Type: application/json\r\n'
+        self.writer.write(head.encode() + b'\r\n' + payload)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('连接被关闭')
+        status = int(status_line.split()[1])
+        length, close = 0, False
+        while (line := await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin1').partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection' and value.strip().lower() == 'close':
+                close = True
+        data = await self.reader.readexactly(length)
+        if close or status_line.startswith(b'HTTP/1.0'):
+            self.close()
+        return status, json.loads(data) if data else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class _Recorder:
+    def __init__(self):
+        self.started = None  # 预热结束的时刻，之前的请求不计入
+        self.latencies = []
+        self.errors = 0
+
+    def add(self, seconds: float, ok: bool):
+        if self.started is None:
+            return
+        if ok:
+            self.latencies.append(seconds)
+        else:
+            self.errors += 1
+
+
+async def _player(n: int, host: str, port: int, args, rec: _Recorder, stop: float):
+    client = _Client(host, port)
+    rng = random.Random(n)
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+
+    async def call(method, path, body=None):
+        t0 = time.perf_counter()
+        try:
+            status, data = await client.request(method, path, body)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            client.close()
+            rec.add(time.perf_counter() - t0, False)
+            return None
+        rec.add(time.perf_counter() - t0, status < 500)
+        return data if status < 400 else None
+
+    game_id = state = None
+    while time.monotonic() < stop:
+        if args.think_ms:
+            await asyncio.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+        if state is None or state.get('phase') != 'combat':
+            data = await call('POST', '/api/new_game', {'character': rng.choice(CHARACTERS), 'name': f'p{n}'})
+            if not data:
+                continue
+            game_id = data['game_id']
+            state = await call('GET', f'/api/state?game_id={game_id}')
+            if state and state['map']['available_nodes']:
+                state = await call('POST', '/api/select_node',
+                                   {'game_id': game_id, 'node_id': state['map']['available_nodes'][0]})
+            continue
+        hand = state.get('hand', [])
+        playable = [i for i, c in enumerate(hand)
+                    if not c.get('unplayable') and (not isinstance(c.get('cost'), int) or c['cost'] <= state['energy'])]
+        alive = [i for i, e in enumerate(state.get('enemies', [])) if e.get('hp', 0) > 0]
+        if playable and alive:
+            state = await call('POST', '/api/combat/play_card',
+                               {'game_id': game_id, 'card_index': playable[0], 'target_index': alive[0]})
+        else:
+            state = await call('POST', '/api/combat/end_turn', {'game_id': game_id})
+        if state is None:
+            state = await call('GET', f'/api/state?game_id={game_id}')
+    client.close()
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def _run_players(url: str, args, first: int, count: int):
+    parts = urlsplit(url)
+    rec = _Recorder()
+    loop = asyncio.get_running_loop()
+    stop = time.monotonic() + args.ramp + args.duration
+    loop.call_later(args.ramp, lambda: setattr(rec, 'started', time.monotonic()))
+    await asyncio.gather(*(_player(n, parts.hostname, parts.port or 80, args, rec, stop)
+                           for n in range(first, first + count)))
+    return rec.latencies, rec.errors, time.monotonic() - rec.started
+
+
+def _load_part(job):
+    url, args, first, count = job
+    return asyncio.run(_run_players(url, args, first, count))
+
+
+def run_load(url: str, args) -> dict:
+    """压测 url；--client-procs > 1 时把玩家分到多个客户端进程"""
+    procs = max(1, min(args.client_procs, args.players))
+    jobs = [(url, args, i * args.players // procs, (i + 1) * args.players // procs - i * args.players // procs)
+            for i in range(procs)]
+    if procs == 1:
+        parts = [_load_part(jobs[0])]
+    else:
+        with multiprocessing.get_context('fork').Pool(procs) as pool:
+            parts = pool.map(_load_part, jobs)
+    lat = sorted(x for part in parts for x in part[0])
+    elapsed = max(part[2] for part in parts)
+    return {
+        'players': args.players,
+        'requests': len(lat),
+        'errors': sum(part[1] for part in parts),
+        'throughput_rps': round(len(lat) / elapsed, 1),
+        'p50_ms': round(_percentile(lat, 0.50) * 1000, 1),
+        'p90_ms': round(_percentile(lat, 0.90) * 1000, 1),
+        'p99_ms': round(_percentile(lat, 0.99) * 1000, 1),
+        'max_ms': round((lat[-1] if lat else 0) * 1000, 1),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'服务器启动失败（退出码 {proc.returncode}）')
+        try:
+            urllib.request.urlopen(url + '/api/characters', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('等待服务器启动超时')
+
+
+def _server_cmd(mode: str, port: int, workers: int, server: str) -> list:
+    if mode == 'prefork':
+        return [sys.executable, os.path.join(HERE, 'serve.py'), '--host', '127.0.0.1', '--port', str(port),
+                '--workers', str(workers), '--server', server]
+    return [sys.executable, os.path.join(HERE, 'asgi.py' if mode == 'asgi' else 'app.py')]
+
+
+def run_mode(mode: str, args, workers: int = 1) -> dict:
+    """以子进程启动一种入口，压测后关闭"""
+    port = _free_port()
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, PORT=str(port), DEBUG='false', DB_PATH=os.path.join(workdir, f'loadtest-{mode}.db'))
+    # 服务器日志（开发服务器的访问日志等）写到临时目录，不占用终端
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    proc = subprocess.Popen(_server_cmd(mode, port, workers, args.server), cwd=HERE, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        _wait_ready(url, proc)
+        result = {'mode': mode}
+        if mode == 'prefork':
+            result.update(server=args.server, workers=workers)
+        result.update(run_load(url, args))
+        return result
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文字肉鸽游戏本地压测（WSGI / ASGI / 多进程）')
+    parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both', 'prefork'], default='both')
+    parser.add_argument('--url', default=None, help='压测已启动的服务器（忽略 --mode）')
+    parser.add_argument('--players', type=int, default=500, help='并发模拟玩家数')
+    parser.add_argument('--duration', type=float, default=30, help='统计时长（秒）')
+    parser.add_argument('--ramp', type=float, default=5, help='玩家陆续加入的预热时长（秒），不计入统计')
+    parser.add_argument('--think-ms', type=float, default=500, help='两次请求之间的平均等待（毫秒）')
+    parser.add_argument('--workers', default='1,2,4', help='prefork 模式依次测试的 worker 数')
+    parser.add_argument('--server', choices=['asgi', 'wsgi'], default='asgi', help='prefork 模式的 worker 服务器')
+    parser.add_argument('--client-procs', type=int, default=1, help='压测客户端进程数')
+    args = parser.parse_args()
+
+    if args.url:
+        results = [{'mode': args.url, **run_load(args.url.rstrip('/'), args)}]
+    elif args.mode == 'prefork':
+        results = [run_mode('prefork', args, int(n)) for n in args.workers.split(',')]
+        base = results[0]['throughput_rps'] / results[0]['workers']
+        for result in results:
+            result['scaling'] = round(result['throughput_rps'] / base, 2) if base else 0
+            result['efficiency'] = round(result['scaling'] / result['workers'], 2)
+    else:
+        modes = ['wsgi', 'asgi'] if args.mode == 'both' else [args.mode]
+        results = [run_mode(mode, args) for mode in modes]
+    for result in results:
+        print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""生产环境启动器 - 看护 worker 进程，可选预派生（prefork）多个 worker 共享同一个监听套接字
+
+    python serve.py                            # 单 worker（WEB_WORKERS 默认 1），服务器默认 WEB_SERVER=asgi
+    python serve.py --workers 4 --server wsgi  # 多 worker 需显式开启，代价见下
+
+主进程只持有监听套接字并看护 worker：异常退出的 worker 会被重新派生，收到 SIGTERM / SIGINT 时
+通知所有 worker 退出（超过 --graceful 秒仍未退出则强制结束）。worker 在 fork 之后才导入应用，
+SQLite 连接、状态缓存写回线程都属于各自进程。
+
+多 worker 时默认 STATE_FLUSH_MS=0（写穿）与 STATE_CACHE_VERIFY=1（命中缓存前核对版本）：同一局的请求
+落到不同 worker 时由 games.version 乐观并发保证一致（并发冲突返回 409），但每次保存都同步写库、
+每次命中缓存都多一次版本查询，热缓存的写回合并不再起作用；周期维护任务（game/maintenance.py）
+通过数据库中的租约（db.claim_job）保证全局只有一个 worker 执行。推送（/api/stream）只收到所在 worker 处理的动作，
+其他 worker 处理的动作要等客户端下次请求（响应中带完整日志）或重连时才同步。
+因此默认只启动一个 worker，CPU 确实成为瓶颈时再用 --workers / WEB_WORKERS 开启多进程。
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 1))
+WEB_SERVER = os.environ.get('WEB_SERVER', 'asgi')
+
+
+def _listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    # 非阻塞：多个 worker 同时被唤醒时，没抢到连接的一方 accept 立即返回而不是阻塞
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_wsgi(sock: socket.socket):
+    from werkzeug.serving import make_server
+    from app import app
+    from game.db import flush_games
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        flush_games()
+
+
+def _run_asgi(sock: socket.socket):
+    import uvicorn
+    from asgi import app
+    # uvicorn 自行处理 SIGTERM / SIGINT，退出时经 lifespan 把缓存写回
+    config = uvicorn.Config(app, log_level='warning', access_log=False, lifespan='on')
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _worker(sock: socket.socket, server: str):
+    """子进程入口：不返回"""
+    code = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        (_run_asgi if server == 'asgi' else _run_wsgi)(sock)
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 0
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def serve(host: str, port: int, workers: int, server: str, graceful: float = 30):
+    if workers > 1:
+        os.environ.setdefault('STATE_FLUSH_MS', '0')
+        os.environ.setdefault('STATE_CACHE_VERIFY', '1')
+    sock = _listen(host, port)
+    children = {}  # pid -> 启动时刻
+    stopping = []  # 收到退出信号的时刻
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _worker(sock, server)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        if not stopping:
+            stopping.append(time.monotonic())
+            for pid in list(children):
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f'🎮 文字肉鸽游戏服务器启动（{server} × {workers} worker）- http://{host}:{port}', flush=True)
+
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if stopping and time.monotonic() - stopping[0] > graceful:
+                for pid in list(children):
+                    os.kill(pid, signal.SIGKILL)
+            time.sleep(0.5)
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f'worker {pid} 退出（状态 {status}），重新派生', file=sys.stderr, flush=True)
+        if time.monotonic() - started < 1:
+            time.sleep(1)  # 启动即崩溃时不要空转
+        spawn()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文字肉鸽游戏多进程启动器')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=WEB_WORKERS)
+    parser.add_argument('--server', choices=['asgi', 'wsgi'], default=WEB_SERVER)
+    parser.add_argument('--graceful', type=float, default=30, help='退出时等待 worker 的秒数')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.server, args.graceful)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+"""测试公共设置：每次测试会话使用临时数据库；game.db 在导入时读取环境变量，必须先于导入设置"""
+import os
+import sys
+import tempfile
+
+os.environ.setdefault('DB_PATH', os.path.join(tempfile.mkdtemp(prefix='textgame-test-'), 'test.db'))
+os.environ.setdefault('MAINTENANCE', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,87 @@
+"""修改类请求中途出错：只回滚出错的动作，之前已确认、尚未写回的修改照常落盘"""
+import pytest
+
+import app as appmod
+from game import db
+from game.replay import state_hash
+from game.state_cache import StateCache
+from game.sim.policies import make_policy
+
+ROUTES = {'select_node': '/api/select_node', 'play_card': '/api/combat/play_card',
+          'end_turn': '/api/combat/end_turn'}
+
+
+@pytest.fixture
+def client():
+    return appmod.app.test_client()
+
+
+@pytest.fixture
+def held_cache(monkeypatch):
+    """不启动后台写回线程的缓存：脏状态一直留在内存中，直到显式 flush"""
+    cache = StateCache(db._write_states, db._encode_state, lock_for=db.lock_for, flush_interval_ms=60_000)
+    monkeypatch.setattr(cache, '_ensure_flusher', lambda: None)
+    monkeypatch.setattr(db, '_state_cache', cache)
+    return cache
+
+
+def _step(client, game_id, bot):
+    name, params = bot.decide(db.get_game(game_id))
+    resp = client.post(ROUTES[name], json={'game_id': game_id, **params})
+    assert resp.status_code == 200, resp.get_json()
+    return resp
+
+
+def test_failed_action_keeps_acknowledged_writes(client, held_cache, monkeypatch):
+    game_id = client.post('/api/new_game', json={'character': 'warrior', 'seed': 7}).get_json()['game_id']
+    bot = make_policy('greedy', 7)
+    for _ in range(3):
+        _step(client, game_id, bot)
+    acknowledged = db.get_game(game_id)
+    version, digest = acknowledged['version'], state_hash(acknowledged)
+    assert held_cache.dirty_state(game_id) is not None
+
+    real_apply = appmod.apply_action
+
+    def broken(state, name, **params):
+        real_apply(state, name, **params)
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(appmod, 'apply_action', broken)
+    name, params = bot.decide(db.get_game(game_id))
+    resp = client.post(ROUTES[name], json={'game_id': game_id, **params})
+    assert resp.status_code == 500
+    monkeypatch.setattr(appmod, 'apply_action', real_apply)
+
+    state = db.get_game(game_id)
+    assert state['version'] == version
+    assert state_hash(state) == digest
+
+    db.flush_games()
+    held_cache.discard(game_id)
+    reloaded = db.get_game(game_id)
+    assert reloaded['version'] == version
+    assert state_hash(reloaded) == digest
+    assert len(db.get_action_log(game_id)) == 4
+
+
+def test_failed_write_keeps_pending_actions(client, held_cache, monkeypatch):
+    game_id = client.post('/api/new_game', json={'character': 'mage', 'seed': 8}).get_json()['game_id']
+    bot = make_policy('greedy', 8)
+    _step(client, game_id, bot)
+
+    write_batch = db._write_batch
+
+    def fails_after_writing(*args):
+        # 动作已从待写队列取出，事务随后失败
+        write_batch(*args)
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(db, '_write_batch', fails_after_writing)
+    assert db.flush_games() == 0
+    assert held_cache.dirty_state(game_id) is not None
+    assert db.get_game(game_id) is held_cache.dirty_state(game_id)
+    monkeypatch.setattr(db, '_write_batch', write_batch)
+
+    assert db.flush_games() == 1
+    assert len(db.get_action_log(game_id)) == 2
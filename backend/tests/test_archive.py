@@ -0,0 +1,112 @@
+"""归档：已结束的对局移入 games_archive 后，记录可解压、可回放，热表中不再保留"""
+import sqlite3
+
+from game import codec, db, replay
+from game.sim.policies import make_policy
+
+import app as appmod
+
+ROUTES = {'select_node': '/api/select_node', 'play_card': '/api/combat/play_card',
+          'end_turn': '/api/combat/end_turn', 'pick_card': '/api/pick_card', 'pick_relic': '/api/pick_relic',
+          'rest': '/api/rest', 'shop_buy_card': '/api/shop/buy_card', 'shop_buy_relic': '/api/shop/buy_relic',
+          'shop_remove_card': '/api/shop/remove_card', 'shop_heal': '/api/shop/heal',
+          'shop_leave': '/api/shop/leave', 'event_choose': '/api/event/choose', 'use_potion': '/api/use_potion',
+          'shop_buy_potion': '/api/shop/buy_potion'}
+
+
+def _finished_game(seed: int) -> str:
+    """经 HTTP 接口打完一局（记录动作日志），返回 game_id"""
+    client = appmod.app.test_client()
+    game_id = client.post('/api/new_game', json={'character': 'warrior', 'seed': seed}).get_json()['game_id']
+    bot = make_policy('greedy', seed)
+    for _ in range(5000):
+        state = db.get_game(game_id)
+        if state['phase'] in replay.TERMINAL_PHASES:
+            return game_id
+        name, params = bot.decide(state)
+        if client.post(ROUTES[name], json={'game_id': game_id, **params}).status_code != 200:
+            name, params = bot.fallback(state)
+            assert client.post(ROUTES[name], json={'game_id': game_id, **params}).status_code == 200
+    raise AssertionError('对局没有结束')
+
+
+def test_finished_game_is_archived_and_replayable():
+    game_id = _finished_game(41)
+    db.flush_games()
+    expected = replay.record_from_db(game_id)
+    final = db.get_game(game_id)
+
+    # 空闲时间取负值：刚结束的对局也满足条件
+    result = db.archive_finished_games(idle_minutes=-1, limit=100)
+    assert result['games'] >= 1
+    with db._get_conn() as conn:
+        assert conn.execute('SELECT 1 FROM games WHERE game_id = ?', (game_id,)).fetchone() is None
+        assert conn.execute('SELECT 1 FROM game_deltas WHERE game_id = ?', (game_id,)).fetchone() is None
+    assert db.get_game(game_id) is None
+
+    record = db.get_archived_game(game_id)
+    assert record['result'] == final['phase']
+    assert record['log'] == expected['log']
+    assert record['actions']['count'] == len(expected['log'])
+    assert replay.state_hash(record['state']) == replay.state_hash(final)
+    assert replay.verify({'log': record['log'], 'hash': record['actions']['state_hash']})['ok']
+    assert any(r['game_id'] == game_id for r in db.iter_archived_games())
+
+
+def test_active_games_are_not_archived():
+    client = appmod.app.test_client()
+    game_id = client.post('/api/new_game', json={'character': 'mage', 'seed': 42}).get_json()['game_id']
+    db.flush_games()
+    db.archive_finished_games(idle_minutes=-1, limit=100)
+    assert db.get_game(game_id) is not None
+    assert db.get_archived_game(game_id) is None
+
+
+def _bump_from_another_connection(game_id: str, floor: int):
+    """模拟另一进程在归档读取之后写入该局（独立连接，立即提交）"""
+    other = sqlite3.connect(db.DB_PATH)
+    other.execute('UPDATE games SET version = version + 1, floor = ? WHERE game_id = ?', (floor, game_id))
+    other.commit()
+    other.close()
+
+
+def test_version_race_keeps_hot_row_and_writes_no_archive(monkeypatch):
+    game_id = _finished_game(43)
+    db.flush_games()
+    assert db._state_cache.get(game_id) is not None
+    real_record = db._archive_record
+
+    def racing_record(gid, *args):
+        if gid == game_id:
+            _bump_from_another_connection(game_id, 99)
+        return real_record(gid, *args)
+
+    monkeypatch.setattr(db, '_archive_record', racing_record)
+    db.archive_finished_games(idle_minutes=-1, limit=100)
+    monkeypatch.setattr(db, '_archive_record', real_record)
+
+    # 读取之后版本变了：热表记录、缓存都保留，也没有留下旧版本的归档
+    assert db.get_archived_game(game_id) is None
+    assert db._state_cache.get(game_id) is not None
+    with db._get_conn() as conn:
+        assert conn.execute('SELECT floor FROM games WHERE game_id = ?', (game_id,)).fetchone()['floor'] == 99
+
+    db.archive_finished_games(idle_minutes=-1, limit=100)
+    with db._get_conn() as conn:
+        assert conn.execute('SELECT 1 FROM games WHERE game_id = ?', (game_id,)).fetchone() is None
+        assert conn.execute('SELECT floor FROM games_archive WHERE game_id = ?', (game_id,)).fetchone()['floor'] == 99
+
+
+def test_stale_archive_row_is_replaced():
+    game_id = _finished_game(44)
+    db.flush_games()
+    with db._get_conn() as conn:
+        conn.execute('''
+            INSERT INTO games_archive (game_id, player_name, character, result, ascension, floor, actions,
+                                       state_hash, created_at, finished_at, archived_at, data)
+            VALUES (?, 'old', '', 'game_over', 0, 7, 0, NULL, '', '', '', ?)
+        ''', (game_id, codec.encode_state({'stale': True}, db.ARCHIVE_FORMAT)))
+        conn.commit()
+    db.archive_finished_games(idle_minutes=-1, limit=100)
+    record = db.get_archived_game(game_id)
+    assert 'stale' not in record and record['game_id'] == game_id
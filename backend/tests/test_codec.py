@@ -0,0 +1,52 @@
+"""序列化层：各 JSON 实现与各存档格式的往返"""
+import pytest
+
+from game import codec
+from game.combatants import CombatPlayer
+from game.state import create_new_game
+
+
+@pytest.fixture
+def state():
+    return codec.loads(codec.dumps(create_new_game('mage', '测试', 3, seed=42)))
+
+
+@pytest.mark.parametrize('name', sorted(codec.available_codecs()))
+def test_json_codec_round_trip(name, state):
+    impl = codec.available_codecs()[name]
+    text = impl.dumps(state)
+    assert '测试' in text
+    assert impl.loads(text) == state
+    assert impl.loads(impl.dumps_bytes(state)) == state
+
+
+def test_json_codecs_agree(state):
+    decoded = [impl.loads(impl.dumps(state)) for impl in codec.available_codecs().values()]
+    assert all(d == decoded[0] for d in decoded)
+
+
+@pytest.mark.parametrize('name', sorted(codec.available_codecs()))
+def test_json_codec_combatant_as_dict(name, state):
+    impl = codec.available_codecs()[name]
+    player = CombatPlayer.from_dict(state['player'])
+    assert impl.loads(impl.dumps({'player': player})) == {'player': state['player']}
+
+
+@pytest.mark.parametrize('fmt', codec.available_state_formats())
+def test_state_format_round_trip(fmt, state):
+    value = codec.encode_state(state, fmt)
+    assert codec.state_format_of(value) == fmt
+    assert codec.decode_state(value) == state
+
+
+def test_zstd_dictionary_round_trip(state, monkeypatch):
+    if 'zstd' not in codec.available_state_formats():
+        pytest.skip('未安装 zstandard')
+    samples = [codec.dumps(create_new_game(c, 'p', a, seed=a)).encode()
+               for c in ('warrior', 'mage', 'assassin') for a in range(20)]
+    data = codec.train_dictionary(samples, size=4096)
+    codec.register_dictionary(999, data)
+    monkeypatch.setattr(codec, '_active_dict_id', 999)
+    value = codec.encode_state_json(codec.dumps(state), 'zstd')
+    assert codec.state_format_of(value) == 'zstd-dict'
+    assert codec.decode_state(value) == state
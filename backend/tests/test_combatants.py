@@ -0,0 +1,104 @@
+"""战斗实体：与 dict 的往返、占位值、映射接口与 dict 的一致性"""
+import pytest
+
+from game import codec
+from game.cards import hydrate_player_cards
+from game.combatants import CombatEnemy, CombatPlayer, hydrate_combat, release_combat
+from game.replay import state_hash
+from game.rng import game_rng
+from game.state import create_new_game, init_combat
+
+
+@pytest.fixture
+def state():
+    state = create_new_game('assassin', 'p', 2, seed=11)
+    with game_rng(state):
+        init_combat(state, 'elite', 1)
+    return state
+
+
+def test_combat_state_round_trip(state):
+    assert isinstance(state['player'], CombatPlayer)
+    assert all(isinstance(e, CombatEnemy) for e in state['combat']['enemies'])
+    saved = codec.loads(codec.dumps(state))
+    assert type(saved['player']) is dict
+
+    player = CombatPlayer.from_dict(saved['player'])
+    assert player.to_dict() == saved['player']
+    for enemy in saved['combat']['enemies']:
+        assert CombatEnemy.from_dict(enemy).to_dict() == enemy
+
+    # 与 db 加载存档相同：先恢复卡牌实例，再转换战斗实体
+    loaded = codec.loads(codec.dumps(state))
+    hydrate_player_cards(loaded['player'])
+    hydrate_combat(loaded)
+    assert isinstance(loaded['player'], CombatPlayer)
+    assert state_hash(loaded) == state_hash(state)
+
+
+def test_release_combat(state):
+    digest = state_hash(state)
+    release_combat(state)
+    assert type(state['player']) is dict
+    assert all(type(e) is dict for e in state['combat']['enemies'])
+    assert state_hash(state) == digest
+
+
+def test_placeholder_copied_to_field_is_kept():
+    player = CombatPlayer.from_dict({'hp': 50})
+    player.energy = player.max_energy
+    player._saved_energy = player.block
+    player['strength'] = player.dexterity
+    assert player.to_dict() == {'hp': 50, 'energy': 3, '_saved_energy': 0, 'strength': 0}
+    assert all(type(v) is int for v in player.to_dict().values())
+
+
+def test_unset_fields_are_skipped():
+    player = CombatPlayer.from_dict({'hp': 50})
+    player.block += 0
+    player.pop('hp')
+    assert player.to_dict() == {'block': 0}
+
+
+@pytest.mark.parametrize('key', ['hp', 'block', 'orbs', 'gold', '_legacy'])
+def test_mapping_interface_matches_dict(key):
+    # _legacy：存档带来的字段表外的键，保存在 _extra 中
+    data = {'hp': 40, 'orbs': [], '_legacy': 1}
+    player, expected = CombatPlayer.from_dict(dict(data)), dict(data)
+    assert (key in player) == (key in expected)
+    assert player.get(key) == expected.get(key)
+    assert player.get(key, 7) == expected.get(key, 7)
+    assert player.pop(key, 7) == expected.pop(key, 7)
+    assert (key in player) == (key in expected)
+    with pytest.raises(KeyError):
+        player[key]
+    with pytest.raises(KeyError):
+        player.pop(key)
+    assert player.to_dict() == expected
+    if key in CombatPlayer._DEFAULTS:
+        assert player.setdefault(key, 5) == expected.setdefault(key, 5) == 5
+        assert player.to_dict() == expected
+
+
+@pytest.mark.parametrize('operation', [
+    lambda p: p['_tpyo'],
+    lambda p: p.get('_tpyo'),
+    lambda p: p.get('_tpyo', 0),
+    lambda p: p.pop('_tpyo'),
+    lambda p: p.pop('_tpyo', None),
+    lambda p: p.setdefault('_tpyo', 0),
+    lambda p: p.__setitem__('_tpyo', 1),
+])
+def test_unknown_key_raises(operation):
+    player = CombatPlayer.from_dict({'hp': 10})
+    assert '_tpyo' not in player
+    with pytest.raises(KeyError):
+        operation(player)
+
+
+def test_unknown_attribute_raises():
+    player = CombatPlayer.from_dict({'hp': 10})
+    with pytest.raises(AttributeError):
+        player._tpyo = 1
+    with pytest.raises(AttributeError):
+        player._tpyo
@@ -0,0 +1,98 @@
+"""排行榜：过滤查询走复合索引、键集分页游标、ISO 周分区"""
+import random
+from datetime import datetime
+
+import pytest
+
+from game import db, storage
+
+CHARACTERS = ('战士', '法师', '刺客')
+
+
+@pytest.fixture(scope='module', autouse=True)
+def runs():
+    db.init_db()
+    rnd = random.Random(5)
+    for i in range(150):
+        player = {'name': f'lb{i}', 'character_name': rnd.choice(CHARACTERS), 'character_icon': '',
+                  # 楼层、击杀取值范围小，制造大量同分记录，检验分页的 id 决胜
+                  'floor': rnd.randint(1, 4), 'kills': rnd.randint(0, 2), 'turns': 10}
+        db.record_run(player, rnd.choice(('victory', 'game_over')), rnd.choice((0, 5)))
+
+
+# 查询模式 -> 应使用的复合索引（与 leaderboard_query_plans 的模式一一对应）
+EXPECTED_INDEX = {
+    'all': 'idx_leaderboard_rank',
+    'all_page2': 'idx_leaderboard_rank',
+    'character': 'idx_leaderboard_character',
+    'ascension': 'idx_leaderboard_ascension',
+    'victories': 'idx_leaderboard_result',
+    'day': 'idx_leaderboard_day',
+    'week_page2': 'idx_leaderboard_week',
+    'character_victories': ('idx_leaderboard_character', 'idx_leaderboard_result'),
+}
+
+
+def test_filtered_queries_use_composite_index():
+    plans = db.leaderboard_query_plans()
+    assert set(plans) == set(EXPECTED_INDEX)
+    assert storage.check_plans(plans) == []
+    for mode, details in plans.items():
+        expected = EXPECTED_INDEX[mode]
+        expected = expected if isinstance(expected, tuple) else (expected,)
+        assert len(details) == 1, (mode, details)
+        assert any(f'USING INDEX {name} ' in details[0] or details[0].endswith(f'USING INDEX {name}')
+                   for name in expected), (mode, details)
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'character': '法师'},
+    {'ascension': 5},
+    {'result': 'victory'},
+    {'window': 'day'},
+    {'window': 'week', 'character': '战士'},
+    {'character': '刺客', 'ascension': 0, 'result': 'game_over'},
+])
+def test_cursor_pages_match_single_query(filters):
+    terms, params = db._leaderboard_where(**filters)
+    expected = [{name: r[name] for name in db._LEADERBOARD_FIELDS}
+                for r in db._select_leaderboard(terms, params, 10_000)]
+    assert expected
+
+    pages, cursor = [], None
+    while True:
+        entries, cursor = db.query_leaderboard(7, cursor=cursor, **filters)
+        pages.extend(entries)
+        if cursor is None:
+            break
+        assert len(entries) == 7
+    assert pages == expected
+
+
+def test_invalid_cursor_and_window_raise():
+    with pytest.raises(ValueError):
+        db.query_leaderboard(5, cursor='abc')
+    with pytest.raises(ValueError):
+        db.query_leaderboard(5, window='month')
+
+
+def test_week_window_is_iso_week():
+    fmt = db.LEADERBOARD_WINDOWS['week']
+    # 跨年的一周（周一 12-28 到周日 01-03）是同一个分区
+    assert datetime(2026, 12, 28).strftime(fmt) == datetime(2027, 1, 3).strftime(fmt) == '2026-W53'
+    assert datetime(2027, 1, 4).strftime(fmt) == '2027-W01'
+
+
+def test_old_week_partitions_are_migrated():
+    with db._get_conn() as conn:
+        run_id = conn.execute('''
+            INSERT INTO leaderboard (player_name, character, character_icon, ascension, floor, kills, turns,
+                                     cards_played, damage_dealt, damage_taken, result, score, created_at, day, week)
+            VALUES ('old', '战士', '', 0, 1, 0, 1, 0, 0, 0, 'game_over', 100, '2027-01-01T10:00:00', '2027-01-01', '2027-00')
+        ''').lastrowid
+        conn.commit()
+    db.init_db()
+    with db._get_conn() as conn:
+        week = conn.execute('SELECT week FROM leaderboard WHERE id = ?', (run_id,)).fetchone()['week']
+    assert week == '2026-W53'
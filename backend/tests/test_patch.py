@@ -0,0 +1,96 @@
+"""响应差量：diff 生成的补丁经 apply_patch（以及前端 api.js 的 applyPatch）还原出新视图"""
+import copy
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import app as appmod
+from game import patch
+from game.actions import ActionError, apply_action
+from game.sim.policies import make_policy
+from game.state import create_new_game
+
+API_JS = os.path.join(os.path.dirname(__file__), '..', '..', 'frontend', 'js', 'api.js')
+
+
+def _view_pairs(seed: int, character: str, limit: int = 400) -> list:
+    """一局机器人对局中每个动作前后的客户端视图"""
+    state = create_new_game(character, 'p', 0, seed=seed)
+    bot = make_policy('greedy', seed)
+    pairs = []
+    before = appmod._view(state)
+    for _ in range(limit):
+        if state['phase'] in ('victory', 'game_over'):
+            break
+        name, params = bot.decide(state)
+        try:
+            state, _ = apply_action(state, name, **params)
+        except ActionError:
+            decision = bot.fallback(state)
+            if decision is None:
+                break
+            state, _ = apply_action(state, decision[0], **decision[1])
+        state['version'] = state.get('version', 0) + 1
+        after = appmod._view(state)
+        pairs.append((before, after))
+        before = after
+    return pairs
+
+
+@pytest.fixture(scope='module')
+def pairs():
+    return _view_pairs(3, 'warrior') + _view_pairs(4, 'mage')
+
+
+def test_apply_patch_reproduces_view(pairs):
+    kinds = set()
+    for before, after in pairs:
+        ops = patch.diff(before, after)
+        kinds.update(op['op'] for op in ops)
+        assert patch.apply_patch(copy.deepcopy(before), ops) == after
+    assert {'add', 'remove', 'replace', 'copy'} <= kinds
+
+
+def test_identical_views_give_empty_patch(pairs):
+    before, _ = pairs[0]
+    assert patch.diff(before, copy.deepcopy(before)) == []
+
+
+def test_copy_reads_pre_patch_document():
+    before = {'hand': [{'id': 'a'}, {'id': 'b'}], 'discard': []}
+    after = {'hand': [{'id': 'b'}], 'discard': [{'id': 'a'}]}
+    ops = patch.diff(before, after)
+    assert {'op': 'copy', 'from': '/hand/0', 'path': '/discard/-'} in ops
+    assert patch.apply_patch(copy.deepcopy(before), ops) == after
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node')
+def test_js_apply_patch_matches_python(pairs, tmp_path):
+    cases = [[before, patch.diff(before, after)] for before, after in pairs]
+    cases_file = tmp_path / 'cases.json'
+    cases_file.write_text(json.dumps(cases, ensure_ascii=False), encoding='utf-8')
+    script = '''
+        const fs = require('fs');
+        const API = new Function(fs.readFileSync(process.argv[1], 'utf8') + '; return API;')();
+        const cases = JSON.parse(fs.readFileSync(process.argv[2], 'utf8'));
+        process.stdout.write(JSON.stringify(cases.map(([base, ops]) => API.applyPatch(base, ops))));
+    '''
+    out = subprocess.run(['node', '-e', script, API_JS, str(cases_file)],
+                         capture_output=True, text=True, check=True).stdout
+    assert json.loads(out) == [after for _, after in pairs]
+
+
+def test_view_cache_matches_state_object_and_version():
+    views = patch.ViewCache(max_entries=2)
+    state = {'game_id': 'g', 'version': 3}
+    views.put('g', state, {'version': 3})
+    assert views.get('g', state) == {'version': 3}
+    assert views.get('g', dict(state)) is None  # 重新加载的状态对象
+    state['version'] = 4
+    assert views.get('g', state) is None
+    views.put('h', state, {})
+    views.put('i', state, {})
+    assert len(views) == 2 and views.get('g', state) is None
@@ -0,0 +1,87 @@
+"""状态持久化：快照 + 路径增量落盘后重新加载，与内存中的状态一致"""
+import os
+
+import pytest
+
+from game import codec, db, delta
+from game.actions import ActionError, apply_action
+from game.replay import state_hash
+from game.sim.policies import make_policy
+from game.state import create_new_game
+
+
+def _reload(game_id: str):
+    """写回后丢弃缓存，从数据库（最新快照 + 之后的增量）重建；同时返回重建用到的增量条数"""
+    db.flush_games()
+    db._state_cache.discard(game_id)
+    with db._get_conn() as conn:
+        row = conn.execute('SELECT version, snapshot_version FROM games WHERE game_id = ?', (game_id,)).fetchone()
+        deltas = len(db._select_deltas(conn, game_id, row))
+    return db.get_game(game_id), deltas
+
+
+def test_split_and_join_round_trip():
+    state = create_new_game('warrior', 'p', 0, seed=21)
+    parts = delta.split_state(state)
+    assert ('player', 'hp') in parts and ('map', 'nodes') not in parts
+    assert codec.loads(delta.join_state(parts)) == codec.loads(codec.dumps(state))
+
+
+def test_apply_delta_matches_new_state():
+    before = create_new_game('mage', 'p', 0, seed=22)
+    after = codec.loads(codec.dumps(before))
+    after['player']['gold'] += 10
+    after['player'].pop('potions', None)
+    after['map']['extra'] = {'a': 1}
+    old, new = delta.split_state(before), delta.split_state(after)
+    changed, removed = delta.diff(new, delta.fingerprints(new), delta.fingerprints(old))
+    rebuilt = delta.apply_delta(codec.loads(codec.dumps(before)), codec.loads(delta.encode_delta(changed, removed)))
+    assert rebuilt == codec.loads(codec.dumps(after))
+
+
+@pytest.mark.parametrize('character, seed', [('warrior', 31), ('assassin', 32)])
+def test_saved_game_reloads_identically(character, seed):
+    db.init_db()
+    state = create_new_game(character, 'p', 0, seed=seed)
+    game_id = state['game_id']
+    db.save_game(game_id, state)
+    bot = make_policy('greedy', seed)
+    used_deltas = 0
+    for step in range(120):
+        if state['phase'] in ('victory', 'game_over'):
+            break
+        name, params = bot.decide(state)
+        try:
+            state, _ = apply_action(state, name, **params)
+        except ActionError:
+            name, params = bot.fallback(state)
+            state, _ = apply_action(state, name, **params)
+        db.save_game(game_id, state)
+        if step % 10 == 9:
+            digest, version = state_hash(state), state['version']
+            state, deltas = _reload(game_id)
+            used_deltas += deltas
+            assert state['version'] == version
+            assert state_hash(state) == digest
+
+    assert used_deltas > 0
+
+
+@pytest.mark.skipif('STATE_FORMAT' in os.environ, reason='检查默认存档格式')
+def test_snapshots_are_compressed_and_old_json_rows_load():
+    db.init_db()
+    assert codec.STATE_FORMAT == 'zlib'
+    state = create_new_game('mage', 'p', 0, seed=33)
+    game_id = state['game_id']
+    db.save_game(game_id, state)
+    db.flush_games()
+    with db._get_conn() as conn:
+        value = conn.execute('SELECT state_json FROM games WHERE game_id = ?', (game_id,)).fetchone()['state_json']
+        assert codec.state_format_of(value) == 'zlib'
+        assert len(value) * 2 < len(codec.dumps(state))
+        # 升级前写入的 JSON 文本快照
+        conn.execute('UPDATE games SET state_json = ? WHERE game_id = ?', (codec.dumps(state), game_id))
+        conn.commit()
+    digest = state_hash(state)
+    db._state_cache.discard(game_id)
+    assert state_hash(db.get_game(game_id)) == digest
@@ -0,0 +1,84 @@
+"""遗物钩子：每个处理函数都能在 CombatPlayer 上运行；线上模式下单个遗物出错不影响其他遗物"""
+import pytest
+
+from game import codec, relic_effects
+from game.cards import expand_card, make_card
+from game.combatants import CombatPlayer, release_combat
+from game.relic_effects import _HANDLERS, refresh_relic_hooks, strict_relics
+from game.relics import ALL_RELICS_DICT, STARTER_RELICS
+from game.rng import game_rng
+from game.state import create_new_game, init_combat
+
+RELICS = {**ALL_RELICS_DICT, **{r.id: r for r in STARTER_RELICS.values()}}
+HANDLED = sorted({relic_id for handlers in _HANDLERS.values() for relic_id in handlers})
+
+
+def _combat(relic_ids, seed=1, hp=None):
+    state = create_new_game('mage', 'p', 0, seed=seed)
+    state['player']['relics'] = [RELICS[relic_id].to_dict() for relic_id in relic_ids]
+    if hp is not None:
+        state['player']['hp'] = hp
+    with game_rng(state):
+        init_combat(state, 'elite', 1)
+    return state
+
+
+def _play_every_hook(state):
+    """依次触发全部钩子（战斗开始已由 init_combat 触发）"""
+    player, enemies = state['player'], state['combat']['enemies']
+    assert isinstance(player, CombatPlayer)
+    for turn in (2, 3):
+        relic_effects.on_turn_start(player, enemies, turn)
+        for card_id in ('w_strike', 'w_defend'):
+            relic_effects.on_card_played(player, enemies, expand_card(make_card(card_id)), turn, turn, 2 * turn)
+        relic_effects.on_discard(player, enemies, 2)
+        relic_effects.on_player_take_damage(player, enemies, 6)
+        relic_effects.on_turn_end(player, enemies)
+    player.hp = 1
+    relic_effects.on_combat_end(player, is_victory=True)
+    release_combat(state)
+
+
+def test_every_relic_is_defined():
+    assert set(HANDLED) <= set(RELICS)
+
+
+@pytest.mark.parametrize('relic_id', HANDLED)
+def test_relic_hooks_run_on_combat_player(relic_id):
+    with strict_relics():
+        state = _combat([relic_id])
+        _play_every_hook(state)
+    assert type(state['player']) is dict
+    assert all(type(e) is dict for e in state['combat']['enemies'])
+    assert codec.loads(codec.dumps(state)) == state
+
+
+def test_all_relics_together():
+    with strict_relics():
+        state = _combat(HANDLED, hp=10)
+        _play_every_hook(state)
+    assert codec.loads(codec.dumps(state)) == state
+
+
+def _broken(player, *args):
+    raise KeyError('_typo')
+
+
+def test_failing_relic_is_logged_and_skipped(monkeypatch, caplog):
+    monkeypatch.setitem(_HANDLERS, 'on_turn_start', {'broken': _broken, **_HANDLERS['on_turn_start']})
+    state = _combat(['happy_flower'])
+    player, enemies = state['player'], state['combat']['enemies']
+    player['relics'].insert(0, {'id': 'broken', 'name': '坏掉的遗物'})
+    refresh_relic_hooks(player)
+    flowers = player._flower_count
+
+    with strict_relics(False):
+        relic_effects.on_turn_start(player, enemies, 2)
+    # 排在后面的遗物照常触发
+    assert player._flower_count == flowers + 1
+    assert '遗物 broken 的 on_turn_start 效果出错' in caplog.text
+
+    strict = relic_effects.RELIC_STRICT
+    with strict_relics(), pytest.raises(KeyError):
+        relic_effects.on_turn_start(player, enemies, 3)
+    assert relic_effects.RELIC_STRICT is strict
@@ -0,0 +1,56 @@
+"""回放：同一动作日志总得到同一状态哈希，哈希不随存档往返与战斗实体的表示而变"""
+import pytest
+
+from game import codec, replay
+from game.cards import expand_card, hydrate_player_cards
+from game.combatants import hydrate_combat
+from game.sim.runner import simulate_run
+
+SEEDS = [('warrior', 1), ('mage', 2), ('assassin', 3)]
+
+
+@pytest.fixture(scope='module')
+def records():
+    return [replay.record_from_sim('greedy', character, 0, seed, max_steps=400) for character, seed in SEEDS]
+
+
+def test_replay_reproduces_recorded_hash(records):
+    results = replay.verify_corpus(records)
+    assert [r['ok'] for r in results] == [True] * len(records)
+    assert all(r['hash'] == record['hash'] for r, record in zip(results, records))
+
+
+def test_same_seed_same_hash():
+    first = simulate_run('greedy', 'mage', 1, 9, max_steps=300, record=True)
+    second = simulate_run('greedy', 'mage', 1, 9, max_steps=300, record=True)
+    assert first['log'] == second['log']
+    assert first['state_hash'] == second['state_hash']
+
+
+def test_hash_survives_save_and_load(records):
+    # 停在战斗中途：玩家与敌人是战斗实体
+    log = next(r['log'] for r in records)
+    cut = next(i for i, (_, name, _) in enumerate(log) if name == 'play_card') + 1
+    state = replay.replay(log[:cut])
+    assert state['phase'] == 'combat'
+    loaded = codec.loads(codec.dumps(state))
+    hydrate_player_cards(loaded['player'])
+    hydrate_combat(loaded)
+    assert replay.state_hash(loaded) == replay.state_hash(state)
+
+
+def test_tampered_log_is_reported(records):
+    record = dict(records[0], hash='0' * 32)
+    assert replay.verify(record)['ok'] is False
+    bad = dict(records[0], log=[records[0]['log'][0], [999, 'end_turn', {}]])
+    result = replay.verify(bad)
+    assert result['ok'] is False and 'seq 999' in result['error']
+
+
+def test_hash_ignores_card_representation(records):
+    state = replay.replay(records[0]['log'])
+    saved = codec.loads(codec.dumps(state))
+    assert replay.state_hash(saved) == replay.state_hash(state)
+    for pile in ('deck', 'draw_pile'):
+        saved['player'][pile] = [expand_card(c) for c in state['player'][pile]]
+    assert replay.state_hash(saved) == replay.state_hash(state)
@@ -0,0 +1,76 @@
+"""热状态缓存：写回失败、出错回滚"""
+import pytest
+
+from game.state_cache import StateCache
+
+
+class FlakyWriter:
+    """可切换为失败的写入函数，记录成功写入的 (game_id, 版本)"""
+
+    def __init__(self):
+        self.fail = False
+        self.written = []
+
+    def __call__(self, items):
+        if self.fail:
+            raise RuntimeError('disk full')
+        self.written.extend((game_id, data['version']) for game_id, data, _ in items)
+        return {game_id: 1 for game_id, _, _ in items}, []
+
+
+def _cache(writer, flush_interval_ms):
+    return StateCache(writer, lambda state, base: dict(state), flush_interval_ms=flush_interval_ms)
+
+
+def test_sync_flush_failure_reaches_caller():
+    writer = FlakyWriter()
+    cache = _cache(writer, 0)
+    writer.fail = True
+    with pytest.raises(RuntimeError):
+        cache.save('g', {'version': 1, 'phase': 'map'})
+    assert cache.stats()['flush_errors'] == 1
+    assert cache.dirty_state('g') is not None
+
+    writer.fail = False
+    cache.save('g', {'version': 2, 'phase': 'map'})
+    assert writer.written == [('g', 2)]
+    assert cache.dirty_state('g') is None
+
+
+def test_critical_phase_failure_reaches_caller():
+    writer = FlakyWriter()
+    cache = _cache(writer, 60_000)
+    writer.fail = True
+    with pytest.raises(RuntimeError):
+        cache.save('g', {'version': 1, 'phase': 'game_over'})
+    writer.fail = False
+
+
+def test_async_flush_failure_stays_dirty_and_retries():
+    writer = FlakyWriter()
+    cache = _cache(writer, 60_000)
+    cache.save('g', {'version': 1, 'phase': 'map'})
+    writer.fail = True
+    assert cache.flush() == 0
+    assert cache.stats()['flush_errors'] == 1
+    assert cache.dirty_state('g') == {'version': 1, 'phase': 'map'}
+
+    writer.fail = False
+    assert cache.flush() == 1
+    assert writer.written == [('g', 1)]
+    assert cache.dirty_state('g') is None
+
+
+def test_restore_keeps_unflushed_state_dirty():
+    writer = FlakyWriter()
+    cache = _cache(writer, 60_000)
+    acknowledged = {'version': 1, 'phase': 'map'}
+    cache.save('g', acknowledged)
+    cache.save('g', {'version': 2, 'phase': 'map', 'half': True})
+
+    assert cache.restore('g', dict(acknowledged))
+    assert cache.flush() == 1
+    assert writer.written == [('g', 1)]
+    # 数据库中已是该版本：不再回滚
+    assert not cache.restore('g', dict(acknowledged))
+    assert not cache.restore('missing', dict(acknowledged))
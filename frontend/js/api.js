@@ -4,6 +4,10 @@
 const API_BASE = '/api';
 
 const API = {
+  // 差量响应：请求带上已持有视图的版本号，服务端只返回变化部分（JSON Patch）
+  useDiff: true,
+  view: null, // 最近一次的完整视图（不含 log 等附加字段）
+
   async request(method, path, body = null) {
     const opts = {
       method,
@@ -16,7 +20,7 @@ const API = {
         const err = await res.json().catch(() => ({ error: '请求失败' }));
         throw new Error(err.error || '请求失败');
       }
-      return await res.json();
+      return API.unpack(await res.json());
     } catch (e) {
       if (e.message !== '请求失败') throw e;
       throw e;
@@ -26,51 +30,134 @@ const API = {
   get: (path) => API.request('GET', path),
   post: (path, body) => API.request('POST', path, body),
 
+  // 某局游戏已持有视图的版本号（没有时为 -1，服务端会返回完整视图）
+  baseVersion(gameId) {
+    return API.view && API.view.game_id === gameId ? API.view.version : -1;
+  },
+
+  // 带上 base_version 的动作请求
+  action(path, body) {
+    if (API.useDiff) body = { ...body, base_version: API.baseVersion(body.game_id) };
+    return API.post(path, body);
+  },
+
+  // 把差量响应还原为完整状态（附加字段合并在顶层，与不启用差量时的响应一致）
+  unpack(data) {
+    if (!data || (data.patch === undefined && data.state === undefined)) return data;
+    const { patch, state, version, base_version, ...extra } = data;
+    let view;
+    if (state !== undefined) {
+      view = state;
+    } else if (API.view && API.view.version === version) {
+      view = API.view; // 推送已先送达同一版本的补丁
+    } else if (API.view && API.view.version === base_version) {
+      view = API.applyPatch(API.view, patch);
+    } else {
+      API.view = null; // 下次请求取完整视图
+      throw new Error('本地状态已过期，请刷新');
+    }
+    API.view = view;
+    return { ...view, ...extra };
+  },
+
+  // add / remove / replace / copy 补丁（与 backend/game/patch.py 的 apply_patch 一致；copy 的 from 指向打补丁前的文档，不是 RFC 6902）
+  // 返回新文档，不修改 base
+  applyPatch(base, ops) {
+    let doc = structuredClone(base);
+    const split = path => path.split('/').slice(1).map(p => p.replace(/~1/g, '/').replace(/~0/g, '~'));
+    const resolve = (root, parts) => parts.reduce((n, p) => n[Array.isArray(n) ? Number(p) : p], root);
+    for (const op of ops) {
+      const value = op.op === 'copy' ? structuredClone(resolve(base, split(op.from))) : op.value;
+      if (op.path === '') {
+        doc = value;
+        continue;
+      }
+      const parts = split(op.path);
+      const last = parts.pop();
+      const node = resolve(doc, parts);
+      if (Array.isArray(node)) {
+        if (op.op === 'remove') node.splice(Number(last), 1);
+        else if (last === '-') node.push(value);
+        else if (op.op === 'replace') node[Number(last)] = value;
+        else node.splice(Number(last), 0, value);
+      } else if (op.op === 'remove') {
+        delete node[last];
+      } else {
+        node[last] = value;
+      }
+    }
+    return doc;
+  },
+
+  // 订阅某局的服务端推送（SSE）：state / patch 更新本地视图后回调 onState，log 逐段回调 onLog；
+  // 自己的动作若响应先到则忽略对应补丁；中间漏了版本时关闭连接并回调 onGap。不支持 EventSource 时返回 null
+  openStream(gameId, { onState, onLog, onGap }) {
+    if (!window.EventSource) return null;
+    const es = new EventSource(`${API_BASE}/stream?game_id=${gameId}&base_version=${API.baseVersion(gameId)}`);
+    es.addEventListener('state', (e) => onState(API.unpack(JSON.parse(e.data))));
+    es.addEventListener('log', (e) => onLog(JSON.parse(e.data)));
+    es.addEventListener('patch', (e) => {
+      const data = JSON.parse(e.data);
+      if (!API.view || API.view.game_id !== gameId || data.version <= API.view.version) return;
+      if (data.base_version !== API.view.version) {
+        API.view = null;
+        es.close();
+        onGap();
+        return;
+      }
+      onState(API.unpack(data));
+    });
+    return es;
+  },
+
   // 游戏管理
   getCharacters: () => API.get('/characters'),
   newGame: (character, name, ascension = 0) => API.post('/new_game', { character, name, ascension }),
-  getState: (gameId) => API.get(`/state?game_id=${gameId}`),
+  getState: (gameId) => API.get(`/state?game_id=${gameId}` + (API.useDiff ? `&base_version=${API.baseVersion(gameId)}` : '')),
 
   // 地图
   getMap: (gameId) => API.get(`/map?game_id=${gameId}`),
-  selectNode: (gameId, nodeId) => API.post('/select_node', { game_id: gameId, node_id: nodeId }),
+  selectNode: (gameId, nodeId) => API.action('/select_node', { game_id: gameId, node_id: nodeId }),
 
   // 战斗
   playCard: (gameId, cardIndex, targetIndex) =>
-    API.post('/combat/play_card', { game_id: gameId, card_index: cardIndex, target_index: targetIndex }),
-  endTurn: (gameId) => API.post('/combat/end_turn', { game_id: gameId }),
+    API.action('/combat/play_card', { game_id: gameId, card_index: cardIndex, target_index: targetIndex }),
+  endTurn: (gameId) => API.action('/combat/end_turn', { game_id: gameId }),
+  // 一次执行多个战斗动作：[{ action: 'play_card', card_index, target_index }, { action: 'end_turn' }, ...]
+  combatBatch: (gameId, actions) => API.action('/combat/batch', { game_id: gameId, actions }),
 
   // 卡牌奖励
-  pickCard: (gameId, cardId) => API.post('/pick_card', { game_id: gameId, card_id: cardId }),
-  skipCard: (gameId) => API.post('/pick_card', { game_id: gameId, skip: true }),
+  pickCard: (gameId, cardId) => API.action('/pick_card', { game_id: gameId, card_id: cardId }),
+  skipCard: (gameId) => API.action('/pick_card', { game_id: gameId, skip: true }),
 
   // Boss遗物
-  pickRelic: (gameId, relicId) => API.post('/pick_relic', { game_id: gameId, relic_id: relicId }),
+  pickRelic: (gameId, relicId) => API.action('/pick_relic', { game_id: gameId, relic_id: relicId }),
 
   // 休息点
-  rest: (gameId, action, cardId) => API.post('/rest', { game_id: gameId, action, card_id: cardId }),
+  rest: (gameId, action, cardId) => API.action('/rest', { game_id: gameId, action, card_id: cardId }),
 
   // 商店
-  buyCard: (gameId, cardId) => API.post('/shop/buy_card', { game_id: gameId, card_id: cardId }),
-  buyRelic: (gameId, relicId) => API.post('/shop/buy_relic', { game_id: gameId, relic_id: relicId }),
-  removeCard: (gameId, cardId) => API.post('/shop/remove_card', { game_id: gameId, card_id: cardId }),
-  shopHeal: (gameId) => API.post('/shop/heal', { game_id: gameId }),
-  leaveShop: (gameId) => API.post('/shop/leave', { game_id: gameId }),
+  buyCard: (gameId, cardId) => API.action('/shop/buy_card', { game_id: gameId, card_id: cardId }),
+  buyRelic: (gameId, relicId) => API.action('/shop/buy_relic', { game_id: gameId, relic_id: relicId }),
+  removeCard: (gameId, cardId) => API.action('/shop/remove_card', { game_id: gameId, card_id: cardId }),
+  shopHeal: (gameId) => API.action('/shop/heal', { game_id: gameId }),
+  leaveShop: (gameId) => API.action('/shop/leave', { game_id: gameId }),
 
   // 事件
   eventChoose: (gameId, choiceIndex) =>
-    API.post('/event/choose', { game_id: gameId, choice_index: choiceIndex }),
+    API.action('/event/choose', { game_id: gameId, choice_index: choiceIndex }),
 
   // 查看牌组
   getDeck: (gameId) => API.get(`/deck?game_id=${gameId}`),
 
   // 排行榜
-  getLeaderboard: (limit = 20) => API.get(`/leaderboard?limit=${limit}`),
+  // filters: { character, ascension, result, window, cursor }，翻页时传入上一页的 next_cursor
+  getLeaderboard: (limit = 20, filters = {}) => API.get(`/leaderboard?${new URLSearchParams({ limit, ...filters })}`),
   getActivePlayers: () => API.get('/active_players'),
 
   // 药水
   usePotion: (gameId, potionIndex, targetIndex) =>
-    API.post('/use_potion', { game_id: gameId, potion_index: potionIndex, target_index: targetIndex }),
+    API.action('/use_potion', { game_id: gameId, potion_index: potionIndex, target_index: targetIndex }),
   buyPotion: (gameId, potionId) =>
-    API.post('/shop/buy_potion', { game_id: gameId, potion_id: potionId }),
+    API.action('/shop/buy_potion', { game_id: gameId, potion_id: potionId }),
 };
@@ -8,6 +8,8 @@ const Game = {
   selectedCharacter: null,
   selectedEnemy: 0,
   isProcessing: false,
+  stream: null,
+  logQueue: Promise.resolve(),
 
   // ===== 初始化 =====
   async init() {
@@ -22,6 +24,7 @@ const Game = {
         if (state && state.phase && state.phase !== 'game_over' && state.phase !== 'victory') {
           UI.notify('已恢复上次游戏进度', 'success', 2500);
           this.applyState(state);
+          this.openStream();
           return;
         }
       } catch (e) {
@@ -142,6 +145,7 @@ const Game = {
       localStorage.setItem('roguelike_game_id', this.gameId);
       UI.notify(`游戏开始！欢迎，${name}！`, 'success', 2000);
       await this.refreshState();
+      this.openStream();
     } catch (e) {
       UI.notify('开始游戏失败：' + e.message, 'error');
     } finally {
@@ -160,6 +164,42 @@ const Game = {
     }
   },
 
+  // ===== 服务端推送 =====
+  openStream() {
+    this.closeStream();
+    this.stream = API.openStream(this.gameId, {
+      // 自己的动作进行中时由响应更新界面；其余（如另一个标签页的操作）由推送更新
+      onState: (state) => { if (!this.isProcessing) this.applyState(state); },
+      onLog: (data) => this.playLog(data),
+      onGap: () => this.openStream(),
+    });
+  },
+
+  closeStream() {
+    if (this.stream) this.stream.close();
+    this.stream = null;
+  },
+
+  streamLive() {
+    return !!this.stream && this.stream.readyState === EventSource.OPEN;
+  },
+
+  // 日志已经推送（streamed）且推送连接正常时由推送逐段播放，否则直接显示响应中的日志
+  showLog(state) {
+    if (state.log && !(state.streamed && this.streamLive())) UI.appendLog(state.log);
+  },
+
+  // 推送的日志按段排队播放，敌人回合逐行显示
+  playLog({ phase, lines }) {
+    const delay = phase === 'enemy_turn' ? 200 : 0;
+    this.logQueue = this.logQueue.then(async () => {
+      for (const line of lines) {
+        UI.appendLog([line]);
+        if (delay) await new Promise((resolve) => setTimeout(resolve, delay));
+      }
+    });
+  },
+
   applyState(state) {
     if (!state) return;
     this.state = state;
@@ -225,11 +265,13 @@ const Game = {
         break;
 
       case 'game_over':
+        this.closeStream();
         UI.showScreen('game-over');
         UI.renderStats(player, 'game-over-stats', state.final_stats, state.ascension_name);
         break;
 
       case 'victory':
+        this.closeStream();
         UI.showScreen('victory');
         UI.renderStats(player, 'victory-stats', state.final_stats, state.ascension_name);
         break;
@@ -311,7 +353,7 @@ const Game = {
         }
       }
       this.applyState(state);
-      if (state.log) UI.appendLog(state.log);
+      this.showLog(state);
 
       if (state.combat_result === 'victory') {
         UI.notify('⚔️ 战斗胜利！', 'success', 2000);
@@ -337,7 +379,7 @@ const Game = {
         UI.flashElement('header-hp', 'damage');
       }
       this.applyState(state);
-      if (state.log) UI.appendLog(state.log);
+      this.showLog(state);
 
       if (state.combat_result === 'defeat') {
         UI.notify('💀 你已倒下...', 'error', 3000);
@@ -566,7 +608,7 @@ const Game = {
     this.isProcessing = true;
     try {
       const state = await API.usePotion(this.gameId, potionIndex, this.selectedEnemy);
-      if (state.log) UI.appendLog(state.log);
+      this.showLog(state);
       this.applyState(state);
     } catch (e) {
       UI.notify(e.message || '使用药水失败', 'error');